@@ -2,8 +2,9 @@ from typing import Dict, Any
 
 from attr import asdict
 from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
 
-from shotgrid_leecher.domain import batch_domain
+from shotgrid_leecher.domain import batch_domain, batch_job_domain
 from shotgrid_leecher.record.commands import (
     ShotgridCheckCommand,
     UpdateShotgridInAvalonCommand,
@@ -11,14 +12,20 @@ from shotgrid_leecher.record.commands import (
 )
 from shotgrid_leecher.record.http_models import BatchConfig
 from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
-from shotgrid_leecher.record.results import BatchResult
 from shotgrid_leecher.repository import avalon_repo, config_repo
 
 router = APIRouter(tags=["batch"], prefix="/batch")
 
+# Shotgrid and Mongo calls are blocking, all of them run in the threadpool
+# to keep the event loop serving other endpoints during a batch
 
-def _get_credentials(batch_config: BatchConfig) -> ShotgridCredentials:
-    credentials = config_repo.find_credentials_by_url(batch_config.shotgrid_url)
+
+async def _get_credentials(
+    batch_config: BatchConfig,
+) -> ShotgridCredentials:
+    credentials = await run_in_threadpool(
+        config_repo.find_credentials_by_url, batch_config.shotgrid_url
+    )
     if not credentials:
         raise HTTPException(
             status_code=404,
@@ -27,27 +34,22 @@ def _get_credentials(batch_config: BatchConfig) -> ShotgridCredentials:
     return credentials
 
 
-@router.put("/{project_name}")
-async def batch_create(project_name: str, batch_config: BatchConfig):
+@router.put("/{project_name}", status_code=202)
+async def batch_create(
+    project_name: str, batch_config: BatchConfig
+) -> Dict[str, Any]:
     command = CreateShotgridInAvalonCommand.from_http_model(
-        project_name, _get_credentials(batch_config), batch_config
+        project_name, await _get_credentials(batch_config), batch_config
     )
-    result = batch_domain.create_shotgrid_in_avalon(command)
+    return asdict(await batch_job_domain.submit_create_job(command))
 
-    if result == BatchResult.WRONG_PROJECT_NAME:
-        raise HTTPException(
-            status_code=500,
-            detail="Openpype and Shotgrid project name does not correspond",
-        )
-    return result
 
-
-@router.post("/{project_name}")
+@router.post("/{project_name}", status_code=202)
 async def batch_update(
     project_name: str,
     batch_config: BatchConfig,
-):
-    project = avalon_repo.fetch_project(project_name)
+) -> Dict[str, Any]:
+    project = await run_in_threadpool(avalon_repo.fetch_project, project_name)
     if not project:
         raise HTTPException(
             status_code=404,
@@ -55,18 +57,22 @@ async def batch_update(
         )
     command = UpdateShotgridInAvalonCommand.from_http_model(
         project_name,
-        _get_credentials(batch_config),
+        await _get_credentials(batch_config),
         batch_config,
         project.data,
     )
-    result = batch_domain.update_shotgrid_in_avalon(command)
+    return asdict(await batch_job_domain.submit_update_job(command))
+
 
-    if result == BatchResult.WRONG_PROJECT_NAME:
+@router.get("/jobs/{job_id}")
+async def batch_job(job_id: str) -> Dict[str, Any]:
+    job = await run_in_threadpool(batch_job_domain.fetch_batch_job, job_id)
+    if not job:
         raise HTTPException(
-            status_code=500,
-            detail="Openpype and Shotgrid project name does not correspond",
+            status_code=404,
+            detail=f"No batch job found for {job_id}",
         )
-    return result
+    return asdict(job)
 
 
 @router.get("/check")
@@ -78,4 +84,7 @@ async def batch_check(
 ) -> Dict[str, Any]:
     cred = ShotgridCredentials(shotgrid_url, script_name, script_key)
     command = ShotgridCheckCommand(shotgrid_project_id, cred)
-    return asdict(batch_domain.check_shotgrid_before_batch(command))
+    result = await run_in_threadpool(
+        batch_domain.check_shotgrid_before_batch, command
+    )
+    return asdict(result)
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from shotgrid_leecher.domain import schedule_domain
+from shotgrid_leecher.utils.metrics import render_metrics
+
+router = APIRouter(tags=["meta"], prefix="/metrics")
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    await schedule_domain.refresh_schedule_metrics()
+    return PlainTextResponse(render_metrics(), media_type=_CONTENT_TYPE)
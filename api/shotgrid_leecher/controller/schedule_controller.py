@@ -1,6 +1,7 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
 
 from shotgrid_leecher.domain import schedule_domain
 from shotgrid_leecher.mapper import query_mapper
@@ -29,7 +30,9 @@ async def projects(
     params: ScheduleQueryParams = Depends(ScheduleQueryParams),
 ) -> List[ScheduleProject]:
     query = query_mapper.http_to_find_query(params)
-    return schedule_repo.fetch_scheduled_projects(query)
+    return await run_in_threadpool(
+        schedule_repo.fetch_scheduled_projects, query
+    )
 
 
 @router.get("/enhanced-projects")
@@ -37,7 +40,9 @@ async def enhanced_projects(
     params: ScheduleQueryParams = Depends(ScheduleQueryParams),
 ) -> List[EnhancedScheduleProject]:
     query = query_mapper.http_to_find_query(params)
-    return schedule_repo.fetch_enhanced_projects(query)
+    return await run_in_threadpool(
+        schedule_repo.fetch_enhanced_projects, query
+    )
 
 
 @router.get("/queue")
@@ -45,7 +50,7 @@ async def queue(
     params: ScheduleQueryParams = Depends(ScheduleQueryParams),
 ) -> List[ScheduleQueueItem]:
     query = query_mapper.http_to_find_query(params)
-    return schedule_repo.fetch_scheduled_queue(query)
+    return await run_in_threadpool(schedule_repo.fetch_scheduled_queue, query)
 
 
 @router.get("/logs")
@@ -53,19 +58,21 @@ async def logs(
     params: ScheduleQueryParams = Depends(ScheduleQueryParams),
 ) -> List[ScheduleLog]:
     query = query_mapper.http_to_find_query(params)
-    return schedule_repo.fetch_scheduled_logs(query)
+    return await run_in_threadpool(schedule_repo.fetch_scheduled_logs, query)
 
 
 @router.post("/{project_name}")
 async def schedule_batch(project_name: str, batch_config: BatchConfig):
-    credentials = config_repo.find_credentials_by_url(batch_config.shotgrid_url)
+    credentials = await run_in_threadpool(
+        config_repo.find_credentials_by_url, batch_config.shotgrid_url
+    )
     if not credentials:
         raise HTTPException(
             status_code=404,
             detail="Credentials not found",
         )
     query = FindEntityQuery({"_id": project_name}, limit=1)
-    if schedule_repo.fetch_scheduled_projects(query):
+    if await run_in_threadpool(schedule_repo.fetch_scheduled_projects, query):
         raise HTTPException(
             status_code=422,
             detail=f"Project {project_name} already exists",
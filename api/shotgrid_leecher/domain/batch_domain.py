@@ -1,34 +1,82 @@
-from typing import Dict, Any, List, Set, Tuple, Optional
+import os
+from contextlib import closing
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import (
+    Dict,
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Set,
+    Tuple,
+    Optional,
+    Callable,
+    Sequence,
+)
 
+import attr
 from bson.objectid import ObjectId
-from toolz import curry, pipe
+from toolz import curry, partition_all, pipe
 
 import shotgrid_leecher.repository.shotgrid_entity_repo as entity_repo
 import shotgrid_leecher.repository.shotgrid_hierarchy_repo as repository
+import shotgrid_leecher.utils.connectivity as conn
 from shotgrid_leecher.mapper import avalon_mapper, intermediate_mapper
 from shotgrid_leecher.record.avalon_structures import AvalonProjectData
 from shotgrid_leecher.record.commands import (
     UpdateShotgridInAvalonCommand,
+    UpdateShotgridChangesInAvalonCommand,
     ShotgridCheckCommand,
     CreateShotgridInAvalonCommand,
+    UpsertShotgridWatermarksCommand,
 )
+from shotgrid_leecher.record.enums import ShotgridType
 from shotgrid_leecher.record.intermediate_structures import (
     IntermediateRow,
+    IntermediateColumns,
 )
+from shotgrid_leecher.record.leecher_structures import ShotgridWatermark
 from shotgrid_leecher.record.queries import (
     ShotgridFindProjectByIdQuery,
     ShotgridHierarchyByProjectQuery,
+    ShotgridHierarchyDeltaQuery,
+    ShotgridHierarchyChangesQuery,
+)
+from shotgrid_leecher.record.results import (
+    BatchCheckResult,
+    BatchResult,
+    BatchStage,
 )
-from shotgrid_leecher.record.results import BatchCheckResult, BatchResult
+from shotgrid_leecher.record.shotgrid_structures import ShotgridEntitySummary
 from shotgrid_leecher.record.shotgrid_subtypes import ProjectFieldsMapping
 from shotgrid_leecher.repository import (
     avalon_repo,
     intermediate_hierarchy_repo,
+    watermark_repo,
 )
-from shotgrid_leecher.utils.functional import try_or
-from shotgrid_leecher.writers import batch_writer
+from shotgrid_leecher.utils import metrics
+from shotgrid_leecher.utils.fetch_planner import prefetch
+from shotgrid_leecher.utils.ids import to_fingerprint
+from shotgrid_leecher.writers import batch_writer, watermark_writer
 
 Map = Dict[str, Any]
+BatchProgress = Callable[[BatchStage, int], None]
+
+_FULL_SYNC_INTERVAL = timedelta(
+    hours=float(os.getenv("SHOTGRID_FULL_SYNC_HOURS", 24))
+)
+_STREAM_CHUNK_SIZE = int(os.getenv("BATCH_STREAM_CHUNK_SIZE", 1000))
+_SHOTGRID_DEADLINE_SECONDS = float(
+    os.getenv("BATCH_SHOTGRID_DEADLINE_SECONDS", 0)
+)
+_ROWS_MAPPED = metrics.counter(
+    "leecher_rows_mapped_total", "Rows produced per pipeline stage", ["stage"]
+)
+
+
+def _no_progress(stage: BatchStage, count: int) -> None:
+    pass
 
 
 def check_shotgrid_before_batch(
@@ -47,12 +95,97 @@ def check_shotgrid_before_batch(
 
 def update_shotgrid_in_avalon(
     command: UpdateShotgridInAvalonCommand,
+    progress: BatchProgress = _no_progress,
+) -> BatchResult:
+    with conn.shotgrid_deadline(_SHOTGRID_DEADLINE_SECONDS):
+        return _update_shotgrid_in_avalon(command, progress)
+
+
+def _update_shotgrid_in_avalon(
+    command: UpdateShotgridInAvalonCommand,
+    progress: BatchProgress,
+) -> BatchResult:
+    query = _to_hierarchy_query(command)
+    summaries = (
+        repository.get_summaries_by_project(query)
+        if command.incremental
+        else dict()
+    )
+    stored_hierarchy = (
+        _fetch_stored_hierarchy(command) if command.incremental else None
+    )
+    watermarks = _fetch_usable_watermarks(command, stored_hierarchy or [])
+    if command.streaming and not watermarks:
+        return _stream_shotgrid_in_avalon(
+            command, query, stored_hierarchy, summaries, progress
+        )
+    current_hierarchy = _fetch_current_hierarchy(
+        _to_delta_query(query, watermarks, summaries),
+        stored_hierarchy,
+    )
+    result = _write_hierarchy(
+        command, current_hierarchy, stored_hierarchy, progress
+    )
+    if result == BatchResult.OK and command.incremental:
+        watermark_writer.upsert_watermarks(
+            _to_watermarks_command(command, watermarks, summaries)
+        )
+    return result
+
+
+def update_shotgrid_changes_in_avalon(
+    command: UpdateShotgridChangesInAvalonCommand,
+    progress: BatchProgress = _no_progress,
+) -> BatchResult:
+    with conn.shotgrid_deadline(_SHOTGRID_DEADLINE_SECONDS):
+        return _update_shotgrid_changes_in_avalon(command, progress)
+
+
+def _update_shotgrid_changes_in_avalon(
+    command: UpdateShotgridChangesInAvalonCommand,
+    progress: BatchProgress,
+) -> BatchResult:
+    # changes only apply to a hierarchy stored by a previous batch, the
+    # watermarks are left to the next scheduled batch
+    stored_hierarchy = _fetch_stored_hierarchy(command)
+    if not stored_hierarchy:
+        return _update_shotgrid_in_avalon(command, progress)
+    query = ShotgridHierarchyChangesQuery(
+        **attr.asdict(_to_hierarchy_query(command), recurse=False),
+        changed_ids=command.changed_ids,
+        retired_ids=command.retired_ids,
+    )
+    current_hierarchy = repository.get_hierarchy_changes_by_project(
+        query, stored_hierarchy
+    )
+    return _write_hierarchy(
+        command, current_hierarchy, stored_hierarchy, progress
+    )
+
+
+def _write_hierarchy(
+    command: UpdateShotgridInAvalonCommand,
+    current_hierarchy: List[IntermediateRow],
+    stored_hierarchy: Optional[List[IntermediateRow]],
+    progress: BatchProgress,
 ) -> BatchResult:
-    current_hierarchy, dropped_ids = _fetch_and_augment_hierarchy(command)
     if not current_hierarchy:
         return BatchResult.NO_SHOTGRID_HIERARCHY
+    # one column view serves the deletion diff and the avalon mapping
+    current = IntermediateColumns.from_rows(current_hierarchy)
+    _ROWS_MAPPED.inc(len(current), stage="intermediate")
+    progress(BatchStage.FETCHED, len(current))
+    if stored_hierarchy is None:
+        stored_hierarchy = _fetch_stored_hierarchy(command)
+    _, dropped_ids = pipe(
+        current_hierarchy,
+        _fetch_previous_hierarchy(command.project_name, stored_hierarchy),
+        _propagate_deletion(current),
+    )
     # TODO get rid of mutability and avalon_tree
-    avalon_rows = avalon_mapper.shotgrid_to_avalon(current_hierarchy)
+    avalon_rows = avalon_mapper.shotgrid_to_avalon(current)
+    _ROWS_MAPPED.inc(len(avalon_rows), stage="avalon")
+    progress(BatchStage.MAPPED, len(avalon_rows))
 
     if command.project_name.lower() != str(avalon_rows[0]["name"]).lower():
         return BatchResult.WRONG_PROJECT_NAME
@@ -62,12 +195,95 @@ def update_shotgrid_in_avalon(
 
     batch_writer.upsert_avalon_rows(command.project_name, avalon_rows)
     batch_writer.delete_avalon_rows(command.project_name, dropped_ids)
-    batch_writer.overwrite_intermediate(command.project_name, current_hierarchy)
+    if command.overwrite:
+        batch_writer.overwrite_intermediate(
+            command.project_name, current_hierarchy
+        )
+    else:
+        batch_writer.sync_intermediate(
+            command.project_name, stored_hierarchy, current_hierarchy
+        )
+    progress(BatchStage.WRITTEN, len(avalon_rows))
 
     return BatchResult.OK
 
 
-def create_shotgrid_in_avalon(command: CreateShotgridInAvalonCommand):
+def _kept_in(
+    rows: Iterable[IntermediateRow], kept: List[IntermediateRow]
+) -> Iterator[IntermediateRow]:
+    for row in rows:
+        kept.append(row)
+        yield row
+
+
+def _stream_shotgrid_in_avalon(
+    command: UpdateShotgridInAvalonCommand,
+    query: ShotgridHierarchyByProjectQuery,
+    stored_hierarchy: Optional[List[IntermediateRow]],
+    summaries: Dict[ShotgridType, ShotgridEntitySummary],
+    progress: BatchProgress,
+) -> BatchResult:
+    # avalon rows are written chunk by chunk while the next pages are
+    # fetched, deletions and the intermediate hierarchy wait for the end
+    current_hierarchy: List[IntermediateRow] = []
+    chunk_size = max(1, _STREAM_CHUNK_SIZE)
+    fetched = prefetch(
+        repository.iter_hierarchy_by_project(query), 2 * chunk_size
+    )
+    with closing(fetched) as rows:
+        avalon_rows = avalon_mapper.stream_to_avalon(
+            _kept_in(rows, current_hierarchy)
+        )
+        project = next(avalon_rows, None)
+        if not project:
+            return BatchResult.NO_SHOTGRID_HIERARCHY
+        if command.project_name.lower() != str(project["name"]).lower():
+            return BatchResult.WRONG_PROJECT_NAME
+        if stored_hierarchy is None:
+            stored_hierarchy = _fetch_stored_hierarchy(command)
+        previous_hierarchy = _fetch_previous_hierarchy(
+            command.project_name, stored_hierarchy, current_hierarchy[:1]
+        )
+        if command.overwrite:
+            batch_writer.drop_avalon_assets(command.project_name)
+        written = 0
+        for chunk in partition_all(chunk_size, chain([project], avalon_rows)):
+            batch_writer.upsert_avalon_rows(command.project_name, list(chunk))
+            written += len(chunk)
+            _ROWS_MAPPED.inc(len(chunk), stage="avalon")
+            progress(BatchStage.FETCHED, len(current_hierarchy))
+            progress(BatchStage.MAPPED, written)
+            progress(BatchStage.WRITTEN, written)
+    _ROWS_MAPPED.inc(len(current_hierarchy), stage="intermediate")
+    _, dropped_ids = _propagate_deletion(current_hierarchy, previous_hierarchy)
+    batch_writer.delete_avalon_rows(command.project_name, dropped_ids)
+    if command.overwrite:
+        batch_writer.overwrite_intermediate(
+            command.project_name, current_hierarchy
+        )
+    else:
+        batch_writer.sync_intermediate(
+            command.project_name, stored_hierarchy, current_hierarchy
+        )
+    if command.incremental:
+        watermark_writer.upsert_watermarks(
+            _to_watermarks_command(command, dict(), summaries)
+        )
+    return BatchResult.OK
+
+
+def create_shotgrid_in_avalon(
+    command: CreateShotgridInAvalonCommand,
+    progress: BatchProgress = _no_progress,
+) -> BatchResult:
+    with conn.shotgrid_deadline(_SHOTGRID_DEADLINE_SECONDS):
+        return _create_shotgrid_in_avalon(command, progress)
+
+
+def _create_shotgrid_in_avalon(
+    command: CreateShotgridInAvalonCommand,
+    progress: BatchProgress,
+) -> BatchResult:
     default_project_data = AvalonProjectData()
     query = ShotgridHierarchyByProjectQuery(
         command.project_id,
@@ -76,86 +292,151 @@ def create_shotgrid_in_avalon(command: CreateShotgridInAvalonCommand):
         default_project_data,
     )
     current_hierarchy = repository.get_hierarchy_by_project(query)
+    progress(BatchStage.FETCHED, len(current_hierarchy))
     # TODO get rid of mutability and avalon_tree
     avalon_rows = avalon_mapper.shotgrid_to_avalon(current_hierarchy)
+    progress(BatchStage.MAPPED, len(avalon_rows))
 
     if not avalon_rows:
-        return
+        return BatchResult.NO_SHOTGRID_HIERARCHY
 
     batch_writer.insert_avalon_rows(command.project_name, avalon_rows)
+    progress(BatchStage.WRITTEN, len(avalon_rows))
+    return BatchResult.OK
 
 
-@curry
-def _fetch_previous_hierarchy(
-    project_name: str,
-    project_data: AvalonProjectData,
-    current_hierarchy: List[IntermediateRow],
-) -> List[IntermediateRow]:
-    project_params = intermediate_mapper.to_params(project_data)
-    previous_hierarchy = list(
-        intermediate_hierarchy_repo.fetch_by_project(
-            project_name, project_params
-        )
+def _to_hierarchy_query(
+    command: UpdateShotgridInAvalonCommand,
+) -> ShotgridHierarchyByProjectQuery:
+    return ShotgridHierarchyByProjectQuery(
+        command.project_id,
+        command.credentials,
+        command.fields_mapping,
+        command.project_data,
     )
-    if previous_hierarchy:
-        return previous_hierarchy
-    avalon_project = avalon_mapper.entity_to_project(
-        avalon_repo.fetch_project(project_name),
-        current_hierarchy,
+
+
+def _to_delta_query(
+    query: ShotgridHierarchyByProjectQuery,
+    watermarks: Dict[ShotgridType, ShotgridWatermark],
+    summaries: Dict[ShotgridType, ShotgridEntitySummary],
+) -> ShotgridHierarchyByProjectQuery:
+    if not watermarks:
+        return query
+    return ShotgridHierarchyDeltaQuery(
+        **attr.asdict(query, recurse=False),
+        watermarks=watermarks,
+        summaries=summaries,
     )
-    return [avalon_project] if avalon_project else []
 
 
-def _to_paths(
-    hierarchy: List[IntermediateRow],
-) -> Set[Tuple[Optional[str], str]]:
-    return {(try_or(lambda: x.parent), x.id) for x in hierarchy}
+def _fingerprint(command: UpdateShotgridInAvalonCommand) -> str:
+    source = {
+        "fields_mapping": attr.asdict(command.fields_mapping),
+        "project_data": command.project_data.to_dict(),
+    }
+    return to_fingerprint(source)
 
 
-def _detect_deletion(
-    current_hierarchy: List[IntermediateRow],
-    previous_hierarchy: List[IntermediateRow],
-) -> Set[Tuple[Optional[str], str]]:
-    return _to_paths(previous_hierarchy) - _to_paths(current_hierarchy)
+def _fetch_usable_watermarks(
+    command: UpdateShotgridInAvalonCommand,
+    stored_hierarchy: List[IntermediateRow],
+) -> Dict[ShotgridType, ShotgridWatermark]:
+    if not command.incremental or command.overwrite or not stored_hierarchy:
+        return dict()
+    fingerprint = _fingerprint(command)
+    full_sync_due = datetime.utcnow() - _FULL_SYNC_INTERVAL
+    watermarks = watermark_repo.fetch_watermarks(command.project_name)
+    usable = {
+        k: v
+        for k, v in watermarks.items()
+        if v.fingerprint == fingerprint and v.full_sync_at > full_sync_due
+    }
+    if set(usable.keys()) != set(ShotgridType.watermarked_types()):
+        return dict()
+    return usable
 
 
-def _fetch_and_augment_hierarchy(
+def _to_watermarks_command(
     command: UpdateShotgridInAvalonCommand,
-) -> Tuple[List[IntermediateRow], Set[ObjectId]]:
-    query = ShotgridHierarchyByProjectQuery(
-        command.project_id,
-        command.credentials,
-        command.fields_mapping,
-        command.project_data,
+    watermarks: Dict[ShotgridType, ShotgridWatermark],
+    summaries: Dict[ShotgridType, ShotgridEntitySummary],
+) -> UpsertShotgridWatermarksCommand:
+    full_sync_at = (
+        min(x.full_sync_at for x in watermarks.values())
+        if watermarks
+        else datetime.utcnow()
     )
-    current_hierarchy = repository.get_hierarchy_by_project(query)
-    if not current_hierarchy:
-        return [], set()
-    previous_hierarchy, dropped_ids = pipe(
-        current_hierarchy,
-        _fetch_previous_hierarchy(command.project_name, command.project_data),
-        _propagate_deletion(current_hierarchy),
+    fingerprint = _fingerprint(command)
+    return UpsertShotgridWatermarksCommand(
+        [
+            ShotgridWatermark(
+                project_name=command.project_name,
+                type=k.value,
+                count=v.count,
+                updated_at=v.latest_update,
+                fingerprint=fingerprint,
+                full_sync_at=full_sync_at,
+            )
+            for k, v in summaries.items()
+        ]
+    )
+
+
+def _fetch_stored_hierarchy(
+    command: UpdateShotgridInAvalonCommand,
+) -> List[IntermediateRow]:
+    project_params = intermediate_mapper.to_params(command.project_data)
+    return list(
+        intermediate_hierarchy_repo.fetch_by_project(
+            command.project_name, project_params
+        )
     )
-    return (
+
+
+@curry
+def _fetch_previous_hierarchy(
+    project_name: str,
+    stored_hierarchy: List[IntermediateRow],
+    current_hierarchy: List[IntermediateRow],
+) -> List[IntermediateRow]:
+    if stored_hierarchy:
+        return stored_hierarchy
+    avalon_project = avalon_mapper.entity_to_project(
+        avalon_repo.fetch_project(project_name),
         current_hierarchy,
-        dropped_ids,
     )
+    return [avalon_project] if avalon_project else []
+
+
+def _fetch_current_hierarchy(
+    query: ShotgridHierarchyByProjectQuery,
+    stored_hierarchy: Optional[List[IntermediateRow]],
+) -> List[IntermediateRow]:
+    if isinstance(query, ShotgridHierarchyDeltaQuery) and stored_hierarchy:
+        return repository.get_hierarchy_delta_by_project(
+            query, stored_hierarchy
+        )
+    return repository.get_hierarchy_by_project(query)
 
 
 @curry
 def _propagate_deletion(
-    current_hierarchy: List[IntermediateRow],
+    current_hierarchy: Sequence[IntermediateRow],
     previous_hierarchy: List[IntermediateRow],
 ) -> Tuple[List[IntermediateRow], Set[ObjectId]]:
-    deleted_ones = _detect_deletion(current_hierarchy, previous_hierarchy)
+    previous = IntermediateColumns.from_rows(previous_hierarchy)
+    deleted_ones = set(
+        previous.positions_missing_from(
+            IntermediateColumns.from_rows(current_hierarchy)
+        )
+    )
     if not deleted_ones:
         return previous_hierarchy, set()
     altered_hierarchy = [
-        x for x in previous_hierarchy if not (x.parent, x.id) in deleted_ones
+        x for i, x in enumerate(previous) if i not in deleted_ones
     ]
     deleted_object_ids = {
-        x.object_id
-        for x in previous_hierarchy
-        if (x.parent, x.id) in deleted_ones and x.object_id
+        x for i, x in enumerate(previous.object_ids) if i in deleted_ones and x
     }
     return altered_hierarchy, deleted_object_ids
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional, Set, Union
+
+import attr
+from starlette.concurrency import run_in_threadpool
+
+import shotgrid_leecher.repository.batch_job_repo as batch_job_repo
+from shotgrid_leecher.domain import batch_domain
+from shotgrid_leecher.record.commands import (
+    CreateShotgridInAvalonCommand,
+    UpdateShotgridInAvalonCommand,
+)
+from shotgrid_leecher.record.leecher_structures import BatchJob
+from shotgrid_leecher.record.results import (
+    BatchJobStatus,
+    BatchResult,
+    BatchStage,
+)
+from shotgrid_leecher.utils.ids import to_fingerprint
+from shotgrid_leecher.utils.logger import get_logger
+from shotgrid_leecher.writers import batch_job_writer
+
+_LOG = get_logger(__name__.split(".")[-1])
+
+BatchCommand = Union[
+    CreateShotgridInAvalonCommand, UpdateShotgridInAvalonCommand
+]
+Batch = Callable[[Any, batch_domain.BatchProgress], BatchResult]
+
+_JOB_HEARTBEAT_SECONDS = 30
+_JOB_STALE_AFTER = timedelta(
+    seconds=int(os.getenv("BATCH_JOB_STALE_SECONDS", 120))
+)
+_RUNNING_JOBS: Set["asyncio.Future[None]"] = set()
+# jobs past the cap stay queued, heartbeating, until a worker frees up
+_JOB_EXECUTOR = ThreadPoolExecutor(
+    max_workers=max(1, int(os.getenv("BATCH_JOB_CONCURRENCY", 2))),
+    thread_name_prefix="batch_job",
+)
+
+
+async def submit_create_job(
+    command: CreateShotgridInAvalonCommand,
+) -> BatchJob:
+    return await _submit_job(
+        "create", command, batch_domain.create_shotgrid_in_avalon
+    )
+
+
+async def submit_update_job(
+    command: UpdateShotgridInAvalonCommand,
+) -> BatchJob:
+    return await _submit_job(
+        "update", command, batch_domain.update_shotgrid_in_avalon
+    )
+
+
+def fetch_batch_job(job_id: str) -> Optional[BatchJob]:
+    job = batch_job_repo.fetch_batch_job(job_id)
+    if not job or not _is_abandoned(job):
+        return job
+    # its replica went away without finishing it
+    return attr.evolve(
+        job,
+        status=BatchJobStatus.FAILED.value,
+        result=BatchResult.FAILURE.value,
+        error="Job abandoned",
+    )
+
+
+async def wait_batch_jobs() -> None:
+    if not _RUNNING_JOBS:
+        return None
+    _LOG.info(f"Waiting for {len(_RUNNING_JOBS)} batch jobs")
+    await asyncio.gather(*_RUNNING_JOBS, return_exceptions=True)
+
+
+async def clean_batch_jobs(created_before: datetime) -> None:
+    await run_in_threadpool(batch_job_writer.clean_batch_jobs, created_before)
+
+
+def _is_abandoned(job: BatchJob) -> bool:
+    active = {x.value for x in BatchJobStatus.active()}
+    stale_at = datetime.utcnow() - _JOB_STALE_AFTER
+    return job.status in active and job.updated_at < stale_at
+
+
+def _to_job_fingerprint(kind: str, command: BatchCommand) -> str:
+    # the script key is a secret, jobs are told apart without it
+    dic = attr.asdict(command, filter=lambda x, _: x.name != "script_key")
+    return to_fingerprint({"kind": kind, **dic})
+
+
+def _new_job(kind: str, command: BatchCommand) -> BatchJob:
+    now = datetime.utcnow()
+    return BatchJob(
+        id=str(uuid.uuid4()),
+        project_name=command.project_name,
+        kind=kind,
+        fingerprint=_to_job_fingerprint(kind, command),
+        status=BatchJobStatus.QUEUED.value,
+        progress=dict(),
+        created_at=now,
+        updated_at=now,
+    )
+
+
+async def _submit_job(
+    kind: str, command: BatchCommand, batch: Batch
+) -> BatchJob:
+    job = _new_job(kind, command)
+    current = await run_in_threadpool(
+        batch_job_writer.create_or_get_active_job,
+        job,
+        datetime.utcnow() - _JOB_STALE_AFTER,
+    )
+    if current.id != job.id:
+        _LOG.info(f"Reuse batch job {current.id} of {job.project_name}")
+        return current
+    future = asyncio.ensure_future(_run_job(job, command, batch))
+    _RUNNING_JOBS.add(future)
+    future.add_done_callback(_RUNNING_JOBS.discard)
+    return current
+
+
+def _report_progress(job_id: str) -> batch_domain.BatchProgress:
+    def _report(stage: BatchStage, count: int) -> None:
+        batch_job_writer.update_job_progress(job_id, stage, count)
+
+    return _report
+
+
+async def _keep_alive(job_id: str) -> None:
+    while True:
+        await asyncio.sleep(_JOB_HEARTBEAT_SECONDS)
+        await run_in_threadpool(batch_job_writer.touch_job, job_id)
+
+
+def _start_batch(
+    job: BatchJob, command: BatchCommand, batch: Batch
+) -> BatchResult:
+    batch_job_writer.start_job(job.id)
+    return batch(command, _report_progress(job.id))
+
+
+def _to_status(result: BatchResult) -> BatchJobStatus:
+    if result == BatchResult.OK:
+        return BatchJobStatus.DONE
+    return BatchJobStatus.FAILED
+
+
+async def _run_job(job: BatchJob, command: BatchCommand, batch: Batch) -> None:
+    heartbeat = asyncio.ensure_future(_keep_alive(job.id))
+    try:
+        result = await asyncio.get_event_loop().run_in_executor(
+            _JOB_EXECUTOR, _start_batch, job, command, batch
+        )
+        await run_in_threadpool(
+            batch_job_writer.finish_job,
+            job.id,
+            _to_status(result),
+            result.value,
+        )
+    except Exception as ex:
+        _LOG.error(f"Batch job {job.id} of {job.project_name} failed: {ex}")
+        await run_in_threadpool(
+            batch_job_writer.finish_job,
+            job.id,
+            BatchJobStatus.FAILED,
+            BatchResult.FAILURE.value,
+            str(ex),
+        )
+    finally:
+        heartbeat.cancel()
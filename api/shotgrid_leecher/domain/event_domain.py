@@ -0,0 +1,150 @@
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from toolz import groupby
+
+import shotgrid_leecher.repository.event_cursor_repo as event_cursor_repo
+import shotgrid_leecher.repository.schedule_repo as schedule_repo
+import shotgrid_leecher.repository.shotgrid_entity_repo as entity_repo
+import shotgrid_leecher.repository.shotgrid_events_repo as events_repo
+from shotgrid_leecher.domain import schedule_domain
+from shotgrid_leecher.record.commands import (
+    ScheduleShotgridBatchCommand,
+    ScheduleShotgridChangesCommand,
+    UpsertShotgridEventCursorCommand,
+)
+from shotgrid_leecher.record.enums import ShotgridEventKind, ShotgridType
+from shotgrid_leecher.record.leecher_structures import (
+    ShotgridCredentials,
+    ShotgridEventCursor,
+)
+from shotgrid_leecher.record.queries import ShotgridFindEventsQuery
+from shotgrid_leecher.record.shotgrid_structures import (
+    ShotgridEvent,
+    ShotgridEventPage,
+)
+from shotgrid_leecher.utils.logger import get_logger
+from shotgrid_leecher.writers import event_cursor_writer
+
+_LOG = get_logger(__name__.split(".")[-1])
+
+EntityChanges = Dict[Tuple[ShotgridType, int], ShotgridEventKind]
+
+
+def _coalesce(events: List[ShotgridEvent]) -> Dict[int, EntityChanges]:
+    # events come ordered by id, the latest one of an entity wins
+    changes: Dict[int, EntityChanges] = dict()
+    for event in events:
+        project = changes.setdefault(event.project_id, dict())
+        project[(event.entity_type, event.entity_id)] = event.kind
+    return changes
+
+
+def _move_cursor(credentials: ShotgridCredentials, last_event_id: int) -> None:
+    cursor = ShotgridEventCursor(
+        credentials.shotgrid_url,
+        last_event_id,
+        datetime.now(),
+        credentials.script_name,
+    )
+    event_cursor_writer.upsert_event_cursor(
+        UpsertShotgridEventCursorCommand(cursor)
+    )
+
+
+def _to_changes_command(
+    command: ScheduleShotgridBatchCommand,
+    changes: EntityChanges,
+) -> ScheduleShotgridChangesCommand:
+    # link changes carry no entity, the links are fetched again anyway
+    changed: Dict[ShotgridType, List[int]] = dict()
+    retired: Dict[ShotgridType, List[int]] = dict()
+    entity_types = set(ShotgridType.watermarked_types())
+    for (type_, id_), kind in changes.items():
+        if type_ not in entity_types:
+            continue
+        ids = retired if kind == ShotgridEventKind.RETIREMENT else changed
+        ids.setdefault(type_, []).append(id_)
+    return ScheduleShotgridChangesCommand(command, changed, retired)
+
+
+def _prepare_batch(
+    command: ScheduleShotgridBatchCommand,
+    changes: EntityChanges,
+) -> None:
+    kinds = list(changes.values())
+    _LOG.info(
+        f"{command.project_name} changed by events: "
+        + ", ".join(f"{kinds.count(x)} {x.value}" for x in set(kinds))
+    )
+    link_types = set(ShotgridType.link_types())
+    if any(type_ in link_types for type_, _ in changes):
+        entity_repo.invalidate_linked_entities(command.project_id)
+
+
+def _last_consumed_id(
+    page: ShotgridEventPage, skipped: List[ScheduleShotgridBatchCommand]
+) -> int:
+    # the cursor stops ahead of the first event of a project left to
+    # another worker, its changes are read again at the next poll
+    skipped_ids = {x.project_id for x in skipped}
+    held = [x.id for x in page.events if x.project_id in skipped_ids]
+    if not held:
+        return page.last_event_id
+    names = [x.project_name for x in skipped]
+    _LOG.info(f"Hold event cursor before {min(held)} for {names}")
+    return min(held) - 1
+
+
+async def _consume_site_events(
+    commands: List[ScheduleShotgridBatchCommand],
+) -> None:
+    # every script keeps its own cursor, it only reads the events of the
+    # projects it syncs
+    credentials = commands[0].credentials
+    cursor = await run_in_threadpool(
+        event_cursor_repo.fetch_event_cursor,
+        credentials.shotgrid_url,
+        credentials.script_name,
+    )
+    if not cursor:
+        last_id = await run_in_threadpool(
+            events_repo.find_last_event_id, credentials
+        )
+        _LOG.info(
+            f"Start consuming {credentials.shotgrid_url} events "
+            f"of {credentials.script_name} after {last_id}"
+        )
+        await run_in_threadpool(_move_cursor, credentials, last_id)
+        return None
+    page = await run_in_threadpool(
+        events_repo.find_events_after,
+        ShotgridFindEventsQuery(
+            credentials,
+            cursor.last_event_id,
+            list({x.project_id for x in commands}),
+        ),
+    )
+    changes = _coalesce(page.events)
+    touched = [x for x in commands if x.project_id in changes]
+    for command in touched:
+        await run_in_threadpool(
+            _prepare_batch, command, changes[command.project_id]
+        )
+    skipped = await schedule_domain.process_changes_now(
+        [_to_changes_command(x, changes[x.project_id]) for x in touched]
+    )
+    last_id = _last_consumed_id(page, [x.batch for x in skipped])
+    if last_id > cursor.last_event_id:
+        await run_in_threadpool(_move_cursor, credentials, last_id)
+
+
+async def consume_shotgrid_events() -> None:
+    commands = await run_in_threadpool(schedule_repo.fetch_batch_commands, [])
+    sites = groupby(
+        lambda x: (x.credentials.shotgrid_url, x.credentials.script_name),
+        commands,
+    )
+    for site_commands in sites.values():
+        await _consume_site_events(site_commands)
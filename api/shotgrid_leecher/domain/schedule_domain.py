@@ -1,22 +1,34 @@
+import asyncio
+import os
 import sys
+import threading
 import time
 import traceback
-from datetime import datetime
-from typing import Any, Dict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlparse
 
+import attr
 from starlette.concurrency import run_in_threadpool
 
 import shotgrid_leecher.repository.schedule_repo as schedule_repo
 from shotgrid_leecher.domain import batch_domain
 from shotgrid_leecher.record.commands import (
     ScheduleShotgridBatchCommand,
+    ScheduleShotgridChangesCommand,
     UpdateShotgridInAvalonCommand,
+    UpdateShotgridChangesInAvalonCommand,
     LogScheduleUpdateCommand,
     CancelBatchSchedulingCommand,
     CleanScheduleBatchLogsCommand,
 )
-from shotgrid_leecher.record.results import BatchResult, ScheduleResult
+from shotgrid_leecher.record.results import (
+    BatchResult,
+    BulkWriteSummary,
+    ScheduleResult,
+)
 from shotgrid_leecher.repository import avalon_repo
+from shotgrid_leecher.utils import metrics
 from shotgrid_leecher.utils.functional import try_or
 from shotgrid_leecher.utils.logger import get_logger
 from shotgrid_leecher.writers import schedule_writer
@@ -25,6 +37,24 @@ from shotgrid_leecher.writers import schedule_writer as writer
 _LOG = get_logger(__name__.split(".")[-1])
 
 _UNROLL_BATCH_SIZE = 10
+_BATCH_WORKERS = int(os.getenv("SCHEDULE_BATCH_WORKERS", 4))
+_HOST_CONCURRENCY = int(os.getenv("SCHEDULE_HOST_CONCURRENCY", 2))
+
+_BATCH_SECONDS = metrics.histogram(
+    "leecher_batch_seconds",
+    "Duration of scheduled batches",
+    ["project", "result"],
+)
+_QUEUE_DEPTH = metrics.gauge(
+    "leecher_schedule_queue_depth", "Projects waiting in the schedule queue"
+)
+_WORKERS = metrics.gauge("leecher_batch_workers", "Batch workers started")
+_BUSY_WORKERS = metrics.gauge(
+    "leecher_batch_workers_busy", "Batch workers processing a project"
+)
+
+_DRAINING = threading.Event()
+_RUNNING_WORKERS: Set["asyncio.Future[None]"] = set()
 
 
 async def schedule_clean_batch_log(
@@ -39,21 +69,84 @@ async def schedule_batch(command: ScheduleShotgridBatchCommand) -> BatchResult:
     return BatchResult.OK
 
 
-async def queue_scheduled_batches() -> Dict[str, Any]:
-    groups = schedule_repo.group_batch_commands()
+async def queue_scheduled_batches() -> Optional[BulkWriteSummary]:
+    groups = await run_in_threadpool(schedule_repo.group_batch_commands)
     already_queued = list({x.name for x in groups})
-    commands = schedule_repo.fetch_batch_commands(already_queued)
+    commands = await run_in_threadpool(
+        schedule_repo.fetch_batch_commands, already_queued
+    )
     if not commands:
-        return dict()
+        return None
 
-    return schedule_writer.queue_requests(commands)
+    return await run_in_threadpool(schedule_writer.queue_requests, commands)
 
 
 async def dequeue_and_process_batches() -> None:
-    raw_count = schedule_repo.count_projects()
-    size = int(raw_count + raw_count * 0.15 + 1)
-    for x in range(size):
-        await run_in_threadpool(_batch_and_log, x)
+    if _DRAINING.is_set():
+        return None
+    raw_count = await run_in_threadpool(schedule_repo.count_projects)
+    budget = iter(range(int(raw_count + raw_count * 0.15 + 1)))
+    host_slots: Dict[str, asyncio.Semaphore] = dict()
+    leasing = asyncio.Condition()
+    workers = [
+        asyncio.ensure_future(_batch_worker(budget, host_slots, leasing))
+        for _ in range(max(_BATCH_WORKERS, 1))
+    ]
+    _RUNNING_WORKERS.update(workers)
+    _WORKERS.inc(len(workers))
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        _RUNNING_WORKERS.difference_update(workers)
+        _WORKERS.dec(len(workers))
+
+
+async def process_changes_now(
+    commands: List[ScheduleShotgridChangesCommand],
+) -> List[ScheduleShotgridChangesCommand]:
+    # projects already leased by another worker are left to it, they come
+    # back to the caller along with the ones a drain kept from running
+    if _DRAINING.is_set() or not commands:
+        return commands
+    await run_in_threadpool(
+        schedule_writer.queue_requests, [x.batch for x in commands]
+    )
+    pending = iter(commands)
+    skipped: List[ScheduleShotgridChangesCommand] = []
+    host_slots: Dict[str, asyncio.Semaphore] = dict()
+    leasing = asyncio.Condition()
+    workers = [
+        asyncio.ensure_future(
+            _changes_worker(pending, skipped, host_slots, leasing)
+        )
+        for _ in range(min(max(_BATCH_WORKERS, 1), len(commands)))
+    ]
+    _RUNNING_WORKERS.update(workers)
+    _WORKERS.inc(len(workers))
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        _RUNNING_WORKERS.difference_update(workers)
+        _WORKERS.dec(len(workers))
+    return [*skipped, *pending]
+
+
+async def drain_batch_workers() -> None:
+    _DRAINING.set()
+    if not _RUNNING_WORKERS:
+        return None
+    _LOG.info(f"Draining {len(_RUNNING_WORKERS)} batch workers")
+    await asyncio.gather(*_RUNNING_WORKERS, return_exceptions=True)
+
+
+async def acquire_timer_lease(timer: str, period: timedelta) -> bool:
+    return await run_in_threadpool(
+        schedule_writer.acquire_timer_lease, timer, period
+    )
+
+
+async def refresh_schedule_metrics() -> None:
+    _QUEUE_DEPTH.set(await run_in_threadpool(schedule_repo.queue_size))
 
 
 async def cancel_batch_scheduling(
@@ -62,17 +155,140 @@ async def cancel_batch_scheduling(
     return schedule_writer.remove_scheduled_project(command)
 
 
-def _batch_and_log(_: Any) -> None:
-    request = schedule_writer.dequeue_request()
-    if not request:
-        return None
+async def _batch_worker(
+    budget: Iterator[int],
+    host_slots: Dict[str, asyncio.Semaphore],
+    leasing: asyncio.Condition,
+) -> None:
+    # the budget iterator is shared by all workers of a tick, every worker
+    # stops once it is exhausted, the queue is empty or a drain started
+    for _ in budget:
+        if _DRAINING.is_set():
+            return None
+        leased = await _lease_request(host_slots, leasing)
+        if not leased:
+            return None
+        await _process_leased(*leased, leasing)
+
+
+async def _changes_worker(
+    pending: Iterator[ScheduleShotgridChangesCommand],
+    skipped: List[ScheduleShotgridChangesCommand],
+    host_slots: Dict[str, asyncio.Semaphore],
+    leasing: asyncio.Condition,
+) -> None:
+    # a project not leased here stays queued for the scheduled workers
+    for command in pending:
+        if _DRAINING.is_set():
+            skipped.append(command)
+            return None
+        leased = await _lease_request(
+            host_slots, leasing, command.batch.project_name
+        )
+        if leased:
+            await _process_leased(*leased, leasing, command)
+        else:
+            skipped.append(command)
+
+
+async def _lease_request(
+    host_slots: Dict[str, asyncio.Semaphore],
+    leasing: asyncio.Condition,
+    project_name: Optional[str] = None,
+) -> Optional[Tuple[ScheduleShotgridBatchCommand, asyncio.Semaphore]]:
+    # the host slot is taken along with the lease, a request never sits
+    # leased while waiting for its host: busy hosts are skipped and the
+    # queue is asked again once one of their slots is released
+    async with leasing:
+        while True:
+            busy = [k for k, v in host_slots.items() if v.locked()]
+            request = await run_in_threadpool(
+                schedule_writer.dequeue_request, project_name, busy
+            )
+            if request or not busy or project_name:
+                break
+            await leasing.wait()
+        if not request:
+            return None
+        host = urlparse(request.credentials.shotgrid_url).netloc
+        slot = host_slots.setdefault(
+            host, asyncio.Semaphore(max(_HOST_CONCURRENCY, 1))
+        )
+        await slot.acquire()
+        return request, slot
+
+
+async def _process_leased(
+    request: ScheduleShotgridBatchCommand,
+    slot: asyncio.Semaphore,
+    leasing: asyncio.Condition,
+    changes: Optional[ScheduleShotgridChangesCommand] = None,
+) -> None:
+    heartbeat = asyncio.ensure_future(_keep_lease(request))
+    try:
+        _BUSY_WORKERS.inc()
+        try:
+            await run_in_threadpool(_batch_and_log, request, changes)
+        finally:
+            _BUSY_WORKERS.dec()
+            slot.release()
+            async with leasing:
+                leasing.notify_all()
+    finally:
+        heartbeat.cancel()
+    await run_in_threadpool(schedule_writer.ack_request, request)
+
+
+async def _keep_lease(request: ScheduleShotgridBatchCommand) -> None:
+    interval = schedule_writer.get_lease_duration().total_seconds() / 3
+    while True:
+        await asyncio.sleep(interval)
+        extended = await run_in_threadpool(
+            schedule_writer.extend_request_lease, request
+        )
+        if not extended:
+            _LOG.warning(f"Could not extend lease of {request.project_name}")
+
+
+def _log_batch_result(command: LogScheduleUpdateCommand) -> None:
+    _BATCH_SECONDS.observe(
+        command.duration,
+        project=command.project_name,
+        result=command.batch_result.value,
+    )
+    schedule_writer.log_batch_result(command)
+
+
+def _to_update_command(
+    request: ScheduleShotgridBatchCommand,
+    changes: Optional[ScheduleShotgridChangesCommand],
+) -> UpdateShotgridInAvalonCommand:
+    project_data = avalon_repo.fetch_project(request.project_name).data
+    command = UpdateShotgridInAvalonCommand.from_dict(
+        {**request.to_dict(), "project_data": project_data.to_dict()},
+        incremental=True,
+    )
+    if not changes:
+        return command
+    return UpdateShotgridChangesInAvalonCommand(
+        **attr.asdict(command, recurse=False),
+        changed_ids=changes.changed_ids,
+        retired_ids=changes.retired_ids,
+    )
+
+
+def _batch_and_log(
+    request: ScheduleShotgridBatchCommand,
+    changes: Optional[ScheduleShotgridChangesCommand] = None,
+) -> None:
     start = time.time()
     try:
-        project_data = avalon_repo.fetch_project(request.project_name).data
-        command = UpdateShotgridInAvalonCommand.from_dict(
-            {**request.to_dict(), "project_data": project_data.to_dict()}
+        command = _to_update_command(request, changes)
+        result = (
+            batch_domain.update_shotgrid_changes_in_avalon(command)
+            if isinstance(command, UpdateShotgridChangesInAvalonCommand)
+            else batch_domain.update_shotgrid_in_avalon(command)
         )
-        result = batch_domain.update_shotgrid_in_avalon(command)
         log_command = LogScheduleUpdateCommand(
             batch_result=result,
             project_name=command.project_name,
@@ -81,7 +297,7 @@ def _batch_and_log(_: Any) -> None:
             data=None,
             datetime=datetime.now(),
         )
-        schedule_writer.log_batch_result(log_command)
+        _log_batch_result(log_command)
     except Exception as ex:
         _, _, ex_traceback = sys.exc_info()
         traceback.print_tb(ex_traceback, limit=10, file=sys.stdout)
@@ -97,4 +313,4 @@ def _batch_and_log(_: Any) -> None:
             datetime=datetime.now(),
         )
         _LOG.error(ex)
-        schedule_writer.log_batch_result(log_command)
+        _log_batch_result(log_command)
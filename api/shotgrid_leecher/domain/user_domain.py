@@ -1,6 +1,5 @@
 from typing import Any
 
-from pymongo.results import BulkWriteResult
 from toolz import pipe
 from toolz.curried import (
     map as select,
@@ -10,6 +9,7 @@ import shotgrid_leecher.repository.shotgrid_user_repo as shotgrid_repo
 from shotgrid_leecher.record.commands import UpsertProjectUserLinksCommand
 from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
 from shotgrid_leecher.record.queries import ShotgridFindUserProjectLinkQuery
+from shotgrid_leecher.record.results import BulkWriteSummary
 from shotgrid_leecher.repository import config_repo
 from shotgrid_leecher.utils.logger import get_logger
 from shotgrid_leecher.writers import user_writer
@@ -19,7 +19,7 @@ _LOG = get_logger(__name__.split(".")[-1])
 
 def _refill_project_user_links(
     credentials: ShotgridCredentials,
-) -> BulkWriteResult:
+) -> BulkWriteSummary:
     user_writer.delete_links_by_host_url(credentials.shotgrid_url)
     return pipe(
         credentials,
@@ -1,14 +1,18 @@
 from itertools import chain
-from typing import Dict, Any, List, Optional, Iterator, cast, Union
+from typing import (
+    Dict,
+    Any,
+    List,
+    Optional,
+    Iterator,
+    Iterable,
+    cast,
+    Union,
+    Sequence,
+)
 
 import attr
 from bson import ObjectId
-from toolz import pipe, curry
-from toolz.curried import (
-    filter as where,
-    map as select,
-    reduce,
-)
 
 from shotgrid_leecher.record.avalon_structures import AvalonProject
 from shotgrid_leecher.record.enums import ShotgridType, AvalonType
@@ -18,9 +22,13 @@ from shotgrid_leecher.record.intermediate_structures import (
     IntermediateTask,
     IntermediateShot,
     IntermediateAsset,
+    IntermediateColumns,
+    IntermediatePathIndex,
 )
 from shotgrid_leecher.utils.functional import try_or
+from shotgrid_leecher.utils.ids import to_fingerprint
 from shotgrid_leecher.utils.logger import get_logger
+from shotgrid_leecher.utils.timer import timed
 
 _LOG = get_logger(__name__.split(".")[-1])
 
@@ -29,6 +37,7 @@ Map = Dict[str, Any]
 _CONF_MAPPING = {
     "steps": "tasks",
 }
+_FINGERPRINT = "fingerprint"
 
 
 def entity_to_project(
@@ -45,8 +54,9 @@ def entity_to_project(
     return attr.evolve(shotgrid_project, object_id=project.object_id())
 
 
+@timed
 def shotgrid_to_avalon(
-    intermediate_rows: List[IntermediateRow],
+    intermediate_rows: Sequence[IntermediateRow],
 ) -> List[Map]:
     """
     Utility function to map hierarchy shotgrid data to MongoDB avalon format.
@@ -64,18 +74,90 @@ def shotgrid_to_avalon(
     """
     if not intermediate_rows:
         return []
+    columns = IntermediateColumns.from_rows(intermediate_rows)
     project_rows = [
         cast(IntermediateProject, x)
-        for x in intermediate_rows
-        if x.type == ShotgridType.PROJECT
+        for x in columns.rows_of([ShotgridType.PROJECT])
     ]
     _check_project_row(project_rows)
     project = _project_row(project_rows[0])
-    tasks_hash = _find_tasks(intermediate_rows)
+    tasks_hash = _find_tasks(columns.rows_of([ShotgridType.TASK]))
     _check_task_types(project, tasks_hash)
-    avalon_rows = _asset_rows(intermediate_rows, project, tasks_hash)
+    avalon_rows = _asset_rows(
+        columns.rows_of(ShotgridType.middle_types()),
+        project,
+        tasks_hash,
+        columns.path_index(),
+    )
 
-    return [project] + list(avalon_rows)
+    return [_with_fingerprint(x) for x in [project, *avalon_rows]]
+
+
+def stream_to_avalon(
+    intermediate_rows: Iterable[IntermediateRow],
+) -> Iterator[Map]:
+    """
+    Map hierarchy rows to MongoDB avalon format while they stream, the
+    streaming counterpart of shotgrid_to_avalon.
+
+    Note:
+        The project row has to come first and every entity has to be
+        directly followed by its tasks, as the hierarchy stream of the
+        shotgrid repository produces them.
+
+    Args:
+        intermediate_rows iterable(IntermediateRow):
+        rows to format to avalon format.
+
+    Returns iterator(dict(str, any)): Formatted rows, the project first.
+
+    """
+    rows = iter(intermediate_rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    _check_project_row(
+        [cast(IntermediateProject, first)]
+        if first.type == ShotgridType.PROJECT
+        else []
+    )
+    project = _project_row(cast(IntermediateProject, first))
+    yield _with_fingerprint(project)
+    paths = IntermediatePathIndex(dict(), dict())
+    entity: Optional[IntermediateRow] = None
+    tasks: List[IntermediateTask] = []
+    for row in rows:
+        if row.type == ShotgridType.TASK:
+            tasks.append(cast(IntermediateTask, row))
+            continue
+        if row.type == ShotgridType.PROJECT:
+            _check_project_row(
+                [
+                    cast(IntermediateProject, first),
+                    cast(IntermediateProject, row),
+                ]
+            )
+        if entity:
+            yield _stream_asset_row(entity, project, tasks, paths)
+        entity, tasks = row, []
+    if entity:
+        yield _stream_asset_row(entity, project, tasks, paths)
+
+
+def _stream_asset_row(
+    row: IntermediateRow,
+    project: Map,
+    tasks: List[IntermediateTask],
+    paths: IntermediatePathIndex,
+) -> Map:
+    _check_task_types(project, {row.object_id: tasks})
+    return _with_fingerprint(
+        _create_avalon_asset_row(row, project, tasks, paths)
+    )
+
+
+def _with_fingerprint(row: Map) -> Map:
+    return {**row, _FINGERPRINT: to_fingerprint(row)}
 
 
 def _check_project_row(project_rows: List[IntermediateProject]):
@@ -107,45 +189,25 @@ def _check_task_types(
         raise RuntimeError(f"Task types {tasks_difference} are unknown")
 
 
-def _reduce_found_tasks(
-    acc: Dict[ObjectId, List[IntermediateTask]], x: IntermediateTask
-) -> Dict[ObjectId, List[IntermediateTask]]:
-    return {
-        **acc,
-        x.parent_id: acc.get(x.parent_id, []) + [x],
-    }
-
-
 def _find_tasks(
-    rows: List[IntermediateRow],
+    task_rows: List[IntermediateRow],
 ) -> Dict[ObjectId, List[IntermediateTask]]:
-    tasks_hash = pipe(
-        rows,
-        where(lambda x: x.type == ShotgridType.TASK),
-        select(curry(cast)(IntermediateTask)),
-        lambda x: reduce(_reduce_found_tasks, x, dict()),
-    )
+    tasks_hash: Dict[ObjectId, List[IntermediateTask]] = dict()
+    for x in task_rows:
+        task = cast(IntermediateTask, x)
+        tasks_hash.setdefault(task.parent_id, []).append(task)
     return tasks_hash
 
 
-def _get_parent(row: IntermediateRow) -> str:
-    if not row.parent:
-        raise ValueError(f"No parent on the middle node {row}")
-    return row.parent.split(",")[-2]
-
-
 def _asset_rows(
-    intermediate_rows: List[IntermediateRow],
+    asset_rows: List[IntermediateRow],
     project: Map,
     tasks_hash: Dict[ObjectId, List[IntermediateTask]],
+    paths: IntermediatePathIndex,
 ) -> Iterator[Map]:
-
-    aka_asset_types = ShotgridType.middle_types()
-    asset_rows = [x for x in intermediate_rows if x.type in aka_asset_types]
-
     for row in asset_rows:
         tasks = tasks_hash.get(row.object_id, [])
-        yield _create_avalon_asset_row(row, project, tasks)
+        yield _create_avalon_asset_row(row, project, tasks, paths)
 
 
 def _project_data(project: IntermediateProject) -> Map:
@@ -209,12 +271,15 @@ def _create_avalon_asset_row(
     intermediate_row: IntermediateRow,
     project: Dict[str, Any],
     tasks: List[IntermediateTask],
+    paths: IntermediatePathIndex,
 ) -> Map:
     first_level_citizen = str(project["_id"]) != str(
         intermediate_row.parent_id
     )
     tasks_hash = _create_task_rows(tasks)
-    data = _create_data_row(first_level_citizen, intermediate_row, tasks_hash)
+    data = _create_data_row(
+        first_level_citizen, intermediate_row, tasks_hash, paths
+    )
     return {
         "_id": _try_fortify_object_id(intermediate_row.object_id),
         "type": AvalonType.ASSET.value,
@@ -229,6 +294,7 @@ def _create_data_row(
     first_level_citizen: bool,
     intermediate_row: IntermediateRow,
     tasks: Map,
+    paths: IntermediatePathIndex,
 ) -> Map:
     return {
         **intermediate_row.params.to_avalonish_dict(),
@@ -239,7 +305,7 @@ def _create_data_row(
             else {}
         ),
         "tasks": tasks,
-        "parents": intermediate_row.parent.split(",")[2:-1],
+        "parents": paths.lineage(intermediate_row.parent),
         "visualParent": (
             intermediate_row.parent_id if first_level_citizen else None
         ),
@@ -247,18 +313,14 @@ def _create_data_row(
 
 
 def _create_task_rows(tasks: List[IntermediateTask]) -> Map:
-    return reduce(
-        lambda acc, x: {
-            **acc,
-            _unify_task_id(acc, x): {
-                "type": x.task_type,
-                "status": x.status,
-                "assigned_users": [{"name": y.name} for y in x.assigned_users],
-            },
-        },
-        tasks,
-        dict(),
-    )
+    task_rows: Map = dict()
+    for x in tasks:
+        task_rows[_unify_task_id(task_rows, x)] = {
+            "type": x.task_type,
+            "status": x.status,
+            "assigned_users": [{"name": y.name} for y in x.assigned_users],
+        }
+    return task_rows
 
 
 def _unify_task_id(acc: Map, x: IntermediateTask) -> str:
@@ -1,9 +1,14 @@
+from datetime import datetime, timezone
 from typing import Dict, Any, Optional, Callable, TypeVar, List
 
 import attr
 from toolz import curry, get_in
 
-from shotgrid_leecher.record.enums import ShotgridField, ShotgridType
+from shotgrid_leecher.record.enums import (
+    ShotgridField,
+    ShotgridType,
+    ShotgridEventKind,
+)
 from shotgrid_leecher.record.shotgrid_structures import (
     ShotgridTask,
     ShotgridTaskEntity,
@@ -17,6 +22,8 @@ from shotgrid_leecher.record.shotgrid_structures import (
     ShotgridStep,
     ShotgridEntityToEntityLink,
     ShotgridProjectUserLink,
+    ShotgridEntitySummary,
+    ShotgridEvent,
 )
 from shotgrid_leecher.record.shotgrid_subtypes import (
     TaskFieldsMapping,
@@ -36,6 +43,8 @@ from shotgrid_leecher.utils.ids import to_sha256_id
 Map = Dict[str, Any]
 TOut = TypeVar("TOut")
 
+_SUMMARY_DATE_FORMATS = ["%Y-%m-%d %H:%M:%S UTC", "%Y-%m-%dT%H:%M:%SZ"]
+
 
 def to_shotgrid_project(
     project_mapping: ProjectFieldsMapping,
@@ -60,6 +69,58 @@ def to_shotgrid_project_user_link(
     )
 
 
+def to_utc_datetime(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo:
+            return value.astimezone(timezone.utc)
+        return value.replace(tzinfo=timezone.utc)
+    for format_ in _SUMMARY_DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(str(value), format_)
+            return parsed.replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+    raise ValueError(f"Unsupported shotgrid datetime {value}")
+
+
+def to_shotgrid_entity_summary(
+    type_: ShotgridType,
+    target: Map,
+) -> ShotgridEntitySummary:
+    summaries = target.get("summaries") or dict()
+    return ShotgridEntitySummary(
+        type=type_,
+        count=int(summaries.get(ShotgridField.ID.value) or 0),
+        latest_update=to_utc_datetime(
+            summaries.get(ShotgridField.UPDATED_AT.value)
+        ),
+    )
+
+
+def to_shotgrid_event(target: Map) -> Optional[ShotgridEvent]:
+    # event types read Shotgun_<EntityType>_<Kind>, retired entities are
+    # only referenced from the event meta
+    parts = (target.get("event_type") or "").split("_", 2)
+    _, type_, kind = parts if len(parts) == 3 else ["", "", ""]
+    entity_id = get_in(["meta", "entity_id"], target) or get_in(
+        ["entity", "id"], target
+    )
+    project_id = get_in(["project", "id"], target)
+    kinds = {x.value: x for x in ShotgridEventKind}
+    types = {x.value: x for x in ShotgridType.event_types()}
+    if kind not in kinds or type_ not in types or not entity_id:
+        return None
+    return ShotgridEvent(
+        id=target[ShotgridField.ID.value],
+        kind=kinds[kind],
+        entity_type=types[type_],
+        entity_id=entity_id,
+        project_id=project_id,
+    )
+
+
 @curry
 def to_shotgrid_asset(
     asset_mapping: AssetFieldsMapping,
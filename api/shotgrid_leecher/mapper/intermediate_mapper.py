@@ -1,4 +1,4 @@
-from typing import Dict, Any, cast, List, Optional
+from typing import Dict, Any, cast, List, Optional, Iterable, Iterator
 
 import attr
 import cattr
@@ -21,6 +21,8 @@ from shotgrid_leecher.record.intermediate_structures import (
     IntermediateProjectStep,
     IntermediateLinkedEntity,
     IntermediateUser,
+    IntermediateColumns,
+    IntermediatePathIndex,
 )
 from shotgrid_leecher.record.shotgrid_structures import (
     ShotgridTask,
@@ -103,23 +105,23 @@ def to_row(
 
 
 def to_top_shot(
-    project: ShotgridProject, project_data: AvalonProjectData
+    project: ShotgridProject, params: IntermediateParams
 ) -> IntermediateGroup:
     return IntermediateGroup(
         TopMediaLevelType.SHOTS.value,
         f",{project.name},",
-        to_params(project_data),
+        params,
         object_id=to_object_id(TopMediaLevelType.SHOTS.value),
     )
 
 
 def to_top_asset(
-    project: ShotgridProject, project_data: AvalonProjectData
+    project: ShotgridProject, params: IntermediateParams
 ) -> IntermediateGroup:
     return IntermediateGroup(
         TopMediaLevelType.ASSETS.value,
         f",{project.name},",
-        to_params(project_data),
+        params,
         object_id=to_object_id(TopMediaLevelType.ASSETS.value),
     )
 
@@ -127,7 +129,7 @@ def to_top_asset(
 def to_task(
     task: ShotgridTask,
     parent_task_path: str,
-    project_data: AvalonProjectData,
+    params: IntermediateParams,
 ) -> IntermediateTask:
 
     return IntermediateTask(
@@ -136,7 +138,7 @@ def to_task(
         task_type=str(task.step_name()),
         src_id=task.id,
         status=task.status,
-        params=to_params(project_data),
+        params=params,
         object_id=to_object_id(task.id),
         assigned_users=_to_assigned_users(task.assigned_users),
     )
@@ -145,14 +147,14 @@ def to_task(
 def to_asset(
     asset: ShotgridAsset,
     parent_path: str,
-    project_data: AvalonProjectData,
+    params: IntermediateParams,
 ) -> IntermediateAsset:
     return IntermediateAsset(
         id=asset.code,
         src_id=asset.id,
         parent=parent_path,
         status=asset.status,
-        params=to_params(project_data),
+        params=params,
         linked_entities=[],
         object_id=to_object_id(asset.id),
     )
@@ -161,28 +163,28 @@ def to_asset(
 def to_shot(
     shot: ShotgridShot,
     parent_path: str,
-    project_data: AvalonProjectData,
+    params: IntermediateParams,
 ) -> IntermediateShot:
     result = IntermediateShot(
         id=shot.code,
         src_id=shot.id,
         parent=parent_path,
         status=shot.status,
-        params=to_params(project_data),
+        params=params,
         linked_entities=[],
         object_id=to_object_id(shot.id),
     )
     if not shot.has_params():
         return result
     raw_params: ShotgridShotParams = cast(ShotgridShotParams, shot.params)
-    params = attr.evolve(
-        result.params,
-        clip_in=raw_params.cut_in or project_data.clip_in,
-        clip_out=raw_params.cut_out or project_data.clip_out,
-        frame_start=raw_params.frame_start or project_data.frame_start,
-        frame_end=raw_params.frame_end or project_data.frame_end,
+    shot_params = attr.evolve(
+        params,
+        clip_in=raw_params.cut_in or params.clip_in,
+        clip_out=raw_params.cut_out or params.clip_out,
+        frame_start=raw_params.frame_start or params.frame_start,
+        frame_end=raw_params.frame_end or params.frame_end,
     )
-    return attr.evolve(result, params=params)
+    return attr.evolve(result, params=shot_params)
 
 
 @curry
@@ -201,6 +203,8 @@ def to_linked_shot(
         )
         for x in links_hash.get(shot.src_id, [])
     ]
+    if links == shot.linked_entities:
+        return shot
     return attr.evolve(shot, linked_entities=links)
 
 
@@ -220,18 +224,20 @@ def to_linked_asset(
         )
         for x in links_hash.get(asset.src_id, [])
     ]
+    if links == asset.linked_entities:
+        return asset
     return attr.evolve(asset, linked_entities=links)
 
 
 def to_asset_group(
     asset_type: str,
     project: ShotgridProject,
-    project_data: AvalonProjectData,
+    params: IntermediateParams,
 ) -> IntermediateGroup:
     return IntermediateGroup(
         id=asset_type,
         parent=f",{project.name},{TopMediaLevelType.ASSETS.value},",
-        params=to_params(project_data),
+        params=params,
         object_id=to_object_id(asset_type),
     )
 
@@ -239,13 +245,13 @@ def to_asset_group(
 def to_episode_shot_group(
     episode: ShotgridShotEpisode,
     project: ShotgridProject,
-    project_data: AvalonProjectData,
+    params: IntermediateParams,
 ) -> IntermediateEpisode:
     return IntermediateEpisode(
         id=episode.name,
         src_id=episode.id,
         parent=f",{project.name},{TopMediaLevelType.SHOTS.value},",
-        params=to_params(project_data),
+        params=params,
         object_id=to_object_id(episode.id),
     )
 
@@ -253,13 +259,13 @@ def to_episode_shot_group(
 def to_sequence_shot_group(
     sequence: ShotgridShotSequence,
     parent_path: str,
-    project_data: AvalonProjectData,
+    params: IntermediateParams,
 ) -> IntermediateSequence:
     return IntermediateSequence(
         id=sequence.name,
         src_id=sequence.id,
         parent=parent_path,
-        params=to_params(project_data),
+        params=params,
         object_id=to_object_id(sequence.id),
     )
 
@@ -267,7 +273,7 @@ def to_sequence_shot_group(
 def to_project(
     project: ShotgridProject,
     steps: List[ShotgridStep],
-    project_data: AvalonProjectData,
+    params: IntermediateParams,
 ) -> IntermediateProject:
     project_config = IntermediateProjectConfig(
         steps=[IntermediateProjectStep(x.code, x.short_name) for x in steps]
@@ -277,7 +283,7 @@ def to_project(
         src_id=project.id,
         code=project.code,
         config=project_config,
-        params=to_params(project_data),
+        params=params,
         object_id=to_object_id(project.id),
     )
 
@@ -291,13 +297,12 @@ def _to_assigned_users(
     ]
 
 
-def _get_parent_id(
-    hash_table: Dict[str, IntermediateRow], x: IntermediateRow
-) -> Optional[ObjectId]:
-    parent = hash_table.get(x.parent)
-    if parent:
-        return parent.object_id
-    return None
+def _with_parent_id(
+    row: IntermediateRow, parent_id: Optional[ObjectId]
+) -> IntermediateRow:
+    if row.parent_id == parent_id:
+        return row
+    return attr.evolve(row, parent_id=parent_id)
 
 
 @memoize
@@ -306,11 +311,62 @@ def _has_from_dict(type_: Any) -> bool:
 
 
 def map_parent_ids(rows: List[IntermediateRow]) -> List[IntermediateRow]:
-    tree = {f"{x.parent or ','}{x.id},": x for x in rows}
-    result = [attr.evolve(x, parent_id=_get_parent_id(tree, x)) for x in rows]
+    columns = IntermediateColumns.from_rows(rows)
+    result = [
+        _with_parent_id(x, y) for x, y in zip(columns, columns.parent_ids())
+    ]
     orphans = [
         x for x in result if not x.parent and x.type != ShotgridType.PROJECT
     ]
     if orphans:
         raise RuntimeError(f"Not all rows have parents {orphans}")
     return result
+
+
+def _orphan_check(row: IntermediateRow) -> IntermediateRow:
+    if not row.parent and row.type != ShotgridType.PROJECT:
+        raise RuntimeError(f"Not all rows have parents {[row]}")
+    return row
+
+
+def stream_parent_ids(
+    rows: Iterable[IntermediateRow],
+) -> Iterator[IntermediateRow]:
+    """
+    Set parent ids of rows while they stream, the streaming counterpart
+    of map_parent_ids.
+
+    Note:
+        A row whose parent did not show up yet is held back until it does,
+        it then comes out right after its parent, ahead of the rows of the
+        parent siblings. Rows whose parent never shows up come out at the
+        end without parent id, as map_parent_ids would leave them.
+
+    Args:
+        rows iterable(IntermediateRow): rows, mostly from top to bottom.
+
+    Returns iterator(IntermediateRow): Rows with their parent ids set.
+
+    """
+    index = IntermediatePathIndex(dict(), dict())
+    waiting: Dict[str, List[IntermediateRow]] = dict()
+
+    def _release(row: IntermediateRow) -> Iterator[IntermediateRow]:
+        stack = [row]
+        while stack:
+            ready = stack.pop()
+            path = f"{ready.parent or ','}{ready.id},"
+            index.object_ids[path] = ready.object_id
+            yield _with_parent_id(ready, index.object_id(ready.parent))
+            stack.extend(reversed(waiting.pop(path, [])))
+
+    for row in rows:
+        _orphan_check(row)
+        if row.parent and row.parent not in index.object_ids:
+            waiting.setdefault(row.parent, []).append(row)
+            continue
+        yield from _release(row)
+    while waiting:
+        parent = next(iter(waiting))
+        for row in waiting.pop(parent):
+            yield from _release(row)
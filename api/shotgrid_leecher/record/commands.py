@@ -5,8 +5,14 @@ import attr
 import cattr
 
 from shotgrid_leecher.record.avalon_structures import AvalonProjectData
+from shotgrid_leecher.record.enums import ShotgridType
 from shotgrid_leecher.record.http_models import BatchConfig
-from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
+from shotgrid_leecher.record.leecher_structures import (
+    ShotgridCredentials,
+    ShotgridWatermark,
+    ShotgridEventCursor,
+    ShotgridResponse,
+)
 from shotgrid_leecher.record.results import BatchResult, LogType
 from shotgrid_leecher.record.shotgrid_structures import ShotgridProjectUserLink
 from shotgrid_leecher.record.shotgrid_subtypes import FieldsMapping
@@ -18,6 +24,22 @@ class UpsertProjectUserLinksCommand:
     links: List[ShotgridProjectUserLink]
 
 
+@attr.s(auto_attribs=True, frozen=True)
+class UpsertShotgridWatermarksCommand:
+    watermarks: List[ShotgridWatermark]
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class UpsertShotgridEventCursorCommand:
+    cursor: ShotgridEventCursor
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class StoreShotgridResponseCommand:
+    response: ShotgridResponse
+    pages: List[bytes]
+
+
 @attr.s(auto_attribs=True, frozen=True)
 class CancelBatchSchedulingCommand:
     project_name: str
@@ -70,13 +92,16 @@ class UpdateShotgridInAvalonCommand:
     credentials: ShotgridCredentials
     fields_mapping: FieldsMapping
     project_data: AvalonProjectData
+    incremental: bool = False
+    streaming: bool = False
 
     @staticmethod
     def from_dict(
         source: Dict[str, Any],
         overwrite: bool = False,
+        incremental: bool = False,
     ) -> "UpdateShotgridInAvalonCommand":
-        params = {**source, "overwrite": overwrite}
+        params = {**source, "overwrite": overwrite, "incremental": incremental}
         return cattr.structure(params, UpdateShotgridInAvalonCommand)
 
     @staticmethod
@@ -93,9 +118,16 @@ class UpdateShotgridInAvalonCommand:
             credentials,
             FieldsMapping.from_dict(model.fields_mapping),
             project_data,
+            streaming=model.streaming,
         )
 
 
+@attr.s(auto_attribs=True, frozen=True)
+class UpdateShotgridChangesInAvalonCommand(UpdateShotgridInAvalonCommand):
+    changed_ids: Dict[ShotgridType, List[int]] = attr.Factory(dict)
+    retired_ids: Dict[ShotgridType, List[int]] = attr.Factory(dict)
+
+
 @attr.s(auto_attribs=True, frozen=True)
 class CleanScheduleBatchLogsCommand:
     datetime_gt: dt
@@ -129,6 +161,13 @@ class ScheduleShotgridBatchCommand:
         return attr.asdict(self, value_serializer=attr_value_to_dict)
 
 
+@attr.s(auto_attribs=True, frozen=True)
+class ScheduleShotgridChangesCommand:
+    batch: ScheduleShotgridBatchCommand
+    changed_ids: Dict[ShotgridType, List[int]]
+    retired_ids: Dict[ShotgridType, List[int]]
+
+
 @attr.s(auto_attribs=True, frozen=True)
 class ShotgridCheckCommand:
     project_id: int
@@ -33,8 +33,14 @@ class DbCollection(Enum):
     SCHEDULE_PROJECTS = "projects"
     SCHEDULE_QUEUE = "queue"
     SCHEDULE_LOGS = "logs"
+    SCHEDULE_TIMERS = "timers"
     SHOTGRID_CREDENTIALS = "shotgrid_credentials"
     SHOTGRID_PROJ_USER_LINKS = "shotgrid_project_user_links"
+    SHOTGRID_WATERMARKS = "shotgrid_watermarks"
+    SHOTGRID_EVENT_CURSORS = "shotgrid_event_cursors"
+    SHOTGRID_RESPONSES = "shotgrid_responses"
+    SHOTGRID_RESPONSE_PAGES = "shotgrid_response_pages"
+    BATCH_JOBS = "batch_jobs"
 
 
 @unique
@@ -80,12 +86,46 @@ class ShotgridType(Enum):
     def middle_names() -> List[str]:
         return [x.value for x in ShotgridType.middle_types()]
 
+    @staticmethod
+    def watermarked_types() -> List["ShotgridType"]:
+        return [
+            ShotgridType.ASSET,
+            ShotgridType.SHOT,
+            ShotgridType.TASK,
+        ]
+
+    @staticmethod
+    def link_types() -> List["ShotgridType"]:
+        return [
+            ShotgridType.ASSET_TO_SHOT_LINK,
+            ShotgridType.SHOT_TO_SHOT_LINK,
+            ShotgridType.ASSET_TO_ASSET_LINK,
+        ]
+
+    @staticmethod
+    def event_types() -> List["ShotgridType"]:
+        return [
+            *ShotgridType.watermarked_types(),
+            *ShotgridType.link_types(),
+        ]
+
 
 @unique
 class ShotgridEvents(Enum):
     NEW_ASSET = "Shotgun_Asset_New"
 
 
+@unique
+class ShotgridEventKind(Enum):
+    NEW = "New"
+    CHANGE = "Change"
+    RETIREMENT = "Retirement"
+    REVIVAL = "Revival"
+
+    def event_type(self, type_: ShotgridType) -> str:
+        return f"Shotgun_{type_.value}_{self.value}"
+
+
 @unique
 class EventTables(Enum):
     ASSET_EVENTS = "asset_events"
@@ -139,6 +179,8 @@ class ShotgridField(Enum):
     LINK_ASSET_ID = "link_asset_id"
     LINK_PARENT_ID = "link_parent_id"
     LINK_PARENT_SHOT_ID = "link_parent_shot_id"
+    UPDATED_AT = "updated_at"
+    CREATED_AT = "created_at"
 
     def to_db_key(self) -> str:
         return str(self.value).replace(".", "_")
@@ -77,6 +77,11 @@ class BatchConfig(BaseModel):
         title="Flag that specifies whether batch "
         "should overwrite existing data or not",
     )
+    streaming: bool = Field(
+        default=False,
+        title="Flag that specifies whether batch should write "
+        "Shotgrid pages while fetching the next ones",
+    )
     fields_mapping: Dict[str, Dict[str, str]]
 
     @validator("shotgrid_url")
@@ -92,4 +97,3 @@ class BatchConfig(BaseModel):
         field: ModelField,
     ) -> Any:
         return _validate_non_empty_fields(value, values, config, field)
-
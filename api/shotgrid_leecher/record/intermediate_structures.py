@@ -1,9 +1,21 @@
+import sys
 from functools import reduce
-from typing import Dict, Any, List, Optional
+from typing import (
+    Dict,
+    Any,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Iterator,
+    Iterable,
+    Sequence,
+)
 
 import attr
 import cattr
 from bson import ObjectId
+from toolz import memoize
 
 from shotgrid_leecher.record.enums import ShotgridType
 from shotgrid_leecher.utils.ids import to_object_id
@@ -14,7 +26,12 @@ Map = Dict[str, Any]
 cattr.register_structure_hook(ObjectId, lambda v, _: ObjectId(str(v)))
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@memoize
+def _field_names(type_: type) -> Set[str]:
+    return set(attr.fields_dict(type_).keys())
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateParams:
     clip_in: int
     clip_out: int
@@ -39,7 +56,7 @@ class IntermediateParams:
         return smoker_dic
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateRow:
     id: str
     parent: str
@@ -52,7 +69,7 @@ class IntermediateRow:
     status: Optional[str] = attr.attrib(None, init=False)
 
     def has_field(self, field: str):
-        return field in attr.asdict(self, recurse=False).keys()
+        return field in _field_names(type(self))
 
     def to_dict(self) -> Map:
         base_dict = {k: v for k, v in attr.asdict(self).items() if k != "id"}
@@ -63,11 +80,11 @@ class IntermediateRow:
         }
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateGroup(IntermediateRow):
     object_id: Optional[ObjectId]
     parent_id: Optional[ObjectId] = None
-    type = ShotgridType.GROUP
+    type: ShotgridType = attr.attrib(ShotgridType.GROUP, init=False)
 
     @staticmethod
     def from_dict(raw_dic: Map) -> "IntermediateGroup":
@@ -79,7 +96,7 @@ class IntermediateGroup(IntermediateRow):
         return type_(**dic)
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateLinkedEntity:
     id: int
     link_type: str
@@ -88,14 +105,14 @@ class IntermediateLinkedEntity:
     type = ShotgridType.LINKED_ENTITY
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateAsset(IntermediateRow):
     src_id: int
     linked_entities: List[IntermediateLinkedEntity]
     object_id: Optional[ObjectId]
     status: Optional[str] = None
     parent_id: Optional[ObjectId] = None
-    type = ShotgridType.ASSET
+    type: ShotgridType = attr.attrib(ShotgridType.ASSET, init=False)
 
     @staticmethod
     def from_dict(raw_dic: Map) -> "IntermediateAsset":
@@ -108,7 +125,7 @@ class IntermediateAsset(IntermediateRow):
         return type_(**dic)
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateUser:
     src_id: int
     object_id: ObjectId
@@ -134,7 +151,7 @@ class IntermediateUser:
         return type_(**dic)
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateTask(IntermediateRow):
     task_type: str
     src_id: int
@@ -142,7 +159,7 @@ class IntermediateTask(IntermediateRow):
     assigned_users: List[IntermediateUser]
     status: Optional[str] = None
     parent_id: Optional[ObjectId] = None
-    type = ShotgridType.TASK
+    type: ShotgridType = attr.attrib(ShotgridType.TASK, init=False)
 
     @staticmethod
     def from_dict(raw_dic: Map) -> "IntermediateTask":
@@ -156,14 +173,14 @@ class IntermediateTask(IntermediateRow):
         return type_(**dic)
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateShot(IntermediateRow):
     src_id: int
     linked_entities: List[IntermediateLinkedEntity]
     object_id: Optional[ObjectId]
     status: Optional[str] = None
     parent_id: Optional[ObjectId] = None
-    type = ShotgridType.SHOT
+    type: ShotgridType = attr.attrib(ShotgridType.SHOT, init=False)
 
     @staticmethod
     def from_dict(raw_dic: Map) -> "IntermediateShot":
@@ -176,23 +193,23 @@ class IntermediateShot(IntermediateRow):
         return type_(**dic)
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateEpisode(IntermediateRow):
     src_id: int
     object_id: Optional[ObjectId]
     parent_id: Optional[ObjectId] = None
-    type = ShotgridType.EPISODE
+    type: ShotgridType = attr.attrib(ShotgridType.EPISODE, init=False)
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateSequence(IntermediateRow):
     src_id: int
     object_id: Optional[ObjectId]
     parent_id: Optional[ObjectId] = None
-    type = ShotgridType.SEQUENCE
+    type: ShotgridType = attr.attrib(ShotgridType.SEQUENCE, init=False)
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateProjectStep:
     code: str
     short_name: str
@@ -211,7 +228,7 @@ class IntermediateProjectStep:
         return IntermediateProjectStep(code=code, short_name=short_name)
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateProjectConfig:
     steps: List[IntermediateProjectStep] = []
 
@@ -235,7 +252,7 @@ class IntermediateProjectConfig:
         )
 
 
-@attr.s(auto_attribs=True, frozen=True)
+@attr.s(auto_attribs=True, frozen=True, slots=True)
 class IntermediateProject(IntermediateRow):
     src_id: int
     code: Optional[str]
@@ -243,7 +260,7 @@ class IntermediateProject(IntermediateRow):
     object_id: Optional[ObjectId]
     parent: str = attr.attrib(init=False, default=None)
     parent_id: Optional[ObjectId] = None
-    type = ShotgridType.PROJECT
+    type: ShotgridType = attr.attrib(ShotgridType.PROJECT, init=False)
 
     @staticmethod
     def from_dict(raw_dic: Map) -> "IntermediateProject":
@@ -261,3 +278,122 @@ class IntermediateProject(IntermediateRow):
             config=dic["config"],
             object_id=dic.get("object_id"),
         )
+
+
+Path = Tuple[Optional[str], str]
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class IntermediateColumns(Sequence[IntermediateRow]):
+    # Column view of a hierarchy, rows stay the source of truth and
+    # position i of every column describes rows[i]
+    rows: Tuple[IntermediateRow, ...]
+    ids: Tuple[str, ...]
+    parents: Tuple[Optional[str], ...]
+    types: Tuple[ShotgridType, ...]
+    object_ids: Tuple[Optional[ObjectId], ...]
+    src_ids: Tuple[Optional[int], ...]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[IntermediateRow]:
+        return iter(self.rows)
+
+    def __getitem__(self, position: Any) -> Any:
+        return self.rows[position]
+
+    def paths(self) -> Set[Path]:
+        return set(zip(self.parents, self.ids))
+
+    def full_paths(self) -> List[str]:
+        return [f"{p or ','}{i}," for p, i in zip(self.parents, self.ids)]
+
+    def path_index(self) -> "IntermediatePathIndex":
+        return IntermediatePathIndex(
+            dict(zip(self.full_paths(), self.object_ids)), dict()
+        )
+
+    def parent_ids(self) -> List[Optional[ObjectId]]:
+        index = self.path_index()
+        return [index.object_id(x) for x in self.parents]
+
+    def positions_of(self, types: Iterable[ShotgridType]) -> List[int]:
+        wanted = set(types)
+        return [i for i, x in enumerate(self.types) if x in wanted]
+
+    def rows_of(self, types: Iterable[ShotgridType]) -> List[IntermediateRow]:
+        return [self.rows[i] for i in self.positions_of(types)]
+
+    def positions_missing_from(
+        self, other: "IntermediateColumns"
+    ) -> List[int]:
+        known = other.paths()
+        return [
+            i
+            for i, x in enumerate(zip(self.parents, self.ids))
+            if x not in known
+        ]
+
+    def by_src_id(self) -> Dict[int, IntermediateRow]:
+        return {int(x): self.rows[i] for i, x in enumerate(self.src_ids) if x}
+
+    @staticmethod
+    def from_rows(rows: Iterable[IntermediateRow]) -> "IntermediateColumns":
+        if isinstance(rows, IntermediateColumns):
+            return rows
+        kept = tuple(rows)
+        return IntermediateColumns(
+            rows=kept,
+            ids=tuple([x.id for x in kept]),
+            parents=tuple([_intern(x.parent) for x in kept]),
+            types=tuple([x.type for x in kept]),
+            object_ids=tuple([x.object_id for x in kept]),
+            src_ids=tuple([x.src_id for x in kept]),
+        )
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class IntermediatePathNode:
+    path: str
+    name: str
+    parent: Optional["IntermediatePathNode"]
+    # names below the project, what avalon calls the parents of a child
+    lineage: Tuple[str, ...]
+
+
+@attr.s(auto_attribs=True, frozen=True, slots=True)
+class IntermediatePathIndex:
+    # Tree of the comma joined paths of a hierarchy, every distinct path
+    # is parsed once, the string form only matters for persistence
+    object_ids: Dict[str, Optional[ObjectId]]
+    nodes: Dict[str, IntermediatePathNode]
+
+    def node(self, path: str) -> IntermediatePathNode:
+        found = self.nodes.get(path)
+        if found:
+            return found
+        cut = path.rfind(",", 0, len(path) - 1) + 1
+        if cut > 1 and path.startswith(","):
+            parent = self.node(path[:cut])
+            name = path[cut:-1]
+            lineage = (*parent.lineage, name)
+            node = IntermediatePathNode(path, name, parent, lineage)
+        else:
+            lineage = tuple(path.split(",")[2:-1])
+            node = IntermediatePathNode(path, path.strip(","), None, lineage)
+        return self.nodes.setdefault(sys.intern(path), node)
+
+    def object_id(self, path: Optional[str]) -> Optional[ObjectId]:
+        return self.object_ids.get(path) if path else None
+
+    def lineage(self, path: str) -> List[str]:
+        return list(self.node(path).lineage)
+
+    @staticmethod
+    def from_rows(rows: Iterable[IntermediateRow]) -> "IntermediatePathIndex":
+        return IntermediateColumns.from_rows(rows).path_index()
@@ -137,3 +137,121 @@ class ShotgridCredentials:
             script_key=dic["script_key"],
         )
 
+
+@attr.s(auto_attribs=True, frozen=True)
+class ShotgridWatermark:
+    project_name: str
+    type: str
+    count: int
+    updated_at: Optional[datetime]
+    fingerprint: str
+    full_sync_at: datetime
+
+    def to_mongo(self) -> Dict[str, Any]:
+        return {
+            "_id": f"{self.project_name}/{self.type}",
+            **attr.asdict(self),
+        }
+
+    @staticmethod
+    def from_mongo(dic: Dict[str, Any]) -> "ShotgridWatermark":
+        return ShotgridWatermark(
+            project_name=dic["project_name"],
+            type=dic["type"],
+            count=dic["count"],
+            updated_at=dic.get("updated_at"),
+            fingerprint=dic["fingerprint"],
+            full_sync_at=dic["full_sync_at"],
+        )
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ShotgridEventCursor:
+    shotgrid_url: str
+    last_event_id: int
+    updated_at: datetime
+    script_name: str = ""
+
+    def to_mongo(self) -> Dict[str, Any]:
+        return {
+            "_id": ShotgridEventCursor.to_id(
+                self.shotgrid_url, self.script_name
+            ),
+            **attr.asdict(self),
+        }
+
+    @staticmethod
+    def to_id(shotgrid_url: str, script_name: str) -> str:
+        return f"{shotgrid_url}#{script_name}" if script_name else shotgrid_url
+
+    @staticmethod
+    def from_mongo(dic: Dict[str, Any]) -> "ShotgridEventCursor":
+        return ShotgridEventCursor(
+            shotgrid_url=dic["shotgrid_url"],
+            last_event_id=dic["last_event_id"],
+            updated_at=dic["updated_at"],
+            script_name=dic.get("script_name", ""),
+        )
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ShotgridResponse:
+    key: str
+    shotgrid_url: str
+    type: str
+    fingerprint: str
+    pages: int
+    size: int
+    used_at: datetime
+    stored_at: datetime
+    expires_at: datetime
+
+    def to_mongo(self) -> Dict[str, Any]:
+        return {"_id": self.key, **attr.asdict(self)}
+
+    @staticmethod
+    def from_mongo(dic: Dict[str, Any]) -> "ShotgridResponse":
+        return ShotgridResponse(
+            key=dic["key"],
+            shotgrid_url=dic["shotgrid_url"],
+            type=dic["type"],
+            fingerprint=dic["fingerprint"],
+            pages=dic["pages"],
+            size=dic["size"],
+            used_at=dic["used_at"],
+            stored_at=dic["stored_at"],
+            expires_at=dic["expires_at"],
+        )
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class BatchJob:
+    id: str
+    project_name: str
+    kind: str
+    fingerprint: str
+    status: str
+    progress: Dict[str, int]
+    created_at: datetime
+    updated_at: datetime
+    result: Optional[str] = None
+    error: Optional[str] = None
+
+    def to_mongo(self) -> Dict[str, Any]:
+        dic = attr.asdict(self)
+        return {"_id": dic.pop("id"), **dic}
+
+    @staticmethod
+    def from_mongo(dic: Dict[str, Any]) -> "BatchJob":
+        return BatchJob(
+            id=dic["_id"],
+            project_name=dic["project_name"],
+            kind=dic["kind"],
+            fingerprint=dic["fingerprint"],
+            status=dic["status"],
+            progress=dic.get("progress") or dict(),
+            created_at=dic["created_at"],
+            updated_at=dic["updated_at"],
+            result=dic.get("result"),
+            error=dic.get("error"),
+        )
@@ -1,9 +1,15 @@
+from datetime import datetime
 from typing import Any, Dict, Optional, List, Tuple
 
 import attr
 
 from shotgrid_leecher.record.avalon_structures import AvalonProjectData
-from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
+from shotgrid_leecher.record.enums import ShotgridType
+from shotgrid_leecher.record.leecher_structures import (
+    ShotgridCredentials,
+    ShotgridWatermark,
+)
+from shotgrid_leecher.record.shotgrid_structures import ShotgridEntitySummary
 from shotgrid_leecher.record.shotgrid_subtypes import (
     ShotgridProject,
     FieldsMapping,
@@ -50,6 +56,40 @@ class ShotgridHierarchyByProjectQuery:
     project_data: AvalonProjectData
 
 
+@attr.s(auto_attribs=True, frozen=True)
+class ShotgridHierarchyDeltaQuery(ShotgridHierarchyByProjectQuery):
+    watermarks: Dict[ShotgridType, ShotgridWatermark]
+    summaries: Dict[ShotgridType, ShotgridEntitySummary]
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ShotgridHierarchyChangesQuery(ShotgridHierarchyByProjectQuery):
+    changed_ids: Dict[ShotgridType, List[int]]
+    retired_ids: Dict[ShotgridType, List[int]]
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ShotgridSummarizeByProjectQuery:
+    project_id: int
+    credentials: ShotgridCredentials
+    type: ShotgridType
+    created_after: Optional[datetime] = None
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ShotgridFindIdsByProjectQuery:
+    project_id: int
+    credentials: ShotgridCredentials
+    type: ShotgridType
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ShotgridFindEventsQuery:
+    credentials: ShotgridCredentials
+    after_id: int
+    project_ids: List[int]
+
+
 @attr.s(auto_attribs=True, frozen=True)
 class ShotgridBoundEntityQuery:
     project: ShotgridProject
@@ -73,16 +113,23 @@ class ShotgridFindProjectByIdQuery(ShotgridBaseEntityQuery):
 class ShotgridFindAssetsByProjectQuery(ShotgridBoundEntityQuery):
     asset_mapping: AssetFieldsMapping
     task_mapping: TaskFieldsMapping
+    updated_after: Optional[datetime] = None
+    ids: Optional[List[int]] = None
 
 
 @attr.s(auto_attribs=True, frozen=True)
 class ShotgridFindShotsByProjectQuery(ShotgridBoundEntityQuery):
     shot_mapping: ShotFieldsMapping
+    updated_after: Optional[datetime] = None
+    ids: Optional[List[int]] = None
 
 
 @attr.s(auto_attribs=True, frozen=True)
 class ShotgridFindTasksByProjectQuery(ShotgridBoundEntityQuery):
     task_mapping: TaskFieldsMapping
+    updated_after: Optional[datetime] = None
+    ids: Optional[List[int]] = None
+    entities: Optional[List[Tuple[ShotgridType, int]]] = None
 
 
 @attr.s(auto_attribs=True, frozen=True)
@@ -15,6 +15,23 @@ class InsertionResult:
     inserted_ids: List[Any]
 
 
+@attr.s(auto_attribs=True, frozen=True)
+class UpsertionResult:
+    written_count: int
+    skipped_count: int
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class BulkWriteSummary:
+    operations: int = 0
+    chunks: int = 0
+    inserted_count: int = 0
+    matched_count: int = 0
+    modified_count: int = 0
+    deleted_count: int = 0
+    upserted_count: int = 0
+
+
 @attr.s(auto_attribs=True, frozen=True)
 class BatchCheckResult:
     status: str
@@ -44,6 +61,25 @@ class BatchResult(Enum):
     OK = "Ok"
 
 
+@unique
+class BatchJobStatus(Enum):
+    QUEUED = "Queued"
+    RUNNING = "Running"
+    DONE = "Done"
+    FAILED = "Failed"
+
+    @staticmethod
+    def active() -> List["BatchJobStatus"]:
+        return [BatchJobStatus.QUEUED, BatchJobStatus.RUNNING]
+
+
+@unique
+class BatchStage(Enum):
+    FETCHED = "fetched"
+    MAPPED = "mapped"
+    WRITTEN = "written"
+
+
 @unique
 class LogType(Enum):
     SCHEDULE = "Schedule"
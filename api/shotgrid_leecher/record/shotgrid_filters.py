@@ -49,6 +49,24 @@ class IsNotFilter(BaseFilter):
         return [self.key, "is_not", self.value]
 
 
+@attr.s(auto_attribs=True, frozen=True)
+class GreaterThanFilter(BaseFilter):
+    key: str
+    value: Any
+
+    def to_sublist(self) -> List[Any]:
+        return [self.key, "greater_than", self.value]
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class InFilter(BaseFilter):
+    key: str
+    values: List[Any]
+
+    def to_sublist(self) -> List[Any]:
+        return [self.key, "in", self.values]
+
+
 @attr.s(auto_attribs=True, frozen=True)
 class IdFilter(BaseFilter):
     id: int
@@ -57,6 +75,17 @@ class IdFilter(BaseFilter):
         return ["id", "is", self.id]
 
 
+@attr.s(auto_attribs=True, frozen=True)
+class AnyFilter(BaseFilter):
+    filters: List[BaseFilter]
+
+    def to_sublist(self) -> Any:
+        return {
+            "filter_operator": "any",
+            "filters": [x.to_sublist() for x in self.filters],
+        }
+
+
 @attr.s(auto_attribs=True, frozen=True)
 class CompositeFilter(BaseFilter):
     filters: List[BaseFilter]
@@ -1,8 +1,10 @@
+from datetime import datetime
 from enum import unique, Enum
 from typing import Optional, List, Dict, Any, Iterator, Type
 
 import attr
 
+from shotgrid_leecher.record.enums import ShotgridType, ShotgridEventKind
 from shotgrid_leecher.record.shotgrid_subtypes import ShotgridUser
 from shotgrid_leecher.utils.strings import format_path
 
@@ -187,6 +189,28 @@ class ShotgridAsset(ShotgridEntity):
         return attr.evolve(self, **{"tasks": tasks})
 
 
+@attr.s(auto_attribs=True, frozen=True)
+class ShotgridEntitySummary:
+    type: ShotgridType
+    count: int
+    latest_update: Optional[datetime] = None
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ShotgridEvent:
+    id: int
+    kind: ShotgridEventKind
+    entity_type: ShotgridType
+    entity_id: int
+    project_id: int
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ShotgridEventPage:
+    last_event_id: int
+    events: List[ShotgridEvent]
+
+
 @unique
 class ShotgridRefType(Enum):
     UNKNOWN = "Unknown"
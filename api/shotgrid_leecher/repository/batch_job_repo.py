@@ -0,0 +1,16 @@
+from typing import Callable, Optional
+
+from pymongo.collection import Collection
+
+from shotgrid_leecher.record.enums import DbName, DbCollection
+from shotgrid_leecher.record.leecher_structures import BatchJob
+from shotgrid_leecher.utils.connectivity import db_collection
+
+_collection: Callable[[DbCollection], Collection] = db_collection(
+    DbName.LEECHER
+)
+
+
+def fetch_batch_job(job_id: str) -> Optional[BatchJob]:
+    raw = _collection(DbCollection.BATCH_JOBS).find_one({"_id": job_id})
+    return BatchJob.from_mongo(raw) if raw else None
@@ -0,0 +1,22 @@
+from typing import Callable, Optional
+
+from pymongo.collection import Collection
+
+from shotgrid_leecher.record.enums import DbName, DbCollection
+from shotgrid_leecher.record.leecher_structures import ShotgridEventCursor
+from shotgrid_leecher.utils.connectivity import db_collection
+
+_collection: Callable[[DbCollection], Collection] = db_collection(
+    DbName.LEECHER
+)
+
+
+def fetch_event_cursor(
+    shotgrid_url: str, script_name: str
+) -> Optional[ShotgridEventCursor]:
+    raw = _collection(DbCollection.SHOTGRID_EVENT_CURSORS).find_one(
+        {"_id": ShotgridEventCursor.to_id(shotgrid_url, script_name)}
+    )
+    if not raw:
+        return None
+    return ShotgridEventCursor.from_mongo(raw)
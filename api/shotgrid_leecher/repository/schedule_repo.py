@@ -44,7 +44,9 @@ def group_batch_commands() -> List[GroupAndCountResult]:
 
 
 def queue_size() -> int:
-    return _collection(DbCollection.SCHEDULE_QUEUE).count_documents({})
+    return _collection(DbCollection.SCHEDULE_QUEUE).count_documents(
+        {"parked_at": None}
+    )
 
 
 def count_projects() -> int:
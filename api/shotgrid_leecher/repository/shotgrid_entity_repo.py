@@ -1,14 +1,25 @@
-from typing import List, Dict, Any
+import hashlib
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Set, Iterator, Callable
 
-from cachetools import cached, TTLCache
+from cachetools import cached
 from toolz import pipe
 from toolz.curried import (
     map as select,
 )
 
 import shotgrid_leecher.mapper.entity_mapper as mapper
+import shotgrid_leecher.repository.shotgrid_response_repo as response_repo
 import shotgrid_leecher.utils.connectivity as conn
-from shotgrid_leecher.record.enums import ShotgridType
+from shotgrid_leecher.record.commands import StoreShotgridResponseCommand
+from shotgrid_leecher.record.enums import ShotgridType, ShotgridField
+from shotgrid_leecher.record.leecher_structures import (
+    ShotgridCredentials,
+    ShotgridResponse,
+)
 from shotgrid_leecher.record.queries import (
     ShotgridFindProjectByIdQuery,
     ShotgridFindAssetsByProjectQuery,
@@ -16,10 +27,16 @@ from shotgrid_leecher.record.queries import (
     ShotgridFindTasksByProjectQuery,
     ShotgridFindAllStepsQuery,
     ShotgridLinkedEntitiesQuery,
+    ShotgridSummarizeByProjectQuery,
+    ShotgridFindIdsByProjectQuery,
 )
 from shotgrid_leecher.record.shotgrid_filters import (
+    AnyFilter,
+    BaseFilter,
     CompositeFilter,
+    GreaterThanFilter,
     IdFilter,
+    InFilter,
     IsFilter,
     IsNotFilter,
     NameIsFilter,
@@ -30,8 +47,14 @@ from shotgrid_leecher.record.shotgrid_structures import (
     ShotgridAsset,
     ShotgridStep,
     ShotgridEntityToEntityLink,
+    ShotgridEntitySummary,
+)
+from shotgrid_leecher.record.shotgrid_subtypes import (
+    GenericFieldsMapping,
+    ShotgridProject,
 )
-from shotgrid_leecher.record.shotgrid_subtypes import ShotgridProject
+from shotgrid_leecher.utils.caches import MeteredCache
+from shotgrid_leecher.writers import shotgrid_response_writer
 
 Map = Dict[str, Any]
 _F = CompositeFilter
@@ -39,6 +62,284 @@ _ID = IdFilter
 _IS = IsFilter
 _NAMED = NameIsFilter
 _NOT = IsNotFilter
+_GT = GreaterThanFilter
+_IN = InFilter
+_ANY = AnyFilter
+
+_PAGE_SIZE = int(os.getenv("SHOTGRID_PAGE_SIZE", 500))
+_LINK_CACHE_SIZE = int(os.getenv("SHOTGRID_LINK_CACHE_SIZE", 64))
+_LINK_CACHE_SECONDS = int(os.getenv("SHOTGRID_LINK_CACHE_SECONDS", 600))
+_RESPONSE_CACHE_SECONDS = int(
+    os.getenv("SHOTGRID_RESPONSE_CACHE_SECONDS", 3600)
+)
+_RESPONSE_CACHE_SIZE = (
+    int(os.getenv("SHOTGRID_RESPONSE_CACHE_MB", 512)) * 1024 * 1024
+)
+_DATE = "$date"
+_SUMMARY_FIELDS = [
+    {"field": ShotgridField.ID.value, "type": "count"},
+    {"field": ShotgridField.UPDATED_AT.value, "type": "maximum"},
+]
+
+# Shotgrid datetimes have a one second resolution, a small overlap makes
+# sure nothing updated within the same second as the watermark is missed
+_WATERMARK_OVERLAP = timedelta(seconds=1)
+
+
+def _find_pages(
+    client: conn.ShotgridClient,
+    type_: str,
+    filters: List[List[Any]],
+    fields: List[str],
+    id_field: str = ShotgridField.ID.value,
+) -> Iterator[List[Map]]:
+    # pages start after the last id seen rather than at an offset: rows
+    # retired while scanning can't shift the next pages over unseen rows
+    order = [{"field_name": id_field, "direction": "asc"}]
+    after: List[List[Any]] = []
+    while True:
+        rows = client.find(
+            type_, filters + after, fields, order=order, limit=_PAGE_SIZE
+        )
+        if rows:
+            yield rows
+        if len(rows) < _PAGE_SIZE:
+            return
+        after = _F.filter_by(_GT(id_field, rows[-1][id_field]))
+
+
+def _response_key(
+    credentials: ShotgridCredentials,
+    type_: str,
+    filters: List[List[Any]],
+    fields: List[str],
+) -> str:
+    raw = json.dumps(
+        [
+            credentials.shotgrid_url,
+            credentials.script_name,
+            type_,
+            filters,
+            sorted(fields),
+        ],
+        default=str,
+        sort_keys=True,
+    )
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _fingerprint(
+    client: conn.ShotgridClient,
+    type_: str,
+    filters: List[List[Any]],
+    linked: Dict[str, List[List[Any]]],
+) -> str:
+    # any creation, update, retirement or revival moves either the count
+    # or the latest update of an entity set, the linked sets cover the
+    # names and parents rows carry over from other entities
+    raw = {
+        k: client.summarize(k, v, _SUMMARY_FIELDS).get("summaries")
+        for k, v in [(type_, filters), *sorted(linked.items())]
+    }
+    return json.dumps(raw, default=str, sort_keys=True)
+
+
+def _linked_sets(
+    project: ShotgridProject, types: List[ShotgridType]
+) -> Dict[str, List[List[Any]]]:
+    # steps are shared by all projects
+    in_project = _F.filter_by(
+        _IS(ShotgridType.PROJECT.value.lower(), project.to_dict())
+    )
+    return {
+        x.value: [] if x == ShotgridType.STEP else in_project for x in types
+    }
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {_DATE: value.isoformat()}
+    raise TypeError(f"Can't cache {type(value).__name__} from Shotgrid")
+
+
+def _from_json(dic: Map) -> Any:
+    if len(dic) == 1 and _DATE in dic:
+        return datetime.fromisoformat(dic[_DATE])
+    return dic
+
+
+def _dump_page(page: List[Map]) -> bytes:
+    # plain JSON, datetimes are tagged to come back with their timezone
+    return zlib.compress(json.dumps(page, default=_to_json).encode())
+
+
+def _load_page(blob: bytes) -> List[Map]:
+    return json.loads(zlib.decompress(blob), object_hook=_from_json)
+
+
+def _cached_pages(
+    credentials: ShotgridCredentials,
+    type_: str,
+    filters: List[List[Any]],
+    fields: List[str],
+    id_field: str = ShotgridField.ID.value,
+    linked: Optional[Dict[str, List[List[Any]]]] = None,
+) -> Iterator[List[Map]]:
+    client = conn.get_shotgrid_client(credentials)
+    if _RESPONSE_CACHE_SECONDS <= 0 or _RESPONSE_CACHE_SIZE <= 0:
+        yield from _find_pages(client, type_, filters, fields, id_field)
+        return
+    key = _response_key(credentials, type_, filters, fields)
+    # probed before fetching: rows changed meanwhile only make the next
+    # probe miss, never serve stale rows. Past its expiry a response is
+    # refetched whatever the probe says, for changes it can't see
+    fingerprint = _fingerprint(client, type_, filters, linked or dict())
+    cached = response_repo.fetch_response(key)
+    now = datetime.utcnow()
+    if (
+        cached
+        and cached.fingerprint == fingerprint
+        and cached.expires_at > now
+    ):
+        shotgrid_response_writer.touch_response(key, now)
+        for blob in response_repo.fetch_response_pages(key):
+            yield _load_page(blob)
+        return
+    blobs = []
+    for page in _find_pages(client, type_, filters, fields, id_field):
+        blobs.append(_dump_page(page))
+        yield page
+    response = ShotgridResponse(
+        key=key,
+        shotgrid_url=credentials.shotgrid_url,
+        type=type_,
+        fingerprint=fingerprint,
+        pages=len(blobs),
+        size=sum(len(x) for x in blobs),
+        used_at=now,
+        stored_at=now,
+        expires_at=now + timedelta(seconds=_RESPONSE_CACHE_SECONDS),
+    )
+    shotgrid_response_writer.store_response(
+        StoreShotgridResponseCommand(response, blobs)
+    )
+    shotgrid_response_writer.evict_responses(_RESPONSE_CACHE_SIZE)
+
+
+def _project_pages(
+    credentials: ShotgridCredentials,
+    type_: str,
+    filters: List[List[Any]],
+    fields: List[str],
+    cached: bool = True,
+    id_field: str = ShotgridField.ID.value,
+    linked: Optional[Dict[str, List[List[Any]]]] = None,
+) -> Iterator[List[Map]]:
+    # incremental fetches are already small and never repeat
+    if not cached:
+        client = conn.get_shotgrid_client(credentials)
+        return _find_pages(client, type_, filters, fields, id_field)
+    return _cached_pages(credentials, type_, filters, fields, id_field, linked)
+
+
+def _map_pages(
+    pages: Iterator[List[Map]],
+    to_record: Callable[[Map], Any],
+) -> Iterator[Any]:
+    for page in pages:
+        yield from [to_record(x) for x in page]
+
+
+def _later_than(field: str, mark: Optional[datetime]) -> List[BaseFilter]:
+    if not mark:
+        return []
+    return [_GT(field, mark - _WATERMARK_OVERLAP)]
+
+
+def _linked_updated_at(
+    mapping: GenericFieldsMapping,
+    links: Dict[ShotgridField, ShotgridType],
+) -> List[str]:
+    return [
+        f"{mapping.mapping_table[k.value]}.{v.value}.updated_at"
+        for k, v in links.items()
+    ]
+
+
+def _changed_since(
+    fields: List[str], mark: Optional[datetime]
+) -> List[BaseFilter]:
+    # an entity also changes place when what it is filed under changes,
+    # without its own update date moving
+    if not mark:
+        return []
+    return [_ANY([_GT(x, mark - _WATERMARK_OVERLAP) for x in fields])]
+
+
+def _ids_in(ids: Optional[List[int]]) -> List[BaseFilter]:
+    return [_IN(ShotgridField.ID.value, ids)] if ids is not None else []
+
+
+def _tasks_in(query: ShotgridFindTasksByProjectQuery) -> List[BaseFilter]:
+    # listed tasks along with every task of the listed entities
+    if query.ids is None and query.entities is None:
+        return []
+    field = query.task_mapping.mapping_table[ShotgridField.ENTITY.value]
+    entities = [{"type": k.value, "id": v} for k, v in query.entities or []]
+    return [
+        _ANY(
+            [
+                _IN(ShotgridField.ID.value, query.ids or []),
+                _IN(field, entities),
+            ]
+        )
+    ]
+
+
+def _project_entity_filters(
+    type_: ShotgridType,
+    project_id: int,
+) -> List[BaseFilter]:
+    project = {"type": ShotgridType.PROJECT.value, "id": project_id}
+    filters: List[BaseFilter] = [
+        _IS(ShotgridType.PROJECT.value.lower(), project)
+    ]
+    if type_ == ShotgridType.TASK:
+        return [*filters, _NOT("entity", None)]
+    return filters
+
+
+def _links_key(query: ShotgridLinkedEntitiesQuery) -> Any:
+    return (
+        query.project,
+        query.credentials.shotgrid_url,
+        query.credentials.script_name,
+        tuple(sorted(query.fields_mapping.mapping_table.items())),
+    )
+
+
+def _link_cache(type_: ShotgridType) -> MeteredCache:
+    return MeteredCache(type_.value, _LINK_CACHE_SIZE, _LINK_CACHE_SECONDS)
+
+
+_ASSET_TO_SHOT_LINKS = _link_cache(ShotgridType.ASSET_TO_SHOT_LINK)
+_SHOT_TO_SHOT_LINKS = _link_cache(ShotgridType.SHOT_TO_SHOT_LINK)
+_ASSET_TO_ASSET_LINKS = _link_cache(ShotgridType.ASSET_TO_ASSET_LINK)
+_LINK_CACHES = [
+    _ASSET_TO_SHOT_LINKS,
+    _SHOT_TO_SHOT_LINKS,
+    _ASSET_TO_ASSET_LINKS,
+]
+
+
+def invalidate_linked_entities(project_id: int) -> int:
+    return sum(
+        x.invalidate(lambda key: key[0].id == project_id) for x in _LINK_CACHES
+    )
+
+
+def linked_entities_cache_stats() -> Dict[str, Dict[str, int]]:
+    return {x.name: x.stats() for x in _LINK_CACHES}
 
 
 def find_project_by_id(query: ShotgridFindProjectByIdQuery) -> ShotgridProject:
@@ -52,116 +353,165 @@ def find_project_by_id(query: ShotgridFindProjectByIdQuery) -> ShotgridProject:
     return mapper.to_shotgrid_project(query.project_mapping, raw)
 
 
-@cached(cache=TTLCache(maxsize=24, ttl=60), key=lambda x: x.project)
+@cached(
+    cache=_ASSET_TO_SHOT_LINKS, key=_links_key, lock=_ASSET_TO_SHOT_LINKS.lock
+)
 def find_assets_linked_to_shots(
     query: ShotgridLinkedEntitiesQuery,
 ) -> List[ShotgridEntityToEntityLink]:
     client = conn.get_shotgrid_client(query.credentials)
     fields = list(query.fields_mapping.mapping_table.values())
-    raw = client.find(
+    pages = _find_pages(
+        client,
         ShotgridType.ASSET_TO_SHOT_LINK.value,
         _F.filter_by(_NAMED("asset.Asset.project", query.project.name)),
         fields,
+        query.fields_mapping.mapping_table[ShotgridField.ID.value],
     )
-    return pipe(
-        raw,
-        select(mapper.to_asset_to_shot_link(query.fields_mapping)),
-        list,
+    return list(
+        _map_pages(pages, mapper.to_asset_to_shot_link(query.fields_mapping))
     )
 
 
-@cached(cache=TTLCache(maxsize=24, ttl=60), key=lambda x: x.project)
+@cached(
+    cache=_SHOT_TO_SHOT_LINKS, key=_links_key, lock=_SHOT_TO_SHOT_LINKS.lock
+)
 def find_shots_linked_to_shots(
     query: ShotgridLinkedEntitiesQuery,
 ) -> List[ShotgridEntityToEntityLink]:
     client = conn.get_shotgrid_client(query.credentials)
     fields = list(query.fields_mapping.mapping_table.values())
-    raw = client.find(
+    pages = _find_pages(
+        client,
         ShotgridType.SHOT_TO_SHOT_LINK.value,
         _F.filter_by(_NAMED("shot.Shot.project", query.project.name)),
         fields,
+        query.fields_mapping.mapping_table[ShotgridField.ID.value],
     )
-    return pipe(
-        raw,
-        select(mapper.to_shot_to_shot_link(query.fields_mapping)),
-        list,
+    return list(
+        _map_pages(pages, mapper.to_shot_to_shot_link(query.fields_mapping))
     )
 
 
-@cached(cache=TTLCache(maxsize=24, ttl=60), key=lambda x: x.project)
+@cached(
+    cache=_ASSET_TO_ASSET_LINKS,
+    key=_links_key,
+    lock=_ASSET_TO_ASSET_LINKS.lock,
+)
 def find_assets_linked_to_assets(
     query: ShotgridLinkedEntitiesQuery,
 ) -> List[ShotgridEntityToEntityLink]:
     client = conn.get_shotgrid_client(query.credentials)
     fields = list(query.fields_mapping.mapping_table.values())
-    raw = client.find(
+    pages = _find_pages(
+        client,
         ShotgridType.ASSET_TO_ASSET_LINK.value,
         _F.filter_by(_NAMED("asset.Asset.project", query.project.name)),
         fields,
+        query.fields_mapping.mapping_table[ShotgridField.ID.value],
     )
-    return pipe(
-        raw,
-        select(mapper.to_asset_to_asset_link(query.fields_mapping)),
-        list,
+    return list(
+        _map_pages(pages, mapper.to_asset_to_asset_link(query.fields_mapping))
     )
 
 
-def find_assets_for_project(
+def iter_assets_for_project(
     query: ShotgridFindAssetsByProjectQuery,
-) -> List[ShotgridAsset]:
-    client = conn.get_shotgrid_client(query.credentials)
-
-    assets = client.find(
+) -> Iterator[ShotgridAsset]:
+    pages = _project_pages(
+        query.credentials,
         ShotgridType.ASSET.value,
         _F.filter_by(
-            _IS(ShotgridType.PROJECT.value.lower(), query.project.to_dict())
+            _IS(ShotgridType.PROJECT.value.lower(), query.project.to_dict()),
+            *_later_than(ShotgridField.UPDATED_AT.value, query.updated_after),
+            *_ids_in(query.ids),
         ),
         list(query.asset_mapping.mapping_table.values()),
+        not query.updated_after and query.ids is None,
+        query.asset_mapping.mapping_table[ShotgridField.ID.value],
+        _linked_sets(query.project, [ShotgridType.TASK]),
     )
-    return pipe(
-        assets,
-        select(
-            mapper.to_shotgrid_asset(query.asset_mapping, query.task_mapping)
-        ),
-        list,
+    return _map_pages(
+        pages,
+        mapper.to_shotgrid_asset(query.asset_mapping, query.task_mapping),
     )
 
 
-def find_shots_for_project(
+def find_assets_for_project(
+    query: ShotgridFindAssetsByProjectQuery,
+) -> List[ShotgridAsset]:
+    return list(iter_assets_for_project(query))
+
+
+def iter_shots_for_project(
     query: ShotgridFindShotsByProjectQuery,
-) -> List[ShotgridShot]:
-    client = conn.get_shotgrid_client(query.credentials)
-    shots = client.find(
+) -> Iterator[ShotgridShot]:
+    linked = _linked_updated_at(
+        query.shot_mapping,
+        {
+            ShotgridField.SEQUENCE: ShotgridType.SEQUENCE,
+            ShotgridField.EPISODE: ShotgridType.EPISODE,
+            ShotgridField.SEQUENCE_EPISODE: ShotgridType.EPISODE,
+        },
+    )
+    pages = _project_pages(
+        query.credentials,
         ShotgridType.SHOT.value,
         _F.filter_by(
-            _IS(ShotgridType.PROJECT.value.lower(), query.project.to_dict())
+            _IS(ShotgridType.PROJECT.value.lower(), query.project.to_dict()),
+            *_changed_since(
+                [ShotgridField.UPDATED_AT.value, *linked], query.updated_after
+            ),
+            *_ids_in(query.ids),
         ),
         list(query.shot_mapping.mapping_table.values()),
+        not query.updated_after and query.ids is None,
+        query.shot_mapping.mapping_table[ShotgridField.ID.value],
+        _linked_sets(
+            query.project, [ShotgridType.SEQUENCE, ShotgridType.EPISODE]
+        ),
     )
-    return pipe(
-        shots,
-        select(mapper.to_shotgrid_shot(query.shot_mapping)),
-        list,
-    )
+    return _map_pages(pages, mapper.to_shotgrid_shot(query.shot_mapping))
 
 
-def find_tasks_for_project(
+def find_shots_for_project(
+    query: ShotgridFindShotsByProjectQuery,
+) -> List[ShotgridShot]:
+    return list(iter_shots_for_project(query))
+
+
+def iter_tasks_for_project(
     query: ShotgridFindTasksByProjectQuery,
-) -> List[ShotgridTask]:
-    client = conn.get_shotgrid_client(query.credentials)
-    data = client.find(
+) -> Iterator[ShotgridTask]:
+    linked = _linked_updated_at(
+        query.task_mapping, {ShotgridField.STEP: ShotgridType.STEP}
+    )
+    pages = _project_pages(
+        query.credentials,
         ShotgridType.TASK.value,
         _F.filter_by(
             _IS(ShotgridType.PROJECT.value.lower(), query.project.to_dict()),
             _NOT("entity", None),
+            *_changed_since(
+                [ShotgridField.UPDATED_AT.value, *linked], query.updated_after
+            ),
+            *_tasks_in(query),
         ),
         list(query.task_mapping.mapping_table.values()),
+        not query.updated_after and not _tasks_in(query),
+        query.task_mapping.mapping_table[ShotgridField.ID.value],
+        _linked_sets(
+            query.project,
+            [ShotgridType.STEP, ShotgridType.SHOT, ShotgridType.ASSET],
+        ),
     )
-    return pipe(
-        data,
-        select(mapper.to_shotgrid_task(query.task_mapping)),
-        list,
-    )
+    return _map_pages(pages, mapper.to_shotgrid_task(query.task_mapping))
+
+
+def find_tasks_for_project(
+    query: ShotgridFindTasksByProjectQuery,
+) -> List[ShotgridTask]:
+    return list(iter_tasks_for_project(query))
 
 
 def find_steps(query: ShotgridFindAllStepsQuery) -> List[ShotgridStep]:
@@ -176,3 +526,51 @@ def find_steps(query: ShotgridFindAllStepsQuery) -> List[ShotgridStep]:
         select(mapper.to_shotgrid_step(query.step_mapping)),
         list,
     )
+
+
+def summarize_for_project(
+    query: ShotgridSummarizeByProjectQuery,
+) -> ShotgridEntitySummary:
+    client = conn.get_shotgrid_client(query.credentials)
+    raw = client.summarize(
+        query.type.value,
+        _F.filter_by(
+            *_project_entity_filters(query.type, query.project_id),
+            *_later_than(ShotgridField.CREATED_AT.value, query.created_after),
+        ),
+        [
+            {"field": ShotgridField.ID.value, "type": "count"},
+            {"field": ShotgridField.UPDATED_AT.value, "type": "maximum"},
+        ],
+    )
+    return mapper.to_shotgrid_entity_summary(query.type, raw)
+
+
+def find_asset_types_for_project(
+    query: ShotgridFindAssetsByProjectQuery,
+) -> Set[str]:
+    client = conn.get_shotgrid_client(query.credentials)
+    field = query.asset_mapping.mapping_table[ShotgridField.ASSET_TYPE.value]
+    raw = client.summarize(
+        ShotgridType.ASSET.value,
+        _F.filter_by(
+            _IS(ShotgridType.PROJECT.value.lower(), query.project.to_dict())
+        ),
+        [{"field": ShotgridField.ID.value, "type": "count"}],
+        grouping=[{"field": field, "type": "exact", "direction": "asc"}],
+    )
+    return {
+        x["group_value"]
+        for x in raw.get("groups", [])
+        if x.get("group_value") and x["summaries"].get(ShotgridField.ID.value)
+    }
+
+
+def find_ids_for_project(query: ShotgridFindIdsByProjectQuery) -> Set[int]:
+    pages = _project_pages(
+        query.credentials,
+        query.type.value,
+        _F.filter_by(*_project_entity_filters(query.type, query.project_id)),
+        [ShotgridField.ID.value],
+    )
+    return {x[ShotgridField.ID.value] for page in pages for x in page}
@@ -1,7 +1,26 @@
+import os
 from typing import Any, List, Dict
 
+import shotgrid_leecher.mapper.entity_mapper as mapper
 import shotgrid_leecher.utils.connectivity as connectivity
-from shotgrid_leecher.record.enums import ShotgridEvents, ShotgridEventEntries
+from shotgrid_leecher.record.enums import (
+    ShotgridEvents,
+    ShotgridEventEntries,
+    ShotgridEventKind,
+    ShotgridField,
+    ShotgridType,
+)
+from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
+from shotgrid_leecher.record.queries import ShotgridFindEventsQuery
+from shotgrid_leecher.record.shotgrid_filters import (
+    CompositeFilter,
+    GreaterThanFilter,
+    InFilter,
+)
+from shotgrid_leecher.record.shotgrid_structures import (
+    ShotgridEvent,
+    ShotgridEventPage,
+)
 
 DEFAULT_FIELDS = [
     "id",
@@ -19,6 +38,10 @@ DEFAULT_ORDER = [{"column": "id", "direction": "asc"}]
 
 DEFAULT_LIMIT = 100
 
+_EVENT_PAGE_SIZE = int(os.getenv("SHOTGRID_PAGE_SIZE", 500))
+_MAX_EVENT_PAGES = int(os.getenv("SHOTGRID_MAX_EVENT_PAGES", 10))
+_BY_ID = [{"field_name": ShotgridField.ID.value, "direction": "asc"}]
+
 
 def _find_events(
     filters: List[List[Any]], limit: int = 100
@@ -40,3 +63,49 @@ def get_recent_events(
         ["event_type", "is", event.value],
     ]
     return _find_events(filters, DEFAULT_LIMIT)
+
+
+def find_last_event_id(credentials: ShotgridCredentials) -> int:
+    client = connectivity.get_shotgrid_client(credentials)
+    raw = client.find(
+        ShotgridEventEntries.EVENT_ENTRY.value,
+        [],
+        [ShotgridField.ID.value],
+        order=[{"field_name": ShotgridField.ID.value, "direction": "desc"}],
+        limit=1,
+    )
+    return raw[0][ShotgridField.ID.value] if raw else 0
+
+
+def find_events_after(query: ShotgridFindEventsQuery) -> ShotgridEventPage:
+    # keyset paging on the event id, bounded so a large backlog is
+    # consumed over several calls
+    client = connectivity.get_shotgrid_client(query.credentials)
+    event_types = [
+        kind.event_type(type_)
+        for type_ in ShotgridType.event_types()
+        for kind in ShotgridEventKind
+    ]
+    projects = [
+        {"type": ShotgridType.PROJECT.value, "id": x}
+        for x in query.project_ids
+    ]
+    after_id = query.after_id
+    events: List[ShotgridEvent] = []
+    for _ in range(_MAX_EVENT_PAGES):
+        raw = client.find(
+            ShotgridEventEntries.EVENT_ENTRY.value,
+            CompositeFilter.filter_by(
+                GreaterThanFilter(ShotgridField.ID.value, after_id),
+                InFilter("event_type", event_types),
+                InFilter(ShotgridType.PROJECT.value.lower(), projects),
+            ),
+            DEFAULT_FIELDS,
+            order=_BY_ID,
+            limit=_EVENT_PAGE_SIZE,
+        )
+        events.extend(x for x in map(mapper.to_shotgrid_event, raw) if x)
+        after_id = raw[-1][ShotgridField.ID.value] if raw else after_id
+        if len(raw) < _EVENT_PAGE_SIZE:
+            break
+    return ShotgridEventPage(after_id, events)
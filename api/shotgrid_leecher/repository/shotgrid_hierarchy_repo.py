@@ -1,36 +1,58 @@
-from functools import reduce
-from typing import Dict, Any, List, Iterator
+import os
+import sys
+from itertools import chain
+from typing import (
+    Dict,
+    Any,
+    List,
+    Iterable,
+    Iterator,
+    Callable,
+    Optional,
+    Set,
+)
+
+import attr
 
-from toolz import pipe, curry
+from toolz import pipe, compose, partition_all
 from toolz.curried import (
-    filter as where,
     map as select,
-    unique,
 )
-from toolz.curried import groupby
 
 import shotgrid_leecher.mapper.intermediate_mapper as mapper
 import shotgrid_leecher.repository.shotgrid_entity_repo as entity_repo
+import shotgrid_leecher.utils.connectivity as conn
 from shotgrid_leecher.mapper import query_mapper
-from shotgrid_leecher.record.avalon_structures import AvalonProjectData
-from shotgrid_leecher.record.enums import TopMediaLevelType
+from shotgrid_leecher.record.enums import TopMediaLevelType, ShotgridType
 from shotgrid_leecher.record.intermediate_structures import (
+    IntermediateParams,
     IntermediateRow,
+    IntermediateColumns,
 )
+from shotgrid_leecher.record.leecher_structures import ShotgridWatermark
 from shotgrid_leecher.record.queries import (
     ShotgridHierarchyByProjectQuery,
+    ShotgridHierarchyDeltaQuery,
+    ShotgridHierarchyChangesQuery,
     ShotgridFindAssetsByProjectQuery,
     ShotgridFindShotsByProjectQuery,
     ShotgridFindTasksByProjectQuery,
+    ShotgridFindIdsByProjectQuery,
+    ShotgridSummarizeByProjectQuery,
 )
 from shotgrid_leecher.record.shotgrid_structures import (
     ShotgridShot,
+    ShotgridShotEpisode,
+    ShotgridTask,
     ShotgridEntityToEntityLink,
     ShotgridAsset,
+    ShotgridEntitySummary,
+    ShotgridStep,
 )
 from shotgrid_leecher.record.shotgrid_subtypes import (
     ShotgridProject,
 )
+from shotgrid_leecher.utils.fetch_planner import FetchStep, run_plan
 from shotgrid_leecher.utils.logger import get_logger
 from shotgrid_leecher.utils.timer import timed
 
@@ -38,245 +60,850 @@ _LOG = get_logger(__name__.split(".")[-1])
 
 Map = Dict[str, Any]
 
+_LINKED_TYPES = {ShotgridType.ASSET, ShotgridType.SHOT}
+_GROUP_TYPES = {
+    ShotgridType.GROUP,
+    ShotgridType.EPISODE,
+    ShotgridType.SEQUENCE,
+}
+_STREAM_PAGE_SIZE = int(os.getenv("SHOTGRID_PAGE_SIZE", 500))
+
 
-@curry
 def _fetch_project_tasks(
     rows: Dict[int, IntermediateRow],
-    query: ShotgridFindTasksByProjectQuery,
+    raw_tasks: List[ShotgridTask],
+    params: IntermediateParams,
 ) -> Iterator[IntermediateRow]:
     # TODO: Fields should be configurable
-    raw_tasks = entity_repo.find_tasks_for_project(query)
     asset_tasks = [task for task in raw_tasks if task.step]
     for task in asset_tasks:
         key = task.entity.id
         entity_row = rows.get(key)
         if not entity_row:
             continue
-        parent_path = f"{entity_row.parent}{entity_row.id},"
-        yield mapper.to_task(task, parent_path, query.project_data)
+        parent_path = sys.intern(f"{entity_row.parent}{entity_row.id},")
+        yield mapper.to_task(task, parent_path, params)
 
 
-def _patch_up_shot(shot: ShotgridShot) -> ShotgridShot:
+def _shot_episode(shot: ShotgridShot) -> Optional[ShotgridShotEpisode]:
     if shot.episode or not shot.sequence:
-        return shot
-    if not shot.sequence_episode:
-        return shot
-    return shot.copy_with_episode(shot.sequence_episode)
+        return shot.episode
+    return shot.sequence_episode
+
+
+def _join_path(base_path: str, *names: Optional[str]) -> str:
+    return sys.intern(base_path + "".join(f"{x}," for x in names))
 
 
 def _fetch_project_shots(
     query: ShotgridFindShotsByProjectQuery,
 ) -> Iterator[IntermediateRow]:
     project = query.project
-    raw_shots = entity_repo.find_shots_for_project(query)
+    raw_shots = iter(entity_repo.iter_shots_for_project(query))
+    first = next(raw_shots, None)
+    if not first:
+        return None
+    # built once, every row of the fetch shares the same params
+    params = mapper.to_params(query.project_data)
+    yield mapper.to_top_shot(project, params)
+    yield from _tackle_shots(params, project, chain([first], raw_shots))
+
+
+def _tackle_shots(
+    params: IntermediateParams,
+    project: ShotgridProject,
+    shots: Iterable[ShotgridShot],
+) -> Iterator[IntermediateRow]:
+    # a single pass sorts shots by how much of their episode and sequence
+    # is known, groups come out once per key and in first seen order:
+    # partial shots, episodes, sequences then full shots
+    base_path = f",{project.name},{TopMediaLevelType.SHOTS.value},"
+    partial_shots: List[IntermediateRow] = []
+    full_shots: List[IntermediateRow] = []
+    episodes: Dict[str, ShotgridShotEpisode] = dict()
+    sequences: Dict[str, Dict[Optional[int], IntermediateRow]] = dict()
+    for shot in shots:
+        episode = _shot_episode(shot)
+        sequence_ = shot.sequence
+        episode_name = episode.name if episode else None
+        sequence_name = sequence_.name if sequence_ else None
+        if episode and episode.name:
+            episodes[episode.name] = episode
+        if sequence_ and sequence_.name:
+            by_episode = sequences.setdefault(sequence_.name, dict())
+            episode_id = episode.id if episode else None
+            if episode_id not in by_episode:
+                parent_path = (
+                    _join_path(base_path, episode_name)
+                    if episode_name
+                    else base_path
+                )
+                by_episode[episode_id] = mapper.to_sequence_shot_group(
+                    sequence_, parent_path, params
+                )
+        if sequence_name and episode_name:
+            parent_path = _join_path(base_path, episode_name, sequence_name)
+            full_shots.append(mapper.to_shot(shot, parent_path, params))
+        elif not episode and not sequence_:
+            partial_shots.append(mapper.to_shot(shot, base_path, params))
+        elif not episode:
+            parent_path = _join_path(base_path, sequence_name)
+            partial_shots.append(mapper.to_shot(shot, parent_path, params))
+        elif not sequence_:
+            parent_path = _join_path(base_path, episode_name)
+            partial_shots.append(mapper.to_shot(shot, parent_path, params))
+    yield from partial_shots
+    for episode in episodes.values():
+        yield mapper.to_episode_shot_group(episode, project, params)
+    for by_episode in sequences.values():
+        yield from by_episode.values()
+    yield from full_shots
 
-    if raw_shots:
-        yield mapper.to_top_shot(project, query.project_data)
 
-    shots = pipe(
-        raw_shots,
-        select(_patch_up_shot),
-        list,
+def _fetch_project_assets(
+    query: ShotgridFindAssetsByProjectQuery,
+) -> Iterator[IntermediateRow]:
+    yield from _tackle_assets(
+        query.project,
+        mapper.to_params(query.project_data),
+        entity_repo.iter_assets_for_project(query),
     )
-    yield from _tackle_partial_shots(query.project_data, project, shots)
-    yield from _tackle_shot_episodes(query.project_data, project, shots)
-    yield from _tackle_shot_sequences(query.project_data, project, shots)
-    yield from _tackle_full_shots(query.project_data, project, shots)
 
 
-def _tackle_full_shots(
-    project_data: AvalonProjectData,
+def _tackle_assets(
     project: ShotgridProject,
-    shots: List[ShotgridShot],
+    params: IntermediateParams,
+    assets: Iterable[ShotgridAsset],
 ) -> Iterator[IntermediateRow]:
-    archetype = TopMediaLevelType.SHOTS.value
-    full_shots = pipe(
-        shots,
-        where(lambda x: x.sequence_name() and x.episode_name()),
-        list,
-    )
-    for shot in full_shots:
-        episode = shot.episode_name()
-        sequence_ = shot.sequence_name()
-        parent_path = f",{project.name},{archetype},{episode},{sequence_},"
-        yield mapper.to_shot(shot, parent_path, project_data)
+    # a single pass keeps rows only, untyped assets come out first then
+    # every asset type group followed by its assets
+    archetype = TopMediaLevelType.ASSETS.value
+    untyped: List[IntermediateRow] = []
+    typed: Dict[str, List[IntermediateRow]] = dict()
+    for asset in assets:
+        asset_type = asset.asset_type
+        if not asset_type:
+            parent_path = f",{project.name},"
+            untyped.append(mapper.to_asset(asset, parent_path, params))
+            continue
+        parent_path = _join_path(f",{project.name},{archetype},", asset_type)
+        typed.setdefault(asset_type, []).append(
+            mapper.to_asset(asset, parent_path, params)
+        )
+    yield from untyped
+    if typed:
+        yield mapper.to_top_asset(project, params)
+    for asset_type, rows in typed.items():
+        yield mapper.to_asset_group(asset_type, project, params)
+        yield from rows
 
 
-def _tackle_shot_sequences(
-    project_data: AvalonProjectData,
-    project: ShotgridProject,
-    shots: List[ShotgridShot],
-) -> Iterator[IntermediateRow]:
-    archetype = TopMediaLevelType.SHOTS.value
-    sequence_group = pipe(
-        shots,
-        where(lambda x: x.sequence_name()),
-        groupby(lambda x: x.sequence_name()),
+def _fetch_identified(
+    assets: List[IntermediateRow],
+    shots: List[IntermediateRow],
+) -> Dict[int, IntermediateRow]:
+    return IntermediateColumns.from_rows(assets + shots).by_src_id()
+
+
+def _link_assets(
+    links: Dict[int, List[ShotgridEntityToEntityLink]],
+    assets: List[IntermediateRow],
+) -> List[IntermediateRow]:
+    return pipe(assets, select(mapper.to_linked_asset(links)), list)
+
+
+def _link_shots(
+    links: Dict[int, List[ShotgridEntityToEntityLink]],
+    shots: List[IntermediateRow],
+) -> List[IntermediateRow]:
+    return pipe(shots, select(mapper.to_linked_shot(links)), list)
+
+
+def _index_linked_entities(
+    *linked_entities: List[ShotgridEntityToEntityLink],
+) -> Dict[int, List[ShotgridEntityToEntityLink]]:
+    index: Dict[int, List[ShotgridEntityToEntityLink]] = dict()
+    for links in linked_entities:
+        for link in links:
+            index.setdefault(link.child_id, []).append(link)
+    return index
+
+
+def _project_bound_step(
+    name: str,
+    fetch: Callable[[Any], Any],
+    to_query: Callable[[ShotgridProject, Any], Any],
+    query: ShotgridHierarchyByProjectQuery,
+) -> FetchStep:
+    return FetchStep(
+        name,
+        lambda deps: fetch(to_query(deps["project"], query)),
+        ("project",),
     )
-    for sq, sq_shots in sequence_group.items():
-        for shot in unique(sq_shots, lambda x: x.episode_id()):
-            episode = shot.episode_name()
-            base_path = f",{project.name},{archetype},"
-            parent_path = f"{base_path}{episode}," if episode else base_path
-            yield mapper.to_sequence_shot_group(
-                shot.sequence, parent_path, project_data
-            )
 
 
-def _tackle_shot_episodes(
-    project_data: AvalonProjectData,
-    project: ShotgridProject,
-    shots: List[ShotgridShot],
-) -> Iterator[IntermediateRow]:
-    episode_groups = pipe(
-        shots,
-        where(lambda x: x.episode_name()),
-        groupby(lambda x: x.episode_name()),
+def _hierarchy_plan(query: ShotgridHierarchyByProjectQuery) -> List[FetchStep]:
+    return [
+        FetchStep(
+            "steps",
+            lambda _: entity_repo.find_steps(
+                query_mapper.hierarchy_to_steps_query(query)
+            ),
+        ),
+        FetchStep(
+            "project",
+            lambda _: entity_repo.find_project_by_id(
+                query_mapper.hierarchy_to_project_query(query)
+            ),
+        ),
+        _project_bound_step(
+            "asset_links",
+            entity_repo.find_assets_linked_to_assets,
+            query_mapper.hierarchy_to_linked_asset_to_asset_query,
+            query,
+        ),
+        _project_bound_step(
+            "asset_to_shot_links",
+            entity_repo.find_assets_linked_to_shots,
+            query_mapper.hierarchy_to_linked_asset_to_shot_query,
+            query,
+        ),
+        _project_bound_step(
+            "shot_to_shot_links",
+            entity_repo.find_shots_linked_to_shots,
+            query_mapper.hierarchy_to_linked_shot_to_shot_query,
+            query,
+        ),
+        _project_bound_step(
+            "assets",
+            compose(list, _fetch_project_assets),
+            query_mapper.hierarchy_to_assets_query,
+            query,
+        ),
+        _project_bound_step(
+            "shots",
+            compose(list, _fetch_project_shots),
+            query_mapper.hierarchy_to_shots_query,
+            query,
+        ),
+        _project_bound_step(
+            "tasks",
+            entity_repo.find_tasks_for_project,
+            query_mapper.hierarchy_to_tasks_query,
+            query,
+        ),
+    ]
+
+
+@timed
+def get_hierarchy_by_project(
+    query: ShotgridHierarchyByProjectQuery,
+) -> List[IntermediateRow]:
+    fetched = run_plan(
+        _hierarchy_plan(query),
+        conn.get_shotgrid_concurrency(),
+    )
+    params = mapper.to_params(query.project_data)
+    assets = _link_assets(
+        _index_linked_entities(fetched["asset_links"]),
+        fetched["assets"],
     )
-    for ep, ep_shots in episode_groups.items():
-        yield mapper.to_episode_shot_group(
-            ep_shots[-1].episode, project, project_data
+    shots = _link_shots(
+        _index_linked_entities(
+            fetched["asset_to_shot_links"], fetched["shot_to_shot_links"]
+        ),
+        fetched["shots"],
+    )
+    tasks = list(
+        _fetch_project_tasks(
+            _fetch_identified(assets, shots),
+            fetched["tasks"],
+            params,
         )
+    )
+    project = mapper.to_project(fetched["project"], fetched["steps"], params)
 
+    return mapper.map_parent_ids([project, *assets, *shots, *tasks])
 
-def _tackle_partial_shots(
-    project_data: AvalonProjectData,
-    project: ShotgridProject,
-    shots: List[ShotgridShot],
-) -> Iterator[IntermediateRow]:
-    archetype = TopMediaLevelType.SHOTS.value
-    partial_shots = pipe(
-        shots,
-        where(lambda x: not x.sequence_name() or not x.episode_name()),
-        list,
-    )
-    for shot in partial_shots:
-        if not shot.episode and not shot.sequence:
-            parent_path = f",{project.name},{archetype},"
-            yield mapper.to_shot(shot, parent_path, project_data)
-        if not shot.episode and shot.sequence:
-            sequence_ = shot.sequence.name
-            parent_path = f",{project.name},{archetype},{sequence_},"
-            yield mapper.to_shot(shot, parent_path, project_data)
-        if shot.episode and not shot.sequence:
-            episode = shot.episode.name
-            parent_path = f",{project.name},{archetype},{episode},"
-            yield mapper.to_shot(shot, parent_path, project_data)
 
+def _stream_plan(query: ShotgridHierarchyByProjectQuery) -> List[FetchStep]:
+    # entities are streamed, tasks are not: an entity only goes out with
+    # all of its tasks
+    streamed = {"assets", "shots"}
+    return [x for x in _hierarchy_plan(query) if x.name not in streamed]
 
-def _fetch_project_assets(
+
+def _stream_assets(
     query: ShotgridFindAssetsByProjectQuery,
 ) -> Iterator[IntermediateRow]:
-    raw_assets = entity_repo.find_assets_for_project(query)
-    yield from _fetch_untyped_project_assets(query, raw_assets)
-    yield from _fetch_typed_project_assets(query, raw_assets)
+    params = mapper.to_params(query.project_data)
+    raw_assets = entity_repo.iter_assets_for_project(query)
+    for page in partition_all(_STREAM_PAGE_SIZE, raw_assets):
+        yield from _tackle_assets(query.project, params, page)
 
 
-def _fetch_untyped_project_assets(
-    query: ShotgridFindAssetsByProjectQuery,
-    raw_assets: List[ShotgridAsset],
+def _stream_shots(
+    query: ShotgridFindShotsByProjectQuery,
 ) -> Iterator[IntermediateRow]:
-    assets = [x for x in raw_assets if not x.asset_type]
-    for asset in assets:
-        parent_path = f",{query.project.name},"
-        yield mapper.to_asset(asset, parent_path, query.project_data)
+    params = mapper.to_params(query.project_data)
+    raw_shots = entity_repo.iter_shots_for_project(query)
+    for i, page in enumerate(partition_all(_STREAM_PAGE_SIZE, raw_shots)):
+        if not i:
+            yield mapper.to_top_shot(query.project, params)
+        shots = list(page)
+        yield from _tackle_shots(params, query.project, shots)
 
 
-def _fetch_typed_project_assets(
-    query: ShotgridFindAssetsByProjectQuery,
-    raw_assets: List[ShotgridAsset],
+def _once_per_group(
+    rows: Iterable[IntermediateRow],
 ) -> Iterator[IntermediateRow]:
-    assets = [x for x in raw_assets if x.asset_type]
-    archetype = TopMediaLevelType.ASSETS.value
-    if assets:
-        yield mapper.to_top_asset(query.project, query.project_data)
-    for g, g_assets in groupby(lambda x: x.asset_type, assets).items():
-        yield mapper.to_asset_group(
-            g_assets[0].asset_type, query.project, query.project_data
+    # every page brings its own copy of the groups it touches
+    seen: Set[str] = set()
+    for row in rows:
+        if row.type in _GROUP_TYPES:
+            path = _path(row)
+            if path in seen:
+                continue
+            seen.add(path)
+        yield row
+
+
+def _with_tasks(
+    rows: Iterable[IntermediateRow],
+    raw_tasks: List[ShotgridTask],
+    params: IntermediateParams,
+) -> Iterator[IntermediateRow]:
+    tasks: Dict[int, List[ShotgridTask]] = dict()
+    for task in raw_tasks:
+        if task.step:
+            tasks.setdefault(task.entity.id, []).append(task)
+    for row in rows:
+        yield row
+        if row.type not in _LINKED_TYPES or row.src_id is None:
+            continue
+        entity_tasks = tasks.pop(row.src_id, [])
+        if entity_tasks:
+            parent_path = sys.intern(_path(row))
+            for task in entity_tasks:
+                yield mapper.to_task(task, parent_path, params)
+
+
+def _check_task_types(
+    steps: List[ShotgridStep], raw_tasks: List[ShotgridTask]
+) -> None:
+    # streamed rows are written as they arrive, a task type the project
+    # does not know has to fail the stream before its first row
+    known = {x.code for x in steps}
+    linked = {x.value for x in _LINKED_TYPES}
+    unknown = {
+        x.step_name()
+        for x in raw_tasks
+        if x.step and x.entity.type in linked and x.step_name() not in known
+    }
+    if unknown:
+        raise RuntimeError(f"Task types {unknown} are unknown")
+
+
+def iter_hierarchy_by_project(
+    query: ShotgridHierarchyByProjectQuery,
+) -> Iterator[IntermediateRow]:
+    """
+    Stream the hierarchy of a project while its pages arrive from
+    Shotgrid instead of building it whole.
+
+    Note:
+        The project comes first, then assets and shots page by page, every
+        entity directly followed by its tasks. Groups come out once, rows
+        reaching their group ahead of it wait for it. Task types missing
+        from the project steps are raised before any row comes out.
+
+    Args:
+        query ShotgridHierarchyByProjectQuery: project to stream.
+
+    Returns iterator(IntermediateRow): Rows with their parent ids set.
+
+    """
+    fetched = run_plan(_stream_plan(query), conn.get_shotgrid_concurrency())
+    _check_task_types(fetched["steps"], fetched["tasks"])
+    project = fetched["project"]
+    params = mapper.to_params(query.project_data)
+    link_asset = mapper.to_linked_asset(
+        _index_linked_entities(fetched["asset_links"])
+    )
+    link_shot = mapper.to_linked_shot(
+        _index_linked_entities(
+            fetched["asset_to_shot_links"], fetched["shot_to_shot_links"]
+        )
+    )
+    rows = chain(
+        [mapper.to_project(project, fetched["steps"], params)],
+        map(
+            link_asset,
+            _stream_assets(
+                query_mapper.hierarchy_to_assets_query(project, query)
+            ),
+        ),
+        map(
+            link_shot,
+            _stream_shots(
+                query_mapper.hierarchy_to_shots_query(project, query)
+            ),
+        ),
+    )
+    yield from pipe(
+        _once_per_group(rows),
+        lambda x: _with_tasks(x, fetched["tasks"], params),
+        mapper.stream_parent_ids,
+    )
+
+
+def _summary_step(
+    type_: ShotgridType,
+    query: ShotgridHierarchyByProjectQuery,
+) -> FetchStep:
+    return FetchStep(
+        type_.value,
+        lambda _: entity_repo.summarize_for_project(
+            ShotgridSummarizeByProjectQuery(
+                query.project_id, query.credentials, type_
+            )
+        ),
+    )
+
+
+def get_summaries_by_project(
+    query: ShotgridHierarchyByProjectQuery,
+) -> Dict[ShotgridType, ShotgridEntitySummary]:
+    types = ShotgridType.watermarked_types()
+    fetched = run_plan(
+        [_summary_step(x, query) for x in types],
+        conn.get_shotgrid_concurrency(),
+    )
+    return {x: fetched[x.value] for x in types}
+
+
+def _updated_since(
+    summary: ShotgridEntitySummary, watermark: ShotgridWatermark
+) -> bool:
+    if not summary.latest_update:
+        return False
+    if not watermark.updated_at:
+        return True
+    return summary.latest_update > watermark.updated_at
+
+
+def _live_ids(
+    type_: ShotgridType,
+    query: ShotgridHierarchyDeltaQuery,
+) -> Optional[Set[int]]:
+    # retirements leave no update behind, the ids are checked whenever
+    # entities were updated since the watermark or the count does not
+    # add up. A retirement balanced by a revival with nothing else
+    # touched still slips through, the periodic full sync
+    # (SHOTGRID_FULL_SYNC_HOURS) drops such entities
+    watermark = query.watermarks[type_]
+    if not _updated_since(query.summaries[type_], watermark):
+        created = entity_repo.summarize_for_project(
+            ShotgridSummarizeByProjectQuery(
+                query.project_id,
+                query.credentials,
+                type_,
+                watermark.updated_at,
+            )
         )
-        for asset in g_assets:
-            asset_type = asset.asset_type
-            parent_path = f",{query.project.name},{archetype},{asset_type},"
-            yield mapper.to_asset(asset, parent_path, query.project_data)
+        if query.summaries[type_].count == watermark.count + created.count:
+            return None
+    _LOG.info(f"{type_.value} changed, looking for retired ones")
+    return entity_repo.find_ids_for_project(
+        ShotgridFindIdsByProjectQuery(
+            query.project_id, query.credentials, type_
+        )
+    )
 
 
-def _fetch_identified(
-    assets: List[IntermediateRow],
-    shots: List[IntermediateRow],
-) -> Dict[int, IntermediateRow]:
-    rows_dict = {
-        int(x.src_id): x
-        for x in assets + shots
-        if x.has_field("src_id") and x.src_id
+def _live_ids_step(
+    type_: ShotgridType,
+    query: ShotgridHierarchyDeltaQuery,
+) -> Callable[[Map], Optional[Set[int]]]:
+    return lambda _: _live_ids(type_, query)
+
+
+def _updated_after(
+    type_: ShotgridType,
+    to_query: Callable[[ShotgridProject, Any], Any],
+) -> Callable[[ShotgridProject, ShotgridHierarchyDeltaQuery], Any]:
+    return lambda project, query: attr.evolve(
+        to_query(project, query),
+        updated_after=query.watermarks[type_].updated_at,
+    )
+
+
+def _delta_plan(query: ShotgridHierarchyDeltaQuery) -> List[FetchStep]:
+    changed = {"assets", "shots", "tasks"}
+    return [
+        *[x for x in _hierarchy_plan(query) if x.name not in changed],
+        _project_bound_step(
+            "assets",
+            compose(list, _fetch_project_assets),
+            _updated_after(
+                ShotgridType.ASSET, query_mapper.hierarchy_to_assets_query
+            ),
+            query,
+        ),
+        _project_bound_step(
+            "shots",
+            compose(list, _fetch_project_shots),
+            _updated_after(
+                ShotgridType.SHOT, query_mapper.hierarchy_to_shots_query
+            ),
+            query,
+        ),
+        _project_bound_step(
+            "tasks",
+            entity_repo.find_tasks_for_project,
+            _updated_after(
+                ShotgridType.TASK, query_mapper.hierarchy_to_tasks_query
+            ),
+            query,
+        ),
+        _project_bound_step(
+            "asset_types",
+            entity_repo.find_asset_types_for_project,
+            query_mapper.hierarchy_to_assets_query,
+            query,
+        ),
+        *[
+            FetchStep(f"{x.value}_ids", _live_ids_step(x, query))
+            for x in ShotgridType.watermarked_types()
+        ],
+    ]
+
+
+def _refiled_assets(
+    query: ShotgridHierarchyDeltaQuery,
+    project: ShotgridProject,
+    previous: List[IntermediateRow],
+    asset_types: Set[str],
+) -> List[IntermediateRow]:
+    # renaming an asset type leaves its assets untouched: the ones filed
+    # under a type that is gone are fetched again to find their new one
+    base_path = f",{project.name},{TopMediaLevelType.ASSETS.value},"
+    type_paths = {_join_path(base_path, x) for x in asset_types}
+    ids = [
+        x.src_id
+        for x in previous
+        if x.type == ShotgridType.ASSET
+        and x.src_id is not None
+        and x.parent.startswith(base_path)
+        and x.parent not in type_paths
+    ]
+    if not ids:
+        return []
+    _LOG.info(f"{len(ids)} assets filed under a vanished asset type")
+    assets_query = attr.evolve(
+        query_mapper.hierarchy_to_assets_query(project, query), ids=ids
+    )
+    return list(_fetch_project_assets(assets_query))
+
+
+def _path(row: IntermediateRow) -> str:
+    return f"{row.parent or ','}{row.id},"
+
+
+def _is_retired(
+    live_ids: Dict[ShotgridType, Optional[Set[int]]],
+    row: IntermediateRow,
+) -> bool:
+    ids = live_ids.get(row.type)
+    return ids is not None and row.src_id not in ids
+
+
+def _prune_empty_groups(rows: List[IntermediateRow]) -> List[IntermediateRow]:
+    parents = {x.parent for x in rows}
+    empty = {
+        _path(x)
+        for x in rows
+        if x.type in _GROUP_TYPES and _path(x) not in parents
     }
-    return rows_dict
+    if not empty:
+        return rows
+    return _prune_empty_groups([x for x in rows if _path(x) not in empty])
 
 
-def _fetch_and_link_assets(
-    project: ShotgridProject, query: ShotgridHierarchyByProjectQuery
+def _merge_entities(
+    previous: List[IntermediateRow],
+    fresh: List[IntermediateRow],
+    live_ids: Dict[ShotgridType, Optional[Set[int]]],
+) -> List[IntermediateRow]:
+    fresh_keys = {(x.type, x.src_id) for x in fresh if x.type in _LINKED_TYPES}
+    kept = [
+        x
+        for x in previous
+        if x.type in ShotgridType.middle_types()
+        and (x.type, x.src_id) not in fresh_keys
+        and not _is_retired(live_ids, x)
+    ]
+    merged = {_path(x): x for x in [*kept, *fresh]}
+    return _prune_empty_groups(list(merged.values()))
+
+
+def _merge_tasks(
+    previous: List[IntermediateRow],
+    entities: List[IntermediateRow],
+    raw_tasks: List[ShotgridTask],
+    live_ids: Dict[ShotgridType, Optional[Set[int]]],
+    params: IntermediateParams,
 ) -> List[IntermediateRow]:
-    asset_to_asset_query = (
-        query_mapper.hierarchy_to_linked_asset_to_asset_query(project, query)
+    # tasks follow their entity when it moves to another group
+    entity_paths = {
+        (x.type, x.src_id): _path(x)
+        for x in entities
+        if x.type in _LINKED_TYPES
+    }
+    moves = {
+        _path(x): entity_paths[(x.type, x.src_id)]
+        for x in previous
+        if (x.type, x.src_id) in entity_paths
+    }
+    fresh_ids = {x.id for x in raw_tasks}
+    kept = [
+        attr.evolve(x, parent=moves.get(x.parent, x.parent))
+        for x in previous
+        if x.type == ShotgridType.TASK
+        and x.src_id not in fresh_ids
+        and not _is_retired(live_ids, x)
+    ]
+    fresh = _fetch_project_tasks(
+        _fetch_identified(entities, []), raw_tasks, params
     )
-    links = _reduce_linked_entities(
-        entity_repo.find_assets_linked_to_assets(asset_to_asset_query)
+    paths = set(entity_paths.values())
+    return [x for x in [*kept, *fresh] if x.parent in paths]
+
+
+@timed
+def get_hierarchy_delta_by_project(
+    query: ShotgridHierarchyDeltaQuery,
+    previous_hierarchy: List[IntermediateRow],
+) -> List[IntermediateRow]:
+    fetched = run_plan(_delta_plan(query), conn.get_shotgrid_concurrency())
+    if _is_renamed(fetched["project"], previous_hierarchy):
+        _LOG.info("Project has been renamed, falling back to a full fetch")
+        return get_hierarchy_by_project(query)
+    live_ids = {
+        x: fetched[f"{x.value}_ids"] for x in ShotgridType.watermarked_types()
+    }
+    refiled = _refiled_assets(
+        query, fetched["project"], previous_hierarchy, fetched["asset_types"]
     )
-    return pipe(
-        query_mapper.hierarchy_to_assets_query(project, query),
-        _fetch_project_assets,
-        select(mapper.to_linked_asset(links)),
-        list,
+    entities = _merge_entities(
+        previous_hierarchy,
+        refiled + fetched["assets"] + fetched["shots"],
+        live_ids,
+    )
+    tasks = _merge_tasks(
+        previous_hierarchy,
+        entities,
+        fetched["tasks"],
+        live_ids,
+        mapper.to_params(query.project_data),
     )
+    _LOG.info(
+        f"Project {fetched['project'].name} delta: "
+        f"{len(fetched['assets'])} asset rows, "
+        f"{len(fetched['shots'])} shot rows, {len(fetched['tasks'])} tasks"
+    )
+    return _link_merged(query, fetched, entities, tasks)
 
 
-def _fetch_and_link_shots(
-    project: ShotgridProject, query: ShotgridHierarchyByProjectQuery
+def _is_renamed(
+    project: ShotgridProject,
+    previous_hierarchy: List[IntermediateRow],
+) -> bool:
+    previous_names = {
+        x.id for x in previous_hierarchy if x.type == ShotgridType.PROJECT
+    }
+    return previous_names != {project.name}
+
+
+def _link_merged(
+    query: ShotgridHierarchyByProjectQuery,
+    fetched: Dict[str, Any],
+    entities: List[IntermediateRow],
+    tasks: List[IntermediateRow],
 ) -> List[IntermediateRow]:
-    asset_to_shot_query = query_mapper.hierarchy_to_linked_asset_to_shot_query(
-        project, query
+    linked_entities = pipe(
+        entities,
+        lambda x: _link_assets(
+            _index_linked_entities(fetched["asset_links"]), x
+        ),
+        lambda x: _link_shots(
+            _index_linked_entities(
+                fetched["asset_to_shot_links"], fetched["shot_to_shot_links"]
+            ),
+            x,
+        ),
     )
-    shot_to_shot_query = query_mapper.hierarchy_to_linked_shot_to_shot_query(
-        project, query
+    project = mapper.to_project(
+        fetched["project"],
+        fetched["steps"],
+        mapper.to_params(query.project_data),
     )
-    links = _reduce_linked_entities(
-        entity_repo.find_assets_linked_to_shots(asset_to_shot_query)
-        + entity_repo.find_shots_linked_to_shots(shot_to_shot_query)
+    return mapper.map_parent_ids([project, *linked_entities, *tasks])
+
+
+def _listed(
+    fetch: Callable[[Any], Iterable[IntermediateRow]],
+) -> Callable[[Any], List[IntermediateRow]]:
+    # nothing listed, nothing to ask Shotgrid for
+    return lambda query: list(fetch(query)) if query.ids else []
+
+
+def _with_ids(
+    type_: ShotgridType,
+    to_query: Callable[[ShotgridProject, Any], Any],
+) -> Callable[[ShotgridProject, ShotgridHierarchyChangesQuery], Any]:
+    return lambda project, query: attr.evolve(
+        to_query(project, query), ids=query.changed_ids.get(type_, [])
     )
-    return pipe(
-        query_mapper.hierarchy_to_shots_query(project, query),
-        _fetch_project_shots,
-        select(mapper.to_linked_shot(links)),
-        list,
+
+
+def _to_changed_tasks_query(
+    project: ShotgridProject,
+    query: ShotgridHierarchyChangesQuery,
+) -> ShotgridFindTasksByProjectQuery:
+    # a changed entity comes back with all of its tasks
+    entities = [
+        (x, y)
+        for x in (ShotgridType.ASSET, ShotgridType.SHOT)
+        for y in query.changed_ids.get(x, [])
+    ]
+    return attr.evolve(
+        query_mapper.hierarchy_to_tasks_query(project, query),
+        ids=query.changed_ids.get(ShotgridType.TASK, []),
+        entities=entities,
     )
 
 
-def _reduce_linked_entities(
-    linked_entities: List[ShotgridEntityToEntityLink],
-) -> Dict[int, List[ShotgridEntityToEntityLink]]:
-    return reduce(
-        lambda agg, x: {**agg, x.child_id: agg.get(x.child_id, []) + [x]},
-        linked_entities,
-        dict(),
+def _fetch_changed_tasks(
+    query: ShotgridFindTasksByProjectQuery,
+) -> List[ShotgridTask]:
+    if not query.ids and not query.entities:
+        return []
+    return entity_repo.find_tasks_for_project(query)
+
+
+def _changes_plan(query: ShotgridHierarchyChangesQuery) -> List[FetchStep]:
+    changed = {"assets", "shots", "tasks"}
+    return [
+        *[x for x in _hierarchy_plan(query) if x.name not in changed],
+        _project_bound_step(
+            "assets",
+            _listed(_fetch_project_assets),
+            _with_ids(
+                ShotgridType.ASSET, query_mapper.hierarchy_to_assets_query
+            ),
+            query,
+        ),
+        _project_bound_step(
+            "shots",
+            _listed(_fetch_project_shots),
+            _with_ids(
+                ShotgridType.SHOT, query_mapper.hierarchy_to_shots_query
+            ),
+            query,
+        ),
+        _project_bound_step(
+            "tasks",
+            _fetch_changed_tasks,
+            _to_changed_tasks_query,
+            query,
+        ),
+    ]
+
+
+def _task_parents(
+    query: ShotgridHierarchyChangesQuery,
+    project: ShotgridProject,
+    known: List[IntermediateRow],
+    raw_tasks: List[ShotgridTask],
+) -> List[IntermediateRow]:
+    # a changed task may belong to an entity the hierarchy misses, the
+    # entity is fetched along with the groups it is filed under
+    keys = {(x.type.value, x.src_id) for x in known if x.type in _LINKED_TYPES}
+    missing = {
+        (x.entity.type, x.entity.id)
+        for x in raw_tasks
+        if (x.entity.type, x.entity.id) not in keys
+    }
+    if not missing:
+        return []
+    assets_query = attr.evolve(
+        query_mapper.hierarchy_to_assets_query(project, query),
+        ids=[y for x, y in missing if x == ShotgridType.ASSET.value],
+    )
+    shots_query = attr.evolve(
+        query_mapper.hierarchy_to_shots_query(project, query),
+        ids=[y for x, y in missing if x == ShotgridType.SHOT.value],
     )
+    return [
+        *_listed(_fetch_project_assets)(assets_query),
+        *_listed(_fetch_project_shots)(shots_query),
+    ]
+
+
+def _live_after_retirement(
+    query: ShotgridHierarchyChangesQuery,
+    previous_hierarchy: List[IntermediateRow],
+) -> Dict[ShotgridType, Optional[Set[int]]]:
+    live: Dict[ShotgridType, Optional[Set[int]]] = dict()
+    for type_, ids in query.retired_ids.items():
+        if not ids:
+            continue
+        known = {x.src_id for x in previous_hierarchy if x.type == type_}
+        live[type_] = {x for x in known if x is not None} - set(ids)
+    return live
 
 
 @timed
-def get_hierarchy_by_project(
-    query: ShotgridHierarchyByProjectQuery,
+def get_hierarchy_changes_by_project(
+    query: ShotgridHierarchyChangesQuery,
+    previous_hierarchy: List[IntermediateRow],
 ) -> List[IntermediateRow]:
-    steps = entity_repo.find_steps(
-        query_mapper.hierarchy_to_steps_query(query)
+    """
+    Apply the given entity changes to the previous hierarchy of a project,
+    only the changed entities and their tasks are fetched from Shotgrid.
+
+    Args:
+        query ShotgridHierarchyChangesQuery: project and changed entities.
+        previous_hierarchy list(IntermediateRow): hierarchy stored by the
+            previous batch.
+
+    Returns list(IntermediateRow): The whole hierarchy with the changes.
+
+    """
+    fetched = run_plan(_changes_plan(query), conn.get_shotgrid_concurrency())
+    if _is_renamed(fetched["project"], previous_hierarchy):
+        _LOG.info("Project has been renamed, falling back to a full fetch")
+        return get_hierarchy_by_project(query)
+    fresh = [*fetched["assets"], *fetched["shots"]]
+    parents = _task_parents(
+        query,
+        fetched["project"],
+        [*previous_hierarchy, *fresh],
+        fetched["tasks"],
     )
-    sg_project = entity_repo.find_project_by_id(
-        query_mapper.hierarchy_to_project_query(query)
+    live_ids = _live_after_retirement(query, previous_hierarchy)
+    entities = _merge_entities(previous_hierarchy, fresh + parents, live_ids)
+    tasks = _merge_tasks(
+        previous_hierarchy,
+        entities,
+        fetched["tasks"],
+        live_ids,
+        mapper.to_params(query.project_data),
     )
-    assets = _fetch_and_link_assets(sg_project, query)
-    shots = _fetch_and_link_shots(sg_project, query)
-    tasks = pipe(
-        query_mapper.hierarchy_to_tasks_query(sg_project, query),
-        _fetch_project_tasks(_fetch_identified(assets, shots)),
-        list,
+    _LOG.info(
+        f"Project {fetched['project'].name} changes: "
+        f"{len(fresh) + len(parents)} entity rows, "
+        f"{len(fetched['tasks'])} tasks"
     )
-    project = mapper.to_project(sg_project, steps, query.project_data)
-
-    return mapper.map_parent_ids([project, *assets, *shots, *tasks])
+    return _link_merged(query, fetched, entities, tasks)
@@ -0,0 +1,25 @@
+from typing import Callable, List, Optional
+
+from pymongo.collection import Collection
+
+from shotgrid_leecher.record.enums import DbName, DbCollection
+from shotgrid_leecher.record.leecher_structures import ShotgridResponse
+from shotgrid_leecher.utils.connectivity import db_collection
+
+_collection: Callable[[DbCollection], Collection] = db_collection(
+    DbName.LEECHER
+)
+
+
+def fetch_response(key: str) -> Optional[ShotgridResponse]:
+    raw = _collection(DbCollection.SHOTGRID_RESPONSES).find_one({"_id": key})
+    return ShotgridResponse.from_mongo(raw) if raw else None
+
+
+def fetch_response_pages(key: str) -> List[bytes]:
+    cursor = (
+        _collection(DbCollection.SHOTGRID_RESPONSE_PAGES)
+        .find({"key": key})
+        .sort("page", 1)
+    )
+    return [bytes(x["rows"]) for x in cursor]
@@ -0,0 +1,28 @@
+from typing import Callable, Dict
+
+import attr
+from pymongo.collection import Collection
+
+from shotgrid_leecher.mapper.entity_mapper import to_utc_datetime
+from shotgrid_leecher.record.enums import DbName, DbCollection, ShotgridType
+from shotgrid_leecher.record.leecher_structures import ShotgridWatermark
+from shotgrid_leecher.utils.connectivity import db_collection
+
+_collection: Callable[[DbCollection], Collection] = db_collection(
+    DbName.LEECHER
+)
+
+
+def fetch_watermarks(
+    project_name: str,
+) -> Dict[ShotgridType, ShotgridWatermark]:
+    cursor = _collection(DbCollection.SHOTGRID_WATERMARKS).find(
+        {"project_name": project_name}
+    )
+    watermarks = [ShotgridWatermark.from_mongo(x) for x in cursor]
+    return {
+        ShotgridType(x.type): attr.evolve(
+            x, updated_at=to_utc_datetime(x.updated_at)
+        )
+        for x in watermarks
+    }
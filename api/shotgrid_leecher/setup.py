@@ -1,4 +1,5 @@
 import datetime
+import os
 
 from fastapi import FastAPI
 from fastapi_utils.tasks import repeat_every
@@ -9,16 +10,27 @@ from shotgrid_leecher.const import PROJECT_META
 from shotgrid_leecher.controller import (
     batch_controller as batch,
     metadata_controller as meta,
+    metrics_controller as metrics,
     schedule_controller as schedule,
     config_controller as config,
     user_controller as user,
 )
-from shotgrid_leecher.domain import schedule_domain, user_domain
+from shotgrid_leecher.domain import (
+    batch_job_domain,
+    event_domain,
+    schedule_domain,
+    user_domain,
+)
 from shotgrid_leecher.record.commands import CleanScheduleBatchLogsCommand
 from shotgrid_leecher.utils.logger import get_logger
+from shotgrid_leecher.writers import (
+    batch_job_writer,
+    shotgrid_response_writer,
+)
 
 _START_EVENT = "startup"
 _LOG = get_logger(__name__.split(".")[-1])
+_EVENT_POLL_SECONDS = int(os.getenv("SHOTGRID_EVENT_POLL_SECONDS", 10))
 
 
 def setup_cors(app: FastAPI) -> FastAPI:
@@ -45,36 +57,68 @@ def setup_app() -> FastAPI:
     app = FastAPI(**PROJECT_META)
     app.include_router(batch.router)
     app.include_router(meta.router)
+    app.include_router(metrics.router)
     app.include_router(schedule.router)
     app.include_router(config.router)
     app.include_router(user.router)
     return app
 
 
+async def _leased(timer: str, seconds: int) -> bool:
+    # singleton timers run on the replica holding their lease, batches
+    # themselves are spread across replicas through the leased queue
+    period = datetime.timedelta(seconds=seconds)
+    return await schedule_domain.acquire_timer_lease(timer, period)
+
+
 def setup_events(app: FastAPI) -> FastAPI:
+    @app.on_event("startup")
+    def ensure_indexes() -> None:
+        shotgrid_response_writer.ensure_response_indexes()
+        batch_job_writer.ensure_batch_job_indexes()
 
     @app.on_event("startup")
     @repeat_every(seconds=180, logger=_LOG)
     async def queue_scheduled_batches() -> None:
-        await schedule_domain.queue_scheduled_batches()
+        if await _leased("queue_scheduled_batches", 180):
+            await schedule_domain.queue_scheduled_batches()
 
     @app.on_event("startup")
     @repeat_every(seconds=120, logger=_LOG)
     async def dequeue_and_process_batches() -> None:
         await schedule_domain.dequeue_and_process_batches()
 
+    @app.on_event("startup")
+    @repeat_every(seconds=_EVENT_POLL_SECONDS, logger=_LOG)
+    async def consume_shotgrid_events() -> None:
+        if await _leased("consume_shotgrid_events", 60):
+            await event_domain.consume_shotgrid_events()
+
+    @app.on_event("shutdown")
+    async def drain_batch_workers() -> None:
+        await schedule_domain.drain_batch_workers()
+        await batch_job_domain.wait_batch_jobs()
+
     @app.on_event("startup")
     @repeat_every(seconds=60 * 60, logger=_LOG)
     async def clean_up_schedule() -> None:
+        if not await _leased("clean_up_schedule", 60 * 60):
+            return
         time_delta = datetime.timedelta(days=14)
         await schedule_domain.schedule_clean_batch_log(
-            CleanScheduleBatchLogsCommand(datetime.datetime.now() - time_delta),
+            CleanScheduleBatchLogsCommand(
+                datetime.datetime.now() - time_delta
+            ),
+        )
+        await batch_job_domain.clean_batch_jobs(
+            datetime.datetime.utcnow() - time_delta
         )
 
     @app.on_event("startup")
     @repeat_every(seconds=60 * 2, logger=_LOG)
     async def synchronize_links() -> None:
-        await user_domain.synchronize_project_user_links()
+        if await _leased("synchronize_links", 60 * 2):
+            await user_domain.synchronize_project_user_links()
 
     return app
 
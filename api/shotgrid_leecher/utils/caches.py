@@ -0,0 +1,89 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from cachetools import Cache, TTLCache
+
+from shotgrid_leecher.utils import metrics
+
+_REQUESTS = metrics.counter(
+    "leecher_cache_requests_total",
+    "Cache lookups",
+    ["cache", "result"],
+)
+_REMOVALS = metrics.counter(
+    "leecher_cache_removals_total",
+    "Entries removed from caches",
+    ["cache", "reason"],
+)
+
+
+class MeteredCache(TTLCache):
+    # TTLCache counting its hits, misses and removals, the lock is meant
+    # to be handed to the @cached decorator
+
+    def __init__(self, name: str, maxsize: int, ttl: float) -> None:
+        super().__init__(maxsize=max(maxsize, 1), ttl=ttl)
+        self.name = name
+        self.lock = threading.RLock()
+        self._popping = False
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        if amount <= 0:
+            return
+        self._stats[stat] += amount
+        if stat in {"hits", "misses"}:
+            _REQUESTS.inc(amount, cache=self.name, result=stat[:-1])
+        else:
+            _REMOVALS.inc(amount, cache=self.name, reason=stat[:-1])
+
+    def __getitem__(self, key: Hashable) -> Any:
+        if self._popping:
+            return super().__getitem__(key)
+        try:
+            value = super().__getitem__(key)
+        except KeyError:
+            self._count("misses")
+            raise
+        self._count("hits")
+        return value
+
+    def popitem(self) -> Any:
+        # evicted entries are read through __getitem__, not a lookup
+        self._popping = True
+        try:
+            item = super().popitem()
+        finally:
+            self._popping = False
+        self._count("evictions")
+        return item
+
+    def expire(self, time: Any = None) -> Any:
+        # Cache.currsize still counts expired entries, TTLCache.currsize
+        # would expire them first
+        before = Cache.currsize.fget(self)  # type: ignore
+        result = super().expire(time)
+        self._count("expirations", before - Cache.currsize.fget(self))
+        return result
+
+    def invalidate(self, predicate: Callable[[Any], bool]) -> int:
+        with self.lock:
+            keys = [x for x in list(self.keys()) if predicate(x)]
+            for key in keys:
+                del self[key]
+        self._count("invalidations", len(keys))
+        return len(keys)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                **self._stats,
+                "size": len(self),
+                "capacity": int(self.maxsize),
+            }
@@ -1,7 +1,6 @@
-from itertools import chain, starmap
-from typing import Dict, Any, Tuple, Iterable, Set
+from typing import Dict, Any, Tuple, Set, FrozenSet, List
 
-from toolz import curry
+from toolz import curry, memoize
 
 Map = Dict[str, Any]
 _DEF_SEP = "."
@@ -17,37 +16,58 @@ def keep_keys(keys: Set[str], dic: Map) -> Map:
     return {k: v for k, v in dic.items() if k in keys}
 
 
-@curry
-def _unpack_nested(
-    except_: Set[str],
-    key: str,
-    value: Any,
+# joined keys are cached per exception set, rows of one shape keep
+# hitting the same entries, the cap only guards against unique keys
+_KEY_PLAN_SIZE = 100_000
+
+KeyPlan = Dict[Tuple[Any, Any], Tuple[str, bool]]
+
+
+@memoize
+def _key_plan(except_: FrozenSet[str], sep: str) -> KeyPlan:
+    return dict()
+
+
+def _nested_key(
+    plan: KeyPlan,
+    except_: FrozenSet[str],
+    sep: str,
+    prefix: Any,
+    key: Any,
+) -> Tuple[str, bool]:
+    found = plan.get((prefix, key))
+    if found is not None:
+        return found
+    if len(plan) >= _KEY_PLAN_SIZE:
+        plan.clear()
+    joined = f"{prefix}{sep}{key}"
+    found = plan[(prefix, key)] = (joined, joined in except_)
+    return found
+
+
+def flatten_dict(
+    dictionary: Map,
+    except_: Set[str] = set(),
     sep: str = _DEF_SEP,
-) -> Iterable[Tuple[str, Any]]:
-    value_type = type(value)
-    if value_type is dict and key not in except_:
-        if not value:
-            yield key, None
-        for k, v in value.items():
-            yield f"{key}{sep}{k}", v
-    if value_type is not dict:
-        yield key, value
-    if key in except_:
-        yield key, value
-
-
-def flatten_dict(dictionary: Map, except_: Set[str] = set()) -> Map:
-    dict_ = dictionary
-    while True:
-        dict_ = dict(
-            chain.from_iterable(
-                starmap(_unpack_nested(except_), dict_.items())
+) -> Map:
+    kept = frozenset(except_)
+    plan = _key_plan(kept, sep)
+    flat: Map = dict()
+    stack: List[Tuple[Any, bool, Any]] = [
+        (k, k in kept, v) for k, v in reversed(list(dictionary.items()))
+    ]
+    while stack:
+        key, whole, value = stack.pop()
+        if whole or type(value) is not dict:
+            flat[key] = value
+        elif not value:
+            flat[key] = None
+        else:
+            stack.extend(
+                (*_nested_key(plan, kept, sep, key, k), v)
+                for k, v in reversed(list(value.items()))
             )
-        )
-        if not any(
-            type(v) is dict for k, v in dict_.items() if k not in except_
-        ):
-            return dict_
+    return flat
 
 
 def swap_mapping_keys_values(mapping: Dict[str, str], target: Map) -> Map:
@@ -1,37 +1,463 @@
+import math
 import os
+import random
 import threading
-from typing import List, Any, Dict
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Any, Dict, Callable, Iterator, Optional, Tuple
+from urllib.parse import urlparse
 
 import shotgun_api3 as sg
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 from pymongo.collection import Collection
-from retry import retry
 from toolz import memoize, curry
 
 from shotgrid_leecher.record.enums import EventTables, DbName, DbCollection
 from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
+from shotgrid_leecher.utils import metrics
+from shotgrid_leecher.utils.functional import try_or
 
 Map = Dict[str, Any]
 
+_SHOTGRID_CONCURRENCY = int(os.getenv("SHOTGRID_MAX_CONCURRENCY", 4))
+_SHOTGRID_POOL_SIZE = int(
+    os.getenv("SHOTGRID_POOL_SIZE", _SHOTGRID_CONCURRENCY)
+)
+_SHOTGRID_IDLE_SECONDS = float(os.getenv("SHOTGRID_POOL_IDLE_SECONDS", 300))
+_SHOTGRID_CHECK_SECONDS = float(os.getenv("SHOTGRID_POOL_CHECK_SECONDS", 60))
+_SHOTGRID_HOST_RATE = float(os.getenv("SHOTGRID_HOST_RATE", 0))
+_SHOTGRID_MIN_RATE = 1.0
+_SHOTGRID_RATE_STEP = 1.0
+_SHOTGRID_RATE_WINDOW_SECONDS = 10.0
+_SHOTGRID_THROTTLE_COOLDOWN = 1.0
+_SHOTGRID_THROTTLE_CODES = {429, 503}
+_SHOTGRID_TRIES = max(1, int(os.getenv("SHOTGRID_RETRIES", 3)))
+_SHOTGRID_RETRY_BASE = float(os.getenv("SHOTGRID_RETRY_BASE_SECONDS", 0.5))
+_SHOTGRID_RETRY_MAX = float(os.getenv("SHOTGRID_RETRY_MAX_SECONDS", 30))
+_SHOTGRID_DEADLINE: ContextVar[Optional[float]] = ContextVar(
+    "shotgrid_deadline", default=None
+)
+_SHOTGRID_SECONDS = metrics.histogram(
+    "leecher_shotgrid_request_seconds",
+    "Duration of Shotgrid requests",
+    ["method", "entity_type"],
+)
+_SHOTGRID_ROWS = metrics.counter(
+    "leecher_shotgrid_rows_total",
+    "Rows read from Shotgrid",
+    ["entity_type"],
+)
+_SHOTGRID_CONNECTIONS = metrics.gauge(
+    "leecher_shotgrid_connections", "Open Shotgrid connections", ["host"]
+)
+_SHOTGRID_CLOSED = metrics.counter(
+    "leecher_shotgrid_connections_closed_total",
+    "Shotgrid connections closed by their pool",
+    ["host", "reason"],
+)
+_SHOTGRID_RATE = metrics.gauge(
+    "leecher_shotgrid_rate_limit",
+    "Requests per second allowed to a Shotgrid host after throttling",
+    ["host"],
+)
+_SHOTGRID_THROTTLED = metrics.counter(
+    "leecher_shotgrid_throttled_total",
+    "Shotgrid requests rejected because of the load of the site",
+    ["host"],
+)
+_SHOTGRID_THROTTLE_WAIT = metrics.histogram(
+    "leecher_shotgrid_throttle_wait_seconds",
+    "Time spent waiting for the rate limit of a Shotgrid host",
+    ["host"],
+)
+_SHOTGRID_RETRIES = metrics.counter(
+    "leecher_shotgrid_retries_total",
+    "Shotgrid requests sent again after a failure",
+    ["method", "reason"],
+)
+_SHOTGRID_DEADLINE_EXCEEDED = metrics.counter(
+    "leecher_shotgrid_deadline_exceeded_total",
+    "Shotgrid requests given up because their batch ran out of time",
+    ["method"],
+)
+_SHOTGRID_POOL_WAIT = metrics.histogram(
+    "leecher_shotgrid_pool_wait_seconds",
+    "Time spent waiting for a pooled Shotgrid connection",
+    ["host"],
+)
 
-class ShotgridClient:
-    client: sg.Shotgun
+
+class ShotgridRateLimiter:
+    # token bucket shared by every pool talking to the same host, a
+    # request takes its token even when it has to wait for it so that
+    # waiting requests are served in turn.
+    # The rate is learned from the site: a throttled response halves it,
+    # every successful request then raises it by a fraction of a request
+    # per second, up to the configured rate when there is one
+
+    def __init__(
+        self, rate: float, burst: Optional[int] = None, host: str = ""
+    ) -> None:
+        self.ceiling = rate
+        self.rate = rate
+        self.host = host
+        self._burst = burst
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._throttled_at = -math.inf
+        # requests sent while unlimited, to start from their rate
+        self._sent = 0
+        self._sent_since = self._updated_at
+        self._lock = threading.Lock()
+
+    @property
+    def burst(self) -> int:
+        return max(1, self._burst or math.ceil(self.rate))
+
+    def acquire(self, deadline: Optional[float] = None) -> float:
+        with self._lock:
+            now = time.monotonic()
+            delay = 0.0
+            if self.rate > 0:
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated_at) * self.rate,
+                )
+                self._updated_at = now
+                delay = max(0.0, (1 - self._tokens) / self.rate)
+            if deadline is not None and now + delay > deadline:
+                raise TimeoutError(
+                    f"Shotgrid deadline exceeded waiting for {self.host}"
+                )
+            if self.rate > 0:
+                self._tokens -= 1
+            elif now - self._sent_since > _SHOTGRID_RATE_WINDOW_SECONDS:
+                self._sent, self._sent_since = 1, now
+            else:
+                self._sent += 1
+        if delay:
+            _SHOTGRID_THROTTLE_WAIT.observe(delay, host=self.host)
+            time.sleep(delay)
+        return delay
+
+    def throttled(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            # requests sent at the same rate get throttled together
+            if now - self._throttled_at < _SHOTGRID_THROTTLE_COOLDOWN:
+                return None
+            self._throttled_at = now
+            current = self.rate
+            if current <= 0:
+                current = self._sent / max(1.0, now - self._sent_since)
+            self._set_rate(max(_SHOTGRID_MIN_RATE, current / 2))
+            self._tokens = min(self._tokens, 0.0)
+            self._updated_at = now
+
+    def succeeded(self) -> None:
+        if self.rate <= 0 or self.rate == self.ceiling:
+            return None
+        with self._lock:
+            rate = self.rate + _SHOTGRID_RATE_STEP / self.rate
+            if self.ceiling > 0:
+                rate = min(self.ceiling, rate)
+            self._set_rate(rate)
+
+    def _set_rate(self, rate: float) -> None:
+        self.rate = rate
+        _SHOTGRID_RATE.set(rate, host=self.host)
+
+
+class _PooledConnection:
+    __slots__ = ("client", "used_at")
 
     def __init__(self, client: sg.Shotgun) -> None:
         self.client = client
+        self.used_at = time.monotonic()
+
+
+class ShotgridPool:
+    # sg.Shotgun is not thread-safe: a connection serves one request at a
+    # time, the pool hands them out and caps how many are open at once
+
+    def __init__(
+        self,
+        connect: Callable[[], sg.Shotgun],
+        size: int = _SHOTGRID_POOL_SIZE,
+        idle_seconds: float = _SHOTGRID_IDLE_SECONDS,
+        check_seconds: float = _SHOTGRID_CHECK_SECONDS,
+        host: str = "",
+    ) -> None:
+        self._connect = connect
+        self.size = max(1, size)
+        self.idle_seconds = idle_seconds
+        self.check_seconds = check_seconds
+        self.host = host
+        # most recently used last: busy periods reuse warm connections,
+        # the ones left at the bottom age out
+        self._idle: List[_PooledConnection] = []
+        self._open = 0
+        self._closed = False
+        self._changed = threading.Condition()
+
+    @property
+    def open_count(self) -> int:
+        return self._open
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    @contextmanager
+    def connection(self) -> Iterator[sg.Shotgun]:
+        pooled = self._checkout()
+        try:
+            yield pooled.client
+        except Exception:
+            # the connection may be left half way through a response
+            self._discard(pooled, "failed")
+            raise
+        self._checkin(pooled)
+
+    def close(self) -> None:
+        with self._changed:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._discard(pooled, "closed")
+
+    def _expired(self, now: float) -> List[_PooledConnection]:
+        expired = [
+            x for x in self._idle if now - x.used_at > self.idle_seconds
+        ]
+        if expired:
+            self._idle = [x for x in self._idle if x not in expired]
+        return expired
+
+    def _checkout(self) -> _PooledConnection:
+        start = time.monotonic()
+        while True:
+            with self._changed:
+                while not self._idle and self._open >= self.size:
+                    self._changed.wait()
+                expired = self._expired(time.monotonic())
+                pooled = self._idle.pop() if self._idle else None
+                if not pooled:
+                    self._open += 1
+            for x in expired:
+                self._discard(x, "idle")
+            if not pooled:
+                _SHOTGRID_POOL_WAIT.observe(
+                    time.monotonic() - start, host=self.host
+                )
+                return self._open_connection()
+            if self._healthy(pooled):
+                _SHOTGRID_POOL_WAIT.observe(
+                    time.monotonic() - start, host=self.host
+                )
+                return pooled
+            self._discard(pooled, "unhealthy")
+
+    def _open_connection(self) -> _PooledConnection:
+        try:
+            pooled = _PooledConnection(self._connect())
+        except Exception:
+            with self._changed:
+                self._open -= 1
+                self._changed.notify()
+            raise
+        _SHOTGRID_CONNECTIONS.inc(host=self.host)
+        return pooled
+
+    def _healthy(self, pooled: _PooledConnection) -> bool:
+        if time.monotonic() - pooled.used_at < self.check_seconds:
+            return True
+        return try_or(lambda: pooled.client.info() is not None, False)
+
+    def _checkin(self, pooled: _PooledConnection) -> None:
+        pooled.used_at = time.monotonic()
+        with self._changed:
+            if not self._closed:
+                self._idle.append(pooled)
+                self._changed.notify()
+                return None
+        self._discard(pooled, "closed")
+
+    def _discard(self, pooled: _PooledConnection, reason: str) -> None:
+        try_or(pooled.client.close)
+        _SHOTGRID_CONNECTIONS.dec(host=self.host)
+        _SHOTGRID_CLOSED.inc(host=self.host, reason=reason)
+        with self._changed:
+            self._open -= 1
+            self._changed.notify()
+
+
+def _to_failure_reason(error: Exception) -> str:
+    code = getattr(error, "errcode", None)
+    if (
+        isinstance(error, sg.ProtocolError)
+        and code in _SHOTGRID_THROTTLE_CODES
+    ):
+        return "throttled"
+    return "error"
+
+
+def _full_jitter(attempt: int) -> float:
+    # spreads retries of requests that failed together over the whole
+    # backoff window instead of sending them again at once
+    ceiling = _SHOTGRID_RETRY_BASE * 2 ** (attempt - 1)
+    return random.uniform(0, min(_SHOTGRID_RETRY_MAX, ceiling))
+
+
+@contextmanager
+def shotgrid_deadline(seconds: float) -> Iterator[Optional[float]]:
+    """
+    Give up the Shotgrid requests of the current context, and the ones of
+    the threads started from it, once the given amount of seconds passed.
+
+    Args:
+        seconds float: time allowed to the requests, 0 for no deadline.
+
+    Returns iterator(float): The monotonic time of the deadline if any.
+
+    """
+    deadline = time.monotonic() + seconds if seconds > 0 else None
+    token = _SHOTGRID_DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _SHOTGRID_DEADLINE.reset(token)
+
+
+class ShotgridClient:
+    # every request takes a slot of its site and script, then borrows a
+    # connection from their pool and a token from the rate limiter of its
+    # host. The slots cap the requests in flight for the credentials
+    # whatever the amount of batches sending them. A failed
+    # request is sent again after an exponential backoff with full jitter,
+    # unless that would cross the deadline of its batch
+
+    def __init__(
+        self,
+        connect: Callable[[], sg.Shotgun],
+        max_concurrency: int = _SHOTGRID_CONCURRENCY,
+        host: str = "",
+        limiter: Optional[ShotgridRateLimiter] = None,
+        pool_size: Optional[int] = None,
+        slots: Optional[threading.Semaphore] = None,
+    ) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.pool = ShotgridPool(
+            connect, pool_size or self.max_concurrency, host=host
+        )
+        self.limiter = limiter or ShotgridRateLimiter(0)
+        self.slots = slots or threading.BoundedSemaphore(self.max_concurrency)
+
+    def _take_slot(self, deadline: Optional[float]) -> None:
+        timeout = None
+        if deadline is not None:
+            timeout = max(0.0, deadline - time.monotonic())
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError(
+                f"Shotgrid deadline exceeded waiting for {self.pool.host}"
+            )
+
+    def _send(
+        self, method: str, type_: str, send: Callable[[sg.Shotgun], Any]
+    ) -> Any:
+        try:
+            with self.pool.connection() as client, _SHOTGRID_SECONDS.time(
+                method=method, entity_type=type_
+            ):
+                return send(client)
+        finally:
+            self.slots.release()
+
+    def _request(
+        self, method: str, type_: str, send: Callable[[sg.Shotgun], Any]
+    ) -> Any:
+        deadline = _SHOTGRID_DEADLINE.get()
+        attempt = 1
+        while True:
+            try:
+                self.limiter.acquire(deadline)
+                self._take_slot(deadline)
+            except TimeoutError:
+                _SHOTGRID_DEADLINE_EXCEEDED.inc(method=method)
+                raise
+            try:
+                result = self._send(method, type_, send)
+            except Exception as ex:
+                reason = _to_failure_reason(ex)
+                if reason == "throttled":
+                    _SHOTGRID_THROTTLED.inc(host=self.pool.host)
+                    self.limiter.throttled()
+                if attempt >= _SHOTGRID_TRIES:
+                    raise
+                delay = _full_jitter(attempt)
+                if (
+                    deadline is not None
+                    and time.monotonic() + delay > deadline
+                ):
+                    _SHOTGRID_DEADLINE_EXCEEDED.inc(method=method)
+                    raise
+                _SHOTGRID_RETRIES.inc(method=method, reason=reason)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.succeeded()
+            return result
 
-    @retry(tries=3, backoff=0.7)
     def find_one(
         self, type_: str, filters: List[List[Any]], fields: List[str]
     ) -> Map:
-        return self.client.find_one(type_, filters, fields)
+        return self._request(
+            "find_one",
+            type_,
+            lambda x: x.find_one(type_, filters, fields),
+        )
 
-    @retry(tries=3, backoff=1.5)
     def find(
-        self, type_: str, filters: List[List[Any]], fields: List[str]
+        self,
+        type_: str,
+        filters: List[List[Any]],
+        fields: List[str],
+        order: Optional[List[Map]] = None,
+        limit: int = 0,
+        page: int = 0,
     ) -> List[Map]:
-        return self.client.find(type_, filters, fields)
+        rows = self._request(
+            "find",
+            type_,
+            lambda x: x.find(
+                type_, filters, fields, order=order, limit=limit, page=page
+            ),
+        )
+        _SHOTGRID_ROWS.inc(len(rows), entity_type=type_)
+        return rows
+
+    def summarize(
+        self,
+        type_: str,
+        filters: List[List[Any]],
+        summary_fields: List[Map],
+        grouping: Optional[List[Map]] = None,
+    ) -> Map:
+        return self._request(
+            "summarize",
+            type_,
+            lambda x: x.summarize(
+                type_, filters, summary_fields, grouping=grouping
+            ),
+        )
+
+
+_LIMITERS: Dict[str, ShotgridRateLimiter] = dict()
+_SLOTS: Dict[Tuple[str, str], threading.Semaphore] = dict()
+_CLIENTS: Dict[Tuple[str, str], Tuple[str, ShotgridClient]] = dict()
+_CLIENTS_LOCK = threading.Lock()
 
 
 @memoize
@@ -56,16 +482,52 @@ def get_async_db_client(
 @curry
 def db_collection(db: DbName, collection: DbCollection) -> Collection:
     return (
-        get_db_client()
-        .get_database(db.value)
-        .get_collection(collection.value)
+        get_db_client().get_database(db.value).get_collection(collection.value)
     )
 
 
-@memoize
+def get_shotgrid_concurrency() -> int:
+    # requests in flight are capped per site and script by the slots of
+    # their client, a batch never needs more workers than that
+    return _SHOTGRID_CONCURRENCY
+
+
+def get_host_rate_limiter(host: str) -> ShotgridRateLimiter:
+    with _CLIENTS_LOCK:
+        if host not in _LIMITERS:
+            _LIMITERS[host] = ShotgridRateLimiter(
+                _SHOTGRID_HOST_RATE, host=host
+            )
+        return _LIMITERS[host]
+
+
 def get_shotgrid_client(credentials: ShotgridCredentials) -> ShotgridClient:
     url = credentials.shotgrid_url
     script_name = credentials.script_name
     api_key = credentials.script_key
-    sg_client = sg.Shotgun(url, script_name=script_name, api_key=api_key)
-    return ShotgridClient(sg_client)
+    host = urlparse(url).netloc
+    limiter = get_host_rate_limiter(host)
+    with _CLIENTS_LOCK:
+        found = _CLIENTS.get((url, script_name))
+        if found and found[0] == api_key:
+            return found[1]
+        # slots outlive a key rotation, requests still sent with the
+        # previous key count against the cap of the script
+        slots = _SLOTS.setdefault(
+            (url, script_name),
+            threading.BoundedSemaphore(_SHOTGRID_CONCURRENCY),
+        )
+        client = ShotgridClient(
+            lambda: sg.Shotgun(url, script_name=script_name, api_key=api_key),
+            _SHOTGRID_CONCURRENCY,
+            host=host,
+            limiter=limiter,
+            pool_size=_SHOTGRID_POOL_SIZE,
+            slots=slots,
+        )
+        _CLIENTS[(url, script_name)] = (api_key, client)
+    if found:
+        # the key of the script changed, connections opened with the
+        # previous one are closed once their requests are done
+        found[1].pool.close()
+    return client
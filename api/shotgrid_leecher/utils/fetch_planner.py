@@ -0,0 +1,139 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor
+from concurrent.futures import wait
+from contextvars import copy_context
+from queue import Full, Queue
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Tuple,
+    Set,
+)
+
+import attr
+
+Map = Dict[str, Any]
+
+_PUT_TIMEOUT_SECONDS = 0.1
+_END = object()
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class FetchStep:
+    name: str
+    fetch: Callable[[Map], Any]
+    depends_on: Tuple[str, ...] = ()
+
+
+def _check_plan(steps: List[FetchStep]) -> None:
+    names = [x.name for x in steps]
+    if len(names) != len(set(names)):
+        raise ValueError(f"Duplicated fetch steps in {names}")
+    resolved: Set[str] = set()
+    pending = list(steps)
+    while pending:
+        ready = [x for x in pending if resolved.issuperset(x.depends_on)]
+        if not ready:
+            unresolved = {x.name: x.depends_on for x in pending}
+            raise ValueError(f"Unresolvable fetch steps {unresolved}")
+        resolved.update(x.name for x in ready)
+        pending = [x for x in pending if x not in ready]
+
+
+def _in_context(step: FetchStep, deps: Map) -> Callable[[], Any]:
+    # steps run within the context variables of the caller
+    context = copy_context()
+
+    def _run() -> Any:
+        return context.run(step.fetch, deps)
+
+    return _run
+
+
+def run_plan(steps: List[FetchStep], max_workers: int) -> Map:
+    """
+    Run fetch steps on a bounded executor, each one as soon as all the
+    steps it depends on are done.
+
+    Args:
+        steps list(FetchStep): steps to run, every step receives a dict
+        of its dependencies results keyed by their names.
+        max_workers int: amount of steps allowed to run at the same time.
+
+    Returns dict(str, any): Results of all the steps keyed by their names.
+
+    """
+    _check_plan(steps)
+    results: Map = dict()
+    pending = list(steps)
+    running: Dict[Future, FetchStep] = dict()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while pending or running:
+            ready = [x for x in pending if set(x.depends_on) <= set(results)]
+            for step in ready:
+                deps = {k: results[k] for k in step.depends_on}
+                running[executor.submit(_in_context(step, deps))] = step
+            pending = [x for x in pending if x not in ready]
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future).name] = future.result()
+    return results
+
+
+def _put(ahead: "Queue[Any]", stopped: threading.Event, item: Any) -> bool:
+    while not stopped.is_set():
+        try:
+            ahead.put(item, timeout=_PUT_TIMEOUT_SECONDS)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def prefetch(items: Iterable[Any], size: int) -> Generator[Any, None, None]:
+    """
+    Pull items on a background thread ahead of their consumer, so that
+    producing the next ones overlaps consuming the current ones.
+
+    Args:
+        items iterable(any): items to pull, an error raised while pulling
+        them is raised again to the consumer.
+        size int: amount of items allowed to wait for the consumer.
+
+    Returns generator(any): The items, in their order, closing it
+    stops the background thread.
+
+    """
+    ahead: "Queue[Any]" = Queue(maxsize=max(1, size))
+    stopped = threading.Event()
+
+    def _produce() -> None:
+        pulled = iter(items)
+        try:
+            for item in pulled:
+                if not _put(ahead, stopped, (item, None)):
+                    return None
+            _put(ahead, stopped, (_END, None))
+        except Exception as ex:
+            _put(ahead, stopped, (_END, ex))
+        finally:
+            getattr(pulled, "close", lambda: None)()
+
+    threading.Thread(
+        target=copy_context().run, args=(_produce,), daemon=True
+    ).start()
+    try:
+        while True:
+            item, error = ahead.get()
+            if error:
+                raise error
+            if item is _END:
+                return None
+            yield item
+    finally:
+        # a consumer leaving early must not keep the producer blocked
+        stopped.set()
@@ -1,5 +1,6 @@
 import hashlib
-from typing import Any
+import json
+from typing import Any, Dict
 
 from bson import ObjectId
 
@@ -14,3 +15,7 @@ def to_sha256_id(source: str) -> str:
     checksum = hashlib.sha256()
     checksum.update(source.encode("utf-8"))
     return str(checksum.hexdigest())
+
+
+def to_fingerprint(dic: Dict[str, Any]) -> str:
+    return to_sha256_id(json.dumps(dic, sort_keys=True, default=str))
@@ -0,0 +1,139 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Sequence
+
+import prometheus_client
+from prometheus_client import REGISTRY
+
+# Thin keyword-label facade over prometheus_client, metrics live in its
+# default registry and are registered once per name
+
+_DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+_SIZE_BUCKETS = (1, 10, 100, 500, 1_000, 5_000, 10_000, 50_000, 100_000)
+
+
+class _Metric:
+    def __init__(
+        self, metric: Any, sample: str, labels: Sequence[str] = ()
+    ) -> None:
+        self._metric = metric
+        self._sample = sample
+        self.label_names = tuple(labels)
+
+    def _child(self, labels: Dict[str, str]) -> Any:
+        if not labels and not self.label_names:
+            return self._metric
+        return self._metric.labels(**labels)
+
+    def _read(self, suffix: str, labels: Dict[str, str]) -> float:
+        if set(labels.keys()) != set(self.label_names):
+            raise ValueError(f"{self._sample} expects {self.label_names}")
+        value = REGISTRY.get_sample_value(
+            f"{self._sample}{suffix}", {k: str(v) for k, v in labels.items()}
+        )
+        return value or 0
+
+
+class Counter(_Metric):
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        self._child(labels).inc(amount)
+
+    def value(self, **labels: str) -> float:
+        return self._read("", labels)
+
+
+class Gauge(Counter):
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self._child(labels).dec(amount)
+
+    def set(self, value: float, **labels: str) -> None:
+        self._child(labels).set(value)
+
+
+class Histogram(_Metric):
+    def observe(self, value: float, **labels: str) -> None:
+        self._child(labels).observe(value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        with self._child(labels).time():
+            yield
+
+    def count(self, **labels: str) -> int:
+        return int(self._read("_count", labels))
+
+
+_METRICS: Dict[str, _Metric] = dict()
+_METRICS_LOCK = threading.Lock()
+
+
+def _register(name: str, create: Any) -> Any:
+    with _METRICS_LOCK:
+        if name not in _METRICS:
+            _METRICS[name] = create()
+        return _METRICS[name]
+
+
+def counter(name: str, documentation: str, labels=()) -> Counter:
+    # prometheus_client samples counters as <name>_total
+    sample = name if name.endswith("_total") else f"{name}_total"
+    return _register(
+        name,
+        lambda: Counter(
+            prometheus_client.Counter(name, documentation, labels),
+            sample,
+            labels,
+        ),
+    )
+
+
+def gauge(name: str, documentation: str, labels=()) -> Gauge:
+    return _register(
+        name,
+        lambda: Gauge(
+            prometheus_client.Gauge(name, documentation, labels),
+            name,
+            labels,
+        ),
+    )
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labels=(),
+    buckets: Sequence[float] = _DEFAULT_BUCKETS,
+) -> Histogram:
+    return _register(
+        name,
+        lambda: Histogram(
+            prometheus_client.Histogram(
+                name, documentation, labels, buckets=buckets
+            ),
+            name,
+            labels,
+        ),
+    )
+
+
+def size_histogram(name: str, documentation: str, labels=()) -> Histogram:
+    return histogram(name, documentation, labels, _SIZE_BUCKETS)
+
+
+def render_metrics() -> str:
+    return prometheus_client.generate_latest(REGISTRY).decode("utf-8")
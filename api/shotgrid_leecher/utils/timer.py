@@ -2,15 +2,22 @@ from functools import wraps
 from time import time
 from typing import Callable
 
+from shotgrid_leecher.utils import metrics
 from shotgrid_leecher.utils.logger import global_logger
 
+_STAGE_SECONDS = metrics.histogram(
+    "leecher_stage_seconds", "Duration of batch pipeline stages", ["stage"]
+)
+
 
 def timed(func: Callable) -> Callable:
     @wraps(func)
     def wrapper(*args, **kwargs):
         start = time()
         result = func(*args, **kwargs)
-        took_ms = round((time() - start) * 1000, 2)
+        took = time() - start
+        _STAGE_SECONDS.observe(took, stage=func.__name__)
+        took_ms = round(took * 1000, 2)
         if took_ms > 0.01:
             global_logger().info(f"{func.__name__} took {took_ms} ms")
         return result
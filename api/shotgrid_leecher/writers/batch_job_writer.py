@@ -0,0 +1,116 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import DeleteResult, UpdateResult
+
+import shotgrid_leecher.utils.connectivity as conn
+from shotgrid_leecher.record.enums import DbName, DbCollection
+from shotgrid_leecher.record.leecher_structures import BatchJob
+from shotgrid_leecher.record.results import (
+    BatchJobStatus,
+    BatchResult,
+    BatchStage,
+)
+from shotgrid_leecher.utils.logger import get_logger
+
+_LOG = get_logger(__name__.split(".")[-1])
+
+_collection = conn.db_collection(DbName.LEECHER)
+
+
+def _update_job(job_id: str, fields: Dict[str, Any]) -> UpdateResult:
+    return _collection(DbCollection.BATCH_JOBS).update_one(
+        {"_id": job_id},
+        {"$set": {**fields, "updated_at": datetime.utcnow()}},
+    )
+
+
+def _find_or_insert_job(job: BatchJob, alive_after: datetime) -> BatchJob:
+    raw = _collection(DbCollection.BATCH_JOBS).find_one_and_update(
+        {
+            "fingerprint": job.fingerprint,
+            "active": True,
+            "updated_at": {"$gt": alive_after},
+        },
+        {"$setOnInsert": {**job.to_mongo(), "active": True}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return BatchJob.from_mongo(raw)
+
+
+def _abandon_jobs(fingerprint: str, alive_before: datetime) -> UpdateResult:
+    return _collection(DbCollection.BATCH_JOBS).update_many(
+        {
+            "fingerprint": fingerprint,
+            "active": True,
+            "updated_at": {"$lte": alive_before},
+        },
+        {
+            "$set": {
+                "active": False,
+                "status": BatchJobStatus.FAILED.value,
+                "result": BatchResult.FAILURE.value,
+                "error": "Job abandoned",
+            }
+        },
+    )
+
+
+def create_or_get_active_job(job: BatchJob, alive_after: datetime) -> BatchJob:
+    # the same request still running (and heartbeating) is reused, the
+    # unique index on active fingerprints keeps a single one of them
+    try:
+        return _find_or_insert_job(job, alive_after)
+    except DuplicateKeyError:
+        # raced by another submission, or held by an abandoned job
+        _abandon_jobs(job.fingerprint, alive_after)
+        return _find_or_insert_job(job, alive_after)
+
+
+def ensure_batch_job_indexes() -> None:
+    _collection(DbCollection.BATCH_JOBS).create_index(
+        "fingerprint",
+        unique=True,
+        partialFilterExpression={"active": True},
+    )
+
+
+def start_job(job_id: str) -> UpdateResult:
+    return _update_job(job_id, {"status": BatchJobStatus.RUNNING.value})
+
+
+def touch_job(job_id: str) -> UpdateResult:
+    return _update_job(job_id, dict())
+
+
+def update_job_progress(
+    job_id: str, stage: BatchStage, count: int
+) -> UpdateResult:
+    return _update_job(job_id, {f"progress.{stage.value}": count})
+
+
+def finish_job(
+    job_id: str,
+    status: BatchJobStatus,
+    result: str,
+    error: Optional[str] = None,
+) -> UpdateResult:
+    _LOG.debug(f"Batch job {job_id} finished with {result}")
+    return _update_job(
+        job_id,
+        {
+            "active": status in BatchJobStatus.active(),
+            "status": status.value,
+            "result": result,
+            "error": error,
+        },
+    )
+
+
+def clean_batch_jobs(created_before: datetime) -> DeleteResult:
+    return _collection(DbCollection.BATCH_JOBS).delete_many(
+        {"created_at": {"$lt": created_before}}
+    )
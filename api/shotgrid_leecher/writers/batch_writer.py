@@ -1,17 +1,25 @@
-from typing import Dict, Any, List, Set
+from itertools import chain
+from typing import Dict, Any, List, Set, Optional
 
 from bson import ObjectId
-from pymongo import UpdateOne, InsertOne
+from pymongo import UpdateOne, InsertOne, ReplaceOne, DeleteOne
 from pymongo.collection import Collection
-from pymongo.results import DeleteResult, BulkWriteResult
+from pymongo.results import DeleteResult
 
 import shotgrid_leecher.utils.connectivity as conn
 from shotgrid_leecher.record.enums import DbName, AvalonType
 from shotgrid_leecher.record.intermediate_structures import IntermediateRow
+from shotgrid_leecher.record.results import UpsertionResult, BulkWriteSummary
 from shotgrid_leecher.utils.collections import flatten_dict
+from shotgrid_leecher.utils.logger import get_logger
+from shotgrid_leecher.utils.timer import timed
+from shotgrid_leecher.writers import bulk_writer
+
+_LOG = get_logger(__name__.split(".")[-1])
 
 Map = Dict[str, Any]
 _ROW_FLATTEN_EXCEPTIONS = {"config.tasks", "data.tasks"}
+_FINGERPRINT = "fingerprint"
 
 
 def _avalon_collection(project_name: str) -> Collection:
@@ -30,6 +38,7 @@ def _hierarchy_collection(project_name: str) -> Collection:
     )
 
 
+@timed
 def overwrite_intermediate(
     project_name: str,
     hierarchy_rows: List[IntermediateRow],
@@ -41,6 +50,32 @@ def overwrite_intermediate(
     )
 
 
+@timed
+def sync_intermediate(
+    project_name: str,
+    previous_rows: List[IntermediateRow],
+    hierarchy_rows: List[IntermediateRow],
+) -> Optional[BulkWriteSummary]:
+    previous = {x["_id"]: x for x in [y.to_dict() for y in previous_rows]}
+    current = {x["_id"]: x for x in [y.to_dict() for y in hierarchy_rows]}
+    bulks = chain(
+        (InsertOne(v) for k, v in current.items() if k not in previous),
+        (
+            ReplaceOne({"_id": k}, v)
+            for k, v in current.items()
+            if k in previous and previous[k] != v
+        ),
+        (DeleteOne({"_id": k}) for k in previous.keys() - current.keys()),
+    )
+    result = bulk_writer.bulk_write(
+        _hierarchy_collection(project_name), bulks, False
+    )
+    _LOG.debug(
+        f"{project_name}: {result.operations} intermediate rows changed"
+    )
+    return result if result.operations else None
+
+
 def upsert_avalon_row(project_name: str, avalon_row: Map) -> ObjectId:
     query = {"$set": flatten_dict(avalon_row, _ROW_FLATTEN_EXCEPTIONS)}
     result = _avalon_collection(project_name).update_one(
@@ -51,16 +86,37 @@ def upsert_avalon_row(project_name: str, avalon_row: Map) -> ObjectId:
     return avalon_row["_id"]
 
 
-def upsert_avalon_rows(project_name: str, rows: List[Map]) -> BulkWriteResult:
-    bulks = [
+def _stored_fingerprints(project_name: str, rows: List[Map]) -> Map:
+    found = _avalon_collection(project_name).find(
+        {"_id": {"$in": [x["_id"] for x in rows]}},
+        {_FINGERPRINT: 1},
+    )
+    return {x["_id"]: x.get(_FINGERPRINT) for x in found}
+
+
+@timed
+def upsert_avalon_rows(project_name: str, rows: List[Map]) -> UpsertionResult:
+    stored = _stored_fingerprints(project_name, rows)
+    changed = [
+        x
+        for x in rows
+        if not x.get(_FINGERPRINT) or stored.get(x["_id"]) != x[_FINGERPRINT]
+    ]
+    bulks = (
         UpdateOne(
             {"_id": x["_id"]},
             {"$set": flatten_dict(x, _ROW_FLATTEN_EXCEPTIONS)},
             upsert=True,
         )
-        for x in rows
-    ]
-    return _avalon_collection(project_name).bulk_write(bulks)
+        for x in changed
+    )
+    bulk_writer.bulk_write(_avalon_collection(project_name), bulks, False)
+    result = UpsertionResult(len(changed), len(rows) - len(changed))
+    _LOG.info(
+        f"{project_name}: {result.written_count} avalon rows written, "
+        f"{result.skipped_count} unchanged ones skipped"
+    )
+    return result
 
 
 def delete_avalon_rows(project_name: str, ids: Set[ObjectId]) -> int:
@@ -75,9 +131,12 @@ def insert_avalon_row(project_name: str, avalon_row: Map) -> ObjectId:
     return _avalon_collection(project_name).insert_one(avalon_row).inserted_id
 
 
-def insert_avalon_rows(project_name: str, rows: List[Map]) -> BulkWriteResult:
-    bulks = [InsertOne(flatten_dict(x, _ROW_FLATTEN_EXCEPTIONS)) for x in rows]
-    return _avalon_collection(project_name).bulk_write(bulks)
+def insert_avalon_rows(project_name: str, rows: List[Map]) -> BulkWriteSummary:
+    # fresh rows have distinct ids, they do not need to go in order
+    bulks = (InsertOne(flatten_dict(x, _ROW_FLATTEN_EXCEPTIONS)) for x in rows)
+    return bulk_writer.bulk_write(
+        _avalon_collection(project_name), bulks, False
+    )
 
 
 def drop_avalon_project(project_name: str):
@@ -0,0 +1,178 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor
+from concurrent.futures import wait
+from typing import Any, Dict, Iterable, Iterator, List, Set
+
+import attr
+import bson
+from pymongo.collection import Collection
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from shotgrid_leecher.record.results import BulkWriteSummary
+from shotgrid_leecher.utils import metrics
+from shotgrid_leecher.utils.functional import try_or
+from shotgrid_leecher.utils.logger import get_logger
+
+_LOG = get_logger(__name__.split(".")[-1])
+
+Map = Dict[str, Any]
+
+_CHUNK_OPERATIONS = int(os.getenv("MONGO_BULK_CHUNK_SIZE", 1000))
+_CHUNK_BYTES = int(os.getenv("MONGO_BULK_CHUNK_MB", 8)) * 1024 * 1024
+_WORKERS = int(os.getenv("MONGO_BULK_WORKERS", 4))
+_RETRIES = int(os.getenv("MONGO_BULK_RETRIES", 3))
+_RETRY_DELAY_SECONDS = 0.5
+_DUPLICATE_KEY = 11000
+
+_BULK_SIZE = metrics.size_histogram(
+    "leecher_mongo_bulk_size", "Operations per Mongo bulk write", ["database"]
+)
+_BULK_SECONDS = metrics.histogram(
+    "leecher_mongo_bulk_seconds", "Duration of Mongo bulk writes", ["database"]
+)
+_BULK_RETRIES = metrics.counter(
+    "leecher_mongo_bulk_retries_total",
+    "Mongo bulk write chunks sent again after a connection failure",
+    ["database"],
+)
+
+
+def _operation_size(operation: Any) -> int:
+    # pymongo keeps the documents of its operations private, the estimate
+    # only has to be close enough to keep chunks under the byte budget
+    parts = [getattr(operation, x, None) for x in ("_filter", "_doc")]
+    return sum(
+        try_or(lambda: len(bson.encode(x)), 0)
+        for x in parts
+        if isinstance(x, dict)
+    )
+
+
+def _chunks(
+    operations: Iterable[Any], max_operations: int, max_bytes: int
+) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    size = 0
+    for operation in operations:
+        operation_size = _operation_size(operation)
+        full = (
+            len(chunk) >= max_operations or size + operation_size > max_bytes
+        )
+        if chunk and full:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(operation)
+        size += operation_size
+    if chunk:
+        yield chunk
+
+
+def _merge(
+    left: BulkWriteSummary, right: BulkWriteSummary
+) -> BulkWriteSummary:
+    return BulkWriteSummary(
+        *[x + y for x, y in zip(attr.astuple(left), attr.astuple(right))]
+    )
+
+
+def _to_summary(details: Map) -> BulkWriteSummary:
+    return BulkWriteSummary(
+        inserted_count=details.get("nInserted", 0),
+        matched_count=details.get("nMatched", 0),
+        modified_count=details.get("nModified", 0),
+        deleted_count=details.get("nRemoved", 0),
+        upserted_count=details.get("nUpserted", 0),
+    )
+
+
+def _counted(chunk: List[Any], summary: BulkWriteSummary) -> BulkWriteSummary:
+    return attr.evolve(summary, operations=len(chunk), chunks=1)
+
+
+def _only_duplicates(error: BulkWriteError) -> bool:
+    errors = error.details.get("writeErrors", [])
+    return bool(errors) and all(x["code"] == _DUPLICATE_KEY for x in errors)
+
+
+def _write_chunk(
+    collection: Collection, chunk: List[Any], ordered: bool
+) -> BulkWriteSummary:
+    database = collection.database.name
+    summary = BulkWriteSummary()
+    pending = chunk
+    attempt = 0
+    while True:
+        try:
+            _BULK_SIZE.observe(len(pending), database=database)
+            with _BULK_SECONDS.time(database=database):
+                result = collection.bulk_write(pending, ordered=ordered)
+            return _counted(
+                chunk, _merge(summary, _to_summary(result.bulk_api_result))
+            )
+        except AutoReconnect as ex:
+            attempt += 1
+            if attempt >= _RETRIES:
+                raise
+            _BULK_RETRIES.inc(database=database)
+            _LOG.warning(f"Bulk write to {database} failed ({ex}), retrying")
+            time.sleep(_RETRY_DELAY_SECONDS * 2 ** (attempt - 1))
+        except BulkWriteError as ex:
+            # inserts of a chunk cut by a connection failure may have
+            # landed, their duplicates are what a retry is expected to hit
+            if not attempt or not _only_duplicates(ex):
+                raise
+            summary = _merge(summary, _to_summary(ex.details))
+            if not ordered:
+                return _counted(chunk, summary)
+            resume_at = ex.details["writeErrors"][-1]["index"] + 1
+            pending = pending[resume_at:]
+            if not pending:
+                return _counted(chunk, summary)
+
+
+def _collect(
+    summary: BulkWriteSummary, done: Set["Future[BulkWriteSummary]"]
+) -> BulkWriteSummary:
+    for future in done:
+        summary = _merge(summary, future.result())
+    return summary
+
+
+def bulk_write(
+    collection: Collection,
+    operations: Iterable[Any],
+    ordered: bool = True,
+) -> BulkWriteSummary:
+    """
+    Write operations in chunks bounded by count and size, ordered writes
+    go one chunk after the other while unordered ones are spread over a
+    few concurrent connections.
+
+    Args:
+        collection Collection: collection to write to.
+        operations iterable(any): pymongo write operations, consumed
+        lazily: the producer is held back while enough chunks are in
+        flight.
+        ordered bool: whether operations must be applied in order.
+
+    Returns BulkWriteSummary: Counts summed over all the chunks.
+
+    """
+    chunks = _chunks(operations, max(1, _CHUNK_OPERATIONS), _CHUNK_BYTES)
+    summary = BulkWriteSummary()
+    if ordered or _WORKERS <= 1:
+        for chunk in chunks:
+            summary = _merge(summary, _write_chunk(collection, chunk, ordered))
+        return summary
+    running: Set["Future[BulkWriteSummary]"] = set()
+    with ThreadPoolExecutor(max_workers=_WORKERS) as executor:
+        for chunk in chunks:
+            if len(running) >= _WORKERS * 2:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                summary = _collect(summary, done)
+            running.add(
+                executor.submit(_write_chunk, collection, chunk, ordered)
+            )
+        done, _ = wait(running)
+    return _collect(summary, done)
@@ -0,0 +1,34 @@
+from pymongo.results import UpdateResult
+
+import shotgrid_leecher.utils.connectivity as conn
+from shotgrid_leecher.record.commands import UpsertShotgridEventCursorCommand
+from shotgrid_leecher.record.enums import DbName, DbCollection
+from shotgrid_leecher.record.leecher_structures import ShotgridEventCursor
+from shotgrid_leecher.utils.logger import get_logger
+
+_LOG = get_logger(__name__.split(".")[-1])
+
+_collection = conn.db_collection(DbName.LEECHER)
+
+
+def upsert_event_cursor(
+    command: UpsertShotgridEventCursorCommand,
+) -> UpdateResult:
+    # $max keeps the cursor from moving backwards when two consumers race
+    cursor = command.cursor
+    cursor_id = ShotgridEventCursor.to_id(
+        cursor.shotgrid_url, cursor.script_name
+    )
+    _LOG.debug(f"Move {cursor_id} to event {cursor.last_event_id}")
+    return _collection(DbCollection.SHOTGRID_EVENT_CURSORS).update_one(
+        {"_id": cursor_id},
+        {
+            "$max": {"last_event_id": cursor.last_event_id},
+            "$set": {
+                "shotgrid_url": cursor.shotgrid_url,
+                "script_name": cursor.script_name,
+                "updated_at": cursor.updated_at,
+            },
+        },
+        upsert=True,
+    )
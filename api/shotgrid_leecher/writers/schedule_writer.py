@@ -1,7 +1,12 @@
+import os
+import socket
+import uuid
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Sequence
+from urllib.parse import urlparse
 
-from pymongo import UpdateOne
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 import shotgrid_leecher.utils.connectivity as conn
 from shotgrid_leecher.record.commands import (
@@ -11,16 +16,48 @@ from shotgrid_leecher.record.commands import (
     CleanScheduleBatchLogsCommand,
 )
 from shotgrid_leecher.record.enums import DbName, DbCollection
+from shotgrid_leecher.record.results import BulkWriteSummary
 from shotgrid_leecher.utils.logger import get_logger
+from shotgrid_leecher.writers import bulk_writer
 
 _LOG = get_logger(__name__.split(".")[-1])
 
 _collection = conn.db_collection(DbName.SCHEDULE)
 
+_LEASE_DURATION = timedelta(
+    seconds=int(os.getenv("SCHEDULE_LEASE_SECONDS", 300))
+)
+# a request whose lease expired this many times is parked, it likely
+# crashes every replica picking it
+_MAX_ATTEMPTS = int(os.getenv("SCHEDULE_MAX_ATTEMPTS", 5))
+# identifies this process among the replicas sharing the schedule queue
+_LEASE_OWNER = f"{socket.gethostname()}/{os.getpid()}/{uuid.uuid4().hex[:8]}"
+
+
+def get_lease_duration() -> timedelta:
+    return _LEASE_DURATION
+
+
+def _expired_lease(now: datetime) -> Dict[str, Any]:
+    return {
+        "$or": [
+            {"lease_expires_at": {"$exists": False}},
+            {"lease_expires_at": None},
+            {"lease_expires_at": {"$lt": now}},
+        ]
+    }
+
+
+def _own_lease(command: ScheduleShotgridBatchCommand) -> Dict[str, Any]:
+    return {
+        "command.project_name": command.project_name,
+        "lease_owner": _LEASE_OWNER,
+    }
+
 
 def queue_requests(
     commands: List[ScheduleShotgridBatchCommand],
-) -> Dict[str, Any]:
+) -> BulkWriteSummary:
     now = datetime.now()
     queue_table = _collection(DbCollection.SCHEDULE_QUEUE)
     documents = [
@@ -29,6 +66,7 @@ def queue_requests(
             {
                 "$set": {
                     "command": x.to_dict(),
+                    "host": urlparse(x.credentials.shotgrid_url).netloc,
                     "datetime": now + timedelta(seconds=i * 0.01),
                 }
             },
@@ -36,7 +74,8 @@ def queue_requests(
         )
         for x, i in zip(commands, range(len(commands)))
     ]
-    return queue_table.bulk_write(documents)
+    # a project queued twice keeps its last command
+    return bulk_writer.bulk_write(queue_table, documents)
 
 
 def request_scheduling(
@@ -52,17 +91,111 @@ def request_scheduling(
     )
 
 
-def dequeue_request() -> Optional[ScheduleShotgridBatchCommand]:
+def _park_requests(now: datetime) -> int:
+    # parked requests stay queued, so the project is not queued again,
+    # until they are removed from the queue
     queue_table = _collection(DbCollection.SCHEDULE_QUEUE)
-    raw = queue_table.find_one_and_delete({}, sort=[("datetime", 1)])
+    poisoned = {
+        **_expired_lease(now),
+        "attempts": {"$gte": _MAX_ATTEMPTS},
+        "parked_at": None,
+    }
+    names = [x["_id"] for x in queue_table.find(poisoned, {"_id": 1})]
+    if not names:
+        return 0
+    queue_table.update_many(
+        {**poisoned, "_id": {"$in": names}}, {"$set": {"parked_at": now}}
+    )
+    _LOG.error(f"Park {names} after {_MAX_ATTEMPTS} expired leases")
+    return len(names)
+
+
+def dequeue_request(
+    project_name: Optional[str] = None,
+    busy_hosts: Sequence[str] = (),
+) -> Optional[ScheduleShotgridBatchCommand]:
+    # requests stay queued while leased, a request whose lease expired
+    # without an ack (crashed or stuck replica) is claimed again until
+    # it runs out of attempts
+    now = datetime.utcnow()
+    queue_table = _collection(DbCollection.SCHEDULE_QUEUE)
+    _park_requests(now)
+    project = {"command.project_name": project_name} if project_name else {}
+    # requests of hosts without a free slot are left to other workers
+    hosts = {"host": {"$nin": list(busy_hosts)}} if busy_hosts else {}
+    raw = queue_table.find_one_and_update(
+        {
+            **project,
+            **hosts,
+            **_expired_lease(now),
+            "attempts": {"$not": {"$gte": _MAX_ATTEMPTS}},
+        },
+        {
+            "$set": {
+                "lease_owner": _LEASE_OWNER,
+                "lease_expires_at": now + _LEASE_DURATION,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("datetime", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
     if not raw:
         return None
     _LOG.debug(
         f"Pick project {raw['command']['project_name']}, at {raw['datetime']}"
     )
+    if raw["attempts"] > 1:
+        _LOG.warning(
+            f"Lease expired for {raw['command']['project_name']}, "
+            f"attempt {raw['attempts']}"
+        )
     return ScheduleShotgridBatchCommand.from_dict(raw["command"])
 
 
+def extend_request_lease(command: ScheduleShotgridBatchCommand) -> bool:
+    queue_table = _collection(DbCollection.SCHEDULE_QUEUE)
+    expires_at = datetime.utcnow() + _LEASE_DURATION
+    result = queue_table.update_one(
+        _own_lease(command),
+        {"$set": {"lease_expires_at": expires_at}},
+    )
+    return result.matched_count > 0
+
+
+def ack_request(command: ScheduleShotgridBatchCommand) -> bool:
+    queue_table = _collection(DbCollection.SCHEDULE_QUEUE)
+    result = queue_table.delete_one(_own_lease(command))
+    if not result.deleted_count:
+        _LOG.warning(f"Lease lost for {command.project_name} before ack")
+    return result.deleted_count > 0
+
+
+def acquire_timer_lease(name: str, duration: timedelta) -> bool:
+    now = datetime.utcnow()
+    timers_table = _collection(DbCollection.SCHEDULE_TIMERS)
+    try:
+        timers_table.find_one_and_update(
+            {
+                "_id": name,
+                "$or": [
+                    {"lease_owner": _LEASE_OWNER},
+                    {"lease_expires_at": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "lease_owner": _LEASE_OWNER,
+                    "lease_expires_at": now + duration,
+                }
+            },
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
 def log_batch_result(command: LogScheduleUpdateCommand) -> Dict[str, Any]:
     logs_table = _collection(DbCollection.SCHEDULE_LOGS)
     _LOG.debug(f"log batch result: {command}")
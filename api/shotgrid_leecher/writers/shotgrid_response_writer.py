@@ -0,0 +1,83 @@
+from datetime import datetime
+from typing import List
+
+from pymongo import DESCENDING
+
+import shotgrid_leecher.utils.connectivity as conn
+from shotgrid_leecher.record.commands import StoreShotgridResponseCommand
+from shotgrid_leecher.record.enums import DbName, DbCollection
+from shotgrid_leecher.utils.logger import get_logger
+
+_LOG = get_logger(__name__.split(".")[-1])
+
+_collection = conn.db_collection(DbName.LEECHER)
+
+
+def _drop_responses(keys: List[str]) -> None:
+    _collection(DbCollection.SHOTGRID_RESPONSES).delete_many(
+        {"_id": {"$in": keys}}
+    )
+    _collection(DbCollection.SHOTGRID_RESPONSE_PAGES).delete_many(
+        {"key": {"$in": keys}}
+    )
+
+
+def store_response(command: StoreShotgridResponseCommand) -> None:
+    # pages are written before the response itself, a reader never
+    # finds a response with missing pages
+    response = command.response
+    _drop_responses([response.key])
+    if command.pages:
+        _collection(DbCollection.SHOTGRID_RESPONSE_PAGES).insert_many(
+            [
+                {
+                    "_id": f"{response.key}/{i}",
+                    "key": response.key,
+                    "page": i,
+                    "rows": x,
+                    "expires_at": response.expires_at,
+                }
+                for i, x in enumerate(command.pages)
+            ]
+        )
+    _collection(DbCollection.SHOTGRID_RESPONSES).insert_one(
+        response.to_mongo()
+    )
+
+
+def touch_response(key: str, used_at: datetime) -> None:
+    _collection(DbCollection.SHOTGRID_RESPONSES).update_one(
+        {"_id": key}, {"$set": {"used_at": used_at}}
+    )
+
+
+def evict_responses(max_size: int) -> int:
+    # the most recently used responses are kept up to max_size bytes,
+    # the rest goes with its pages
+    cursor = (
+        _collection(DbCollection.SHOTGRID_RESPONSES)
+        .find({}, {"size": 1})
+        .sort("used_at", DESCENDING)
+    )
+    total, evicted = 0, []
+    for raw in cursor:
+        total += raw["size"]
+        if total > max_size:
+            evicted.append(raw["_id"])
+    if evicted:
+        _LOG.debug(f"Evict {len(evicted)} cached Shotgrid responses")
+        _drop_responses(evicted)
+    return len(evicted)
+
+
+def ensure_response_indexes() -> None:
+    # Mongo drops responses and pages once past their expiry date, reads
+    # still check it as the TTL monitor only runs every minute
+    for collection in [
+        DbCollection.SHOTGRID_RESPONSES,
+        DbCollection.SHOTGRID_RESPONSE_PAGES,
+    ]:
+        _collection(collection).create_index(
+            "expires_at", expireAfterSeconds=0
+        )
+    _collection(DbCollection.SHOTGRID_RESPONSES).create_index("used_at")
@@ -2,12 +2,13 @@ from typing import Callable
 
 from pymongo import UpdateOne
 from pymongo.collection import Collection
-from pymongo.results import BulkWriteResult
 
 from shotgrid_leecher.record.commands import UpsertProjectUserLinksCommand
 from shotgrid_leecher.record.enums import DbName, DbCollection
+from shotgrid_leecher.record.results import BulkWriteSummary
 from shotgrid_leecher.utils.connectivity import db_collection
 from shotgrid_leecher.utils.logger import get_logger
+from shotgrid_leecher.writers import bulk_writer
 
 _LOG = get_logger(__name__.split(".")[-1])
 
@@ -24,14 +25,14 @@ def delete_links_by_host_url(host_url: str) -> None:
 
 def upsert_project_user_links(
     command: UpsertProjectUserLinksCommand,
-) -> BulkWriteResult:
+) -> BulkWriteSummary:
     links_table = _collection(DbCollection.SHOTGRID_PROJ_USER_LINKS)
-    documents = [
+    documents = (
         UpdateOne(
             {"_id": x.id},
             {"$set": x.to_base_dict()},
             upsert=True,
         )
         for x in command.links
-    ]
-    return links_table.bulk_write(documents)
+    )
+    return bulk_writer.bulk_write(links_table, documents, False)
@@ -0,0 +1,32 @@
+from pymongo import UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult
+
+import shotgrid_leecher.utils.connectivity as conn
+from shotgrid_leecher.record.commands import UpsertShotgridWatermarksCommand
+from shotgrid_leecher.record.enums import DbName, DbCollection
+from shotgrid_leecher.utils.collections import drop_keys
+from shotgrid_leecher.utils.logger import get_logger
+
+_LOG = get_logger(__name__.split(".")[-1])
+
+_collection = conn.db_collection(DbName.LEECHER)
+
+
+def upsert_watermarks(
+    command: UpsertShotgridWatermarksCommand,
+) -> BulkWriteResult:
+    table = _collection(DbCollection.SHOTGRID_WATERMARKS)
+    documents = [
+        UpdateOne(
+            {"_id": x["_id"]},
+            {"$set": drop_keys({"_id"}, x)},
+            upsert=True,
+        )
+        for x in [y.to_mongo() for y in command.watermarks]
+    ]
+    return table.bulk_write(documents)
+
+
+def drop_watermarks(project_name: str) -> DeleteResult:
+    table = _collection(DbCollection.SHOTGRID_WATERMARKS)
+    return table.delete_many({"project_name": project_name})
@@ -0,0 +1,77 @@
+import json
+import os
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import pytest
+
+_ENABLED = bool(os.getenv("RUN_BENCHMARKS"))
+_REPEAT = 3
+_BASELINE_DIR = Path(
+    os.getenv("BENCHMARK_BASELINE_DIR", Path(__file__).parent / ".baselines")
+)
+_SAVE_BASELINE = bool(os.getenv("BENCHMARK_SAVE_BASELINE"))
+_TOLERANCE = float(os.getenv("BENCHMARK_TOLERANCE", 1.5))
+_NOISE = float(os.getenv("BENCHMARK_NOISE", 0.05))
+
+
+def pytest_runtest_setup(item: Any) -> None:
+    if not _ENABLED:
+        pytest.skip("Benchmarks run only when RUN_BENCHMARKS is set")
+
+
+@pytest.fixture
+def measure() -> Callable[[Callable[[], Any]], float]:
+    def _measure(fun: Callable[[], Any]) -> float:
+        return min(timeit.repeat(fun, number=1, repeat=_REPEAT))
+
+    return _measure
+
+
+@pytest.fixture
+def assert_linear(
+    measure: Callable[[Callable[[], Any]], float]
+) -> Callable[[Callable[[int], Callable[[], Any]], int, int], None]:
+    # growing the input 10 times should not cost much more than 10 times
+    def _assert_linear(
+        prepare: Callable[[int], Callable[[], Any]], small: int, large: int
+    ) -> None:
+        small_time = measure(prepare(small))
+        large_time = measure(prepare(large))
+        ratio = large_time / max(small_time, 1e-6)
+        assert ratio < (large / small) * 2.5, (
+            f"{small}: {small_time:.3f}s, {large}: {large_time:.3f}s, "
+            f"{ratio:.1f} times slower"
+        )
+
+    return _assert_linear
+
+
+@pytest.fixture
+def baseline() -> Callable[[str, Dict[str, float]], None]:
+    # baselines are machine specific and stay out of the repository,
+    # BENCHMARK_SAVE_BASELINE records them locally; runs fail on stages
+    # slower than them or missing from them
+    def _compare(name: str, timings: Dict[str, float]) -> None:
+        path = _BASELINE_DIR / f"{name}.json"
+        if _SAVE_BASELINE:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(timings, indent=2, sort_keys=True))
+            return
+        if not path.exists():
+            pytest.skip(
+                f"No {name} baseline in {_BASELINE_DIR}, "
+                "record one with BENCHMARK_SAVE_BASELINE set"
+            )
+        previous = json.loads(path.read_text())
+        missing = sorted(timings.keys() - previous.keys())
+        assert not missing, f"Not in the {name} baseline: {missing}"
+        slower = {
+            k: f"{previous[k]:.3f}s -> {v:.3f}s"
+            for k, v in timings.items()
+            if v > previous[k] * _TOLERANCE + _NOISE
+        }
+        assert not slower, f"Slower than the {name} baseline: {slower}"
+
+    return _compare
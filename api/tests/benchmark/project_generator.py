@@ -0,0 +1,246 @@
+import random
+from typing import Any, Dict, List, Optional, Union
+
+import attr
+
+from shotgrid_leecher.record.enums import ShotgridField, ShotgridType
+
+Map = Dict[str, Any]
+
+_STEPS = ["modeling", "rigging", "render", "layout", "animation"]
+_ASSET_TYPES = ["Character", "Prop", "Set", "FX", "Vehicle"]
+# Shotgrid ids are only unique per entity type, while avalon ids are
+# derived from them: keep ranges apart to avoid spurious collisions
+_PROJECT_ID = 900
+_ASSET_ID_OFFSET = 1_000_000
+_SHOT_ID_OFFSET = 10_000_000
+_SEQUENCE_ID_OFFSET = 20_000_000
+_EPISODE_ID_OFFSET = 30_000_000
+_TASK_ID_OFFSET = 100_000_000
+_LINKED_ONLY = {ShotgridType.SEQUENCE.value, ShotgridType.EPISODE.value}
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ProjectSize:
+    assets: int
+    shots: int
+    episodes: int
+    sequences: int
+    tasks: int
+    links: int
+
+    @property
+    def entities(self) -> int:
+        return sum(attr.astuple(self))
+
+    @staticmethod
+    def scaled(entities: int) -> "ProjectSize":
+        # roughly the shape of a feature production: a task dominated
+        # project, a few hundred shots per episode
+        assets = max(1, int(entities * 0.1))
+        shots = max(1, int(entities * 0.15))
+        return ProjectSize(
+            assets=assets,
+            shots=shots,
+            episodes=max(1, shots // 500),
+            sequences=max(1, shots // 40),
+            tasks=max(1, int(entities * 0.6)),
+            links=max(1, int(entities * 0.15)),
+        )
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class SyntheticProject:
+    project: Map
+    steps: List[Map]
+    assets: List[Map]
+    shots: List[Map]
+    tasks: List[Map]
+    asset_to_asset_links: List[Map]
+    asset_to_shot_links: List[Map]
+    shot_to_shot_links: List[Map]
+
+    def _rows(self, type_: str) -> List[Map]:
+        return {
+            ShotgridType.STEP.value: self.steps,
+            ShotgridType.ASSET.value: self.assets,
+            ShotgridType.SHOT.value: self.shots,
+            ShotgridType.TASK.value: self.tasks,
+            ShotgridType.ASSET_TO_ASSET_LINK.value: self.asset_to_asset_links,
+            ShotgridType.ASSET_TO_SHOT_LINK.value: self.asset_to_shot_links,
+            ShotgridType.SHOT_TO_SHOT_LINK.value: self.shot_to_shot_links,
+        }[type_]
+
+    def find_one(self, type_: str, *_: Any, **__: Any) -> Map:
+        return self.project
+
+    def summarize(self, type_: str, *_: Any, **__: Any) -> Map:
+        # sequences and episodes are only generated as shot links
+        rows = [] if type_ in _LINKED_ONLY else self._rows(type_)
+        return {"summaries": {"id": len(rows)}}
+
+    def find(
+        self,
+        type_: str,
+        filters: List[List[Any]],
+        fields: List[str],
+        limit: int = 0,
+        order: Optional[List[Map]] = None,
+        **_: Any,
+    ) -> Union[List[Map], Map]:
+        if type_ == ShotgridType.PROJECT.value:
+            return self.project
+        rows = self._rows(type_)
+        if not limit or not order:
+            return rows
+        # pages go by the last id seen, the way the entity repo asks for them
+        id_field = order[0]["field_name"]
+        after = [
+            x[2]
+            for x in filters
+            if isinstance(x, list) and x[:2] == [id_field, "greater_than"]
+        ]
+        rows = [x for x in rows if not after or x[id_field] > after[0]]
+        return sorted(rows, key=lambda x: x[id_field])[:limit]
+
+
+def _ref(type_: ShotgridType, id_: int, name: str) -> Map:
+    return {"type": type_.value, "id": id_, "name": name}
+
+
+def _asset(rand: random.Random, id_: int) -> Map:
+    return {
+        "type": ShotgridType.ASSET.value,
+        "id": id_,
+        "code": f"ASSET_{id_}",
+        "sg_asset_type": rand.choice(_ASSET_TYPES),
+        "sg_status_list": "ip",
+        "tasks": [],
+    }
+
+
+def _shot(rand: random.Random, id_: int, size: ProjectSize) -> Map:
+    sequence = rand.randint(1, size.sequences)
+    episode_id = sequence % size.episodes + 1
+    episode = _ref(
+        ShotgridType.EPISODE,
+        _EPISODE_ID_OFFSET + episode_id,
+        f"EP_{episode_id}",
+    )
+    cut_in = rand.randint(1, 1000)
+    return {
+        "type": ShotgridType.SHOT.value,
+        "id": id_,
+        "code": f"SHOT_{id_}",
+        "sg_sequence": _ref(
+            ShotgridType.SEQUENCE,
+            _SEQUENCE_ID_OFFSET + sequence,
+            f"SQ_{sequence}",
+        ),
+        "sg_episode": episode,
+        ShotgridField.SEQUENCE_EPISODE.value: episode,
+        "sg_cut_in": cut_in,
+        "sg_cut_out": cut_in + rand.randint(24, 240),
+        "sg_frame_rate": 25.0,
+        "sg_status_list": "ip",
+        "assets": [],
+    }
+
+
+def _task(rand: random.Random, id_: int, entity: Map) -> Map:
+    step = rand.choice(_STEPS)
+    return {
+        "type": ShotgridType.TASK.value,
+        "id": id_,
+        "content": f"{step}_{id_}",
+        "step": {"name": step},
+        "sg_status_list": "wtg",
+        "task_assignees": [],
+        ShotgridField.ENTITY.value: _ref(
+            ShotgridType(entity["type"]), entity["id"], entity["code"]
+        ),
+    }
+
+
+def _link(
+    type_: ShotgridType,
+    id_: int,
+    parent: str,
+    parent_id: int,
+    child: str,
+    child_id: int,
+) -> Map:
+    return {
+        "type": type_.value,
+        "id": id_,
+        parent: parent_id,
+        child: child_id,
+        "cached_display_name": f"{parent_id} {child_id}",
+        "sg_instance": 1,
+    }
+
+
+def generate_project(size: ProjectSize, seed: int = 42) -> SyntheticProject:
+    rand = random.Random(seed)
+    name = f"Synthetic_{size.entities}"
+    assets = [
+        _asset(rand, _ASSET_ID_OFFSET + x) for x in range(1, size.assets + 1)
+    ]
+    shots = [
+        _shot(rand, _SHOT_ID_OFFSET + x, size)
+        for x in range(1, size.shots + 1)
+    ]
+    entities = assets + shots
+    tasks = [
+        _task(rand, _TASK_ID_OFFSET + x, rand.choice(entities))
+        for x in range(1, size.tasks + 1)
+    ]
+    third = max(1, size.links // 3)
+    return SyntheticProject(
+        project={
+            "type": "Project",
+            "id": _PROJECT_ID,
+            "name": name,
+            "code": name,
+        },
+        steps=[
+            {"id": i, "code": x, "short_name": x[:2]}
+            for i, x in enumerate(_STEPS, 1)
+        ],
+        assets=assets,
+        shots=shots,
+        tasks=tasks,
+        asset_to_asset_links=[
+            _link(
+                ShotgridType.ASSET_TO_ASSET_LINK,
+                x,
+                "parent.Asset.id",
+                rand.choice(assets)["id"],
+                "asset.Asset.id",
+                rand.choice(assets)["id"],
+            )
+            for x in range(third)
+        ],
+        asset_to_shot_links=[
+            _link(
+                ShotgridType.ASSET_TO_SHOT_LINK,
+                x,
+                "asset.Asset.id",
+                rand.choice(assets)["id"],
+                "shot.Shot.id",
+                rand.choice(shots)["id"],
+            )
+            for x in range(third)
+        ],
+        shot_to_shot_links=[
+            _link(
+                ShotgridType.SHOT_TO_SHOT_LINK,
+                x,
+                "parent_shot.Shot.id",
+                rand.choice(shots)["id"],
+                "shot.Shot.id",
+                rand.choice(shots)["id"],
+            )
+            for x in range(size.links - 2 * third)
+        ],
+    )
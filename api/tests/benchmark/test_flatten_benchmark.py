@@ -0,0 +1,33 @@
+from typing import Any, Callable, Dict, List
+
+from shotgrid_leecher.mapper.avalon_mapper import shotgrid_to_avalon
+from shotgrid_leecher.utils.collections import flatten_dict
+from test_task_benchmark import _rows
+
+Map = Dict[str, Any]
+
+_EXCEPTIONS = {"config.tasks", "data.tasks"}
+
+
+def _avalon_rows(n: int) -> List[Map]:
+    # a task light slice of a project, repeated to the wanted row count
+    rows = shotgrid_to_avalon(_rows(5_000))
+    return (rows * (n // len(rows) + 1))[:n]
+
+
+def _flattening(n: int) -> Callable[[], Any]:
+    rows = _avalon_rows(n)
+    return lambda: [flatten_dict(x, _EXCEPTIONS) for x in rows]
+
+
+def test_flatten_dict_is_linear(assert_linear):
+    assert_linear(_flattening, 10_000, 100_000)
+
+
+def test_flatten_dict_avalon_rows(measure, baseline):
+    # Arrange
+    flattening = _flattening(50_000)
+    # Act
+    seconds = measure(flattening)
+    # Assert
+    baseline("flatten_dict_50000", {"flatten": seconds})
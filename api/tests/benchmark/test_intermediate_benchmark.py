@@ -0,0 +1,67 @@
+import gc
+import os
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from _pytest.monkeypatch import MonkeyPatch
+from mongomock import MongoClient
+
+import shotgrid_leecher.repository.shotgrid_hierarchy_repo as hierarchy_repo
+import shotgrid_leecher.utils.connectivity as conn
+from project_generator import ProjectSize, generate_project
+from shotgrid_leecher.record.avalon_structures import AvalonProjectData
+from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
+from shotgrid_leecher.record.queries import ShotgridHierarchyByProjectQuery
+from shotgrid_leecher.record.shotgrid_subtypes import FieldsMapping
+
+_ENTITIES = int(os.getenv("BENCHMARK_ENTITIES", 20_000))
+
+
+def _fun(param: Any) -> Callable[[Any], Any]:
+    return lambda *_: param
+
+
+def test_intermediate_hierarchy_memory(monkeypatch: MonkeyPatch, baseline):
+    # Arrange
+    size = ProjectSize.scaled(_ENTITIES)
+    project = generate_project(size)
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(project))
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    monkeypatch.setattr(
+        hierarchy_repo.entity_repo, "_RESPONSE_CACHE_SECONDS", 0
+    )
+    query = ShotgridHierarchyByProjectQuery(
+        project.project["id"],
+        ShotgridCredentials("https://benchmark", "script", "key"),
+        FieldsMapping.from_dict({}),
+        AvalonProjectData(),
+    )
+    # Act
+    start = time.perf_counter()
+    hierarchy_repo.get_hierarchy_by_project(query)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    # allocations are traced on a second run, tracing skews its timing
+    tracemalloc.start()
+    hierarchy = hierarchy_repo.get_hierarchy_by_project(query)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc_start = time.perf_counter()
+    gc.collect()
+    gc_seconds = time.perf_counter() - gc_start
+    # Assert
+    print(
+        f"{len(hierarchy)} rows, retained {retained / 2 ** 20:.1f}MiB, "
+        f"peak {peak / 2 ** 20:.1f}MiB"
+    )
+    assert len(hierarchy) >= size.assets + size.shots + size.tasks
+    baseline(
+        f"intermediate_hierarchy_{size.entities}",
+        {
+            "hierarchy_seconds": seconds,
+            "gc_seconds": gc_seconds,
+            "retained_mib": retained / 2**20,
+            "peak_mib": peak / 2**20,
+        },
+    )
@@ -0,0 +1,68 @@
+import random
+from typing import Any, Callable, List
+
+import shotgrid_leecher.repository.shotgrid_hierarchy_repo as sut
+from shotgrid_leecher.mapper import intermediate_mapper
+from shotgrid_leecher.record.avalon_structures import AvalonProjectData
+from shotgrid_leecher.record.enums import ShotgridType
+from shotgrid_leecher.record.intermediate_structures import IntermediateRow
+from shotgrid_leecher.record.shotgrid_structures import (
+    ShotgridEntityToEntityLink,
+    ShotgridShot,
+)
+
+_LINKS_PER_SHOT = 20
+
+
+def _links(n: int) -> List[ShotgridEntityToEntityLink]:
+    shots = max(1, n // _LINKS_PER_SHOT)
+    return [
+        ShotgridEntityToEntityLink(
+            x,
+            ShotgridType.ASSET_TO_SHOT_LINK.value,
+            random.randint(1, 10_000),
+            random.randint(1, shots),
+            1,
+        )
+        for x in range(n)
+    ]
+
+
+def _shots(n: int) -> List[IntermediateRow]:
+    return [
+        intermediate_mapper.to_shot(
+            ShotgridShot(
+                id=x,
+                code=f"SHOT_{x}",
+                type=ShotgridType.SHOT.value,
+                params=None,
+                sequence=None,
+                episode=None,
+                sequence_episode=None,
+            ),
+            ",Project,Shots,",
+            intermediate_mapper.to_params(AvalonProjectData()),
+        )
+        for x in range(1, n // _LINKS_PER_SHOT + 1)
+    ]
+
+
+def _link_processing(n: int) -> Callable[[], Any]:
+    links = _links(n)
+    half = n // 2
+    shots = _shots(n)
+    return lambda: sut._link_shots(
+        sut._index_linked_entities(links[:half], links[half:]), shots
+    )
+
+
+def test_link_processing_is_linear(assert_linear):
+    assert_linear(_link_processing, 100_000, 1_000_000)
+
+
+def test_link_indexing_is_linear(assert_linear):
+    def _indexing(n: int) -> Callable[[], Any]:
+        links = _links(n)
+        return lambda: sut._index_linked_entities(links)
+
+    assert_linear(_indexing, 100_000, 1_000_000)
@@ -0,0 +1,134 @@
+import os
+import time
+from typing import Any, Callable, Dict, Iterator
+
+import attr
+from _pytest.monkeypatch import MonkeyPatch
+from mongomock import MongoClient as MockMongoClient
+from pymongo import MongoClient
+
+import shotgrid_leecher.repository.shotgrid_hierarchy_repo as hierarchy_repo
+import shotgrid_leecher.utils.connectivity as conn
+from project_generator import ProjectSize, generate_project
+from shotgrid_leecher.mapper import avalon_mapper, intermediate_mapper
+from shotgrid_leecher.record.avalon_structures import AvalonProjectData
+from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
+from shotgrid_leecher.record.queries import ShotgridHierarchyByProjectQuery
+from shotgrid_leecher.record.shotgrid_subtypes import FieldsMapping
+from shotgrid_leecher.writers import batch_writer
+
+_ENTITIES = int(os.getenv("BENCHMARK_ENTITIES", 20_000))
+_MONGODB_URL = os.getenv("BENCHMARK_MONGODB_URL")
+
+
+def _fun(param: Any) -> Callable[[Any], Any]:
+    return lambda *_: param
+
+
+def _timed(timings: Dict[str, float], stage: str, fun: Callable[[], Any]):
+    start = time.perf_counter()
+    result = fun()
+    timings[stage] = time.perf_counter() - start
+    return result
+
+
+def _staged(
+    timings: Dict[str, float], stage: str, fun: Callable[..., Any]
+) -> Callable[..., Any]:
+    # stands for a stage of the hierarchy build, generators are drained
+    # so their whole work is timed
+    def _stage(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        result = fun(*args, **kwargs)
+        if isinstance(result, Iterator):
+            result = list(result)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    return _stage
+
+
+def _time_hierarchy_stages(
+    monkeypatch: MonkeyPatch, timings: Dict[str, float]
+) -> None:
+    plan = hierarchy_repo._hierarchy_plan
+    monkeypatch.setattr(
+        hierarchy_repo,
+        "_hierarchy_plan",
+        lambda query: [
+            attr.evolve(x, fetch=_staged(timings, f"fetch_{x.name}", x.fetch))
+            for x in plan(query)
+        ],
+    )
+    for stage, name in [
+        ("link_assets", "_link_assets"),
+        ("link_shots", "_link_shots"),
+        ("tasks", "_fetch_project_tasks"),
+    ]:
+        fun = getattr(hierarchy_repo, name)
+        monkeypatch.setattr(hierarchy_repo, name, _staged(timings, stage, fun))
+    monkeypatch.setattr(
+        intermediate_mapper,
+        "map_parent_ids",
+        _staged(timings, "parent_ids", intermediate_mapper.map_parent_ids),
+    )
+
+
+def _db_client() -> Any:
+    # a local mongod gives realistic writer timings, mongomock only
+    # catches algorithmic regressions
+    return MongoClient(_MONGODB_URL) if _MONGODB_URL else MockMongoClient()
+
+
+def test_full_batch_pipeline(monkeypatch: MonkeyPatch, baseline):
+    # Arrange
+    size = ProjectSize.scaled(_ENTITIES)
+    project = generate_project(size)
+    name = project.project["name"]
+    client = _db_client()
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(project))
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    query = ShotgridHierarchyByProjectQuery(
+        project.project["id"],
+        ShotgridCredentials("https://benchmark", "script", "key"),
+        FieldsMapping.from_dict({}),
+        AvalonProjectData(),
+    )
+    timings: Dict[str, float] = dict()
+    _time_hierarchy_stages(monkeypatch, timings)
+    # Act
+    hierarchy = _timed(
+        timings,
+        "hierarchy",
+        lambda: hierarchy_repo.get_hierarchy_by_project(query),
+    )
+    rows = _timed(
+        timings,
+        "avalon_mapping",
+        lambda: avalon_mapper.shotgrid_to_avalon(hierarchy),
+    )
+    _timed(
+        timings,
+        "upsert_avalon_initial",
+        lambda: batch_writer.upsert_avalon_rows(name, rows),
+    )
+    _timed(
+        timings,
+        "upsert_avalon_unchanged",
+        lambda: batch_writer.upsert_avalon_rows(name, rows),
+    )
+    _timed(
+        timings,
+        "sync_intermediate_initial",
+        lambda: batch_writer.sync_intermediate(name, [], hierarchy),
+    )
+    _timed(
+        timings,
+        "sync_intermediate_unchanged",
+        lambda: batch_writer.sync_intermediate(name, hierarchy, hierarchy),
+    )
+    # Assert
+    assert len(hierarchy) >= size.assets + size.shots + size.tasks
+    baseline(f"full_batch_pipeline_{size.entities}", timings)
+    if _MONGODB_URL:
+        client.drop_database(name)
@@ -0,0 +1,52 @@
+import random
+from typing import Any, Callable, List
+
+import shotgrid_leecher.repository.shotgrid_hierarchy_repo as hierarchy_repo
+from shotgrid_leecher.mapper import intermediate_mapper
+from shotgrid_leecher.record.avalon_structures import AvalonProjectData
+from shotgrid_leecher.record.shotgrid_structures import (
+    ShotgridShot,
+    ShotgridShotEpisode,
+    ShotgridShotSequence,
+)
+from shotgrid_leecher.record.shotgrid_subtypes import ShotgridProject
+
+_SHOTS_PER_SEQUENCE = 40
+_SEQUENCES_PER_EPISODE = 12
+
+
+def _shots(shot_num: int) -> List[ShotgridShot]:
+    # an episodic series, a tenth of the shots miss their episode link
+    rand = random.Random(shot_num)
+    shots = []
+    for x in range(shot_num):
+        sequence = x // _SHOTS_PER_SEQUENCE
+        episode = sequence // _SEQUENCES_PER_EPISODE
+        shots.append(
+            ShotgridShot(
+                f"SH{x}",
+                "Shot",
+                x,
+                None,
+                ShotgridShotSequence(sequence, f"SQ{sequence}", "Sequence"),
+                ShotgridShotEpisode(episode, f"EP{episode}", "Episode")
+                if rand.random() > 0.1
+                else None,
+                ShotgridShotEpisode(episode, f"EP{episode}", "Episode"),
+            )
+        )
+    return shots
+
+
+def test_shot_hierarchy_is_linear(assert_linear):
+    project = ShotgridProject(1, "Series", "Project", "series")
+
+    params = intermediate_mapper.to_params(AvalonProjectData())
+
+    def _building(n: int) -> Callable[[], Any]:
+        shots = _shots(n)
+        return lambda: list(
+            hierarchy_repo._tackle_shots(params, project, shots)
+        )
+
+    assert_linear(_building, 10_000, 100_000)
@@ -0,0 +1,68 @@
+import uuid
+from typing import Any, Callable, List
+
+from shotgrid_leecher.mapper.avalon_mapper import shotgrid_to_avalon
+from shotgrid_leecher.record.intermediate_structures import (
+    IntermediateAsset,
+    IntermediateParams,
+    IntermediateProject,
+    IntermediateProjectConfig,
+    IntermediateProjectStep,
+    IntermediateRow,
+    IntermediateTask,
+)
+from shotgrid_leecher.utils.ids import to_object_id
+
+_TASKS_PER_ASSET = 50
+_STEPS = ["modeling", "shading", "rigging"]
+
+
+def _params() -> IntermediateParams:
+    return IntermediateParams(1, 1, 25.0, 1, 1, 0, 0, 1.0, 1080, 1920, [])
+
+
+def _rows(task_num: int) -> List[IntermediateRow]:
+    project = IntermediateProject(
+        id="Project",
+        src_id=1,
+        code="",
+        params=_params(),
+        config=IntermediateProjectConfig(
+            [IntermediateProjectStep(x, x[:1]) for x in _STEPS]
+        ),
+        object_id=to_object_id(1),
+    )
+    assets = [
+        IntermediateAsset(
+            id=f"Asset_{x}",
+            parent=",Project,",
+            src_id=x,
+            params=_params(),
+            linked_entities=[],
+            object_id=to_object_id(x),
+            parent_id=project.object_id,
+        )
+        for x in range(2, task_num // _TASKS_PER_ASSET + 2)
+    ]
+    tasks = [
+        IntermediateTask(
+            id=f"{_STEPS[x % 3]}_{uuid.uuid4().int}",
+            src_id=x,
+            task_type=_STEPS[x % 3],
+            parent=f",Project,{assets[x % len(assets)].id},",
+            params=_params(),
+            object_id=to_object_id(uuid.uuid4().int),
+            parent_id=assets[x % len(assets)].object_id,
+            assigned_users=[],
+        )
+        for x in range(task_num)
+    ]
+    return [project, *assets, *tasks]
+
+
+def test_task_mapping_is_linear(assert_linear):
+    def _mapping(n: int) -> Callable[[], Any]:
+        rows = _rows(n)
+        return lambda: shotgrid_to_avalon(rows)
+
+    assert_linear(_mapping, 20_000, 200_000)
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+import attr
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from assertpy import assert_that
+from mongomock import MongoClient
+
+import shotgrid_leecher.utils.connectivity as conn
+from shotgrid_leecher.domain import batch_domain, batch_job_domain as sut
+from shotgrid_leecher.writers import batch_job_writer
+from shotgrid_leecher.record.avalon_structures import AvalonProjectData
+from shotgrid_leecher.record.commands import UpdateShotgridInAvalonCommand
+from shotgrid_leecher.record.enums import DbCollection, DbName
+from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
+from shotgrid_leecher.record.results import (
+    BatchJobStatus,
+    BatchResult,
+    BatchStage,
+)
+from shotgrid_leecher.record.shotgrid_subtypes import FieldsMapping
+
+
+def _fun(param: Any) -> Callable[[Any], Any]:
+    return lambda *_: param
+
+
+def _command(project_name: str) -> UpdateShotgridInAvalonCommand:
+    return UpdateShotgridInAvalonCommand(
+        1,
+        project_name,
+        False,
+        ShotgridCredentials("https://sg.test", "script", "key"),
+        FieldsMapping.from_dict({}),
+        AvalonProjectData(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_update_job_reports_progress(monkeypatch: MonkeyPatch):
+    # Arrange
+    def _batch(_: Any, progress: Any) -> BatchResult:
+        progress(BatchStage.FETCHED, 10)
+        progress(BatchStage.MAPPED, 8)
+        progress(BatchStage.WRITTEN, 8)
+        return BatchResult.OK
+
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", _batch)
+    # Act
+    job = await sut.submit_update_job(_command(str(uuid.uuid4())))
+    await sut.wait_batch_jobs()
+    actual = sut.fetch_batch_job(job.id)
+    # Assert
+    assert_that(job.status).is_equal_to(BatchJobStatus.QUEUED.value)
+    assert_that(actual.status).is_equal_to(BatchJobStatus.DONE.value)
+    assert_that(actual.result).is_equal_to(BatchResult.OK.value)
+    assert_that(actual.progress).is_equal_to(
+        {"fetched": 10, "mapped": 8, "written": 8}
+    )
+
+
+@pytest.mark.asyncio
+async def test_identical_in_flight_jobs_are_deduplicated(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    release, calls = threading.Event(), []
+
+    def _batch(command: Any, _: Any) -> BatchResult:
+        calls.append(command)
+        release.wait(5)
+        return BatchResult.OK
+
+    name = str(uuid.uuid4())
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", _batch)
+    # Act
+    first = await sut.submit_update_job(_command(name))
+    second = await sut.submit_update_job(_command(name))
+    other = await sut.submit_update_job(_command(str(uuid.uuid4())))
+    release.set()
+    await sut.wait_batch_jobs()
+    after = await sut.submit_update_job(_command(name))
+    await sut.wait_batch_jobs()
+    # Assert
+    assert_that(second.id).is_equal_to(first.id)
+    assert_that(other.id).is_not_equal_to(first.id)
+    assert_that(after.id).is_not_equal_to(first.id)
+    assert_that(calls).is_length(3)
+
+
+@pytest.mark.asyncio
+async def test_failing_job_keeps_error(monkeypatch: MonkeyPatch):
+    # Arrange
+    def _batch(*_: Any) -> BatchResult:
+        raise RuntimeError("Shotgrid is down")
+
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", _batch)
+    # Act
+    job = await sut.submit_update_job(_command(str(uuid.uuid4())))
+    await sut.wait_batch_jobs()
+    actual = sut.fetch_batch_job(job.id)
+    # Assert
+    assert_that(actual.status).is_equal_to(BatchJobStatus.FAILED.value)
+    assert_that(actual.result).is_equal_to(BatchResult.FAILURE.value)
+    assert_that(actual.error).is_equal_to("Shotgrid is down")
+
+
+def test_abandoned_job_is_reported_failed(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = MongoClient()
+    stale = datetime.utcnow() - sut._JOB_STALE_AFTER - timedelta(seconds=1)
+    job = sut._new_job("update", _command(str(uuid.uuid4())))
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    client.get_database(DbName.LEECHER.value).get_collection(
+        DbCollection.BATCH_JOBS.value
+    ).insert_one(
+        {
+            **job.to_mongo(),
+            "status": BatchJobStatus.RUNNING.value,
+            "updated_at": stale,
+        }
+    )
+    # Act
+    actual = sut.fetch_batch_job(job.id)
+    # Assert
+    assert_that(actual.status).is_equal_to(BatchJobStatus.FAILED.value)
+    assert_that(actual.error).is_equal_to("Job abandoned")
+
+
+def test_job_fingerprint_leaves_script_key_out():
+    # Arrange
+    command = _command(str(uuid.uuid4()))
+    rotated = attr.evolve(
+        command,
+        credentials=attr.evolve(command.credentials, script_key="rotated"),
+    )
+    elsewhere = attr.evolve(
+        command,
+        credentials=attr.evolve(command.credentials, shotgrid_url="https://x"),
+    )
+    # Act
+    actual = sut._to_job_fingerprint("update", command)
+    # Assert
+    assert_that(sut._to_job_fingerprint("update", rotated)).is_equal_to(actual)
+    assert_that(sut._to_job_fingerprint("update", elsewhere)).is_not_equal_to(
+        actual
+    )
+
+
+@pytest.mark.asyncio
+async def test_jobs_past_concurrency_stay_queued(monkeypatch: MonkeyPatch):
+    # Arrange
+    started, release = threading.Event(), threading.Event()
+
+    def _batch(*_: Any) -> BatchResult:
+        started.set()
+        release.wait(5)
+        return BatchResult.OK
+
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", _batch)
+    monkeypatch.setattr(sut, "_JOB_EXECUTOR", ThreadPoolExecutor(1))
+    # Act
+    first = await sut.submit_update_job(_command(str(uuid.uuid4())))
+    second = await sut.submit_update_job(_command(str(uuid.uuid4())))
+    await asyncio.get_event_loop().run_in_executor(None, started.wait, 5)
+    running = sut.fetch_batch_job(first.id)
+    waiting = sut.fetch_batch_job(second.id)
+    release.set()
+    await sut.wait_batch_jobs()
+    # Assert
+    assert_that(running.status).is_equal_to(BatchJobStatus.RUNNING.value)
+    assert_that(waiting.status).is_equal_to(BatchJobStatus.QUEUED.value)
+    assert_that(sut.fetch_batch_job(second.id).status).is_equal_to(
+        BatchJobStatus.DONE.value
+    )
+
+
+@pytest.mark.asyncio
+async def test_clean_batch_jobs_off_event_loop(monkeypatch: MonkeyPatch):
+    # Arrange
+    threads = []
+    created_before = datetime.utcnow()
+
+    def _clean(before: datetime) -> None:
+        threads.append((threading.get_ident(), before))
+
+    monkeypatch.setattr(batch_job_writer, "clean_batch_jobs", _clean)
+    # Act
+    await sut.clean_batch_jobs(created_before)
+    # Assert
+    assert_that(threads).is_length(1)
+    assert_that(threads[0][0]).is_not_equal_to(threading.get_ident())
+    assert_that(threads[0][1]).is_equal_to(created_before)
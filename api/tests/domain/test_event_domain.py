@@ -0,0 +1,273 @@
+import uuid
+from typing import Any, Callable, List, Sequence
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from assertpy import assert_that
+from mock import Mock
+
+import shotgrid_leecher.repository.event_cursor_repo as event_cursor_repo
+import shotgrid_leecher.repository.schedule_repo as schedule_repo
+import shotgrid_leecher.repository.shotgrid_entity_repo as entity_repo
+import shotgrid_leecher.repository.shotgrid_events_repo as events_repo
+from shotgrid_leecher.domain import event_domain, schedule_domain
+from shotgrid_leecher.record.commands import (
+    ScheduleShotgridBatchCommand,
+    ScheduleShotgridChangesCommand,
+)
+from shotgrid_leecher.record.enums import ShotgridEventKind, ShotgridType
+from shotgrid_leecher.record.leecher_structures import (
+    ShotgridCredentials,
+    ShotgridEventCursor,
+)
+from shotgrid_leecher.record.shotgrid_structures import (
+    ShotgridEvent,
+    ShotgridEventPage,
+)
+from shotgrid_leecher.record.shotgrid_subtypes import FieldsMapping
+from shotgrid_leecher.writers import event_cursor_writer
+
+_URL = "https://studio.shotgunstudio.com"
+
+
+def _fun(param: Any) -> Callable[[Any], Any]:
+    return lambda *_: param
+
+
+def _command(project_id: int) -> ScheduleShotgridBatchCommand:
+    return ScheduleShotgridBatchCommand(
+        project_id,
+        str(uuid.uuid4()),
+        ShotgridCredentials(_URL, str(uuid.uuid4()), str(uuid.uuid4())),
+        FieldsMapping.from_dict({}),
+    )
+
+
+def _event(
+    id_: int, project_id: int, kind: ShotgridEventKind, entity_id: int = 1
+) -> ShotgridEvent:
+    return ShotgridEvent(id_, kind, ShotgridType.ASSET, entity_id, project_id)
+
+
+def _process(
+    processed: List[Any], skipped: Sequence[int] = ()
+) -> Callable[[Any], Any]:
+    async def _process_changes_now(commands: List[Any]) -> List[Any]:
+        processed.extend(commands)
+        return [x for x in commands if x.batch.project_id in skipped]
+
+    return _process_changes_now
+
+
+@pytest.mark.asyncio
+async def test_consume_events_starts_from_latest(monkeypatch: MonkeyPatch):
+    # Arrange
+    processed, upsert, find = [], Mock(), Mock()
+    monkeypatch.setattr(
+        schedule_repo, "fetch_batch_commands", _fun([_command(1)])
+    )
+    monkeypatch.setattr(event_cursor_repo, "fetch_event_cursor", _fun(None))
+    monkeypatch.setattr(events_repo, "find_last_event_id", _fun(42))
+    monkeypatch.setattr(events_repo, "find_events_after", find)
+    monkeypatch.setattr(event_cursor_writer, "upsert_event_cursor", upsert)
+    monkeypatch.setattr(
+        schedule_domain, "process_changes_now", _process(processed)
+    )
+    # Act
+    await event_domain.consume_shotgrid_events()
+    # Assert
+    assert_that(find.call_count).is_equal_to(0)
+    assert_that(processed).is_empty()
+    assert_that(upsert.call_args[0][0].cursor.last_event_id).is_equal_to(42)
+    assert_that(upsert.call_args[0][0].cursor.shotgrid_url).is_equal_to(_URL)
+
+
+@pytest.mark.asyncio
+async def test_consume_events_syncs_touched_projects(monkeypatch: MonkeyPatch):
+    # Arrange
+    commands = [_command(1), _command(2), _command(3)]
+    cursor = ShotgridEventCursor(_URL, 10, Mock())
+    page = ShotgridEventPage(
+        15,
+        [
+            _event(11, 1, ShotgridEventKind.NEW),
+            _event(12, 1, ShotgridEventKind.CHANGE),
+            _event(13, 3, ShotgridEventKind.RETIREMENT),
+            _event(14, 3, ShotgridEventKind.REVIVAL),
+        ],
+    )
+    processed, upsert = [], Mock()
+    monkeypatch.setattr(schedule_repo, "fetch_batch_commands", _fun(commands))
+    monkeypatch.setattr(event_cursor_repo, "fetch_event_cursor", _fun(cursor))
+    monkeypatch.setattr(events_repo, "find_events_after", _fun(page))
+    monkeypatch.setattr(event_cursor_writer, "upsert_event_cursor", upsert)
+    monkeypatch.setattr(
+        schedule_domain, "process_changes_now", _process(processed)
+    )
+    # Act
+    await event_domain.consume_shotgrid_events()
+    # Assert
+    assert_that(processed).is_equal_to(
+        [
+            ScheduleShotgridChangesCommand(
+                commands[0], {ShotgridType.ASSET: [1]}, dict()
+            ),
+            ScheduleShotgridChangesCommand(
+                commands[2], {ShotgridType.ASSET: [1]}, dict()
+            ),
+        ]
+    )
+    assert_that(upsert.call_args[0][0].cursor.last_event_id).is_equal_to(15)
+
+
+@pytest.mark.asyncio
+async def test_consume_events_hold_cursor_for_skipped_projects(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    commands = [_command(1), _command(2)]
+    cursor = ShotgridEventCursor(_URL, 10, Mock())
+    page = ShotgridEventPage(
+        16,
+        [
+            _event(11, 1, ShotgridEventKind.CHANGE),
+            _event(13, 2, ShotgridEventKind.CHANGE),
+            _event(15, 2, ShotgridEventKind.CHANGE, 2),
+        ],
+    )
+    upsert = Mock()
+    monkeypatch.setattr(schedule_repo, "fetch_batch_commands", _fun(commands))
+    monkeypatch.setattr(event_cursor_repo, "fetch_event_cursor", _fun(cursor))
+    monkeypatch.setattr(events_repo, "find_events_after", _fun(page))
+    monkeypatch.setattr(event_cursor_writer, "upsert_event_cursor", upsert)
+    monkeypatch.setattr(
+        schedule_domain, "process_changes_now", _process([], [2])
+    )
+    # Act
+    await event_domain.consume_shotgrid_events()
+    # Assert
+    assert_that(upsert.call_args[0][0].cursor.last_event_id).is_equal_to(12)
+
+
+@pytest.mark.asyncio
+async def test_consume_events_keep_cursor_when_first_event_skipped(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    commands = [_command(1)]
+    cursor = ShotgridEventCursor(_URL, 10, Mock())
+    page = ShotgridEventPage(12, [_event(11, 1, ShotgridEventKind.CHANGE)])
+    upsert = Mock()
+    monkeypatch.setattr(schedule_repo, "fetch_batch_commands", _fun(commands))
+    monkeypatch.setattr(event_cursor_repo, "fetch_event_cursor", _fun(cursor))
+    monkeypatch.setattr(events_repo, "find_events_after", _fun(page))
+    monkeypatch.setattr(event_cursor_writer, "upsert_event_cursor", upsert)
+    monkeypatch.setattr(
+        schedule_domain, "process_changes_now", _process([], [1])
+    )
+    # Act
+    await event_domain.consume_shotgrid_events()
+    # Assert
+    assert_that(upsert.call_count).is_equal_to(0)
+
+
+@pytest.mark.asyncio
+async def test_consume_events_invalidates_changed_links(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    commands = [_command(1), _command(2)]
+    cursor = ShotgridEventCursor(_URL, 10, Mock())
+    page = ShotgridEventPage(
+        12,
+        [
+            _event(11, 1, ShotgridEventKind.CHANGE),
+            ShotgridEvent(
+                12,
+                ShotgridEventKind.NEW,
+                ShotgridType.ASSET_TO_SHOT_LINK,
+                5,
+                2,
+            ),
+        ],
+    )
+    invalidate = Mock()
+    monkeypatch.setattr(schedule_repo, "fetch_batch_commands", _fun(commands))
+    monkeypatch.setattr(event_cursor_repo, "fetch_event_cursor", _fun(cursor))
+    monkeypatch.setattr(events_repo, "find_events_after", _fun(page))
+    monkeypatch.setattr(event_cursor_writer, "upsert_event_cursor", Mock())
+    monkeypatch.setattr(entity_repo, "invalidate_linked_entities", invalidate)
+    monkeypatch.setattr(schedule_domain, "process_changes_now", _process([]))
+    # Act
+    await event_domain.consume_shotgrid_events()
+    # Assert
+    invalidate.assert_called_once_with(2)
+
+
+@pytest.mark.asyncio
+async def test_consume_events_per_script(monkeypatch: MonkeyPatch):
+    # Arrange
+    commands = [_command(1), _command(2)]
+    cursors = {
+        x.credentials.script_name: ShotgridEventCursor(
+            _URL, 10, Mock(), x.credentials.script_name
+        )
+        for x in commands
+    }
+    find, upsert = Mock(return_value=ShotgridEventPage(12, [])), Mock()
+    monkeypatch.setattr(schedule_repo, "fetch_batch_commands", _fun(commands))
+    monkeypatch.setattr(
+        event_cursor_repo, "fetch_event_cursor", lambda _, x: cursors[x]
+    )
+    monkeypatch.setattr(events_repo, "find_events_after", find)
+    monkeypatch.setattr(event_cursor_writer, "upsert_event_cursor", upsert)
+    monkeypatch.setattr(schedule_domain, "process_changes_now", _process([]))
+    # Act
+    await event_domain.consume_shotgrid_events()
+    # Assert
+    assert_that([x[0][0] for x in find.call_args_list]).extracting(
+        "credentials", "project_ids"
+    ).is_equal_to([(x.credentials, [x.project_id]) for x in commands])
+    assert_that([x[0][0].cursor for x in upsert.call_args_list]).extracting(
+        "script_name"
+    ).is_equal_to([x.credentials.script_name for x in commands])
+
+
+def test_to_changes_command_splits_retirements():
+    # Arrange
+    command = _command(1)
+    changes = {
+        (ShotgridType.ASSET, 7): ShotgridEventKind.CHANGE,
+        (ShotgridType.ASSET, 8): ShotgridEventKind.RETIREMENT,
+        (ShotgridType.TASK, 9): ShotgridEventKind.REVIVAL,
+        (ShotgridType.ASSET_TO_SHOT_LINK, 5): ShotgridEventKind.NEW,
+    }
+    # Act
+    actual = event_domain._to_changes_command(command, changes)
+    # Assert
+    assert_that(actual.changed_ids).is_equal_to(
+        {ShotgridType.ASSET: [7], ShotgridType.TASK: [9]}
+    )
+    assert_that(actual.retired_ids).is_equal_to({ShotgridType.ASSET: [8]})
+
+
+def test_coalesce_keeps_latest_event_per_entity():
+    # Arrange
+    events = [
+        _event(1, 1, ShotgridEventKind.NEW, 7),
+        _event(2, 1, ShotgridEventKind.CHANGE, 8),
+        _event(3, 1, ShotgridEventKind.RETIREMENT, 7),
+        _event(4, 2, ShotgridEventKind.CHANGE, 7),
+    ]
+    # Act
+    actual = event_domain._coalesce(events)
+    # Assert
+    assert_that(actual).is_equal_to(
+        {
+            1: {
+                (ShotgridType.ASSET, 7): ShotgridEventKind.RETIREMENT,
+                (ShotgridType.ASSET, 8): ShotgridEventKind.CHANGE,
+            },
+            2: {(ShotgridType.ASSET, 7): ShotgridEventKind.CHANGE},
+        }
+    )
@@ -1,5 +1,9 @@
+import asyncio
 import random
+import threading
+import time
 import uuid
+from datetime import timedelta
 from typing import Any, Callable
 
 import pytest
@@ -13,7 +17,11 @@ from shotgrid_leecher.record.avalon_structures import (
     AvalonProject,
     AvalonProjectData,
 )
-from shotgrid_leecher.record.commands import ScheduleShotgridBatchCommand
+from shotgrid_leecher.record.commands import (
+    ScheduleShotgridBatchCommand,
+    ScheduleShotgridChangesCommand,
+)
+from shotgrid_leecher.record.enums import ShotgridType
 from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
 from shotgrid_leecher.record.results import BatchResult, GroupAndCountResult
 from shotgrid_leecher.record.shotgrid_subtypes import FieldsMapping
@@ -29,12 +37,12 @@ async def _async_f(param: Any):
     return lambda *_: param
 
 
-def _get_schedule_command() -> ScheduleShotgridBatchCommand:
+def _get_schedule_command(url=None) -> ScheduleShotgridBatchCommand:
     return ScheduleShotgridBatchCommand(
-        random.randint(10 ** 2, 10 ** 5),
+        random.randint(10**2, 10**5),
         str(uuid.uuid4()),
         ShotgridCredentials(
-            str(uuid.uuid4()),
+            url or str(uuid.uuid4()),
             str(uuid.uuid4()),
             str(uuid.uuid4()),
         ),
@@ -45,7 +53,7 @@ def _get_schedule_command() -> ScheduleShotgridBatchCommand:
 def _get_group_result() -> GroupAndCountResult:
     return GroupAndCountResult(
         str(uuid.uuid4()),
-        random.randint(10 ** 2, 10 ** 5),
+        random.randint(10**2, 10**5),
     )
 
 
@@ -59,8 +67,9 @@ async def test_queue_scheduled_when_no_commands(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(schedule_repo, "fetch_batch_commands", fetch)
     monkeypatch.setattr(schedule_writer, "queue_requests", queue)
     # Act
-    await schedule_domain.queue_scheduled_batches()
+    actual = await schedule_domain.queue_scheduled_batches()
     # Assert
+    assert_that(actual).is_none()
     assert_that(queue.call_count).is_equal_to(0)
 
 
@@ -96,6 +105,7 @@ async def test_dequeue_and_process_when_success(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", batch)
     monkeypatch.setattr(schedule_writer, "dequeue_request", dequeue)
     monkeypatch.setattr(schedule_writer, "log_batch_result", log)
+    monkeypatch.setattr(schedule_writer, "ack_request", Mock())
     # Act
     await schedule_domain.dequeue_and_process_batches()
 
@@ -127,6 +137,7 @@ async def test_dequeue_and_process_when_no_hierarchy(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", batch)
     monkeypatch.setattr(schedule_writer, "dequeue_request", dequeue)
     monkeypatch.setattr(schedule_writer, "log_batch_result", log)
+    monkeypatch.setattr(schedule_writer, "ack_request", Mock())
     # Act
     await schedule_domain.dequeue_and_process_batches()
 
@@ -156,6 +167,7 @@ async def test_dequeue_and_process_when_failure(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(schedule_repo, "count_projects", count)
     monkeypatch.setattr(schedule_writer, "dequeue_request", dequeue)
     monkeypatch.setattr(schedule_writer, "log_batch_result", log)
+    monkeypatch.setattr(schedule_writer, "ack_request", Mock())
     # Act
     await schedule_domain.dequeue_and_process_batches()
     # Assert
@@ -164,3 +176,204 @@ async def test_dequeue_and_process_when_failure(monkeypatch: MonkeyPatch):
         BatchResult.FAILURE
     )
     assert_that(log.call_args_list[0][0][0].data["exception"]).is_equal_to(ex)
+
+
+def _tracked_batch(running: list, peaks: list) -> Callable[[Any], Any]:
+    lock = threading.Lock()
+
+    def _batch(_: Any) -> BatchResult:
+        with lock:
+            running.append(1)
+            peaks.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+        return BatchResult.OK
+
+    return _batch
+
+
+@pytest.mark.asyncio
+async def test_dequeue_and_process_concurrently(monkeypatch: MonkeyPatch):
+    # Arrange
+    project = AvalonProject("", "", AvalonProjectData(), dict())
+    running, peaks, log = [], [], Mock()
+    dequeue = Mock(
+        side_effect=lambda *_: _get_schedule_command(f"https://{uuid.uuid4()}")
+    )
+    monkeypatch.setattr(schedule_domain, "_BATCH_WORKERS", 3)
+    monkeypatch.setattr(avalon_repo, "fetch_project", _fun(project))
+    monkeypatch.setattr(schedule_repo, "count_projects", _fun(5))
+    batch = _tracked_batch(running, peaks)
+    monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", batch)
+    monkeypatch.setattr(schedule_writer, "dequeue_request", dequeue)
+    monkeypatch.setattr(schedule_writer, "log_batch_result", log)
+    monkeypatch.setattr(schedule_writer, "ack_request", Mock())
+    # Act
+    await schedule_domain.dequeue_and_process_batches()
+    # Assert
+    assert_that(log.call_count).is_equal_to(6)
+    assert_that(dequeue.call_count).is_equal_to(6)
+    assert_that(max(peaks)).is_equal_to(3)
+
+
+@pytest.mark.asyncio
+async def test_dequeue_and_process_limits_same_host(monkeypatch: MonkeyPatch):
+    # Arrange
+    project = AvalonProject("", "", AvalonProjectData(), dict())
+    url = "https://studio.shotgunstudio.com"
+    running, peaks, log = [], [], Mock()
+    dequeue = Mock(
+        side_effect=lambda _, busy: None
+        if "studio.shotgunstudio.com" in busy
+        else _get_schedule_command(url)
+    )
+    monkeypatch.setattr(schedule_domain, "_BATCH_WORKERS", 4)
+    monkeypatch.setattr(schedule_domain, "_HOST_CONCURRENCY", 2)
+    monkeypatch.setattr(avalon_repo, "fetch_project", _fun(project))
+    monkeypatch.setattr(schedule_repo, "count_projects", _fun(5))
+    batch = _tracked_batch(running, peaks)
+    monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", batch)
+    monkeypatch.setattr(schedule_writer, "dequeue_request", dequeue)
+    monkeypatch.setattr(schedule_writer, "log_batch_result", log)
+    monkeypatch.setattr(schedule_writer, "ack_request", Mock())
+    # Act
+    await schedule_domain.dequeue_and_process_batches()
+    # Assert
+    assert_that(log.call_count).is_equal_to(6)
+    assert_that(max(peaks)).is_equal_to(2)
+
+
+@pytest.mark.asyncio
+async def test_drain_batch_workers_stops_dequeuing(monkeypatch: MonkeyPatch):
+    # Arrange
+    project = AvalonProject("", "", AvalonProjectData(), dict())
+    running, peaks, log = [], [], Mock()
+    dequeue = Mock(side_effect=lambda *_: _get_schedule_command())
+    monkeypatch.setattr(schedule_domain, "_BATCH_WORKERS", 2)
+    monkeypatch.setattr(schedule_domain, "_DRAINING", threading.Event())
+    monkeypatch.setattr(avalon_repo, "fetch_project", _fun(project))
+    monkeypatch.setattr(schedule_repo, "count_projects", _fun(20))
+    batch = _tracked_batch(running, peaks)
+    monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", batch)
+    monkeypatch.setattr(schedule_writer, "dequeue_request", dequeue)
+    monkeypatch.setattr(schedule_writer, "log_batch_result", log)
+    monkeypatch.setattr(schedule_writer, "ack_request", Mock())
+    # Act
+    processing = asyncio.ensure_future(
+        schedule_domain.dequeue_and_process_batches()
+    )
+    await asyncio.sleep(0.02)
+    await schedule_domain.drain_batch_workers()
+    # Assert
+    assert_that(processing.done()).is_true()
+    assert_that(running).is_empty()
+    assert_that(log.call_count).is_equal_to(dequeue.call_count)
+    assert_that(log.call_count).is_less_than(24)
+
+
+@pytest.mark.asyncio
+async def test_dequeue_and_process_keeps_and_acks_lease(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    project = AvalonProject("", "", AvalonProjectData(), dict())
+    command = _get_schedule_command()
+    log, extend, ack = Mock(), Mock(return_value=True), Mock()
+    dequeue = Mock(side_effect=[command, None])
+
+    def _batch(_: Any) -> BatchResult:
+        time.sleep(0.1)
+        return BatchResult.OK
+
+    monkeypatch.setattr(
+        schedule_writer, "get_lease_duration", _fun(timedelta(seconds=0.06))
+    )
+    monkeypatch.setattr(avalon_repo, "fetch_project", _fun(project))
+    monkeypatch.setattr(schedule_repo, "count_projects", _fun(1))
+    monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", _batch)
+    monkeypatch.setattr(schedule_writer, "dequeue_request", dequeue)
+    monkeypatch.setattr(schedule_writer, "log_batch_result", log)
+    monkeypatch.setattr(schedule_writer, "extend_request_lease", extend)
+    monkeypatch.setattr(schedule_writer, "ack_request", ack)
+    # Act
+    await schedule_domain.dequeue_and_process_batches()
+    # Assert
+    assert_that(extend.call_count).is_greater_than_or_equal_to(1)
+    assert_that(extend.call_args[0][0]).is_equal_to(command)
+    ack.assert_called_once_with(command)
+
+
+@pytest.mark.asyncio
+async def test_process_changes_now_limits_workers(monkeypatch: MonkeyPatch):
+    # Arrange
+    project = AvalonProject("", "", AvalonProjectData(), dict())
+    commands = [
+        ScheduleShotgridChangesCommand(
+            _get_schedule_command(f"https://{uuid.uuid4()}"),
+            {ShotgridType.ASSET: [1]},
+            dict(),
+        )
+        for _ in range(6)
+    ]
+    leased = iter(x.batch for x in commands)
+    running, peaks, log = [], [], Mock()
+    monkeypatch.setattr(schedule_domain, "_BATCH_WORKERS", 2)
+    monkeypatch.setattr(avalon_repo, "fetch_project", _fun(project))
+    batch = _tracked_batch(running, peaks)
+    monkeypatch.setattr(
+        batch_domain, "update_shotgrid_changes_in_avalon", batch
+    )
+    monkeypatch.setattr(schedule_writer, "queue_requests", Mock())
+    monkeypatch.setattr(
+        schedule_writer, "dequeue_request", lambda *_: next(leased)
+    )
+    monkeypatch.setattr(schedule_writer, "log_batch_result", log)
+    monkeypatch.setattr(schedule_writer, "ack_request", Mock())
+    # Act
+    await schedule_domain.process_changes_now(commands)
+    # Assert
+    assert_that(log.call_count).is_equal_to(6)
+    assert_that(max(peaks)).is_equal_to(2)
+
+
+@pytest.mark.asyncio
+async def test_refresh_schedule_metrics_off_the_event_loop(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def _queue_size() -> int:
+        threads.append(threading.get_ident())
+        return 7
+
+    monkeypatch.setattr(schedule_repo, "queue_size", _queue_size)
+    # Act
+    await schedule_domain.refresh_schedule_metrics()
+    # Assert
+    assert_that(threads).does_not_contain(loop_thread)
+    assert_that(schedule_domain._QUEUE_DEPTH.value()).is_equal_to(7)
+
+
+@pytest.mark.asyncio
+async def test_acquire_timer_lease_off_the_event_loop(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def _acquire(*_: Any) -> bool:
+        threads.append(threading.get_ident())
+        return True
+
+    monkeypatch.setattr(schedule_writer, "acquire_timer_lease", _acquire)
+    # Act
+    actual = await schedule_domain.acquire_timer_lease(
+        "timer", timedelta(minutes=1)
+    )
+    # Assert
+    assert_that(actual).is_true()
+    assert_that(threads).is_length(1).does_not_contain(loop_thread)
@@ -1,9 +1,11 @@
 import random
 import uuid
+from datetime import datetime, timedelta
 from typing import Any, Callable, List
 from unittest.mock import Mock
 
 import attr
+import pytest
 from _pytest.monkeypatch import MonkeyPatch
 from assertpy import assert_that
 from mongomock import MongoClient
@@ -11,6 +13,7 @@ from mongomock import MongoClient
 import shotgrid_leecher.repository.shotgrid_hierarchy_repo as repository
 import shotgrid_leecher.utils.connectivity as conn
 from shotgrid_leecher.domain import batch_domain as sut
+from shotgrid_leecher.mapper import intermediate_mapper
 from shotgrid_leecher.record.avalon_structures import AvalonProjectData
 from shotgrid_leecher.record.commands import UpdateShotgridInAvalonCommand
 from shotgrid_leecher.record.enums import ShotgridType
@@ -24,8 +27,12 @@ from shotgrid_leecher.record.intermediate_structures import (
     IntermediateProjectConfig,
     IntermediateProjectStep,
 )
-from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
-from shotgrid_leecher.record.results import BatchResult
+from shotgrid_leecher.record.leecher_structures import (
+    ShotgridCredentials,
+    ShotgridWatermark,
+)
+from shotgrid_leecher.record.results import BatchResult, BatchStage
+from shotgrid_leecher.record.shotgrid_structures import ShotgridEntitySummary
 from shotgrid_leecher.record.shotgrid_subtypes import (
     FieldsMapping,
     ProjectFieldsMapping,
@@ -37,9 +44,12 @@ from shotgrid_leecher.record.shotgrid_subtypes import (
     ShotToShotLinkMapping,
     AssetToAssetLinkMapping,
 )
-from shotgrid_leecher.repository import intermediate_hierarchy_repo
+from shotgrid_leecher.repository import (
+    intermediate_hierarchy_repo,
+    watermark_repo,
+)
 from shotgrid_leecher.utils.ids import to_object_id
-from shotgrid_leecher.writers import batch_writer
+from shotgrid_leecher.writers import batch_writer, watermark_writer
 
 TASK_NAMES = ["lines", "color", "look", "dev"]
 STEP_NAMES = ["modeling", "shading", "rigging"]
@@ -363,3 +373,264 @@ def test_shotgrid_to_avalon_batch_update_wrong_project_name(
 
     # Assert
     assert_that(res).is_equal_to(BatchResult.WRONG_PROJECT_NAME)
+
+
+def _summaries() -> dict:
+    return {
+        x: ShotgridEntitySummary(x, random.randint(1, 100), datetime.utcnow())
+        for x in ShotgridType.watermarked_types()
+    }
+
+
+def _watermarks(
+    command: UpdateShotgridInAvalonCommand, full_sync_at: datetime
+) -> dict:
+    return {
+        x: ShotgridWatermark(
+            command.project_name,
+            x.value,
+            random.randint(1, 100),
+            datetime.utcnow(),
+            sut._fingerprint(command),
+            full_sync_at,
+        )
+        for x in ShotgridType.watermarked_types()
+    }
+
+
+def _incremental_command(project: IntermediateProject):
+    return UpdateShotgridInAvalonCommand(
+        123,
+        project.id,
+        False,
+        ShotgridCredentials("", "", ""),
+        _default_fields_mapping(),
+        AvalonProjectData(),
+        incremental=True,
+    )
+
+
+def _patch_incremental(
+    monkeypatch: MonkeyPatch,
+    data: List[IntermediateRow],
+    watermarks: dict,
+    summaries: dict,
+) -> None:
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    monkeypatch.setattr(
+        intermediate_hierarchy_repo, "fetch_by_project", _fun(data)
+    )
+    monkeypatch.setattr(watermark_repo, "fetch_watermarks", _fun(watermarks))
+    monkeypatch.setattr(
+        repository, "get_summaries_by_project", _fun(summaries)
+    )
+    monkeypatch.setattr(batch_writer, "overwrite_intermediate", _fun(None))
+    monkeypatch.setattr(batch_writer, "upsert_avalon_rows", _fun(None))
+
+
+def test_shotgrid_to_avalon_batch_update_incremental(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    project = _get_project()
+    data = [project, _get_asset_group(project)]
+    command = _incremental_command(project)
+    full_sync_at = datetime.utcnow() - timedelta(hours=1)
+    summaries = _summaries()
+    full = Mock(return_value=data)
+    delta = Mock(return_value=data)
+    upsert_watermarks = Mock()
+    _patch_incremental(
+        monkeypatch, data, _watermarks(command, full_sync_at), summaries
+    )
+    monkeypatch.setattr(repository, "get_hierarchy_by_project", full)
+    monkeypatch.setattr(repository, "get_hierarchy_delta_by_project", delta)
+    monkeypatch.setattr(
+        watermark_writer, "upsert_watermarks", upsert_watermarks
+    )
+
+    # Act
+    actual = sut.update_shotgrid_in_avalon(command)
+
+    # Assert
+    assert_that(actual).is_equal_to(BatchResult.OK)
+    assert_that(full.call_count).is_equal_to(0)
+    assert_that(delta.call_args[0][0].summaries).is_equal_to(summaries)
+    assert_that(delta.call_args[0][1]).is_equal_to(data)
+    watermarks = upsert_watermarks.call_args[0][0].watermarks
+    assert_that(watermarks).extracting("count").is_equal_to(
+        [x.count for x in summaries.values()]
+    )
+    assert_that(watermarks).extracting("full_sync_at").is_equal_to(
+        [full_sync_at] * len(summaries)
+    )
+
+
+def test_shotgrid_to_avalon_batch_update_incremental_fallback(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    project = _get_project()
+    data = [project, _get_asset_group(project)]
+    command = _incremental_command(project)
+    outdated = datetime.utcnow() - timedelta(days=30)
+    full = Mock(return_value=data)
+    delta = Mock(return_value=data)
+    upsert_watermarks = Mock()
+    _patch_incremental(
+        monkeypatch, data, _watermarks(command, outdated), _summaries()
+    )
+    monkeypatch.setattr(repository, "get_hierarchy_by_project", full)
+    monkeypatch.setattr(repository, "get_hierarchy_delta_by_project", delta)
+    monkeypatch.setattr(
+        watermark_writer, "upsert_watermarks", upsert_watermarks
+    )
+
+    # Act
+    actual = sut.update_shotgrid_in_avalon(command)
+
+    # Assert
+    assert_that(actual).is_equal_to(BatchResult.OK)
+    assert_that(full.call_count).is_equal_to(1)
+    assert_that(delta.call_count).is_equal_to(0)
+    watermarks = upsert_watermarks.call_args[0][0].watermarks
+    assert_that(watermarks[0].full_sync_at).is_greater_than(outdated)
+
+
+def _streaming_command(project: IntermediateProject, streaming: bool):
+    return UpdateShotgridInAvalonCommand(
+        123,
+        project.id,
+        False,
+        ShotgridCredentials("", "", ""),
+        _default_fields_mapping(),
+        AvalonProjectData(),
+        streaming=streaming,
+    )
+
+
+def _patch_hierarchy(monkeypatch: MonkeyPatch, data: List) -> None:
+    # random uuid ids do not fit in bson integers
+    rows = intermediate_mapper.map_parent_ids(
+        [
+            attr.evolve(x, src_id=i) if x.src_id else x
+            for i, x in enumerate(data, 1)
+        ]
+    )
+    monkeypatch.setattr(repository, "get_hierarchy_by_project", _fun(rows))
+    monkeypatch.setattr(
+        repository, "iter_hierarchy_by_project", lambda _: iter(rows)
+    )
+
+
+def _stored(client: MongoClient, project: IntermediateProject) -> dict:
+    return {
+        x.name: sorted(
+            x.get_collection(project.id).find(), key=lambda y: str(y["_id"])
+        )
+        for x in [client["avalon"], client["shotgrid_openpype"]]
+    }
+
+
+def test_shotgrid_to_avalon_batch_update_streaming_matches_batch(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    project = _get_project()
+    asset_grp = _get_asset_group(project)
+    shot_grp = _get_shot_group(project)
+    data = [
+        project,
+        asset_grp,
+        *_get_prp_asset_with_tasks(asset_grp, 3),
+        shot_grp,
+    ]
+    batch_client, stream_client = MongoClient(), MongoClient()
+    progress = Mock()
+    _patch_hierarchy(monkeypatch, data)
+    monkeypatch.setattr(sut, "_STREAM_CHUNK_SIZE", 2)
+    monkeypatch.setattr(conn, "get_db_client", _fun(batch_client))
+    sut.update_shotgrid_in_avalon(_streaming_command(project, False))
+    monkeypatch.setattr(conn, "get_db_client", _fun(stream_client))
+
+    # Act
+    actual = sut.update_shotgrid_in_avalon(
+        _streaming_command(project, True), progress
+    )
+
+    # Assert
+    assert_that(actual).is_equal_to(BatchResult.OK)
+    assert_that(_stored(stream_client, project)).is_equal_to(
+        _stored(batch_client, project)
+    )
+    assert_that(progress.call_args_list[-1][0]).is_equal_to(
+        (BatchStage.WRITTEN, 5)
+    )
+
+
+def test_shotgrid_to_avalon_batch_update_streaming_deletes_at_the_end(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = MongoClient()
+    project = _get_project()
+    asset_grp = _get_asset_group(project)
+    assets = _get_prp_assets(asset_grp)
+    data = [project, asset_grp, *assets]
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    _patch_hierarchy(monkeypatch, data)
+    sut.update_shotgrid_in_avalon(_streaming_command(project, True))
+    _patch_hierarchy(monkeypatch, data[:-1])
+
+    # Act
+    actual = sut.update_shotgrid_in_avalon(_streaming_command(project, True))
+
+    # Assert
+    stored = _stored(client, project)
+    assert_that(actual).is_equal_to(BatchResult.OK)
+    assert_that(stored["avalon"]).extracting("_id").is_equal_to(
+        sorted([x.object_id for x in data[:-1]], key=str)
+    )
+    assert_that(stored["shotgrid_openpype"]).is_length(3)
+
+
+def test_shotgrid_to_avalon_batch_update_streaming_wrong_project_name(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = MongoClient()
+    project = _get_project()
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    _patch_hierarchy(monkeypatch, [project, _get_asset_group(project)])
+    command = attr.evolve(
+        _streaming_command(project, True), project_name="Other"
+    )
+
+    # Act
+    actual = sut.update_shotgrid_in_avalon(command)
+
+    # Assert
+    assert_that(actual).is_equal_to(BatchResult.WRONG_PROJECT_NAME)
+    assert_that(client["avalon"].list_collection_names()).is_empty()
+
+
+def test_shotgrid_to_avalon_batch_update_streaming_unknown_task_types(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = MongoClient()
+    project = _get_project()
+
+    def _unknown_task_types(_):
+        raise RuntimeError("Task types {'fx'} are unknown")
+        yield project
+
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    monkeypatch.setattr(
+        repository, "iter_hierarchy_by_project", _unknown_task_types
+    )
+
+    # Act/Assert
+    with pytest.raises(RuntimeError):
+        sut.update_shotgrid_in_avalon(_streaming_command(project, True))
+    assert_that(client["avalon"].list_collection_names()).is_empty()
@@ -1,4 +1,6 @@
+import asyncio
 import random
+import time
 import uuid
 from typing import Any, Dict, List
 from unittest.mock import Mock
@@ -6,7 +8,6 @@ from unittest.mock import Mock
 import pytest
 from _pytest.monkeypatch import MonkeyPatch
 from assertpy import assert_that
-from fastapi import HTTPException
 from mongomock import MongoClient, ObjectId
 
 import shotgrid_leecher.repository.shotgrid_hierarchy_repo as repository
@@ -18,7 +19,7 @@ from asset import (
     delete_asset_data,
     assets_without_types_data,
 )
-from shotgrid_leecher.controller import batch_controller
+from shotgrid_leecher.domain import batch_domain
 from shotgrid_leecher.mapper import intermediate_mapper
 from shotgrid_leecher.record.avalon_structures import (
     AvalonProject,
@@ -26,9 +27,11 @@ from shotgrid_leecher.record.avalon_structures import (
 )
 from shotgrid_leecher.record.enums import DbName, ShotgridType
 from shotgrid_leecher.record.intermediate_structures import IntermediateRow
+from shotgrid_leecher.record.results import BatchJobStatus, BatchResult
 from shotgrid_leecher.repository import avalon_repo, config_repo
 from shotgrid_leecher.utils.ids import to_object_id
 from utils.funcs import (
+    run_batch_update,
     batch_config,
     avalon_collections,
     all_avalon,
@@ -178,7 +181,7 @@ async def test_batch_assets_without_types(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, batch_config())
+    await run_batch_update(project_id, batch_config())
 
     # Assert
     assert_that(all_avalon_by_type(client, "asset")).is_length(1)
@@ -205,10 +208,12 @@ async def test_update_shotgrid_to_avalon_empty(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
 
     # Act
-    await batch_controller.batch_update("1", batch_config())
+    await run_batch_update("1", batch_config())
 
     # Assert
-    assert_that(client.list_database_names()).is_length(0)
+    assert_that(client.list_database_names()).is_equal_to(
+        [DbName.LEECHER.value]
+    )
 
 
 @pytest.mark.asyncio
@@ -230,11 +235,11 @@ async def test_update_shotgrid_to_avalon_init_project(
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
 
     # Act
-    await batch_controller.batch_update(data[0].id, batch_config())
+    await run_batch_update(data[0].id, batch_config())
 
     # Assert
     assert_that(client.list_database_names()).is_equal_to(
-        [DbName.INTERMEDIATE.value, DbName.AVALON.value]
+        [DbName.LEECHER.value, DbName.INTERMEDIATE.value, DbName.AVALON.value]
     )
     assert_that(avalon_collections(client)).is_equal_to([data[0].id])
     assert_that(intermediate_collections(client)).is_equal_to([data[0].id])
@@ -260,7 +265,7 @@ async def test_update_shotgrid_to_avalon_update_project(
         project.id
     ).insert_one(project_avalon_init_data)
     # Act
-    await batch_controller.batch_update(project.id, batch_config(False))
+    await run_batch_update(project.id, batch_config(False))
 
     # Assert
     assert_that(all_avalon(client)).is_length(1)
@@ -312,15 +317,17 @@ async def test_update_batch_when_projects_with_different_source_name(
         data[0].id
     ).insert_one(project_avalon_init_data)
 
-    with pytest.raises(HTTPException) as ex:
-        # Act
-        await batch_controller.batch_update(
-            "fictitious_project_name",
-            batch_config(False),
-        )
-        # Assert
-        assert_that(ex.status_code).is_equal_to(500)
-        assert_that(all_avalon(client)).is_length(1)
+    # Act
+    actual = await run_batch_update(
+        "fictitious_project_name",
+        batch_config(False),
+    )
+    # Assert
+    assert_that(actual).contains_entry(
+        {"status": BatchJobStatus.FAILED.value},
+        {"result": BatchResult.WRONG_PROJECT_NAME.value},
+    )
+    assert_that(all_avalon(client)).is_length(1)
 
 
 @pytest.mark.asyncio
@@ -346,7 +353,7 @@ async def test_update_shotgrid_to_avalon_update_project_tasks(
         project.id
     ).insert_one(project_avalon_init_data)
     # Act
-    await batch_controller.batch_update(project.id, batch_config())
+    await run_batch_update(project.id, batch_config())
 
     # Assert
     assert_that(all_avalon(client)).extracting(
@@ -379,7 +386,7 @@ async def test_update_shotgrid_to_avalon_init_asset(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
 
     # Act
-    await batch_controller.batch_update(project_id, batch_config())
+    await run_batch_update(project_id, batch_config())
 
     # Assert
     assert_that(all_avalon(client)).extracting("type").is_equal_to(
@@ -421,7 +428,7 @@ async def test_update_shotgrid_to_avalon_overwrite(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, batch_config())
+    await run_batch_update(project_id, batch_config())
 
     # Assert
     assert_that(avalon_collections(client)).is_length(1)
@@ -463,7 +470,7 @@ async def test_update_shotgrid_to_avalon_update_values(
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
 
     # Act
-    await batch_controller.batch_update(project_id, batch_config())
+    await run_batch_update(project_id, batch_config())
 
     # Assert
     assert_that(all_avalon(client)).is_length(
@@ -516,7 +523,7 @@ async def test_update_shotgrid_to_avalon_update_asset_type(
     monkeypatch.setattr(conn, "get_db_client", fun(client))
 
     # Act
-    await batch_controller.batch_update(project_id, batch_config(False))
+    await run_batch_update(project_id, batch_config(False))
 
     # Assert
     assert_that(all_avalon(client)).is_length(
@@ -560,8 +567,41 @@ async def test_update_shotgrid_when_some_assets_deleted(
     )
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     # Act
-    await batch_controller.batch_update(project_id, batch_config(False))
+    await run_batch_update(project_id, batch_config(False))
     # Assert
     assert_that(all_avalon(client)).is_length(
         len(delete_asset_data.AVALON_DATA) - 2
     )
+
+
+@pytest.mark.asyncio
+async def test_batch_update_does_not_block_event_loop(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    project = AvalonProject("", "", AvalonProjectData(), dict())
+    ticks: List[float] = []
+
+    def _slow_batch(*_: Any) -> BatchResult:
+        time.sleep(0.3)
+        return BatchResult.OK
+
+    async def _tick() -> None:
+        for _ in range(10):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(avalon_repo, "fetch_project", fun(project))
+    monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
+    monkeypatch.setattr(conn, "get_db_client", fun(MongoClient()))
+    monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", _slow_batch)
+    # Act
+    start = time.perf_counter()
+    job, _ = await asyncio.gather(
+        run_batch_update("project", batch_config()),
+        _tick(),
+    )
+    # Assert
+    assert_that(job["result"]).is_equal_to(BatchResult.OK.value)
+    assert_that(ticks).is_length(10)
+    assert_that(ticks[-1] - start).is_less_than(0.3)
@@ -17,6 +17,7 @@ from shotgrid_leecher.record.results import BatchCheckResult
 from shotgrid_leecher.repository import config_repo
 from shotgrid_leecher.utils import connectivity as conn
 from utils.funcs import (
+    run_batch_update,
     fun,
     all_avalon,
     populate_db,
@@ -69,7 +70,7 @@ async def test_batch_first_level_virtual_orphans(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
 
     # Act
-    await batch_controller.batch_update(project_id, batch_config())
+    await run_batch_update(project_id, batch_config())
 
     # Assert
     assert_that(all_avalon(client)).is_length(
@@ -8,7 +8,6 @@ from bson import ObjectId
 from mongomock.mongo_client import MongoClient
 
 from asset import params_data
-from shotgrid_leecher.controller import batch_controller
 from shotgrid_leecher.record.avalon_structures import (
     AvalonProject,
     AvalonProjectData,
@@ -17,6 +16,7 @@ from shotgrid_leecher.record.enums import DbName, ShotgridType
 from shotgrid_leecher.repository import avalon_repo, config_repo
 from shotgrid_leecher.utils import connectivity as conn
 from utils.funcs import (
+    run_batch_update,
     sg_query,
     batch_config,
     fun,
@@ -66,7 +66,7 @@ async def test_batch_cut_data_at_intermediate_lvl(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, batch_config())
+    await run_batch_update(project_id, batch_config())
 
     # Assert
     assert_that(
@@ -134,7 +134,7 @@ async def test_batch_frame_data_at_intermediate_lvl(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, batch_config())
+    await run_batch_update(project_id, batch_config())
 
     # Assert
     assert_that(
@@ -202,7 +202,7 @@ async def test_batch_cut_data_at_avalon_lvl(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, batch_config())
+    await run_batch_update(project_id, batch_config())
 
     # Assert
     assert_that(all_avalon_by_type(client, "asset")).extracting(
@@ -244,7 +244,7 @@ async def test_batch_frame_data_at_avalon_lvl(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, batch_config())
+    await run_batch_update(project_id, batch_config())
 
     # Assert
     assert_that(all_avalon_by_type(client, "asset")).extracting(
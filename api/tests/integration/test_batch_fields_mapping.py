@@ -8,7 +8,6 @@ from bson import ObjectId
 from mongomock.mongo_client import MongoClient
 
 from asset import fields_mapping_data
-from shotgrid_leecher.controller import batch_controller
 from shotgrid_leecher.record.avalon_structures import (
     AvalonProject,
     AvalonProjectData,
@@ -18,6 +17,7 @@ from shotgrid_leecher.record.http_models import BatchConfig
 from shotgrid_leecher.repository import avalon_repo, config_repo
 from shotgrid_leecher.utils import connectivity as conn
 from utils.funcs import (
+    run_batch_update,
     batch_config,
     avalon_collections,
     fun,
@@ -59,9 +59,7 @@ async def test_batch_with_fields_mapping(monkeypatch: MonkeyPatch):
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(
-        project_id, _batch_config(fields_mapping)
-    )
+    await run_batch_update(project_id, _batch_config(fields_mapping))
 
     # Assert
     assert_that(avalon_collections(client)).is_length(1)
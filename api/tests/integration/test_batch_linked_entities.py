@@ -8,12 +8,12 @@ from mock import Mock
 from mongomock.mongo_client import MongoClient
 
 from asset import linked_entities_data
-from shotgrid_leecher.controller import batch_controller
 from shotgrid_leecher.record.enums import DbName
 from shotgrid_leecher.repository import config_repo
 from shotgrid_leecher.utils import connectivity as conn
 from shotgrid_leecher.utils.ids import to_object_id
 from utils.funcs import (
+    run_batch_update,
     all_intermediate,
     batch_config,
     fun,
@@ -69,7 +69,7 @@ async def test_batch_with_linked_entities_propagation_without_history(
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, config)
+    await run_batch_update(project_id, config)
     # Assert
     assert_that(_avalon_input_links(client)).is_length(6)
     assert_that(_avalon_input_links(client)).extracting(
@@ -118,7 +118,7 @@ async def test_batch_with_linked_entities_at_intermediate_level(
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, config)
+    await run_batch_update(project_id, config)
     # Assert
     assert_that(_intermediate_entity_links(client)).extracting(
         "link_type", filter={"link_type": "AssetAssetConnection"}
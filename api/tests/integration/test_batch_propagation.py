@@ -5,11 +5,11 @@ from mock import Mock
 from mongomock.mongo_client import MongoClient
 
 from asset import propagation_data
-from shotgrid_leecher.controller import batch_controller
 from shotgrid_leecher.record.enums import DbName, AvalonType
 from shotgrid_leecher.repository import config_repo
 from shotgrid_leecher.utils import connectivity as conn
 from utils.funcs import (
+    run_batch_update,
     batch_config,
     fun,
     all_avalon,
@@ -37,7 +37,7 @@ async def test_batch_propagation_without_project_recreation(
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, config)
+    await run_batch_update(project_id, config)
     # Assert
     assert_that(all_avalon(client)).extracting(
         "name", filter={"type": "project"}
@@ -66,7 +66,7 @@ async def test_batch_with_project_to_children_fps_propagation(
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, config)
+    await run_batch_update(project_id, config)
     # Assert
     assert_that(all_avalon(client)).extracting(
         "data", filter={"type": "asset"}
@@ -101,7 +101,7 @@ async def test_batch_with_project_to_children_tools_env_propagation(
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, config)
+    await run_batch_update(project_id, config)
     # Assert
     assert_that(all_avalon(client)).extracting(
         "data", filter={"type": "asset"}
@@ -136,7 +136,7 @@ async def test_batch_with_project_to_children_pixel_aspect_propagation(
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, config)
+    await run_batch_update(project_id, config)
     # Assert
     assert_that(all_avalon(client)).extracting(
         "data", filter={"type": "asset"}
@@ -171,7 +171,7 @@ async def test_batch_with_project_to_children_partial_cut_in_propagation(
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, config)
+    await run_batch_update(project_id, config)
     # Assert
     assert_that(all_avalon(client)).extracting(
         "data", filter={"name": "SHOT10"}
@@ -204,7 +204,7 @@ async def test_batch_with_project_to_children_partial_cut_out_propagation(
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     monkeypatch.setattr(config_repo, "find_credentials_by_url", creds)
     # Act
-    await batch_controller.batch_update(project_id, config)
+    await run_batch_update(project_id, config)
     # Assert
     assert_that(all_avalon(client)).extracting(
         "data", filter={"name": "SHOT10"}
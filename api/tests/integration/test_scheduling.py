@@ -1,5 +1,5 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, Any, List
 
 import pytest
@@ -10,8 +10,11 @@ from mongomock.mongo_client import MongoClient
 
 from shotgrid_leecher.controller import schedule_controller
 from shotgrid_leecher.domain import batch_domain, schedule_domain
-from shotgrid_leecher.record.commands import ScheduleShotgridBatchCommand
-from shotgrid_leecher.record.enums import DbName, DbCollection
+from shotgrid_leecher.record.commands import (
+    ScheduleShotgridBatchCommand,
+    ScheduleShotgridChangesCommand,
+)
+from shotgrid_leecher.record.enums import DbName, DbCollection, ShotgridType
 from shotgrid_leecher.record.results import BatchResult
 from shotgrid_leecher.repository import avalon_repo, config_repo
 from shotgrid_leecher.utils import connectivity as conn
@@ -129,6 +132,7 @@ async def test_dequeue_scheduled_batches_part_success(
     _rollin_projects(client, 3)
     monkeypatch.setattr(batch_domain, "update_shotgrid_in_avalon", _batch)
     monkeypatch.setattr(avalon_repo, "fetch_project", fun(project))
+    monkeypatch.setattr(schedule_domain, "_BATCH_WORKERS", 1)
     monkeypatch.setattr(conn, "get_db_client", fun(client))
     # Act
     await schedule_domain.dequeue_and_process_batches()
@@ -141,3 +145,57 @@ async def test_dequeue_scheduled_batches_part_success(
             BatchResult.NO_SHOTGRID_HIERARCHY.value,
         ]
     )
+
+
+@pytest.mark.asyncio
+async def test_process_changes_now_skips_leased_projects(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = MongoClient()
+    project = get_project(f"project_{str(uuid.uuid4())[:5]}")
+    batch = Mock(return_value=BatchResult.OK)
+    commands = [
+        ScheduleShotgridBatchCommand.from_http_model(
+            f"project_{str(uuid.uuid4())[:5]}", creds(""), batch_config()
+        )
+        for _ in range(2)
+    ]
+    monkeypatch.setattr(avalon_repo, "fetch_project", fun(project))
+    monkeypatch.setattr(
+        batch_domain, "update_shotgrid_changes_in_avalon", batch
+    )
+    monkeypatch.setattr(conn, "get_db_client", fun(client))
+    client.get_database(DbName.SCHEDULE.value).get_collection(
+        DbCollection.SCHEDULE_QUEUE.value
+    ).insert_one(
+        {
+            "_id": commands[1].project_name,
+            "command": commands[1].to_dict(),
+            "datetime": datetime.utcnow(),
+            "lease_owner": "other",
+            "lease_expires_at": datetime.utcnow() + timedelta(minutes=5),
+        }
+    )
+    changes = [
+        ScheduleShotgridChangesCommand(x, {ShotgridType.ASSET: [1]}, {})
+        for x in commands
+    ]
+    # Act
+    actual = await schedule_domain.process_changes_now(changes)
+
+    # Assert
+    assert_that(actual).is_equal_to(changes[1:])
+    assert_that(_all_logs(client)).extracting("project_name").is_equal_to(
+        [commands[0].project_name]
+    )
+    assert_that(batch.call_args[0][0].changed_ids).is_equal_to(
+        {ShotgridType.ASSET: [1]}
+    )
+    assert_that(
+        list(
+            client.get_database(DbName.SCHEDULE.value)
+            .get_collection(DbCollection.SCHEDULE_QUEUE.value)
+            .find({})
+        )
+    ).extracting("_id").is_equal_to([commands[1].project_name])
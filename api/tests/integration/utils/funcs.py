@@ -1,5 +1,5 @@
 import uuid
-from typing import Any, List, Union, Dict, Callable
+from typing import Any, List, Union, Dict, Callable, Optional
 
 import attr
 from mongomock.object_id import ObjectId
@@ -7,6 +7,8 @@ from pymongo import MongoClient
 from pymongo.collection import Collection
 from toolz import curry
 
+from shotgrid_leecher.controller import batch_controller
+from shotgrid_leecher.domain import batch_job_domain
 from shotgrid_leecher.record.avalon_structures import (
     AvalonProject,
     AvalonProjectData,
@@ -25,9 +27,26 @@ def sg_query(
     type_: str,
     filters: List[List[Any]],
     fields: List[str],
+    limit: int = 0,
+    order: Optional[List[Map]] = None,
+    **_: Any,
 ) -> Union[List[Map], Map]:
     if type_ == ShotgridType.PROJECT.value:
         return data.SHOTGRID_DATA_PROJECT[0]
+    rows = _sg_rows(data, type_)
+    if not limit or not order:
+        return rows
+    id_field = order[0]["field_name"]
+    after = [
+        x[2]
+        for x in filters
+        if isinstance(x, list) and x[:2] == [id_field, "greater_than"]
+    ]
+    # the data files list rows the way Shotgrid would order them
+    return [x for x in rows if not after or x[id_field] > after[0]][:limit]
+
+
+def _sg_rows(data: Any, type_: str) -> List[Map]:
     if type_ == ShotgridType.ASSET.value:
         return data.SHOTGRID_DATA_ASSETS
     if type_ == ShotgridType.SHOT.value:
@@ -125,3 +144,9 @@ def get_project(name: str) -> AvalonProject:
         data=AvalonProjectData(tools_env=[str(uuid.uuid4())]),
         config=dict(),
     )
+
+
+async def run_batch_update(project_name: str, config: BatchConfig) -> Map:
+    job = await batch_controller.batch_update(project_name, config)
+    await batch_job_domain.wait_batch_jobs()
+    return await batch_controller.batch_job(job["id"])
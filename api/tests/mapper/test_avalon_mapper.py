@@ -7,7 +7,10 @@ import attr
 from assertpy import assert_that
 
 from shotgrid_leecher.mapper import intermediate_mapper
-from shotgrid_leecher.mapper.avalon_mapper import shotgrid_to_avalon
+from shotgrid_leecher.mapper.avalon_mapper import (
+    shotgrid_to_avalon,
+    stream_to_avalon,
+)
 from shotgrid_leecher.record.avalon_structures import AvalonProjectData
 from shotgrid_leecher.record.enums import ShotgridType
 from shotgrid_leecher.record.intermediate_structures import (
@@ -229,6 +232,30 @@ def test_shotgrid_to_avalon_assets():
     assert_that(actual).is_length(4)
 
 
+def test_shotgrid_to_avalon_fingerprints():
+    # Arrange
+    project = _get_project()
+    asset_grp = _get_asset_group(project)
+    data = [project, asset_grp, *_get_prp_assets(asset_grp)]
+    renamed = [attr.evolve(data[-1], id="Renamed")]
+
+    # Act
+    actual = shotgrid_to_avalon(data)
+    same = shotgrid_to_avalon(data)
+    changed = shotgrid_to_avalon([*data[:-1], *renamed])
+
+    # Assert
+    assert_that(actual).extracting("fingerprint").is_equal_to(
+        [x["fingerprint"] for x in same]
+    )
+    assert_that(actual[:-1]).extracting("fingerprint").is_equal_to(
+        [x["fingerprint"] for x in changed[:-1]]
+    )
+    assert_that(actual[-1]["fingerprint"]).is_not_equal_to(
+        changed[-1]["fingerprint"]
+    )
+
+
 def test_shotgrid_to_avalon_assets_hierarchy():
     # Arrange
     project = _get_project()
@@ -270,6 +297,26 @@ def test_shotgrid_to_avalon_assets_with_tasks():
     )
 
 
+def test_shotgrid_to_avalon_assets_with_duplicated_task_names():
+    # Arrange
+    project = _get_project()
+    asset_grp = _get_asset_group(project)
+    data = _get_prp_asset_with_tasks(asset_grp, 3)
+    contents = ["lines", "lines", "color"]
+    tasks = [
+        attr.evolve(x, id=f"{contents[i]}_{x.src_id}")
+        for i, x in enumerate(data[2:])
+    ]
+
+    # Act
+    actual = shotgrid_to_avalon([project, asset_grp, *data[:2], *tasks])
+
+    # Assert
+    assert_that(list(actual[-1]["data"]["tasks"].keys())).is_equal_to(
+        ["lines", tasks[1].id, "color"]
+    )
+
+
 def test_shotgrid_to_avalon_assets_with_tasks_values():
     # Arrange
     task_num = 3
@@ -354,3 +401,38 @@ def test_shotgrid_to_avalon_shots_hierarchy():
     assert_that(actual[8]["data"]["visualParent"]).is_equal_to(
         data[7].object_id
     )
+
+
+def test_stream_to_avalon_matches_shotgrid_to_avalon():
+    # Arrange
+    project = _get_project()
+    asset_grp = _get_asset_group(project)
+    shot_grp = _get_shot_group(project)
+    data = intermediate_mapper.map_parent_ids(
+        [
+            project,
+            asset_grp,
+            *_get_prp_asset_with_tasks(asset_grp, 3),
+            shot_grp,
+            *_get_ep_with_seq_with_shot(shot_grp),
+            *_get_seq_with_shot(shot_grp),
+        ]
+    )
+
+    # Act
+    actual = list(stream_to_avalon(iter(data)))
+
+    # Assert
+    assert_that(actual).is_equal_to(shotgrid_to_avalon(data))
+
+
+def test_stream_to_avalon_needs_project_first():
+    # Arrange
+    project = _get_project()
+    asset_grp = _get_asset_group(project)
+
+    # Act/Assert
+    assert_that(list(stream_to_avalon([]))).is_empty()
+    assert_that(stream_to_avalon([asset_grp, project]).__next__).raises(
+        ValueError
+    ).when_called_with()
@@ -6,12 +6,17 @@ import attr
 from assertpy import assert_that
 
 from shotgrid_leecher.mapper import entity_mapper
-from shotgrid_leecher.record.enums import ShotgridField, ShotgridType
+from shotgrid_leecher.record.enums import (
+    ShotgridField,
+    ShotgridType,
+    ShotgridEventKind,
+)
 from shotgrid_leecher.record.shotgrid_structures import (
     ShotgridAsset,
     ShotgridShot,
     ShotgridTask,
     ShotgridEntityToEntityLink,
+    ShotgridEvent,
 )
 from shotgrid_leecher.record.shotgrid_subtypes import (
     ProjectFieldsMapping,
@@ -266,3 +271,35 @@ def test_to_asset_to_asset_link_without_quantity():
     )
     # Assert
     assert_that(actual.quantity).is_equal_to(1)
+
+
+def test_to_shotgrid_event_from_meta():
+    # Arrange
+    raw = {
+        "id": 101,
+        "event_type": "Shotgun_Asset_Retirement",
+        "entity": None,
+        "meta": {"entity_id": 7, "entity_type": "Asset"},
+        "project": {"type": "Project", "id": 3},
+    }
+    # Act
+    actual = entity_mapper.to_shotgrid_event(raw)
+    # Assert
+    assert_that(actual).is_equal_to(
+        ShotgridEvent(
+            101, ShotgridEventKind.RETIREMENT, ShotgridType.ASSET, 7, 3
+        )
+    )
+
+
+def test_to_shotgrid_event_ignores_unknown_types():
+    # Arrange
+    raws = [
+        {"id": 1, "event_type": "Shotgun_Version_New", "entity": {"id": 2}},
+        {"id": 1, "event_type": "Shotgun_Asset_View", "entity": {"id": 2}},
+        {"id": 1, "event_type": "Shotgun_Asset", "entity": {"id": 2}},
+    ]
+    # Act
+    actual = [entity_mapper.to_shotgrid_event(x) for x in raws]
+    # Assert
+    assert_that(actual).is_equal_to([None, None, None])
@@ -3,15 +3,25 @@ import uuid
 from assertpy import assert_that
 from toolz import compose
 
-from shotgrid_leecher.mapper.intermediate_mapper import to_shot
+from shotgrid_leecher.mapper.intermediate_mapper import (
+    to_shot,
+    to_linked_shot,
+    to_params,
+    map_parent_ids,
+    stream_parent_ids,
+    to_project,
+    to_top_shot,
+)
 from shotgrid_leecher.record.avalon_structures import AvalonProjectData
 from shotgrid_leecher.record.intermediate_structures import IntermediateShot
+from shotgrid_leecher.record.shotgrid_subtypes import ShotgridProject
 from shotgrid_leecher.record.shotgrid_structures import (
     ShotgridShot,
     ShotgridShotParams,
 )
 
 _S = compose(str, uuid.uuid4)
+_PARAMS = to_params(AvalonProjectData())
 _I64 = compose(
     lambda x: x if x % 5 == 0 else None,
     lambda: uuid.uuid4().int,
@@ -31,7 +41,7 @@ def test_to_shot_row_without_params():
         None,
     )
     # Act
-    actual = to_shot(shot, _S(), AvalonProjectData())
+    actual = to_shot(shot, _S(), _PARAMS)
     # Assert
     assert_that(actual).is_type_of(IntermediateShot)
     assert_that(set(actual.to_dict().keys())).is_equal_to(
@@ -74,14 +84,84 @@ def test_to_shot_row_with_params():
         None,
         status=str(uuid.uuid4()),
     )
-    project_data = AvalonProjectData()
+    project_params = to_params(AvalonProjectData())
     # Act
-    actual = to_shot(shot, _S(), project_data)
+    actual = to_shot(shot, _S(), project_params)
     # Assert
     assert_that(actual).is_type_of(IntermediateShot)
     assert_that(actual.params.clip_in).is_equal_to(
-        params.cut_in or project_data.clip_in
+        params.cut_in or project_params.clip_in
     )
     assert_that(actual.params.clip_out).is_equal_to(
-        params.cut_out or project_data.clip_out
+        params.cut_out or project_params.clip_out
+    )
+
+
+def test_to_linked_shot_without_links_keeps_row():
+    # Arrange
+    shot = ShotgridShot(_S(), _S(), 1, None, None, None, None, None)
+    row = to_shot(shot, _S(), _PARAMS)
+    # Act
+    actual = to_linked_shot({}, row)
+    # Assert
+    assert_that(actual).is_same_as(row)
+    assert_that(row.has_field("linked_entities")).is_true()
+    assert_that(row.has_field("config")).is_false()
+
+
+def test_map_parent_ids_keeps_rows_already_mapped():
+    # Arrange
+    project = to_project(
+        ShotgridProject(1, "Project", "Project", "project"),
+        [],
+        _PARAMS,
+    )
+    shot = ShotgridShot("SH01", _S(), 2, None, None, None, None, None)
+    rows = [project, to_shot(shot, ",Project,", _PARAMS)]
+    mapped = map_parent_ids(rows)
+    # Act
+    actual = map_parent_ids(mapped)
+    # Assert
+    assert_that(mapped[1].parent_id).is_equal_to(project.object_id)
+    assert_that(actual[0]).is_same_as(mapped[0])
+    assert_that(actual[1]).is_same_as(mapped[1])
+
+
+def _shot_rows():
+    sg_project = ShotgridProject(1, "Project", "Project", "project")
+    project = to_project(sg_project, [], _PARAMS)
+    top = to_top_shot(sg_project, _PARAMS)
+    shots = [
+        to_shot(
+            ShotgridShot(f"SH0{x}", _S(), x, None, None, None, None, None),
+            ",Project,Shots,",
+            _PARAMS,
+        )
+        for x in range(3, 6)
+    ]
+    return [project, top, *shots]
+
+
+def test_stream_parent_ids_holds_rows_back_until_parent_shows_up():
+    # Arrange
+    project, top, *shots = _shot_rows()
+    rows = [project, shots[0], shots[1], top, shots[2]]
+    # Act
+    actual = list(stream_parent_ids(rows))
+    # Assert
+    assert_that([x.id for x in actual]).is_equal_to(
+        ["Project", "Shots", "SH03", "SH04", "SH05"]
+    )
+    assert_that(actual).is_equal_to(map_parent_ids([project, top, *shots]))
+
+
+def test_stream_parent_ids_releases_orphans_at_the_end():
+    # Arrange
+    project, _, *shots = _shot_rows()
+    # Act
+    actual = list(stream_parent_ids([shots[0], project, shots[1]]))
+    # Assert
+    assert_that([x.id for x in actual]).is_equal_to(
+        ["Project", "SH03", "SH04"]
     )
+    assert_that([x.parent_id for x in actual[1:]]).is_equal_to([None, None])
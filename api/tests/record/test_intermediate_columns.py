@@ -0,0 +1,138 @@
+from assertpy import assert_that
+
+from shotgrid_leecher.mapper import intermediate_mapper
+from shotgrid_leecher.record.avalon_structures import AvalonProjectData
+from shotgrid_leecher.record.enums import ShotgridType
+from shotgrid_leecher.record.intermediate_structures import (
+    IntermediateColumns,
+    IntermediatePathIndex,
+    IntermediateGroup,
+    IntermediateProject,
+    IntermediateProjectConfig,
+    IntermediateShot,
+    IntermediateTask,
+)
+from shotgrid_leecher.utils.ids import to_object_id
+
+_PARAMS = intermediate_mapper.to_params(AvalonProjectData())
+
+
+def _hierarchy():
+    project = IntermediateProject(
+        id="Project",
+        src_id=1,
+        code="project",
+        config=IntermediateProjectConfig(),
+        params=_PARAMS,
+        object_id=to_object_id(1),
+    )
+    group = IntermediateGroup(
+        id="Shots",
+        parent=",Project,",
+        params=_PARAMS,
+        object_id=to_object_id("Shots"),
+    )
+    shot = IntermediateShot(
+        id="SH01",
+        parent=",Project,Shots,",
+        params=_PARAMS,
+        src_id=2,
+        linked_entities=[],
+        object_id=to_object_id(2),
+    )
+    task = IntermediateTask(
+        id="layout_3",
+        parent="".join([",Project,Shots,", "SH01,"]),
+        params=_PARAMS,
+        task_type="layout",
+        src_id=3,
+        assigned_users=[],
+        object_id=to_object_id(3),
+    )
+    return [project, group, shot, task]
+
+
+def test_columns_resolve_parent_ids():
+    # Arrange
+    rows = _hierarchy()
+    # Act
+    actual = IntermediateColumns.from_rows(rows).parent_ids()
+    # Assert
+    assert_that(actual).is_equal_to(
+        [None, rows[0].object_id, rows[1].object_id, rows[2].object_id]
+    )
+
+
+def test_columns_intern_parent_paths():
+    # Arrange
+    rows = _hierarchy()
+    # Act
+    actual = IntermediateColumns.from_rows(rows)
+    # Assert
+    assert_that(actual.parents[3]).is_equal_to(rows[3].parent)
+    assert_that(actual.parents[3]).is_same_as(
+        IntermediateColumns.from_rows(_hierarchy()).parents[3]
+    )
+
+
+def test_columns_find_positions_missing_from_other():
+    # Arrange
+    rows = _hierarchy()
+    previous = IntermediateColumns.from_rows(rows)
+    current = IntermediateColumns.from_rows(rows[:2] + [rows[3]])
+    # Act
+    actual = previous.positions_missing_from(current)
+    # Assert
+    assert_that(actual).is_equal_to([2])
+
+
+def test_columns_select_rows_by_type_in_order():
+    # Arrange
+    rows = _hierarchy()
+    columns = IntermediateColumns.from_rows(rows)
+    types = [ShotgridType.SHOT, ShotgridType.GROUP]
+    # Act
+    actual = columns.rows_of(types)
+    # Assert
+    assert_that(actual).is_equal_to([rows[1], rows[2]])
+    assert_that(list(columns)).is_equal_to(rows)
+
+
+def test_columns_index_rows_by_src_id():
+    # Arrange
+    rows = _hierarchy()
+    # Act
+    actual = IntermediateColumns.from_rows(rows).by_src_id()
+    # Assert
+    assert_that(actual).is_equal_to({1: rows[0], 2: rows[2], 3: rows[3]})
+
+
+def test_path_index_lineage_matches_split_paths():
+    # Arrange
+    paths = [
+        ",Project,",
+        ",Project,Shots,",
+        ",Project,Shots,EP01,SQ01,",
+        ",Project,Assets,Character,",
+        "Project,Assets,",
+        ",",
+    ]
+    index = IntermediatePathIndex.from_rows(_hierarchy())
+    # Act
+    actual = [index.lineage(x) for x in paths]
+    # Assert
+    assert_that(actual).is_equal_to([x.split(",")[2:-1] for x in paths])
+
+
+def test_path_index_links_nodes_to_parents():
+    # Arrange
+    rows = _hierarchy()
+    index = IntermediatePathIndex.from_rows(rows)
+    # Act
+    actual = index.node(rows[3].parent)
+    # Assert
+    assert_that(actual.name).is_equal_to("SH01")
+    assert_that(actual.parent.path).is_equal_to(rows[2].parent)
+    assert_that(actual.parent).is_same_as(index.node(",Project,Shots,"))
+    assert_that(index.object_id(actual.path)).is_equal_to(rows[2].object_id)
+    assert_that(index.object_id(None)).is_none()
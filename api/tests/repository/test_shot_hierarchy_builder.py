@@ -0,0 +1,161 @@
+import random
+from typing import List, Iterator, Optional
+
+import pytest
+from assertpy import assert_that
+from toolz import pipe
+from toolz.curried import (
+    filter as where,
+    map as select,
+    groupby,
+    unique,
+)
+
+import shotgrid_leecher.repository.shotgrid_hierarchy_repo as sut
+from shotgrid_leecher.mapper import intermediate_mapper as mapper
+from shotgrid_leecher.record.avalon_structures import AvalonProjectData
+from shotgrid_leecher.record.enums import TopMediaLevelType
+from shotgrid_leecher.record.intermediate_structures import (
+    IntermediateParams,
+    IntermediateRow,
+)
+from shotgrid_leecher.record.shotgrid_structures import (
+    ShotgridShot,
+    ShotgridShotEpisode,
+    ShotgridShotParams,
+    ShotgridShotSequence,
+)
+from shotgrid_leecher.record.shotgrid_subtypes import ShotgridProject
+
+_PROJECT = ShotgridProject(1, "Project", "Project", "project")
+
+
+def _legacy_shot_rows(
+    params: IntermediateParams,
+    project: ShotgridProject,
+    raw_shots: List[ShotgridShot],
+) -> Iterator[IntermediateRow]:
+    # the four passes the single pass builder replaced, kept as oracle
+    archetype = TopMediaLevelType.SHOTS.value
+
+    def _patch_up(shot: ShotgridShot) -> ShotgridShot:
+        if shot.episode or not shot.sequence:
+            return shot
+        if not shot.sequence_episode:
+            return shot
+        return shot.copy_with_episode(shot.sequence_episode)
+
+    shots = pipe(raw_shots, select(_patch_up), list)
+    for shot in shots:
+        if shot.sequence_name() and shot.episode_name():
+            continue
+        if not shot.episode and not shot.sequence:
+            parent_path = f",{project.name},{archetype},"
+            yield mapper.to_shot(shot, parent_path, params)
+        if not shot.episode and shot.sequence:
+            parent_path = f",{project.name},{archetype},{shot.sequence.name},"
+            yield mapper.to_shot(shot, parent_path, params)
+        if shot.episode and not shot.sequence:
+            parent_path = f",{project.name},{archetype},{shot.episode.name},"
+            yield mapper.to_shot(shot, parent_path, params)
+    episode_groups = pipe(
+        shots,
+        where(lambda x: x.episode_name()),
+        groupby(lambda x: x.episode_name()),
+    )
+    for ep_shots in episode_groups.values():
+        yield mapper.to_episode_shot_group(
+            ep_shots[-1].episode, project, params
+        )
+    sequence_groups = pipe(
+        shots,
+        where(lambda x: x.sequence_name()),
+        groupby(lambda x: x.sequence_name()),
+    )
+    for sq_shots in sequence_groups.values():
+        for shot in unique(sq_shots, lambda x: x.episode_id()):
+            episode = shot.episode_name()
+            base_path = f",{project.name},{archetype},"
+            parent_path = f"{base_path}{episode}," if episode else base_path
+            yield mapper.to_sequence_shot_group(
+                shot.sequence, parent_path, params
+            )
+    for shot in shots:
+        if not (shot.sequence_name() and shot.episode_name()):
+            continue
+        episode = shot.episode_name()
+        sequence_ = shot.sequence_name()
+        parent_path = f",{project.name},{archetype},{episode},{sequence_},"
+        yield mapper.to_shot(shot, parent_path, params)
+
+
+def _maybe(rand: random.Random, value):
+    return value if rand.random() < 0.7 else None
+
+
+def _episode(rand: random.Random) -> Optional[ShotgridShotEpisode]:
+    id_ = rand.randint(1, 6)
+    name = rand.choice([f"EP{id_}", f"EP{id_}", ""])
+    return _maybe(rand, ShotgridShotEpisode(id_, name, "Episode"))
+
+
+def _random_shot(rand: random.Random, id_: int) -> ShotgridShot:
+    sequence_id = rand.randint(1, 8)
+    sequence_name = rand.choice([f"SQ{sequence_id}", f"SQ{sequence_id}", ""])
+    cut_in = rand.randint(1, 100)
+    return ShotgridShot(
+        code=f"SH{id_}",
+        type="Shot",
+        id=id_,
+        params=_maybe(
+            rand,
+            ShotgridShotParams(
+                cut_in, cut_in + 10, None, None, None, None, 10, 25, None, None
+            ),
+        ),
+        sequence=_maybe(
+            rand, ShotgridShotSequence(sequence_id, sequence_name, "Sequence")
+        ),
+        episode=_episode(rand),
+        sequence_episode=_episode(rand),
+        status=_maybe(rand, "ip"),
+    )
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_single_pass_shots_match_legacy_passes(seed: int):
+    # Arrange
+    rand = random.Random(seed)
+    shots = [_random_shot(rand, x) for x in range(rand.randint(0, 300))]
+    params = mapper.to_params(AvalonProjectData())
+    expected = list(_legacy_shot_rows(params, _PROJECT, shots))
+    # Act
+    actual = list(sut._tackle_shots(params, _PROJECT, shots))
+    # Assert
+    assert_that(actual).is_equal_to(expected)
+
+
+def test_single_pass_shots_share_parent_paths():
+    # Arrange
+    shots = [
+        ShotgridShot(
+            f"SH{x}",
+            "Shot",
+            x,
+            None,
+            ShotgridShotSequence(1, "SQ1", "Sequence"),
+            ShotgridShotEpisode(2, "EP2", "Episode"),
+            None,
+        )
+        for x in range(3)
+    ]
+    params = mapper.to_params(AvalonProjectData())
+    # Act
+    actual = list(sut._tackle_shots(params, _PROJECT, shots))
+    # Assert
+    assert_that([x.id for x in actual]).is_equal_to(
+        ["EP2", "SQ1", "SH0", "SH1", "SH2"]
+    )
+    assert_that(actual[3].parent).is_same_as(actual[2].parent)
+    assert_that(actual[4].parent).is_equal_to(",Project,Shots,EP2,SQ1,")
+    assert_that({id(x.params) for x in actual}).is_equal_to({id(params)})
@@ -1,28 +1,34 @@
+import time
 import uuid
-from typing import Any, Callable
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
 from unittest.mock import PropertyMock
 
 import attr
 from _pytest.monkeypatch import MonkeyPatch
 from assertpy import assert_that
+from mongomock import MongoClient
 
 import shotgrid_leecher.repository.shotgrid_entity_repo as sut
 import shotgrid_leecher.utils.connectivity as conn
 from shotgrid_leecher.mapper import entity_mapper
 from shotgrid_leecher.mapper.entity_mapper import to_shotgrid_task
 from shotgrid_leecher.record.avalon_structures import AvalonProjectData
-from shotgrid_leecher.record.enums import ShotgridType
+from shotgrid_leecher.record.enums import DbCollection, DbName, ShotgridType
 from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
 from shotgrid_leecher.record.queries import (
     ShotgridFindProjectByIdQuery,
     ShotgridFindAssetsByProjectQuery,
     ShotgridFindShotsByProjectQuery,
     ShotgridFindTasksByProjectQuery,
+    ShotgridSummarizeByProjectQuery,
+    ShotgridLinkedEntitiesQuery,
 )
 from shotgrid_leecher.record.shotgrid_structures import (
     ShotgridAsset,
 )
 from shotgrid_leecher.record.shotgrid_subtypes import (
+    GenericFieldsMapping,
     ShotgridProject,
     FieldsMapping,
     ProjectFieldsMapping,
@@ -48,6 +54,30 @@ def _credentials():
     )
 
 
+def _keyset(rows: List[Dict[str, Any]]) -> Callable[..., Any]:
+    # serves the rows after the id filtered on, like Shotgrid does
+    def _find(_: str, filters: List[Any], *__: Any, limit: int, **___: Any):
+        # ids are the default mapping here
+        after = [
+            x[2]
+            for x in filters
+            if isinstance(x, list) and x[:2] == ["id", "greater_than"]
+        ]
+        return [x for x in rows if not after or x["id"] > after[0]][:limit]
+
+    return _find
+
+
+def _summaries(updates: Dict[str, List[str]]) -> Callable[..., Any]:
+    # the next latest update of the listed types at every probe
+    def _summarize(type_: str, *_: Any, **__: Any) -> Any:
+        if type_ not in updates:
+            return {"summaries": {"id": 1}}
+        return {"summaries": {"id": 1, "updated_at": updates[type_].pop(0)}}
+
+    return _summarize
+
+
 def _default_fields_mapping() -> FieldsMapping:
     return FieldsMapping(
         ProjectFieldsMapping.from_dict({}),
@@ -96,6 +126,7 @@ def test_find_assets_for_project(monkeypatch: MonkeyPatch):
     client.find.return_value = raw_assets
     mapper.return_value = asset
     monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
     monkeypatch.setattr(entity_mapper, "to_shotgrid_asset", _fun(mapper))
     asset_mapping = _default_fields_mapping().asset
     task_mapping = _default_fields_mapping().task
@@ -132,6 +163,7 @@ def test_find_shots_for_project(monkeypatch: MonkeyPatch):
         }
     ]
     monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
     client.find.return_value = expected
     query = ShotgridFindShotsByProjectQuery(
         project,
@@ -173,6 +205,7 @@ def test_find_tasks_for_project(monkeypatch: MonkeyPatch):
         for x in shotgrid_result
     ]
     monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
     client.find.return_value = shotgrid_result
     query = ShotgridFindTasksByProjectQuery(
         project,
@@ -191,3 +224,453 @@ def test_find_tasks_for_project(monkeypatch: MonkeyPatch):
     assert_that(client.find.call_args[0][1][0][2]).is_equal_to(
         attr.asdict(project)
     )
+
+
+def test_iter_tasks_for_project_reads_pages(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = PropertyMock()
+    project = ShotgridProject(1, str(uuid.uuid4()), str(uuid.uuid4()), "")
+    shotgrid_result = [
+        {
+            "id": i,
+            "content": str(uuid.uuid4()),
+            "entity": {"name": str(uuid.uuid4()), "id": -1},
+        }
+        for i in range(5)
+    ]
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    monkeypatch.setattr(sut, "_PAGE_SIZE", 2)
+    client.find.side_effect = _keyset(shotgrid_result)
+    query = ShotgridFindTasksByProjectQuery(
+        project,
+        _credentials(),
+        AvalonProjectData(),
+        _default_fields_mapping().task,
+    )
+    # Act
+    actual = sut.iter_tasks_for_project(query)
+    first = next(actual)
+    # Assert
+    assert_that(first.id).is_equal_to(0)
+    assert_that(client.find.call_count).is_equal_to(1)
+    assert_that([first.id, *[x.id for x in actual]]).is_equal_to(
+        [0, 1, 2, 3, 4]
+    )
+    assert_that(client.find.call_count).is_equal_to(3)
+    assert_that(client.find.call_args[1]["order"]).is_equal_to(
+        [{"field_name": "id", "direction": "asc"}]
+    )
+
+
+def test_iter_tasks_for_project_survives_retired_rows(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = PropertyMock()
+    project = ShotgridProject(1, str(uuid.uuid4()), str(uuid.uuid4()), "")
+    rows = [
+        {
+            "id": i,
+            "content": str(uuid.uuid4()),
+            "entity": {"name": str(uuid.uuid4()), "id": -1},
+        }
+        for i in range(6)
+    ]
+    find = _keyset(rows)
+
+    def _retiring_find(*args: Any, **kwargs: Any) -> Any:
+        page = find(*args, **kwargs)
+        # the first row is retired once the first page went out
+        rows[:] = [x for x in rows if x["id"] != 0]
+        return page
+
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    monkeypatch.setattr(sut, "_PAGE_SIZE", 2)
+    monkeypatch.setattr(sut, "_RESPONSE_CACHE_SECONDS", 0)
+    client.find.side_effect = _retiring_find
+    query = ShotgridFindTasksByProjectQuery(
+        project,
+        _credentials(),
+        AvalonProjectData(),
+        _default_fields_mapping().task,
+    )
+    # Act
+    actual = [x.id for x in sut.iter_tasks_for_project(query)]
+    # Assert
+    assert_that(actual).is_equal_to([0, 1, 2, 3, 4, 5])
+
+
+def test_find_tasks_for_project_updated_after(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = PropertyMock()
+    project = ShotgridProject(1, str(uuid.uuid4()), str(uuid.uuid4()), "")
+    mark = datetime(2022, 1, 1, 10, 0, 5, tzinfo=timezone.utc)
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    client.find.return_value = []
+    query = ShotgridFindTasksByProjectQuery(
+        project,
+        _credentials(),
+        AvalonProjectData(),
+        _default_fields_mapping().task,
+        updated_after=mark,
+    )
+    since = mark.replace(second=4)
+    # Act
+    sut.find_tasks_for_project(query)
+    # Assert
+    assert_that(client.find.call_args[0][1][-1]).is_equal_to(
+        {
+            "filter_operator": "any",
+            "filters": [
+                ["updated_at", "greater_than", since],
+                ["step.Step.updated_at", "greater_than", since],
+            ],
+        }
+    )
+
+
+def test_find_shots_for_project_updated_after(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = PropertyMock()
+    project = ShotgridProject(1, str(uuid.uuid4()), str(uuid.uuid4()), "")
+    mark = datetime(2022, 1, 1, 10, 0, 5, tzinfo=timezone.utc)
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    client.find.return_value = []
+    query = ShotgridFindShotsByProjectQuery(
+        project,
+        _credentials(),
+        AvalonProjectData(),
+        _default_fields_mapping().shot,
+        updated_after=mark,
+    )
+    # Act
+    sut.find_shots_for_project(query)
+    # Assert
+    assert_that(
+        [x[0] for x in client.find.call_args[0][1][-1]["filters"]]
+    ).is_equal_to(
+        [
+            "updated_at",
+            "sg_sequence.Sequence.updated_at",
+            "sg_episode.Episode.updated_at",
+            "sg_sequence.Sequence.episode.Episode.updated_at",
+        ]
+    )
+
+
+def test_find_asset_types_for_project(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = PropertyMock()
+    project = ShotgridProject(1, str(uuid.uuid4()), str(uuid.uuid4()), "")
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    client.summarize.return_value = {
+        "summaries": {"id": 5},
+        "groups": [
+            {"group_value": "Prop", "summaries": {"id": 3}},
+            {"group_value": "Character", "summaries": {"id": 0}},
+            {"group_value": None, "summaries": {"id": 2}},
+        ],
+    }
+    query = ShotgridFindAssetsByProjectQuery(
+        project,
+        _credentials(),
+        AvalonProjectData(),
+        _default_fields_mapping().asset,
+        _default_fields_mapping().task,
+    )
+    # Act
+    actual = sut.find_asset_types_for_project(query)
+    # Assert
+    assert_that(actual).is_equal_to({"Prop"})
+    assert_that(client.summarize.call_args[1]["grouping"]).is_equal_to(
+        [{"field": "sg_asset_type", "type": "exact", "direction": "asc"}]
+    )
+
+
+def test_summarize_for_project(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = PropertyMock()
+    p_id = uuid.uuid4().int
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    client.summarize.return_value = {
+        "summaries": {"id": 42, "updated_at": "2022-01-01 10:00:05 UTC"},
+        "groups": [],
+    }
+    query = ShotgridSummarizeByProjectQuery(
+        p_id, _credentials(), ShotgridType.TASK
+    )
+    # Act
+    actual = sut.summarize_for_project(query)
+    # Assert
+    assert_that(actual.count).is_equal_to(42)
+    assert_that(actual.latest_update).is_equal_to(
+        datetime(2022, 1, 1, 10, 0, 5, tzinfo=timezone.utc)
+    )
+    assert_that(client.summarize.call_args[0][1]).is_equal_to(
+        [
+            ["project", "is", {"type": "Project", "id": p_id}],
+            ["entity", "is_not", None],
+        ]
+    )
+
+
+def test_find_tasks_for_project_served_from_cache(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = PropertyMock()
+    project = ShotgridProject(1, str(uuid.uuid4()), str(uuid.uuid4()), "")
+    rows = [
+        {
+            "id": i,
+            "content": str(uuid.uuid4()),
+            "entity": {"name": str(uuid.uuid4()), "id": -1},
+        }
+        for i in range(3)
+    ]
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    monkeypatch.setattr(sut, "_PAGE_SIZE", 2)
+    client.summarize.return_value = {"summaries": {"id": 3}}
+    client.find.side_effect = _keyset(rows)
+    query = ShotgridFindTasksByProjectQuery(
+        project,
+        _credentials(),
+        AvalonProjectData(),
+        _default_fields_mapping().task,
+    )
+    # Act
+    first = sut.find_tasks_for_project(query)
+    second = sut.find_tasks_for_project(query)
+    # Assert
+    assert_that(second).is_equal_to(first)
+    assert_that([x.id for x in second]).is_equal_to([0, 1, 2])
+    assert_that(client.find.call_count).is_equal_to(2)
+    assert_that(
+        [x[0][0] for x in client.summarize.call_args_list]
+    ).is_equal_to(["Task", "Asset", "Shot", "Step"] * 2)
+
+
+def test_find_tasks_for_project_refetched_once_changed(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = PropertyMock()
+    project = ShotgridProject(1, str(uuid.uuid4()), str(uuid.uuid4()), "")
+    rows = [
+        {
+            "id": 1,
+            "content": "a",
+            "entity": {"name": str(uuid.uuid4()), "id": -1},
+        }
+    ]
+    changed = [
+        {
+            "id": 2,
+            "content": "b",
+            "entity": {"name": str(uuid.uuid4()), "id": -1},
+        }
+    ]
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    client.summarize.side_effect = _summaries(
+        {"Task": ["2022-01-01 10:00:00", "2022-01-01 10:00:05"]}
+    )
+    client.find.side_effect = [rows, changed]
+    query = ShotgridFindTasksByProjectQuery(
+        project,
+        _credentials(),
+        AvalonProjectData(),
+        _default_fields_mapping().task,
+    )
+    # Act
+    sut.find_tasks_for_project(query)
+    actual = sut.find_tasks_for_project(query)
+    # Assert
+    assert_that([x.id for x in actual]).is_equal_to([2])
+    assert_that(client.find.call_count).is_equal_to(2)
+
+
+def _links_query(
+    project: ShotgridProject,
+    credentials: ShotgridCredentials,
+    mapping: Dict[str, str],
+) -> ShotgridLinkedEntitiesQuery:
+    return ShotgridLinkedEntitiesQuery(
+        project,
+        credentials,
+        GenericFieldsMapping(ShotgridType.ASSET_TO_SHOT_LINK, mapping),
+    )
+
+
+def test_linked_entities_cached_per_credentials_and_mapping(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = PropertyMock()
+    project = ShotgridProject(
+        uuid.uuid4().int, str(uuid.uuid4()), str(uuid.uuid4()), ""
+    )
+    credentials = _credentials()
+    mapping = {"id": "id"}
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    monkeypatch.setattr(entity_mapper, "to_asset_to_shot_link", _fun(str))
+    client.find.return_value = []
+    before = sut.linked_entities_cache_stats()["AssetShotConnection"]
+    # Act
+    sut.find_assets_linked_to_shots(
+        _links_query(project, credentials, mapping)
+    )
+    sut.find_assets_linked_to_shots(
+        _links_query(project, credentials, mapping)
+    )
+    sut.find_assets_linked_to_shots(
+        _links_query(project, _credentials(), mapping)
+    )
+    sut.find_assets_linked_to_shots(
+        _links_query(project, credentials, {"id": "code"})
+    )
+    after = sut.linked_entities_cache_stats()["AssetShotConnection"]
+    # Assert
+    assert_that(client.find.call_count).is_equal_to(3)
+    assert_that(after["hits"] - before["hits"]).is_equal_to(1)
+    assert_that(after["misses"] - before["misses"]).is_equal_to(3)
+
+
+def test_invalidate_linked_entities(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = PropertyMock()
+    project = ShotgridProject(
+        uuid.uuid4().int, str(uuid.uuid4()), str(uuid.uuid4()), ""
+    )
+    query = _links_query(project, _credentials(), {"id": "id"})
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    client.find.return_value = []
+    sut.find_assets_linked_to_shots(query)
+    # Act
+    actual = sut.invalidate_linked_entities(project.id)
+    sut.find_assets_linked_to_shots(query)
+    # Assert
+    assert_that(actual).is_equal_to(1)
+    assert_that(client.find.call_count).is_equal_to(2)
+
+
+def test_find_shots_for_project_refetched_once_sequence_changed(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = PropertyMock()
+    project = ShotgridProject(1, str(uuid.uuid4()), str(uuid.uuid4()), "")
+    rows = [{"id": 1, "code": "shot", "sg_sequence": {"id": 2, "name": "a"}}]
+    moved = [{"id": 1, "code": "shot", "sg_sequence": {"id": 3, "name": "b"}}]
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    client.summarize.side_effect = _summaries(
+        {"Sequence": ["2022-01-01 10:00:00", "2022-01-01 10:00:05"]}
+    )
+    client.find.side_effect = [rows, moved]
+    query = ShotgridFindShotsByProjectQuery(
+        project,
+        _credentials(),
+        AvalonProjectData(),
+        _default_fields_mapping().shot,
+    )
+    # Act
+    sut.find_shots_for_project(query)
+    actual = sut.find_shots_for_project(query)
+    # Assert
+    assert_that([x.sequence.id for x in actual]).is_equal_to([3])
+    assert_that(client.find.call_count).is_equal_to(2)
+
+
+def test_find_tasks_for_project_refetched_once_expired(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = PropertyMock()
+    project = ShotgridProject(1, str(uuid.uuid4()), str(uuid.uuid4()), "")
+    rows = [
+        {
+            "id": 1,
+            "content": "a",
+            "entity": {"name": str(uuid.uuid4()), "id": -1},
+        }
+    ]
+    responses = MongoClient()
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    monkeypatch.setattr(conn, "get_db_client", _fun(responses))
+    client.summarize.return_value = {"summaries": {"id": 1}}
+    client.find.side_effect = [rows, rows]
+    query = ShotgridFindTasksByProjectQuery(
+        project,
+        _credentials(),
+        AvalonProjectData(),
+        _default_fields_mapping().task,
+    )
+    sut.find_tasks_for_project(query)
+    # Act
+    conn.db_collection(
+        DbName.LEECHER, DbCollection.SHOTGRID_RESPONSES
+    ).update_many({}, {"$set": {"expires_at": datetime(2000, 1, 1)}})
+    sut.find_tasks_for_project(query)
+    # Assert
+    assert_that(client.find.call_count).is_equal_to(2)
+
+
+def test_find_tasks_for_project_evicted_past_cache_size(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = PropertyMock()
+    projects = [
+        ShotgridProject(x, str(uuid.uuid4()), str(uuid.uuid4()), "")
+        for x in range(2)
+    ]
+    rows = [
+        {
+            "id": 1,
+            "content": "a",
+            "entity": {"name": str(uuid.uuid4()), "id": -1},
+        }
+    ]
+    monkeypatch.setattr(conn, "get_shotgrid_client", _fun(client))
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    # room for a single cached response
+    monkeypatch.setattr(sut, "_RESPONSE_CACHE_SIZE", len(sut._dump_page(rows)))
+    client.summarize.return_value = {"summaries": {"id": 1}}
+    client.find.return_value = rows
+    queries = [
+        ShotgridFindTasksByProjectQuery(
+            x,
+            _credentials(),
+            AvalonProjectData(),
+            _default_fields_mapping().task,
+        )
+        for x in projects
+    ]
+    # Act
+    for x in [0, 1, 1, 0]:
+        # Mongo dates have a millisecond resolution
+        time.sleep(0.01)
+        sut.find_tasks_for_project(queries[x])
+    # Assert
+    assert_that(client.find.call_count).is_equal_to(3)
+    assert_that(
+        conn.db_collection(
+            DbName.LEECHER, DbCollection.SHOTGRID_RESPONSES
+        ).count_documents({})
+    ).is_equal_to(1)
+
+
+def test_cached_pages_keep_datetimes():
+    # Arrange
+    page = [
+        {
+            "id": 1,
+            "updated_at": datetime(2022, 1, 1, 10, tzinfo=timezone.utc),
+            "entity": {"type": "Shot", "id": 2, "name": "sh010"},
+        }
+    ]
+    # Act
+    actual = sut._load_page(sut._dump_page(page))
+    # Assert
+    assert_that(actual).is_equal_to(page)
@@ -1,5 +1,6 @@
 import random
 import uuid
+from datetime import datetime, timedelta, timezone
 from itertools import chain
 from string import ascii_uppercase
 from typing import Any, List, Tuple, Callable
@@ -22,12 +23,23 @@ from shotgrid_leecher.mapper.entity_mapper import (
 )
 from shotgrid_leecher.record.avalon_structures import AvalonProjectData
 from shotgrid_leecher.record.enums import ShotgridType, ShotgridField
-from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
-from shotgrid_leecher.record.queries import ShotgridHierarchyByProjectQuery
+from shotgrid_leecher.record.intermediate_structures import IntermediateRow
+from shotgrid_leecher.record.leecher_structures import (
+    ShotgridCredentials,
+    ShotgridWatermark,
+)
+from shotgrid_leecher.record.queries import (
+    ShotgridHierarchyByProjectQuery,
+    ShotgridHierarchyDeltaQuery,
+    ShotgridHierarchyChangesQuery,
+)
 from shotgrid_leecher.record.shotgrid_structures import (
     ShotgridTask,
     ShotgridShot,
     ShotgridAsset,
+    ShotgridEntitySummary,
+    ShotgridEntityToEntityLink,
+    ShotgridStep,
 )
 from shotgrid_leecher.record.shotgrid_subtypes import (
     ShotgridProject,
@@ -49,6 +61,10 @@ def _fun(param: Any) -> Callable[[Any], Any]:
     return lambda *_: param
 
 
+def _iter(param: List[Any]) -> Callable[[Any], Any]:
+    return lambda *_: iter(param)
+
+
 def _get_project(id_: int) -> ShotgridProject:
     return ShotgridProject(
         id_,
@@ -304,9 +320,21 @@ def _patch_repo(
     monkeypatch.setattr(entity_repo, "find_assets_for_project", _fun(assets))
     monkeypatch.setattr(entity_repo, "find_shots_for_project", _fun(shots))
     monkeypatch.setattr(entity_repo, "find_tasks_for_project", _fun(tasks))
+    monkeypatch.setattr(entity_repo, "iter_assets_for_project", _iter(assets))
+    monkeypatch.setattr(entity_repo, "iter_shots_for_project", _iter(shots))
     monkeypatch.setattr(entity_repo, "find_assets_linked_to_assets", _fun([]))
     monkeypatch.setattr(entity_repo, "find_assets_linked_to_shots", _fun([]))
     monkeypatch.setattr(entity_repo, "find_shots_linked_to_shots", _fun([]))
+    monkeypatch.setattr(
+        entity_repo,
+        "find_asset_types_for_project",
+        _fun({x.asset_type for x in assets if x.asset_type}),
+    )
+
+
+def _steps_of(tasks: List[ShotgridTask]) -> List[ShotgridStep]:
+    names = sorted({x.step.name for x in tasks if x.step})
+    return [ShotgridStep(-1, x, x) for x in names]
 
 
 def _to_query(project_id: int) -> ShotgridHierarchyByProjectQuery:
@@ -663,3 +691,284 @@ def test_odd_random_shots_traversal_at_bottom_level(
         f",{project.name},Shots,EP_2,SQ_2,SHOT*",
         count=size * size,
     )
+
+
+def _to_delta_query(
+    project_id: int,
+    previous_counts: dict,
+    current_counts: dict,
+) -> ShotgridHierarchyDeltaQuery:
+    now = datetime.now(timezone.utc)
+    return ShotgridHierarchyDeltaQuery(
+        **attr.asdict(_to_query(project_id), recurse=False),
+        watermarks={
+            k: ShotgridWatermark("", k.value, v, now, "", now)
+            for k, v in previous_counts.items()
+        },
+        summaries={
+            k: ShotgridEntitySummary(k, v, now)
+            for k, v in current_counts.items()
+        },
+    )
+
+
+def _sorted(rows: List[IntermediateRow]) -> List[IntermediateRow]:
+    return sorted(rows, key=lambda x: f"{x.parent}{x.id}")
+
+
+def test_delta_traversal_matches_full_traversal(monkeypatch: MonkeyPatch):
+    # Arrange
+    project = _get_project(random.randint(10, 1000))
+    assets, asset_tasks = _get_random_assets_with_tasks(3, 4)
+    shots = [*_get_full_shots(1, 1, 3, 1), *_get_full_shots(2, 2, 1, 2)]
+    shot_tasks = _get_shut_tasks(shots, 2)
+    _patch_repo(monkeypatch, project, assets, shots, asset_tasks + shot_tasks)
+    previous = sut.get_hierarchy_by_project(_to_query(project.id))
+    moved = attr.evolve(assets[0], asset_type="MOVED")
+    new_tasks = _get_shut_tasks(shots[:1], 1)
+    current_assets = [moved, *assets[1:]]
+    current_shots = shots[:-1]
+    current_tasks = [
+        *[x for x in asset_tasks + shot_tasks if x.entity.id != shots[-1].id],
+        *new_tasks,
+    ]
+    _patch_repo(
+        monkeypatch, project, current_assets, current_shots, current_tasks
+    )
+    expected = sut.get_hierarchy_by_project(_to_query(project.id))
+    _patch_repo(monkeypatch, project, [moved], [], new_tasks)
+    monkeypatch.setattr(
+        entity_repo,
+        "find_asset_types_for_project",
+        _fun({x.asset_type for x in current_assets}),
+    )
+    live_ids = {
+        ShotgridType.SHOT: {x.id for x in current_shots},
+        ShotgridType.TASK: {x.id for x in current_tasks},
+    }
+    monkeypatch.setattr(
+        entity_repo,
+        "summarize_for_project",
+        lambda q: ShotgridEntitySummary(q.type, 0),
+    )
+    monkeypatch.setattr(
+        entity_repo, "find_ids_for_project", lambda q: live_ids[q.type]
+    )
+    query = _to_delta_query(
+        project.id,
+        {
+            ShotgridType.ASSET: len(assets),
+            ShotgridType.SHOT: len(shots),
+            ShotgridType.TASK: len(asset_tasks + shot_tasks),
+        },
+        {
+            ShotgridType.ASSET: len(current_assets),
+            ShotgridType.SHOT: len(current_shots),
+            ShotgridType.TASK: len(current_tasks),
+        },
+    )
+    # Act
+    actual = sut.get_hierarchy_delta_by_project(query, previous)
+    # Assert
+    assert_that(_sorted(actual)).is_equal_to(_sorted(expected))
+
+
+@pytest.mark.parametrize(
+    "updated,created,expected",
+    [(0, 0, None), (0, 1, {1, 2}), (1, 0, {1, 2})],
+)
+def test_live_ids_checked_once_updated_or_miscounted(
+    monkeypatch: MonkeyPatch, updated: int, created: int, expected: Any
+):
+    # Arrange
+    project_id = random.randint(10, 1000)
+    query = _to_delta_query(
+        project_id, {ShotgridType.SHOT: 2}, {ShotgridType.SHOT: 2}
+    )
+    summary = query.summaries[ShotgridType.SHOT]
+    query = attr.evolve(
+        query,
+        summaries={
+            ShotgridType.SHOT: attr.evolve(
+                summary,
+                latest_update=summary.latest_update
+                + timedelta(seconds=updated),
+            )
+        },
+    )
+    monkeypatch.setattr(
+        entity_repo,
+        "summarize_for_project",
+        lambda q: ShotgridEntitySummary(q.type, created),
+    )
+    monkeypatch.setattr(entity_repo, "find_ids_for_project", _fun({1, 2}))
+    # Act
+    actual = sut._live_ids(ShotgridType.SHOT, query)
+    # Assert
+    assert_that(actual).is_equal_to(expected)
+
+
+def test_delta_traversal_refetches_assets_of_renamed_types(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    project = _get_project(random.randint(10, 1000))
+    assets, asset_tasks = _get_random_assets_with_tasks(3, 4)
+    _patch_repo(monkeypatch, project, assets, [], asset_tasks)
+    previous = sut.get_hierarchy_by_project(_to_query(project.id))
+    old_type = assets[0].asset_type
+    current_assets = [
+        attr.evolve(x, asset_type="RENAMED") if x.asset_type == old_type else x
+        for x in assets
+    ]
+    renamed = [x for x in current_assets if x.asset_type == "RENAMED"]
+    _patch_repo(monkeypatch, project, current_assets, [], asset_tasks)
+    expected = sut.get_hierarchy_by_project(_to_query(project.id))
+    _patch_repo(monkeypatch, project, [], [], [])
+    monkeypatch.setattr(
+        entity_repo,
+        "iter_assets_for_project",
+        lambda q: iter(renamed if q.ids is not None else []),
+    )
+    monkeypatch.setattr(
+        entity_repo,
+        "find_asset_types_for_project",
+        _fun({x.asset_type for x in current_assets}),
+    )
+    monkeypatch.setattr(
+        entity_repo,
+        "summarize_for_project",
+        lambda q: ShotgridEntitySummary(q.type, 0),
+    )
+    counts = {
+        ShotgridType.ASSET: len(assets),
+        ShotgridType.SHOT: 0,
+        ShotgridType.TASK: len(asset_tasks),
+    }
+    query = _to_delta_query(project.id, counts, counts)
+    # Act
+    actual = sut.get_hierarchy_delta_by_project(query, previous)
+    # Assert
+    assert_that(_sorted(actual)).is_equal_to(_sorted(expected))
+    assert_that({x.parent for x in actual}).does_not_contain(
+        f",{project.name},Assets,{old_type},"
+    )
+
+
+def test_changes_traversal_fetches_only_changed_entities(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    project = _get_project(random.randint(10, 1000))
+    assets, asset_tasks = _get_random_assets_with_tasks(3, 4)
+    shots = _get_full_shots(1, 2, 3, 2)
+    shot_tasks = _get_shut_tasks(shots, 2)
+    _patch_repo(monkeypatch, project, assets, shots, shot_tasks + asset_tasks)
+    previous = sut.get_hierarchy_by_project(_to_query(project.id))
+    changed = attr.evolve(assets[0], asset_type="CHANGED")
+    retired = shots[0]
+    current_assets = [changed, *assets[1:]]
+    current_tasks = [
+        x for x in shot_tasks + asset_tasks if x.entity.id != retired.id
+    ]
+    _patch_repo(monkeypatch, project, current_assets, shots[1:], current_tasks)
+    expected = sut.get_hierarchy_by_project(_to_query(project.id))
+    queries: List[Any] = []
+
+    def _listed(rows: List[Any]) -> Callable[[Any], Any]:
+        def _find(query: Any) -> Any:
+            queries.append(query)
+            return iter([x for x in rows if x.id in query.ids])
+
+        return _find
+
+    def _find_tasks(query: Any) -> List[ShotgridTask]:
+        queries.append(query)
+        entities = {(x.value, y) for x, y in query.entities}
+        return [
+            x
+            for x in current_tasks
+            if x.id in query.ids or (x.entity.type, x.entity.id) in entities
+        ]
+
+    monkeypatch.setattr(
+        entity_repo, "iter_assets_for_project", _listed(current_assets)
+    )
+    monkeypatch.setattr(entity_repo, "iter_shots_for_project", _listed([]))
+    monkeypatch.setattr(entity_repo, "find_tasks_for_project", _find_tasks)
+    query = ShotgridHierarchyChangesQuery(
+        **attr.asdict(_to_query(project.id), recurse=False),
+        changed_ids={ShotgridType.ASSET: [changed.id]},
+        retired_ids={ShotgridType.SHOT: [retired.id]},
+    )
+    # Act
+    actual = sut.get_hierarchy_changes_by_project(query, previous)
+    # Assert
+    assert_that(_sorted(actual)).is_equal_to(_sorted(expected))
+    assert_that(queries).extracting("ids").is_equal_to([[changed.id], []])
+
+
+@pytest.mark.parametrize("page_size", [1, 7, 500])
+def test_stream_traversal_matches_full_traversal(
+    monkeypatch: MonkeyPatch, page_size: int
+):
+    # Arrange
+    project = _get_project(random.randint(10, 1000))
+    assets, asset_tasks = _get_random_assets_with_tasks(4, 5, 3)
+    shots = [
+        *_get_shots_without_ep(3, 4, 1),
+        *_get_full_shots(1, 1, 6, 2),
+        *_get_odd_shots(2, 2, 5, 3),
+        *_get_shots_without_seq(1, 3, 4),
+        *_get_full_shots(1, 1, 2, 5),
+    ]
+    shot_tasks = _get_shut_tasks(shots, 2)
+    tasks = [*shot_tasks, *_get_random_broken_tasks(5), *asset_tasks]
+    _patch_repo(monkeypatch, project, assets, shots, tasks)
+    monkeypatch.setattr(entity_repo, "find_steps", _fun(_steps_of(tasks)))
+    monkeypatch.setattr(sut, "_STREAM_PAGE_SIZE", page_size)
+    expected = sut.get_hierarchy_by_project(_to_query(project.id))
+    # Act
+    actual = list(sut.iter_hierarchy_by_project(_to_query(project.id)))
+    # Assert
+    assert_that(_sorted(actual)).is_equal_to(_sorted(expected))
+    assert_that(actual[0].type).is_equal_to(ShotgridType.PROJECT)
+    positions = {f"{x.parent or ','}{x.id},": i for i, x in enumerate(actual)}
+    for i, row in enumerate(actual[1:], 1):
+        assert_that(positions[row.parent]).is_less_than(i)
+        if row.type == ShotgridType.TASK:
+            entity = actual[positions[row.parent]]
+            start = positions[row.parent] + 1
+            between = actual[start:i]
+            assert_that(entity.type).is_not_equal_to(ShotgridType.TASK)
+            assert_that({x.type for x in between}).is_subset_of(
+                {ShotgridType.TASK}
+            )
+
+
+def test_stream_traversal_fails_on_unknown_task_types_up_front(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    project = _get_project(random.randint(10, 1000))
+    assets, tasks = _get_random_assets_with_tasks(2, 3)
+    known = [x for x in _steps_of(tasks) if x.code != tasks[0].step_name()]
+    _patch_repo(monkeypatch, project, assets, [], tasks)
+    monkeypatch.setattr(entity_repo, "find_steps", _fun(known))
+    rows = sut.iter_hierarchy_by_project(_to_query(project.id))
+    # Act/Assert
+    with pytest.raises(RuntimeError, match=str(tasks[0].step_name())):
+        next(rows)
+
+
+def test_index_linked_entities_keeps_link_order():
+    # Arrange
+    links = [
+        ShotgridEntityToEntityLink(x, "", x * 10, x % 3, 1) for x in range(9)
+    ]
+    # Act
+    actual = sut._index_linked_entities(links[:4], links[4:])
+    # Assert
+    assert_that(actual).is_equal_to(
+        {k: [x for x in links if x.child_id == k] for k in range(3)}
+    )
@@ -0,0 +1,66 @@
+import time
+import uuid
+
+from assertpy import assert_that
+from cachetools import cached
+
+from shotgrid_leecher.utils.caches import MeteredCache
+
+
+def _cached_double(cache: MeteredCache):
+    @cached(cache=cache, lock=cache.lock)
+    def _double(x: int) -> int:
+        return x * 2
+
+    return _double
+
+
+def test_metered_cache_counts_hits_misses_and_evictions():
+    # Arrange
+    cache = MeteredCache(str(uuid.uuid4()), 2, 60)
+    double = _cached_double(cache)
+    # Act
+    for x in [1, 1, 2, 3, 3]:
+        double(x)
+    # Assert
+    assert_that(cache.stats()).is_equal_to(
+        {
+            "hits": 2,
+            "misses": 3,
+            "evictions": 1,
+            "expirations": 0,
+            "invalidations": 0,
+            "size": 2,
+            "capacity": 2,
+        }
+    )
+
+
+def test_metered_cache_counts_expirations():
+    # Arrange
+    cache = MeteredCache(str(uuid.uuid4()), 4, 0.05)
+    double = _cached_double(cache)
+    double(1)
+    double(2)
+    time.sleep(0.1)
+    # Act
+    double(1)
+    # Assert
+    assert_that(cache.stats()).contains_entry(
+        {"misses": 3}, {"expirations": 2}, {"size": 1}
+    )
+
+
+def test_metered_cache_invalidate():
+    # Arrange
+    cache = MeteredCache(str(uuid.uuid4()), 4, 60)
+    double = _cached_double(cache)
+    for x in range(3):
+        double(x)
+    # Act
+    actual = cache.invalidate(lambda key: key[0] > 0)
+    # Assert
+    assert_that(actual).is_equal_to(2)
+    assert_that(cache.stats()).contains_entry(
+        {"invalidations": 2}, {"size": 1}
+    )
@@ -105,6 +105,34 @@ def test_flatten_dict_nested_with_sets():
     assert_that(actual.get(f"{k1}.{k2}.{k3}")).is_equal_to({1, 2, k3.int})
 
 
+def test_flatten_dict_keeps_depth_first_key_order():
+    # Arrange
+    data = {"a": {"b": {"c": 1}, "d": {}}, "e": 2, "f": {"g": {"h": 3}}}
+    # Act
+    actual = flatten_dict(data, {"f.g"})
+    # Assert
+    assert_that(list(actual.items())).is_equal_to(
+        [("a.b.c", 1), ("a.d", None), ("e", 2), ("f.g", {"h": 3})]
+    )
+
+
+def test_flatten_dict_same_shape_rows():
+    # Arrange
+    rows = [
+        {"_id": x, "data": {"tasks": {"t": {"n": x}}, "fps": x}}
+        for x in range(3)
+    ]
+    # Act
+    actual = [flatten_dict(x, {"data.tasks"}) for x in rows]
+    # Assert
+    assert_that(actual).is_equal_to(
+        [
+            {"_id": x, "data.tasks": {"t": {"n": x}}, "data.fps": x}
+            for x in range(3)
+        ]
+    )
+
+
 @pytest.mark.parametrize(
     "data",
     list(
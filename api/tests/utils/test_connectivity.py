@@ -0,0 +1,350 @@
+import random
+import threading
+import time
+from typing import Any, List
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from assertpy import assert_that
+
+from shotgun_api3 import ProtocolError
+
+from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
+from shotgrid_leecher.utils import connectivity as sut
+
+
+class _FakeShotgun:
+    # stands for sg.Shotgun, counts the requests in flight on all of them
+    def __init__(self, site: "_FakeSite", key: str = "") -> None:
+        self._site = site
+        self.key = key
+        self.closed = False
+        self.healthy = True
+
+    def find(self, type_: str, *_: Any, **__: Any) -> List[Any]:
+        with self._site.lock:
+            self._site.busy += 1
+            self._site.peak = max(self._site.peak, self._site.busy)
+        time.sleep(self._site.delay)
+        with self._site.lock:
+            self._site.busy -= 1
+        with self._site.lock:
+            self._site.sent += 1
+        if self._site.failures:
+            self._site.failures -= 1
+            raise self._site.error
+        return [{"type": type_, "id": 1}]
+
+    def info(self) -> Any:
+        if not self.healthy:
+            raise ConnectionResetError("connection reset")
+        return {"version": [9, 0, 0]}
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class _FakeSite:
+    def __init__(
+        self,
+        delay: float = 0,
+        failures: int = 0,
+        error: Exception = ConnectionResetError("connection reset"),
+    ) -> None:
+        self.delay = delay
+        self.failures = failures
+        self.error = error
+        self.sent = 0
+        self.busy = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.connections: List[_FakeShotgun] = []
+
+    def connect(self, key: str = "") -> _FakeShotgun:
+        connection = _FakeShotgun(self, key)
+        self.connections.append(connection)
+        return connection
+
+
+def _throttled() -> ProtocolError:
+    return ProtocolError("studio", 429, "Too Many Requests", "")
+
+
+def _no_backoff(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(sut, "_SHOTGRID_RETRY_BASE", 0)
+
+
+def _client(site: _FakeSite, size: int = 2, **kwargs: Any) -> Any:
+    client = sut.ShotgridClient(site.connect, size)
+    for name, value in kwargs.items():
+        setattr(client.pool, name, value)
+    return client
+
+
+def test_shotgrid_client_reuses_connections():
+    # Arrange
+    site = _FakeSite()
+    client = _client(site)
+    # Act
+    actual = [client.find("Asset", [], []) for _ in range(5)]
+    # Assert
+    assert_that(actual).is_length(5)
+    assert_that(site.connections).is_length(1)
+    assert_that(client.pool.idle_count).is_equal_to(1)
+
+
+def test_shotgrid_client_caps_open_connections():
+    # Arrange
+    site = _FakeSite(delay=0.02)
+    client = _client(site, 3)
+    threads = [
+        threading.Thread(target=client.find, args=("Asset", [], []))
+        for _ in range(12)
+    ]
+    # Act
+    [x.start() for x in threads]
+    [x.join() for x in threads]
+    # Assert
+    assert_that(site.peak).is_equal_to(3)
+    assert_that(site.connections).is_length(3)
+    assert_that(client.pool.open_count).is_equal_to(3)
+
+
+def test_shotgrid_client_discards_failed_connections():
+    # Arrange
+    site = _FakeSite(failures=1)
+    client = _client(site)
+    # Act
+    actual = client.find("Asset", [], [])
+    # Assert
+    assert_that(actual).is_length(1)
+    assert_that([x.closed for x in site.connections]).is_equal_to(
+        [True, False]
+    )
+    assert_that(client.pool.open_count).is_equal_to(1)
+
+
+def test_shotgrid_pool_evicts_idle_connections():
+    # Arrange
+    site = _FakeSite()
+    client = _client(site, idle_seconds=0)
+    client.find("Asset", [], [])
+    time.sleep(0.01)
+    # Act
+    client.find("Asset", [], [])
+    # Assert
+    assert_that([x.closed for x in site.connections]).is_equal_to(
+        [True, False]
+    )
+    assert_that(client.pool.open_count).is_equal_to(1)
+
+
+def test_shotgrid_pool_replaces_unhealthy_connections():
+    # Arrange
+    site = _FakeSite()
+    client = _client(site, check_seconds=0)
+    client.find("Asset", [], [])
+    site.connections[0].healthy = False
+    # Act
+    client.find("Asset", [], [])
+    client.find("Asset", [], [])
+    # Assert
+    assert_that([x.closed for x in site.connections]).is_equal_to(
+        [True, False]
+    )
+
+
+def test_shotgrid_pool_close_waits_for_busy_connections():
+    # Arrange
+    site = _FakeSite()
+    client = _client(site)
+    # Act
+    with client.pool.connection() as busy:
+        client.find("Asset", [], [])
+        client.pool.close()
+        closed_while_busy = busy.closed
+    # Assert
+    assert_that(closed_while_busy).is_false()
+    assert_that([x.closed for x in site.connections]).is_equal_to([True, True])
+    assert_that(client.pool.open_count).is_equal_to(0)
+
+
+def test_rate_limiter_spaces_requests_beyond_burst():
+    # Arrange
+    limiter = sut.ShotgridRateLimiter(50, 2)
+    # Act
+    actual = [limiter.acquire() for _ in range(5)]
+    # Assert
+    assert_that(actual[:2]).is_equal_to([0.0, 0.0])
+    assert_that(sum(actual)).is_greater_than(0.05)
+
+
+def test_rate_limiter_unlimited_by_default():
+    # Arrange
+    limiter = sut.ShotgridRateLimiter(0)
+    # Act
+    actual = [limiter.acquire() for _ in range(100)]
+    # Assert
+    assert_that(set(actual)).is_equal_to({0.0})
+
+
+def test_get_shotgrid_client_shares_pools_per_script(monkeypatch: MonkeyPatch):
+    # Arrange
+    site = _FakeSite()
+    monkeypatch.setattr(sut, "_CLIENTS", dict())
+    monkeypatch.setattr(
+        sut.sg, "Shotgun", lambda *_, **kw: site.connect(kw["api_key"])
+    )
+    url = "https://studio.shotgunstudio.com"
+    first = ShotgridCredentials(url, "leecher", "key")
+    other = ShotgridCredentials(url, "other", "key")
+    rotated = ShotgridCredentials(url, "leecher", "new_key")
+    # Act
+    client = sut.get_shotgrid_client(first)
+    client.find("Asset", [], [])
+    same = sut.get_shotgrid_client(first)
+    another = sut.get_shotgrid_client(other)
+    renewed = sut.get_shotgrid_client(rotated)
+    renewed.find("Asset", [], [])
+    # Assert
+    assert_that(same).is_same_as(client)
+    assert_that(another).is_not_same_as(client)
+    assert_that(renewed).is_not_same_as(client)
+    assert_that(renewed.limiter).is_same_as(client.limiter)
+    assert_that([(x.key, x.closed) for x in site.connections]).is_equal_to(
+        [("key", True), ("new_key", False)]
+    )
+
+
+def test_get_shotgrid_client_caps_requests_per_script(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    site, other_site = _FakeSite(delay=0.02), _FakeSite(delay=0.02)
+    sites = {"leecher": site, "other": other_site}
+    monkeypatch.setattr(sut, "_CLIENTS", dict())
+    monkeypatch.setattr(sut, "_SLOTS", dict())
+    monkeypatch.setattr(sut, "_SHOTGRID_CONCURRENCY", 2)
+    monkeypatch.setattr(sut, "_SHOTGRID_POOL_SIZE", 4)
+    monkeypatch.setattr(
+        sut.sg,
+        "Shotgun",
+        lambda *_, **kw: sites[kw["script_name"]].connect(kw["api_key"]),
+    )
+    url = "https://studio.shotgunstudio.com"
+    clients = [
+        sut.get_shotgrid_client(ShotgridCredentials(url, "leecher", "key")),
+        sut.get_shotgrid_client(ShotgridCredentials(url, "leecher", "new")),
+        sut.get_shotgrid_client(ShotgridCredentials(url, "other", "key")),
+    ]
+    threads = [
+        threading.Thread(target=x.find, args=("Asset", [], []))
+        for x in clients
+        for _ in range(6)
+    ]
+    # Act
+    [x.start() for x in threads]
+    [x.join() for x in threads]
+    # Assert
+    assert_that(site.sent).is_equal_to(12)
+    assert_that(site.peak).is_equal_to(2)
+    assert_that(other_site.peak).is_equal_to(2)
+
+
+def test_shotgrid_client_learns_rate_from_throttling(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    _no_backoff(monkeypatch)
+    monkeypatch.setattr(sut, "_SHOTGRID_MIN_RATE", 100)
+    site = _FakeSite(failures=1, error=_throttled())
+    client = _client(site)
+    throttled = sut._SHOTGRID_THROTTLED.value(host="")
+    retries = sut._SHOTGRID_RETRIES.value(method="find", reason="throttled")
+    # Act
+    actual = client.find("Asset", [], [])
+    # Assert
+    assert_that(actual).is_length(1)
+    assert_that(client.limiter.rate).is_between(100, 101)
+    assert_that(sut._SHOTGRID_THROTTLED.value(host="")).is_equal_to(
+        throttled + 1
+    )
+    assert_that(
+        sut._SHOTGRID_RETRIES.value(method="find", reason="throttled")
+    ).is_equal_to(retries + 1)
+
+
+def test_shotgrid_client_gives_up_after_tries(monkeypatch: MonkeyPatch):
+    # Arrange
+    _no_backoff(monkeypatch)
+    site = _FakeSite(failures=10)
+    client = _client(site)
+    # Act/Assert
+    with pytest.raises(ConnectionResetError):
+        client.find("Asset", [], [])
+    assert_that(site.sent).is_equal_to(sut._SHOTGRID_TRIES)
+
+
+def test_shotgrid_client_stops_retrying_at_deadline(monkeypatch: MonkeyPatch):
+    # Arrange
+    monkeypatch.setattr(sut, "_SHOTGRID_RETRY_BASE", 60)
+    monkeypatch.setattr(sut, "_full_jitter", lambda _: 60)
+    site = _FakeSite(failures=10)
+    client = _client(site)
+    # Act/Assert
+    with sut.shotgrid_deadline(30), pytest.raises(ConnectionResetError):
+        client.find("Asset", [], [])
+    assert_that(site.sent).is_equal_to(1)
+
+
+def test_shotgrid_client_sends_nothing_past_deadline():
+    # Arrange
+    site = _FakeSite()
+    client = _client(site)
+    # Act/Assert
+    with sut.shotgrid_deadline(0.001):
+        time.sleep(0.01)
+        with pytest.raises(TimeoutError):
+            client.find("Asset", [], [])
+    assert_that(site.sent).is_equal_to(0)
+    assert_that(client.find("Asset", [], [])).is_length(1)
+
+
+def test_full_jitter_stays_within_exponential_window():
+    # Arrange
+    random.seed(7)
+    # Act
+    actual = [
+        (x, sut._full_jitter(x)) for x in range(1, 12) for _ in range(50)
+    ]
+    # Assert
+    for attempt, delay in actual:
+        window = sut._SHOTGRID_RETRY_BASE * 2 ** (attempt - 1)
+        assert_that(delay).is_between(0, min(sut._SHOTGRID_RETRY_MAX, window))
+    assert_that({x for _, x in actual}).is_length(len(actual))
+
+
+def test_rate_limiter_halves_rate_then_recovers():
+    # Arrange
+    limiter = sut.ShotgridRateLimiter(8, host="studio")
+    # Act
+    limiter.throttled()
+    limiter.throttled()
+    halved = limiter.rate
+    for _ in range(100):
+        limiter.succeeded()
+    # Assert
+    assert_that(halved).is_equal_to(4)
+    assert_that(limiter.rate).is_equal_to(8)
+    assert_that(sut._SHOTGRID_RATE.value(host="studio")).is_equal_to(8)
+
+
+def test_rate_limiter_starts_throttling_from_sent_rate():
+    # Arrange
+    limiter = sut.ShotgridRateLimiter(0)
+    [limiter.acquire() for _ in range(40)]
+    # Act
+    limiter.throttled()
+    # Assert
+    assert_that(limiter.rate).is_equal_to(20)
+    assert_that(limiter.acquire()).is_greater_than(0)
@@ -0,0 +1,162 @@
+import threading
+import uuid
+from contextvars import ContextVar
+
+import pytest
+from assertpy import assert_that
+
+from shotgrid_leecher.utils.fetch_planner import FetchStep, prefetch, run_plan
+
+
+def test_run_plan_passes_dependencies_results():
+    # Arrange
+    project = str(uuid.uuid4())
+    steps = [
+        FetchStep("assets", lambda x: f"{x['project']}/assets", ("project",)),
+        FetchStep("project", lambda _: project),
+        FetchStep(
+            "tasks",
+            lambda x: [x["project"], x["assets"]],
+            ("project", "assets"),
+        ),
+    ]
+    # Act
+    actual = run_plan(steps, 4)
+    # Assert
+    assert_that(actual).is_equal_to(
+        {
+            "project": project,
+            "assets": f"{project}/assets",
+            "tasks": [project, f"{project}/assets"],
+        }
+    )
+
+
+def test_run_plan_runs_independent_steps_together():
+    # Arrange
+    barrier = threading.Barrier(3, timeout=5)
+    steps = [
+        FetchStep("project", lambda _: 1),
+        *[
+            FetchStep(x, lambda _: barrier.wait() >= 0, ("project",))
+            for x in ["assets", "shots", "tasks"]
+        ],
+    ]
+    # Act
+    actual = run_plan(steps, 3)
+    # Assert
+    assert_that(actual).contains_entry({"assets": True}, {"tasks": True})
+
+
+def test_run_plan_propagates_failures():
+    # Arrange
+    def _fail(_):
+        raise RuntimeError("Shotgrid is down")
+
+    steps = [
+        FetchStep("project", _fail),
+        FetchStep("assets", lambda _: 1, ("project",)),
+    ]
+    # Act/Assert
+    with pytest.raises(RuntimeError, match="Shotgrid is down"):
+        run_plan(steps, 2)
+
+
+@pytest.mark.parametrize(
+    "steps",
+    [
+        [FetchStep("assets", lambda _: 1, ("project",))],
+        [
+            FetchStep("assets", lambda _: 1, ("shots",)),
+            FetchStep("shots", lambda _: 1, ("assets",)),
+        ],
+        [FetchStep("assets", lambda _: 1), FetchStep("assets", lambda _: 2)],
+    ],
+)
+def test_run_plan_rejects_broken_plans(steps):
+    # Act/Assert
+    with pytest.raises(ValueError):
+        run_plan(steps, 2)
+
+
+def test_prefetch_keeps_order_and_runs_ahead():
+    # Arrange
+    pulled = []
+    ahead = threading.Event()
+
+    def _items():
+        for x in range(10):
+            pulled.append(x)
+            if x == 3:
+                ahead.set()
+            yield x
+
+    # Act
+    items = prefetch(_items(), 4)
+    first = next(items)
+    # Assert
+    assert_that(ahead.wait(5)).is_true()
+    assert_that(first).is_equal_to(0)
+    assert_that([first, *items]).is_equal_to(list(range(10)))
+
+
+def test_prefetch_raises_producer_failures():
+    # Arrange
+    def _items():
+        yield 1
+        raise RuntimeError("page lost")
+
+    items = prefetch(_items(), 4)
+    # Act/Assert
+    assert_that(next(items)).is_equal_to(1)
+    with pytest.raises(RuntimeError):
+        next(items)
+
+
+def test_prefetch_stops_producer_when_consumer_leaves():
+    # Arrange
+    finished = threading.Event()
+
+    def _items():
+        try:
+            for x in range(1_000_000):
+                yield x
+        finally:
+            finished.set()
+
+    items = prefetch(_items(), 2)
+    # Act
+    next(items)
+    items.close()
+    # Assert
+    assert_that(finished.wait(5)).is_true()
+
+
+def test_run_plan_steps_see_caller_context():
+    # Arrange
+    var: ContextVar[str] = ContextVar("var", default="")
+    token = var.set("caller")
+    steps = [
+        FetchStep("a", lambda _: var.get()),
+        FetchStep("b", lambda _: var.get()),
+    ]
+    # Act
+    actual = run_plan(steps, 2)
+    var.reset(token)
+    # Assert
+    assert_that(actual).is_equal_to({"a": "caller", "b": "caller"})
+
+
+def test_prefetch_producer_sees_consumer_context():
+    # Arrange
+    var: ContextVar[str] = ContextVar("var", default="")
+
+    def _items():
+        yield var.get()
+
+    token = var.set("consumer")
+    # Act
+    actual = list(prefetch(_items(), 1))
+    var.reset(token)
+    # Assert
+    assert_that(actual).is_equal_to(["consumer"])
@@ -0,0 +1,80 @@
+import uuid
+
+import pytest
+from assertpy import assert_that
+
+from shotgrid_leecher.utils import metrics as sut
+
+
+def _name() -> str:
+    return f"test_{uuid.uuid4().hex[:8]}"
+
+
+def test_counter_renders_labelled_samples():
+    # Arrange
+    name = _name()
+    counter = sut.counter(name, "Some rows", ["stage"])
+    # Act
+    counter.inc(2, stage="avalon")
+    counter.inc(stage="avalon")
+    counter.inc(5, stage="intermediate")
+    actual = sut.render_metrics()
+    # Assert
+    assert_that(actual).contains(
+        f"# TYPE {name}_total counter",
+        f'{name}_total{{stage="avalon"}} 3.0',
+        f'{name}_total{{stage="intermediate"}} 5.0',
+    )
+
+
+def test_metrics_are_registered_once():
+    # Arrange
+    name = _name()
+    # Act
+    first = sut.gauge(name, "Busy workers")
+    second = sut.gauge(name, "Busy workers")
+    first.inc()
+    second.inc()
+    second.dec()
+    # Assert
+    assert_that(first).is_same_as(second)
+    assert_that(first.value()).is_equal_to(1)
+
+
+def test_histogram_buckets_are_cumulative():
+    # Arrange
+    name = _name()
+    histogram = sut.histogram(name, "Durations", ["type"], [0.1, 1.0])
+    # Act
+    for value in [0.05, 0.1, 0.5, 3.0]:
+        histogram.observe(value, type="Asset")
+    actual = sut.render_metrics()
+    # Assert
+    assert_that(histogram.count(type="Asset")).is_equal_to(4)
+    assert_that(actual).contains(
+        f'{name}_bucket{{le="0.1",type="Asset"}} 2.0',
+        f'{name}_bucket{{le="1.0",type="Asset"}} 3.0',
+        f'{name}_bucket{{le="+Inf",type="Asset"}} 4.0',
+        f'{name}_sum{{type="Asset"}} 3.65',
+        f'{name}_count{{type="Asset"}} 4.0',
+    )
+
+
+def test_metric_rejects_unknown_labels():
+    # Arrange
+    counter = sut.counter(_name(), "Some rows", ["stage"])
+    # Act / Assert
+    with pytest.raises(ValueError):
+        counter.inc(project="x")
+
+
+def test_label_values_are_escaped():
+    # Arrange
+    name = _name()
+    counter = sut.counter(name, "Batches", ["project"])
+    # Act
+    counter.inc(project='say "hi"')
+    # Assert
+    assert_that(sut.render_metrics()).contains(
+        f'{name}_total{{project="say \\"hi\\""}} 1.0'
+    )
@@ -0,0 +1,66 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from assertpy import assert_that
+from mongomock import MongoClient
+from pymongo.errors import DuplicateKeyError
+
+import shotgrid_leecher.repository.batch_job_repo as batch_job_repo
+import shotgrid_leecher.utils.connectivity as conn
+from shotgrid_leecher.record.enums import DbCollection, DbName
+from shotgrid_leecher.record.leecher_structures import BatchJob
+from shotgrid_leecher.record.results import BatchJobStatus
+from shotgrid_leecher.writers import batch_job_writer as sut
+
+
+def _fun(param: Any) -> Callable[[Any], Any]:
+    return lambda *_: param
+
+
+def _job(fingerprint: str, updated_at: datetime) -> BatchJob:
+    return BatchJob(
+        id=str(uuid.uuid4()),
+        project_name="project",
+        kind="update",
+        fingerprint=fingerprint,
+        status=BatchJobStatus.QUEUED.value,
+        progress=dict(),
+        created_at=updated_at,
+        updated_at=updated_at,
+    )
+
+
+def test_active_job_fingerprints_are_unique(monkeypatch: MonkeyPatch):
+    # Arrange
+    now = datetime.utcnow()
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    collection = conn.db_collection(DbName.LEECHER, DbCollection.BATCH_JOBS)
+    sut.ensure_batch_job_indexes()
+    first, second, third = [_job("same", now) for _ in range(3)]
+    # Act
+    sut.create_or_get_active_job(first, now - timedelta(minutes=1))
+    sut.finish_job(first.id, BatchJobStatus.DONE, "Ok")
+    sut.create_or_get_active_job(second, now - timedelta(minutes=1))
+    # Assert
+    with pytest.raises(DuplicateKeyError):
+        collection.insert_one({**third.to_mongo(), "active": True})
+
+
+def test_abandoned_job_gives_way_to_new_one(monkeypatch: MonkeyPatch):
+    # Arrange
+    now = datetime.utcnow()
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    sut.ensure_batch_job_indexes()
+    stale = _job("same", now - timedelta(hours=1))
+    sut.create_or_get_active_job(stale, now - timedelta(hours=2))
+    job = _job("same", now)
+    # Act
+    actual = sut.create_or_get_active_job(job, now - timedelta(minutes=1))
+    # Assert
+    assert_that(actual.id).is_equal_to(job.id)
+    assert_that(batch_job_repo.fetch_batch_job(stale.id).error).is_equal_to(
+        "Job abandoned"
+    )
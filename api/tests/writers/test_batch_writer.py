@@ -0,0 +1,129 @@
+import uuid
+from typing import Any, Callable, List, Dict
+
+import attr
+from _pytest.monkeypatch import MonkeyPatch
+from assertpy import assert_that
+from mongomock import MongoClient
+
+import shotgrid_leecher.utils.connectivity as conn
+from shotgrid_leecher.record.enums import DbName
+from shotgrid_leecher.record.intermediate_structures import (
+    IntermediateParams,
+    IntermediateGroup,
+    IntermediateRow,
+)
+from shotgrid_leecher.record.results import UpsertionResult
+from shotgrid_leecher.utils.ids import to_object_id, to_fingerprint
+from shotgrid_leecher.writers import batch_writer as sut
+
+Map = Dict[str, Any]
+
+
+def _fun(param: Any) -> Callable[[Any], Any]:
+    return lambda *_: param
+
+
+def _params() -> IntermediateParams:
+    return IntermediateParams(1, 1, 25.0, 1, 1, 0, 0, 1.0, 1080, 1920, [])
+
+
+def _groups(n: int) -> List[IntermediateRow]:
+    names = [str(uuid.uuid4())[:8] for _ in range(n)]
+    return [
+        IntermediateGroup(x, ",Project,", _params(), to_object_id(x))
+        for x in names
+    ]
+
+
+def _stored(client: MongoClient, project_name: str) -> List[Any]:
+    return list(
+        client.get_database(DbName.INTERMEDIATE.value)
+        .get_collection(project_name)
+        .find({})
+    )
+
+
+def test_sync_intermediate_writes_only_changed_rows(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = MongoClient()
+    project_name = str(uuid.uuid4())[:8]
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    previous = _groups(4)
+    sut.overwrite_intermediate(project_name, previous)
+    changed = attr.evolve(previous[1], parent=",Project,Assets,")
+    current = [previous[0], changed, previous[3], *_groups(1)]
+    # Act
+    actual = sut.sync_intermediate(project_name, previous, current)
+    # Assert
+    assert_that(actual.inserted_count).is_equal_to(1)
+    assert_that(actual.modified_count).is_equal_to(1)
+    assert_that(actual.deleted_count).is_equal_to(1)
+    assert_that(_stored(client, project_name)).contains_only(
+        *[x.to_dict() for x in current]
+    )
+
+
+def test_sync_intermediate_skips_unchanged_rows(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = MongoClient()
+    project_name = str(uuid.uuid4())[:8]
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    rows = _groups(3)
+    sut.overwrite_intermediate(project_name, rows)
+    # Act
+    actual = sut.sync_intermediate(project_name, rows, list(rows))
+    # Assert
+    assert_that(actual).is_none()
+    assert_that(_stored(client, project_name)).is_length(3)
+
+
+def _avalon_rows(n: int) -> List[Map]:
+    return [
+        {
+            "_id": to_object_id(uuid.uuid4().int),
+            "type": "asset",
+            "name": str(uuid.uuid4())[:8],
+            "data": {"tasks": {}},
+        }
+        for _ in range(n)
+    ]
+
+
+def _fingerprinted(rows: List[Map]) -> List[Map]:
+    return [{**x, "fingerprint": to_fingerprint(x)} for x in rows]
+
+
+def test_upsert_avalon_rows_skips_unchanged_rows(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = MongoClient()
+    project_name = str(uuid.uuid4())[:8]
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    rows = _avalon_rows(4)
+    sut.upsert_avalon_rows(project_name, _fingerprinted(rows))
+    changed = {**rows[2], "name": "changed"}
+    current = _fingerprinted([rows[0], rows[1], changed, rows[3]])
+    # Act
+    actual = sut.upsert_avalon_rows(project_name, current)
+    # Assert
+    assert_that(actual).is_equal_to(UpsertionResult(1, 3))
+    assert_that(
+        client.get_database(DbName.AVALON.value)
+        .get_collection(project_name)
+        .find_one({"_id": changed["_id"]})
+    ).has_name("changed")
+
+
+def test_upsert_avalon_rows_writes_rows_without_fingerprint(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = MongoClient()
+    project_name = str(uuid.uuid4())[:8]
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    rows = _avalon_rows(2)
+    sut.upsert_avalon_rows(project_name, rows)
+    # Act
+    actual = sut.upsert_avalon_rows(project_name, rows)
+    # Assert
+    assert_that(actual).is_equal_to(UpsertionResult(2, 0))
@@ -0,0 +1,163 @@
+import threading
+from typing import Any, List
+
+import mongomock
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from assertpy import assert_that
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from shotgrid_leecher.record.results import BulkWriteSummary
+from shotgrid_leecher.writers import bulk_writer as sut
+
+
+class _FlakyCollection:
+    # fails the first calls like a dropped connection would, after
+    # applying the operations to the real collection when asked to
+    def __init__(self, collection: Any, failures: int, apply: bool) -> None:
+        self._collection = collection
+        self._failures = failures
+        self._apply = apply
+        self.calls: List[int] = []
+        self.database = collection.database
+
+    def bulk_write(self, operations: List[Any], ordered: bool) -> Any:
+        self.calls.append(len(operations))
+        if self._failures:
+            self._failures -= 1
+            if self._apply:
+                self._collection.bulk_write(operations, ordered=ordered)
+            raise AutoReconnect("connection reset")
+        return self._collection.bulk_write(operations, ordered=ordered)
+
+
+def _collection() -> Any:
+    return mongomock.MongoClient().get_database("test").get_collection("rows")
+
+
+def _inserts(count: int) -> List[InsertOne]:
+    return [InsertOne({"_id": x, "name": f"row_{x}"}) for x in range(count)]
+
+
+def _no_delay(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr(sut, "_RETRY_DELAY_SECONDS", 0)
+
+
+def test_bulk_write_chunks_by_operation_count(monkeypatch: MonkeyPatch):
+    # Arrange
+    monkeypatch.setattr(sut, "_CHUNK_OPERATIONS", 4)
+    collection = _FlakyCollection(_collection(), 0, False)
+    # Act
+    actual = sut.bulk_write(collection, iter(_inserts(10)))
+    # Assert
+    assert_that(collection.calls).is_equal_to([4, 4, 2])
+    assert_that(actual).is_equal_to(
+        BulkWriteSummary(operations=10, chunks=3, inserted_count=10)
+    )
+
+
+def test_bulk_write_chunks_by_size(monkeypatch: MonkeyPatch):
+    # Arrange
+    operations = [InsertOne({"_id": x, "blob": "x" * 1000}) for x in range(6)]
+    monkeypatch.setattr(sut, "_CHUNK_BYTES", 2500)
+    collection = _FlakyCollection(_collection(), 0, False)
+    # Act
+    sut.bulk_write(collection, operations)
+    # Assert
+    assert_that(collection.calls).is_equal_to([2, 2, 2])
+
+
+def test_bulk_write_nothing_to_write():
+    # Arrange
+    collection = _FlakyCollection(_collection(), 0, False)
+    # Act
+    actual = sut.bulk_write(collection, iter([]), False)
+    # Assert
+    assert_that(collection.calls).is_empty()
+    assert_that(actual).is_equal_to(BulkWriteSummary())
+
+
+def test_bulk_write_unordered_sums_parallel_chunks(monkeypatch: MonkeyPatch):
+    # Arrange
+    monkeypatch.setattr(sut, "_CHUNK_OPERATIONS", 3)
+    monkeypatch.setattr(sut, "_WORKERS", 3)
+    target = _collection()
+    target.insert_many([{"_id": x, "name": "old"} for x in range(5)])
+    operations = [
+        UpdateOne({"_id": x}, {"$set": {"name": "new"}}, upsert=True)
+        for x in range(20)
+    ]
+    lock = threading.Lock()
+    threads = set()
+    collection = _FlakyCollection(target, 0, False)
+    write = collection.bulk_write
+
+    def _bulk_write(chunk: List[Any], ordered: bool) -> Any:
+        with lock:
+            threads.add(threading.get_ident())
+            return write(chunk, ordered)
+
+    collection.bulk_write = _bulk_write
+    # Act
+    actual = sut.bulk_write(collection, iter(operations), False)
+    # Assert
+    assert_that(actual).is_equal_to(
+        BulkWriteSummary(
+            operations=20,
+            chunks=7,
+            matched_count=5,
+            modified_count=5,
+            upserted_count=15,
+        )
+    )
+    assert_that(threads).does_not_contain(threading.get_ident())
+    assert_that(target.count_documents({"name": "new"})).is_equal_to(20)
+
+
+def test_bulk_write_retries_dropped_connection(monkeypatch: MonkeyPatch):
+    # Arrange
+    _no_delay(monkeypatch)
+    collection = _FlakyCollection(_collection(), 2, False)
+    # Act
+    actual = sut.bulk_write(collection, _inserts(5))
+    # Assert
+    assert_that(collection.calls).is_equal_to([5, 5, 5])
+    assert_that(actual.inserted_count).is_equal_to(5)
+
+
+def test_bulk_write_gives_up_after_retries(monkeypatch: MonkeyPatch):
+    # Arrange
+    _no_delay(monkeypatch)
+    collection = _FlakyCollection(_collection(), sut._RETRIES, False)
+    # Act/Assert
+    with pytest.raises(AutoReconnect):
+        sut.bulk_write(collection, _inserts(5))
+    assert_that(collection.calls).is_length(sut._RETRIES)
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+def test_bulk_write_accepts_duplicates_of_landed_inserts(
+    monkeypatch: MonkeyPatch, ordered: bool
+):
+    # Arrange
+    _no_delay(monkeypatch)
+    target = _collection()
+    target.insert_many([{"_id": 5}, {"_id": 6}])
+    collection = _FlakyCollection(target, 1, True)
+    operations = _inserts(8)[:5] + [InsertOne({"_id": 7})]
+    # Act
+    actual = sut.bulk_write(collection, operations, ordered)
+    # Assert
+    assert_that(target.count_documents({})).is_equal_to(8)
+    assert_that(actual.operations).is_equal_to(6)
+
+
+def test_bulk_write_raises_real_write_errors():
+    # Arrange
+    target = _collection()
+    target.insert_one({"_id": 1})
+    collection = _FlakyCollection(target, 0, False)
+    # Act/Assert
+    with pytest.raises(BulkWriteError):
+        sut.bulk_write(collection, _inserts(3))
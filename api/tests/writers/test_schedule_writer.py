@@ -0,0 +1,189 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from _pytest.monkeypatch import MonkeyPatch
+from assertpy import assert_that
+from mongomock import MongoClient
+
+import shotgrid_leecher.repository.schedule_repo as schedule_repo
+import shotgrid_leecher.utils.connectivity as conn
+from shotgrid_leecher.record.commands import ScheduleShotgridBatchCommand
+from shotgrid_leecher.record.enums import DbName, DbCollection
+from shotgrid_leecher.record.leecher_structures import ShotgridCredentials
+from shotgrid_leecher.record.shotgrid_subtypes import FieldsMapping
+from shotgrid_leecher.writers import schedule_writer as sut
+
+Map = Dict[str, Any]
+
+
+def _fun(param: Any) -> Callable[[Any], Any]:
+    return lambda *_: param
+
+
+def _command(
+    project_name: str, url: str = "https://sg.test"
+) -> ScheduleShotgridBatchCommand:
+    return ScheduleShotgridBatchCommand(
+        1,
+        project_name,
+        ShotgridCredentials(url, "script", "key"),
+        FieldsMapping.from_dict({}),
+    )
+
+
+def _queue(client: MongoClient) -> Any:
+    return client.get_database(DbName.SCHEDULE.value).get_collection(
+        DbCollection.SCHEDULE_QUEUE.value
+    )
+
+
+def _roll_in(names: List[str]) -> None:
+    sut.queue_requests([_command(x) for x in names])
+
+
+def test_dequeue_request_leases_instead_of_deleting(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = MongoClient()
+    names = [str(uuid.uuid4()) for _ in range(2)]
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    _roll_in(names)
+    # Act
+    first = sut.dequeue_request()
+    second = sut.dequeue_request()
+    third = sut.dequeue_request()
+    # Assert
+    assert_that([first.project_name, second.project_name]).is_equal_to(names)
+    assert_that(third).is_none()
+    assert_that(_queue(client).count_documents({})).is_equal_to(2)
+    assert_that(list(_queue(client).find({}))).extracting(
+        "lease_owner"
+    ).contains_only(sut._LEASE_OWNER)
+
+
+def test_dequeue_request_claims_expired_lease(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = MongoClient()
+    name = str(uuid.uuid4())
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    _roll_in([name])
+    sut.dequeue_request()
+    _queue(client).update_one(
+        {"_id": name},
+        {
+            "$set": {
+                "lease_owner": "crashed",
+                "lease_expires_at": datetime.utcnow() - timedelta(seconds=1),
+            }
+        },
+    )
+    # Act
+    actual = sut.dequeue_request()
+    # Assert
+    assert_that(actual.project_name).is_equal_to(name)
+    assert_that(_queue(client).find_one({"_id": name})).contains_entry(
+        {"attempts": 2}, {"lease_owner": sut._LEASE_OWNER}
+    )
+
+
+def test_dequeue_request_skips_busy_hosts(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = MongoClient()
+    names = [str(uuid.uuid4()) for _ in range(3)]
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    sut.queue_requests(
+        [
+            _command(names[0], "https://busy.test"),
+            _command(names[1], "https://busy.test"),
+            _command(names[2], "https://free.test"),
+        ]
+    )
+    # Act
+    first = sut.dequeue_request(busy_hosts=["busy.test"])
+    second = sut.dequeue_request(busy_hosts=["busy.test"])
+    third = sut.dequeue_request()
+    # Assert
+    assert_that(first.project_name).is_equal_to(names[2])
+    assert_that(second).is_none()
+    assert_that(third.project_name).is_equal_to(names[0])
+
+
+def test_ack_request_only_removes_own_lease(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = MongoClient()
+    names = [str(uuid.uuid4()) for _ in range(2)]
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    _roll_in(names)
+    sut.dequeue_request()
+    sut.dequeue_request()
+    _queue(client).update_one(
+        {"_id": names[1]}, {"$set": {"lease_owner": "other"}}
+    )
+    # Act
+    own = sut.ack_request(_command(names[0]))
+    other = sut.ack_request(_command(names[1]))
+    # Assert
+    assert_that(own).is_true()
+    assert_that(other).is_false()
+    assert_that(list(_queue(client).find({}))).extracting("_id").is_equal_to(
+        [names[1]]
+    )
+
+
+def test_extend_request_lease(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = MongoClient()
+    name = str(uuid.uuid4())
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    _roll_in([name])
+    sut.dequeue_request()
+    before = _queue(client).find_one({"_id": name})["lease_expires_at"]
+    # Act
+    actual = sut.extend_request_lease(_command(name))
+    # Assert
+    assert_that(actual).is_true()
+    assert_that(
+        _queue(client).find_one({"_id": name})["lease_expires_at"]
+    ).is_greater_than_or_equal_to(before)
+
+
+def test_dequeue_request_parks_request_out_of_attempts(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = MongoClient()
+    names = [str(uuid.uuid4()) for _ in range(2)]
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    monkeypatch.setattr(sut, "_MAX_ATTEMPTS", 2)
+    _roll_in(names)
+    expired = {"$set": {"lease_expires_at": datetime(2000, 1, 1)}}
+    # Act
+    claims = []
+    for _ in range(3):
+        claims.append(sut.dequeue_request(names[0]))
+        _queue(client).update_one({"_id": names[0]}, expired)
+    other = sut.dequeue_request()
+    # Assert
+    assert_that([x and x.project_name for x in claims]).is_equal_to(
+        [names[0], names[0], None]
+    )
+    assert_that(other.project_name).is_equal_to(names[1])
+    parked = _queue(client).find_one({"_id": names[0]})
+    assert_that(parked["attempts"]).is_equal_to(2)
+    assert_that(parked["parked_at"]).is_not_none()
+    assert_that(schedule_repo.queue_size()).is_equal_to(1)
+
+
+def test_acquire_timer_lease_is_exclusive(monkeypatch: MonkeyPatch):
+    # Arrange
+    client = MongoClient()
+    timer = str(uuid.uuid4())
+    period = timedelta(minutes=2)
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    # Act
+    first = sut.acquire_timer_lease(timer, period)
+    renewed = sut.acquire_timer_lease(timer, period)
+    monkeypatch.setattr(sut, "_LEASE_OWNER", "other")
+    other = sut.acquire_timer_lease(timer, period)
+    # Assert
+    assert_that([first, renewed, other]).is_equal_to([True, True, False])
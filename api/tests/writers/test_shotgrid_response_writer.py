@@ -0,0 +1,103 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, List
+
+from _pytest.monkeypatch import MonkeyPatch
+from assertpy import assert_that
+from mongomock import MongoClient
+
+import shotgrid_leecher.repository.shotgrid_response_repo as response_repo
+import shotgrid_leecher.utils.connectivity as conn
+from shotgrid_leecher.record.commands import StoreShotgridResponseCommand
+from shotgrid_leecher.record.enums import DbCollection, DbName
+from shotgrid_leecher.record.leecher_structures import ShotgridResponse
+from shotgrid_leecher.writers import shotgrid_response_writer as sut
+
+
+def _fun(param: Any) -> Callable[[Any], Any]:
+    return lambda *_: param
+
+
+def _store(key: str, pages: List[bytes], stored_at: datetime) -> None:
+    response = ShotgridResponse(
+        key=key,
+        shotgrid_url="https://sg.test",
+        type="Task",
+        fingerprint=str(uuid.uuid4()),
+        pages=len(pages),
+        size=sum(len(x) for x in pages),
+        used_at=stored_at,
+        stored_at=stored_at,
+        expires_at=stored_at + timedelta(hours=1),
+    )
+    sut.store_response(StoreShotgridResponseCommand(response, pages))
+
+
+def test_store_response_replaces_pages(monkeypatch: MonkeyPatch):
+    # Arrange
+    key = str(uuid.uuid4())
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    _store(key, [b"a", b"b", b"c"], datetime.utcnow())
+    # Act
+    _store(key, [b"d"], datetime.utcnow())
+    # Assert
+    assert_that(response_repo.fetch_response(key).pages).is_equal_to(1)
+    assert_that(response_repo.fetch_response_pages(key)).is_equal_to([b"d"])
+
+
+def test_evict_responses_drops_least_recently_used(monkeypatch: MonkeyPatch):
+    # Arrange
+    now = datetime.utcnow()
+    keys = [str(uuid.uuid4()) for _ in range(4)]
+    monkeypatch.setattr(conn, "get_db_client", _fun(MongoClient()))
+    for i, key in enumerate(keys):
+        _store(key, [b"x" * 5, b"y" * 5], now - timedelta(minutes=i))
+    sut.touch_response(keys[3], now + timedelta(minutes=1))
+    # Act
+    actual = sut.evict_responses(25)
+    # Assert
+    assert_that(actual).is_equal_to(2)
+    for key in keys[1:3]:
+        assert_that(response_repo.fetch_response(key)).is_none()
+        assert_that(response_repo.fetch_response_pages(key)).is_empty()
+    for key in [keys[0], keys[3]]:
+        assert_that(response_repo.fetch_response_pages(key)).is_length(2)
+
+
+def test_ensure_response_indexes_expire_responses_and_pages(
+    monkeypatch: MonkeyPatch,
+):
+    # Arrange
+    client = MongoClient()
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    # Act
+    sut.ensure_response_indexes()
+    sut.ensure_response_indexes()
+    # Assert
+    for collection in [
+        DbCollection.SHOTGRID_RESPONSES,
+        DbCollection.SHOTGRID_RESPONSE_PAGES,
+    ]:
+        indexes = conn.db_collection(
+            DbName.LEECHER, collection
+        ).index_information()
+        assert_that(indexes["expires_at_1"]).contains_entry(
+            {"expireAfterSeconds": 0}
+        )
+
+
+def test_store_response_pages_expire_with_response(monkeypatch: MonkeyPatch):
+    # Arrange
+    key = str(uuid.uuid4())
+    now = datetime.utcnow()
+    client = MongoClient()
+    monkeypatch.setattr(conn, "get_db_client", _fun(client))
+    # Act
+    _store(key, [b"a", b"b"], now)
+    # Assert
+    pages = conn.db_collection(
+        DbName.LEECHER, DbCollection.SHOTGRID_RESPONSE_PAGES
+    ).find({"key": key})
+    assert_that({x["expires_at"] for x in pages}).is_equal_to(
+        {response_repo.fetch_response(key).expires_at}
+    )